@@ -0,0 +1,229 @@
+"""
+Local blob cache of downloaded Snapchat memory payloads.
+
+The cache keeps the original payload of every download (the media file or
+the ZIP as served), keyed by SID. When the output directory is rebuilt or
+wiped, memories are restored from the cache at disk speed instead of being
+downloaded again.
+
+Blobs are hardlinked where possible, so caching a download costs no extra
+disk space until the output file is deleted. Downloaded files are never
+modified in place (metadata tools write a new file and rename it), so a
+shared inode keeps the original bytes. The cache has a size cap; the least
+recently used blobs are evicted first.
+"""
+
+import os
+import json
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from dedup import reflink
+from json_store import read_json_object, write_json_atomic, merge_entries
+
+# Default size cap of the cache in bytes
+DEFAULT_BLOB_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+# Name of the index file inside the cache directory
+BLOB_INDEX_FILE = "index.json"
+# Index changes (added, used or removed blobs) collected before the index is saved
+BLOB_INDEX_SAVE_INTERVAL = 50
+
+
+def place_file(source: Path, dest: Path) -> str:
+    """Create dest with the contents of source as cheaply as possible.
+
+    Args:
+        source: Existing file
+        dest: New file to create (must not exist)
+
+    Returns:
+        'hardlink', 'reflink' or 'copy'
+
+    Raises:
+        OSError: If the file could not be copied either
+    """
+    try:
+        os.link(source, dest)
+        return 'hardlink'
+    except OSError:
+        pass
+    if reflink(source, dest):
+        return 'reflink'
+    shutil.copyfile(source, dest)
+    return 'copy'
+
+
+class BlobCache:
+    """Size-capped, least recently used SID -> payload store.
+
+    All methods hold an internal lock, so one cache can be shared by
+    concurrent download workers. Index changes are saved in batches of
+    BLOB_INDEX_SAVE_INTERVAL; call save() when a run ends.
+    """
+
+    def __init__(self, cache_dir: str = "blob_cache", max_bytes: int = DEFAULT_BLOB_CACHE_SIZE):
+        """Initialize the blob cache.
+
+        Args:
+            cache_dir: Directory holding the blobs and their index
+            max_bytes: Size cap; least recently used blobs are evicted above it
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / BLOB_INDEX_FILE
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self.entries = self._load_index()
+        # SIDs added, used or removed since the last save
+        self._changed = set()
+        self.total_bytes = sum(entry['size'] for entry in self.entries.values())
+
+    def _load_index(self) -> "OrderedDict[str, Dict]":
+        """Load the index, least recently used first, dropping blobs that are gone."""
+        entries = {}
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    entries = data
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not load blob cache index {self.index_file}: {e}")
+
+        ordered = sorted(entries.items(), key=lambda item: item[1].get('last_used', 0))
+        return OrderedDict((sid, entry) for sid, entry in ordered
+                           if (self.cache_dir / entry['file']).exists())
+
+    def save(self):
+        """Save the index to the cache directory.
+
+        Blobs other processes (shards) added in the meantime are kept and
+        count towards the size cap; blobs they evicted are dropped.
+        """
+        with self._lock:
+            merged = merge_entries(read_json_object(str(self.index_file)), self.entries, self._changed)
+            ordered = sorted(((sid, entry) for sid, entry in merged.items()
+                              if (self.cache_dir / entry['file']).exists()),
+                             key=lambda item: item[1].get('last_used', 0))
+            self.entries = OrderedDict(ordered)
+            self.total_bytes = sum(entry['size'] for entry in self.entries.values())
+            self._evict()
+            try:
+                write_json_atomic(str(self.index_file), self.entries)
+                self._changed.clear()
+            except OSError as e:
+                print(f"Warning: Failed to save blob cache index: {e}")
+
+    def get(self, sid: str) -> Optional[Dict]:
+        """Look up a memory's cached payload and mark it as recently used.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            Entry with path, media_type, ext, size and sha256, or None if not cached
+        """
+        with self._lock:
+            entry = self.entries.get(sid)
+            if entry is None:
+                return None
+            entry['last_used'] = time.time()
+            self.entries.move_to_end(sid)
+            self._changed.add(sid)
+            self._save_if_due()
+            return dict(entry, path=self.cache_dir / entry['file'])
+
+    def put(self, sid: str, source: Path, media_type: str, ext: str, sha256: str) -> bool:
+        """Add a downloaded payload to the cache.
+
+        Args:
+            sid: Session ID
+            source: Fully downloaded payload, before it is processed
+            media_type: Sniffed payload type ('zip', 'image' or 'video')
+            ext: Sniffed file extension
+            sha256: SHA-256 hex digest of the payload
+
+        Returns:
+            True if the payload was cached, False if it exceeds the size cap or could not be stored
+        """
+        size = source.stat().st_size
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            self._remove(sid)
+            blob_name = f"{sid}.{ext}"
+            blob_path = self.cache_dir / blob_name
+            try:
+                if blob_path.exists():
+                    blob_path.unlink()
+                place_file(source, blob_path)
+            except OSError as e:
+                print(f"Warning: Could not add {sid[:8]}... to blob cache: {e}")
+                return False
+
+            self.entries[sid] = {
+                'file': blob_name,
+                'size': size,
+                'media_type': media_type,
+                'ext': ext,
+                'sha256': sha256,
+                'last_used': time.time()
+            }
+            self._changed.add(sid)
+            self.total_bytes += size
+            self._evict()
+            self._save_if_due()
+            return True
+
+    def restore(self, entry: Dict, dest: Path) -> str:
+        """Recreate a cached payload at dest.
+
+        Args:
+            entry: Entry returned by get()
+            dest: File to create (must not exist)
+
+        Returns:
+            'hardlink', 'reflink' or 'copy'
+
+        Raises:
+            OSError: If the blob is gone or could not be copied
+        """
+        return place_file(entry['path'], dest)
+
+    def invalidate(self, sid: str):
+        """Drop a memory's payload, e.g. after it could not be processed.
+
+        Args:
+            sid: Session ID
+        """
+        with self._lock:
+            if self._remove(sid):
+                self._save_if_due()
+
+    def _remove(self, sid: str) -> bool:
+        """Delete a blob and its entry (lock must be held)."""
+        entry = self.entries.pop(sid, None)
+        if entry is None:
+            return False
+        self._changed.add(sid)
+        self.total_bytes -= entry['size']
+        try:
+            (self.cache_dir / entry['file']).unlink()
+        except OSError:
+            pass
+        return True
+
+    def _save_if_due(self):
+        """Save the index once enough changes have collected (lock must be held)."""
+        if len(self._changed) >= BLOB_INDEX_SAVE_INTERVAL:
+            self.save()
+
+    def _evict(self):
+        """Evict least recently used blobs until the cache fits its cap (lock must be held)."""
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._remove(next(iter(self.entries)))
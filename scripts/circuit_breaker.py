@@ -0,0 +1,157 @@
+"""
+Circuit breaker for Snapchat memories downloads.
+
+When the CDN fails for everything (HTML error pages, 5xx, dropped
+connections), retrying memory after memory only burns their retry budgets.
+The breaker watches the outcome of the last downloads:
+
+- closed: downloads run normally
+- open: the recent error rate crossed the threshold, all workers pause
+- half-open: after the cool-down one probe request is let through; success
+  closes the circuit, failure opens it again with a longer cool-down. A probe
+  that ends without an outcome (or never reports back within the probe
+  timeout) is handed to the next worker.
+"""
+
+import time
+import threading
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Seconds a probe may stay in flight before waiting workers send another one
+DEFAULT_PROBE_TIMEOUT = 600.0
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker shared by all download workers."""
+
+    def __init__(self, window: int = 20, min_requests: int = 10, threshold: float = 0.5,
+                 cooldown: float = 30.0, max_cooldown: float = 300.0,
+                 probe_timeout: float = DEFAULT_PROBE_TIMEOUT):
+        """Initialize the circuit breaker.
+
+        Args:
+            window: Number of recent outcomes the error rate is computed over
+            min_requests: Outcomes needed in the window before the breaker can trip
+            threshold: Error rate (0-1) at which the breaker trips
+            cooldown: Pause in seconds before the first probe
+            max_cooldown: Upper bound for the pause, which doubles after each failed probe
+            probe_timeout: Seconds a probe may stay in flight before another one is sent
+        """
+        self.min_requests = min_requests
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+
+        self.state = CLOSED
+        self.trip_count = 0
+        self.current_cooldown = cooldown
+
+        self._outcomes = deque(maxlen=window)
+        self._open_until = 0.0
+        self._probe_thread = None
+        self._probe_deadline = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def error_rate(self) -> float:
+        """Share of failures among the recent outcomes."""
+        with self._condition:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def acquire(self) -> bool:
+        """Block while the circuit is open.
+
+        A caller chosen to send the probe must end it with record_success(),
+        record_failure() or release_probe().
+
+        Returns:
+            True if the caller was chosen to send the probe request
+        """
+        with self._condition:
+            while True:
+                if self.state == CLOSED:
+                    return False
+
+                now = time.monotonic()
+                if self.state == OPEN:
+                    remaining = self._open_until - now
+                    if remaining <= 0:
+                        self.state = HALF_OPEN
+                        self._probe_thread = threading.get_ident()
+                        self._probe_deadline = now + self.probe_timeout
+                        return True
+                    self._condition.wait(remaining)
+                else:
+                    # Another worker's probe is in flight
+                    remaining = self._probe_deadline - now
+                    if remaining <= 0:
+                        # The probe never reported back - send another one
+                        self.state = OPEN
+                        self._open_until = now
+                        continue
+                    self._condition.wait(remaining)
+
+    def release_probe(self):
+        """Give up the calling thread's probe without an outcome.
+
+        Called when a probe attempt ended some other way (interrupted, disk
+        full, ...): the circuit stays open and the next worker sends a probe.
+        Does nothing if the probe already recorded its outcome.
+        """
+        with self._condition:
+            if self.state == HALF_OPEN and self._probe_thread == threading.get_ident():
+                self._probe_thread = None
+                self.state = OPEN
+                self._open_until = time.monotonic()
+                self._condition.notify_all()
+
+    def record_success(self):
+        """Record a request the server answered properly; closes a half-open circuit."""
+        with self._condition:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.current_cooldown = self.base_cooldown
+                self._outcomes.clear()
+                self._condition.notify_all()
+            elif self.state == CLOSED:
+                self._outcomes.append(True)
+
+    def record_failure(self) -> bool:
+        """Record a systemic failure (server error, error page, network failure).
+
+        Returns:
+            True if the failure happened with the circuit closed and should count
+            against the memory. False if the circuit was open, the failed request
+            was the probe, or this failure tripped the breaker.
+        """
+        with self._condition:
+            if self.state == HALF_OPEN:
+                # Probe failed - stay open longer
+                self.current_cooldown = min(self.max_cooldown, self.current_cooldown * 2)
+                self._open(time.monotonic())
+                return False
+
+            if self.state == OPEN:
+                # Request was already in flight when the breaker tripped
+                return False
+
+            self._outcomes.append(False)
+            if (len(self._outcomes) >= self.min_requests
+                    and self._outcomes.count(False) / len(self._outcomes) >= self.threshold):
+                self.trip_count += 1
+                self._open(time.monotonic())
+                return False
+            return True
+
+    def _open(self, now: float):
+        """Open the circuit for the current cool-down (lock must be held)."""
+        self.state = OPEN
+        self._open_until = now + self.current_cooldown
+        self._condition.notify_all()
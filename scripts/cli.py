@@ -7,6 +7,13 @@ import argparse
 import sys
 from snap_config import check_dependencies
 from downloader import SnapchatDownloader
+from scheduler import SCHEDULE_POLICIES
+from http_pool import DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, DEFAULT_CONNECT_RETRIES, DEFAULT_RETRY_BACKOFF
+from memory_filter import MemoryFilter, MEDIA_TYPES, parse_date, load_sids
+from blob_cache import DEFAULT_BLOB_CACHE_SIZE
+from sharding import Shard, merge_shards
+from coordinator import DEFAULT_COORDINATOR_PORT, DEFAULT_LEASE_SECONDS, DEFAULT_LEASE_BATCH
+from pipeline import DEFAULT_STAGE_WORKERS, DEFAULT_QUEUE_SIZE, parse_stage_workers
 
 try:
     import questionary
@@ -30,6 +37,48 @@ except ImportError:
     MENU_AVAILABLE = False
     custom_style = None
 
+def megabytes(value):
+    """Convert an optional MB value from the command line to bytes."""
+    return int(value * 1024 * 1024) if value is not None else None
+
+
+def gigabytes(value):
+    """Convert a GB value from the command line to bytes."""
+    return int(value * 1024 * 1024 * 1024)
+
+
+def iso_date(value):
+    """Parse a YYYY-MM-DD date from the command line."""
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}' (expected YYYY-MM-DD)")
+
+
+def shard(value):
+    """Parse --shard i/N from the command line."""
+    try:
+        return Shard.parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def stage_workers(value):
+    """Parse --pipeline STAGE=N,... worker counts from the command line."""
+    try:
+        return parse_stage_workers(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def listen_address(value):
+    """Parse a [HOST:]PORT address to listen on from the command line."""
+    host, sep, port = value.rpartition(':')
+    if not port.isdigit():
+        raise argparse.ArgumentTypeError(f"invalid address '{value}' (expected [HOST:]PORT)")
+    return (host if sep else '127.0.0.1'), int(port)
+
+
 def show_interactive_menu():
     """Show interactive menu for selecting operations."""
     if not MENU_AVAILABLE:
@@ -86,6 +135,63 @@ def get_submenu_choice(title, options):
 def run_operation(args, downloader):
     """Execute the selected operation based on args."""
 
+    # Hand out memories to workers on other machines
+    if args.coordinate:
+        host, port = args.coordinate
+        results = downloader.coordinate(host, port, lease_seconds=args.lease_seconds)
+
+        print(f"\nCoordinator Results:")
+        print(f"{'='*60}")
+        print(f"Downloaded by workers: {results['downloaded']}")
+        print(f"Failed: {results['failed']}")
+        print(f"Not finished: {results['pending'] + results['leased']}")
+        print(f"Expired leases handed out again: {results['reissued']}")
+        print(f"{'='*60}\n")
+        return
+
+    # Download memories leased from a coordinator
+    if args.worker:
+        downloader.run_worker(args.worker, batch_size=args.lease_batch, jobs=args.jobs,
+                              delay=args.delay, max_rate=args.max_rate,
+                              pool_connections=args.pool_hosts, pool_maxsize=args.pool_size,
+                              connect_retries=args.connect_retries, retry_backoff=args.retry_backoff)
+        return
+
+    # Fold the state of a sharded run back into the shared files
+    if args.merge_shards:
+        print(f"Merging the state files of {args.merge_shards} shards...")
+        results = merge_shards(args.merge_shards)
+
+        print(f"\nShard Merge Results:")
+        print(f"{'='*60}")
+        print(f"Shards merged: {len(results['shards'])} of {args.merge_shards}")
+        if results['missing']:
+            print(f"Shards without state files: {', '.join(str(index) for index in results['missing'])}")
+        print(f"Downloaded: {results['downloaded']}")
+        print(f"Failed: {results['failed']}")
+        print(f"Logged errors: {results['errors']}")
+        print(f"Timezone conversions: {results['conversions']}")
+        print(f"{'='*60}\n")
+        return
+
+    # Import fresh download links from a newer export
+    if args.refresh_links:
+        print(f"Importing download links from {args.refresh_links}...")
+        results = downloader.refresh_links(args.refresh_links)
+
+        print(f"\nLink Refresh Results:")
+        print(f"{'='*60}")
+        print(f"Links refreshed: {results['refreshed']}")
+        print(f"Already downloaded (unchanged): {results['already_downloaded']}")
+        print(f"Expired-link failures cleared: {results['cleared_failures']}")
+        if results['not_in_export']:
+            print(f"Not in {args.html}: {results['not_in_export']} "
+                  f"(use --html with the newer export to download them)")
+        print(f"{'='*60}\n")
+        if results['refreshed']:
+            print("Run the script again without --refresh-links to download the remaining memories.")
+        return
+
     # Run timezone conversion
     if args.convert_timezone:
         print("Converting all files from UTC to GPS-based timezone...")
@@ -160,7 +266,15 @@ def run_operation(args, downloader):
                 print(f"  ... and {len(results['failed']) - 10} more")
     else:
         # Download all memories
-        downloader.download_all(delay=args.delay)
+        downloader.download_all(delay=args.delay, jobs=args.jobs, max_rate=args.max_rate,
+                                preflight=args.preflight, schedule_policy=args.schedule,
+                                max_bandwidth=megabytes(args.max_bandwidth),
+                                bandwidth_burst=megabytes(args.bandwidth_burst),
+                                pool_connections=args.pool_hosts, pool_maxsize=args.pool_size,
+                                connect_retries=args.connect_retries, retry_backoff=args.retry_backoff,
+                                incremental=args.incremental, pipeline=args.pipeline,
+                                pipeline_queue=args.pipeline_queue,
+                                composite_on_download=args.composite_on_download)
 
 
 def main():
@@ -170,12 +284,71 @@ def main():
                         help='Path to memories_history.html file')
     parser.add_argument('--output', default='memories',
                         help='Output directory for downloaded memories')
+    parser.add_argument('--staging-dir', default=None,
+                        help='Directory for temporary ZIP downloads, e.g. a tmpfs/RAM disk '
+                             '(default: output directory)')
     parser.add_argument('--delay', type=float, default=2.0,
-                        help='Delay between downloads in seconds (default: 2.0, increase if rate limited)')
+                        help='Maximum delay between download requests in seconds (default: 2.0). '
+                             'The rate adapts automatically, this is the slowest it will go')
+    parser.add_argument('--max-rate', type=float, default=5.0,
+                        help='Maximum download requests per second (default: 5.0)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Number of downloads to run in parallel (default: 1)')
+    parser.add_argument('--pipeline', type=stage_workers, nargs='?', const=dict(DEFAULT_STAGE_WORKERS),
+                        default=None, metavar='STAGE=N,...',
+                        help='Download through separate fetch, unpack, metadata and composite stages, each with '
+                             'its own workers, and report how busy each stage was. Optionally set workers per '
+                             'stage, e.g. fetch=6,metadata=3 (default: ' +
+                             ','.join(f'{name}={count}' for name, count in DEFAULT_STAGE_WORKERS.items()) +
+                             '; composite=0 skips compositing). Replaces --jobs')
+    parser.add_argument('--pipeline-queue', type=int, default=DEFAULT_QUEUE_SIZE, metavar='N',
+                        help=f'Items that may wait in front of each pipeline stage before the stage before '
+                             f'it pauses (default: {DEFAULT_QUEUE_SIZE})')
+    parser.add_argument('--max-bandwidth', type=float, default=None, metavar='MB_PER_SEC',
+                        help='Cap total download bandwidth in MB/s, shared by all parallel downloads '
+                             '(default: unlimited)')
+    parser.add_argument('--bandwidth-burst', type=float, default=None, metavar='MB',
+                        help='MB that may be downloaded above --max-bandwidth after idle time '
+                             '(default: one second at --max-bandwidth)')
+    parser.add_argument('--pool-size', type=int, default=None, metavar='N',
+                        help=f'Keep-alive connections kept open per host '
+                             f'(default: {DEFAULT_POOL_MAXSIZE} or --jobs, whichever is larger)')
+    parser.add_argument('--pool-hosts', type=int, default=DEFAULT_POOL_CONNECTIONS, metavar='N',
+                        help=f'Number of hosts to keep connections open for (default: {DEFAULT_POOL_CONNECTIONS})')
+    parser.add_argument('--connect-retries', type=int, default=DEFAULT_CONNECT_RETRIES, metavar='N',
+                        help=f'Retries of a failed connection attempt (DNS, TCP, TLS) '
+                             f'(default: {DEFAULT_CONNECT_RETRIES})')
+    parser.add_argument('--retry-backoff', type=float, default=DEFAULT_RETRY_BACKOFF, metavar='SECONDS',
+                        help=f'Backoff factor between connection retries (default: {DEFAULT_RETRY_BACKOFF})')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='Keep a full copy of every file instead of linking duplicate content')
+    parser.add_argument('--blob-cache', default=None, metavar='DIR',
+                        help='Keep the original downloads in DIR and restore from there instead of '
+                             'downloading again, e.g. after wiping or moving the output directory')
+    parser.add_argument('--blob-cache-size', type=float, default=DEFAULT_BLOB_CACHE_SIZE / 1024 ** 3, metavar='GB',
+                        help=f'Size cap of --blob-cache, least recently used downloads are dropped above it '
+                             f'(default: {DEFAULT_BLOB_CACHE_SIZE // 1024 ** 3})')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only download memories that are new since the last export you imported; '
+                             'an export that was already imported is skipped without parsing it')
+    parser.add_argument('--preflight', action='store_true',
+                        help='Probe all download sizes first: check free disk space and show a byte-based ETA')
+    parser.add_argument('--schedule', choices=SCHEDULE_POLICIES, default='html',
+                        help='Download order (default: html). smallest-first uses --preflight sizes '
+                             'when available')
+    parser.add_argument('--timing-log', default=None, metavar='PATH',
+                        help='Also append the per-download timing breakdown to this JSONL file '
+                             '(default: only print the summary at the end of the run)')
     parser.add_argument('--verify', action='store_true',
                         help='Verify downloads without downloading')
+    parser.add_argument('--refresh-links', default=None, metavar='NEW_HTML',
+                        help='Take fresh download links from a newer memories_history.html for memories '
+                             'that are not downloaded yet')
     parser.add_argument('--apply-overlays', action='store_true',
                         help='Composite overlay PNGs onto base images and videos')
+    parser.add_argument('--composite-on-download', action='store_true',
+                        help='Composite overlays while downloading, as soon as a memory is unpacked, instead of '
+                             'in a separate --apply-overlays pass')
     parser.add_argument('--images-only', action='store_true',
                         help='Only composite overlays onto images (skip videos)')
     parser.add_argument('--videos-only', action='store_true',
@@ -186,15 +359,90 @@ def main():
                         help='Force rebuild of overlay pairs cache')
     parser.add_argument('--convert-timezone', action='store_true',
                         help='Convert all file timestamps and filenames from UTC to GPS-based timezone')
+    parser.add_argument('--since', type=iso_date, default=None, metavar='YYYY-MM-DD',
+                        help='Only process memories captured on or after this date (UTC)')
+    parser.add_argument('--until', type=iso_date, default=None, metavar='YYYY-MM-DD',
+                        help='Only process memories captured on or before this date (UTC)')
+    parser.add_argument('--type', choices=MEDIA_TYPES, action='append', default=None, dest='media_types',
+                        help='Only process memories of this media type (repeat for several)')
+    parser.add_argument('--sids-from', default=None, metavar='FILE',
+                        help='Only process memories whose SID (or 8-character SID prefix) is listed in FILE, '
+                             'one per line')
+    parser.add_argument('--shard', type=shard, default=None, metavar='I/N',
+                        help='Only process shard I of N: a fixed share of the memories, with its own '
+                             'progress and error files, so N processes or machines can split one export')
+    parser.add_argument('--merge-shards', type=int, default=None, metavar='N',
+                        help='Merge the progress, error and timezone files of N shards back into the shared files')
+    parser.add_argument('--coordinate', type=listen_address, default=None, metavar='[HOST:]PORT',
+                        help=f'Hand out the memories of this export to --worker processes, e.g. '
+                             f'0.0.0.0:{DEFAULT_COORDINATOR_PORT} for other machines (default host: 127.0.0.1)')
+    parser.add_argument('--worker', default=None, metavar='URL',
+                        help=f'Download memories handed out by a coordinator, '
+                             f'e.g. http://192.168.1.10:{DEFAULT_COORDINATOR_PORT}. The worker keeps its own '
+                             f'progress and error files (download_progress.worker-<id>.json, errors.worker-<id>.json)')
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS, metavar='SECONDS',
+                        help=f'Seconds a worker may hold memories without reporting before they are '
+                             f'handed out again (default: {DEFAULT_LEASE_SECONDS})')
+    parser.add_argument('--lease-batch', type=int, default=DEFAULT_LEASE_BATCH, metavar='N',
+                        help=f'Memories a worker takes at once (default: {DEFAULT_LEASE_BATCH})')
     parser.add_argument('--interactive', action='store_true',
                         help='Show interactive menu')
 
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.pipeline_queue < 1:
+        parser.error('--pipeline-queue must be at least 1')
+    if args.max_rate <= 0:
+        parser.error('--max-rate must be greater than 0')
+    if args.max_bandwidth is not None and args.max_bandwidth <= 0:
+        parser.error('--max-bandwidth must be greater than 0')
+    if args.bandwidth_burst is not None and args.bandwidth_burst <= 0:
+        parser.error('--bandwidth-burst must be greater than 0')
+    if args.pool_size is not None and args.pool_size < 1:
+        parser.error('--pool-size must be at least 1')
+    if args.pool_hosts < 1:
+        parser.error('--pool-hosts must be at least 1')
+    if args.connect_retries < 0:
+        parser.error('--connect-retries must not be negative')
+    if args.retry_backoff < 0:
+        parser.error('--retry-backoff must not be negative')
+    if args.blob_cache_size <= 0:
+        parser.error('--blob-cache-size must be greater than 0')
+    if args.merge_shards is not None and args.merge_shards < 1:
+        parser.error('--merge-shards must be at least 1')
+    if args.lease_seconds <= 0:
+        parser.error('--lease-seconds must be greater than 0')
+    if args.lease_batch < 1:
+        parser.error('--lease-batch must be at least 1')
+    if args.coordinate and args.worker:
+        parser.error('--coordinate cannot be combined with --worker')
+    if args.merge_shards and args.shard:
+        parser.error('--merge-shards cannot be combined with --shard')
+    if args.composite_on_download and args.pipeline:
+        parser.error('--composite-on-download cannot be combined with --pipeline '
+                     '(its composite stage already composites while downloading)')
+    if args.since and args.until and args.since > args.until:
+        parser.error('--since must not be after --until')
+
+    sids = None
+    if args.sids_from:
+        try:
+            sids = load_sids(args.sids_from)
+        except OSError as e:
+            parser.error(f'--sids-from: cannot read {args.sids_from}: {e}')
+    memory_filter = MemoryFilter(since=args.since, until=args.until, media_types=args.media_types, sids=sids,
+                                 shard=args.shard)
+
     # Determine if we should show interactive menu
     # Show menu if --interactive flag OR if no action flags were provided
     show_menu = args.interactive or not any([
         args.verify,
+        args.coordinate,
+        args.worker,
+        args.merge_shards,
+        args.refresh_links,
         args.apply_overlays,
         args.verify_composites,
         args.convert_timezone,
@@ -204,7 +452,10 @@ def main():
     check_dependencies()
 
     # Create downloader instance (once, reused for all operations)
-    downloader = SnapchatDownloader(args.html, args.output)
+    downloader = SnapchatDownloader(args.html, args.output, staging_dir=args.staging_dir,
+                                    dedup=not args.no_dedup, timing_log=args.timing_log,
+                                    memory_filter=memory_filter, blob_cache_dir=args.blob_cache,
+                                    blob_cache_size=gigabytes(args.blob_cache_size))
 
     # Interactive menu loop
     if show_menu and MENU_AVAILABLE:
@@ -217,6 +468,10 @@ def main():
 
             # Reset args for this iteration
             args.verify = False
+            args.coordinate = None
+            args.worker = None
+            args.merge_shards = None
+            args.refresh_links = None
             args.apply_overlays = False
             args.verify_composites = False
             args.convert_timezone = False
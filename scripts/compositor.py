@@ -2,6 +2,7 @@
 Overlay compositing for Snapchat memories (images and videos).
 """
 
+import io
 import os
 import json
 import subprocess
@@ -217,7 +218,8 @@ def find_overlay_pairs(output_dir: Path, pairs_cache_file: str = "overlay_pairs.
     return pairs
 
 
-def composite_image(base_file: Path, overlay_file: Path, output_dir: Path, has_exiftool: bool = False, error_logger: Optional[ErrorLogger] = None) -> Tuple[bool, str]:
+def composite_image(base_file: Path, overlay_file: Path, output_dir: Path, has_exiftool: bool = False, error_logger: Optional[ErrorLogger] = None,
+                    base_data: Optional[bytes] = None, overlay_data: Optional[bytes] = None) -> Tuple[bool, str]:
     """Composite overlay onto image using Pillow.
 
     Args:
@@ -226,6 +228,8 @@ def composite_image(base_file: Path, overlay_file: Path, output_dir: Path, has_e
         output_dir: Output directory for composited images
         has_exiftool: Whether exiftool is available (auto-copies metadata if True)
         error_logger: Optional error logger for detailed error tracking
+        base_data: Contents of base_file if still in memory (decoded instead of reading the file)
+        overlay_data: Contents of overlay_file if still in memory
 
     Returns:
         (success, message)
@@ -234,7 +238,7 @@ def composite_image(base_file: Path, overlay_file: Path, output_dir: Path, has_e
         from PIL import Image
 
         # Validate base file (overlay validation already done in find_overlay_pairs())
-        base_size = base_file.stat().st_size
+        base_size = len(base_data) if base_data is not None else base_file.stat().st_size
         if base_size == 0:
             error_msg = "Base image file is empty (0 bytes)"
             if error_logger:
@@ -250,8 +254,8 @@ def composite_image(base_file: Path, overlay_file: Path, output_dir: Path, has_e
             return False, error_msg
 
         # Open base image and overlay
-        base = Image.open(base_file)
-        overlay = Image.open(overlay_file)
+        base = Image.open(io.BytesIO(base_data) if base_data is not None else base_file)
+        overlay = Image.open(io.BytesIO(overlay_data) if overlay_data is not None else overlay_file)
 
         # Convert to RGBA if needed
         if base.mode != 'RGBA':
@@ -0,0 +1,334 @@
+"""
+Work coordinator for downloading one export with several machines.
+
+The coordinator holds the pending memories of an export and hands them out
+in batches over a small JSON-over-HTTP protocol:
+
+- POST /lease  {"worker": ID, "count": N}
+  -> {"memories": [...], "finished": bool, "lease_seconds": S}
+- POST /report {"worker": ID, "sid": SID, "success": bool, "message": TEXT, "retry": bool}
+  -> {"accepted": bool}
+- GET  /status -> counts of pending, leased, downloaded and failed memories
+
+Every handed-out memory is leased to the worker for a limited time. A
+report renews the worker's other leases, so a busy worker keeps its batch.
+Leases of workers that stopped reporting expire and the memories are
+handed out again. A failure the worker may retry goes back to the end of
+the queue, up to DEFAULT_MAX_REQUEUES times. The protocol works the same on
+localhost, so coordinator and workers can run on one machine; each worker
+keeps its own progress and error files (see worker_state_file()).
+"""
+
+import re
+import json
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+# Port the coordinator listens on by default
+DEFAULT_COORDINATOR_PORT = 8765
+# Seconds a worker may hold leased memories without reporting
+DEFAULT_LEASE_SECONDS = 600
+# Memories leased to a worker at once
+DEFAULT_LEASE_BATCH = 10
+# Seconds an idle worker waits before asking for work again
+WORKER_POLL_INTERVAL = 5.0
+# Times a memory whose download failed with a retryable error is handed out again
+DEFAULT_MAX_REQUEUES = 3
+
+
+def worker_state_file(path: str, worker: str) -> str:
+    """Get the name of a worker's own copy of a state file.
+
+    Workers started in the coordinator's directory would otherwise rewrite
+    the coordinator's progress and error files.
+
+    Args:
+        path: Shared state file, e.g. download_progress.json
+        worker: Worker ID
+
+    Returns:
+        Path with '.worker-<id>' before the extension
+    """
+    file_path = Path(path)
+    safe_id = re.sub(r'[^\w.-]', '_', worker)
+    return str(file_path.with_name(f"{file_path.stem}.worker-{safe_id}{file_path.suffix}"))
+
+
+class LeaseQueue:
+    """Pending memories handed out to workers under expiring leases.
+
+    All methods hold an internal lock, so the queue can be shared by the
+    coordinator's request handler threads.
+    """
+
+    def __init__(self, memories: List[Dict], lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 on_success: Optional[Callable[[Dict], None]] = None, max_requeues: int = DEFAULT_MAX_REQUEUES):
+        """Initialize the queue.
+
+        Args:
+            memories: Memories to hand out, in order
+            lease_seconds: Seconds a worker may hold a memory without reporting
+            on_success: Called with each memory a worker downloaded
+            max_requeues: Times a retryable failure is handed out again before it is final
+        """
+        self.lease_seconds = lease_seconds
+        self.max_requeues = max_requeues
+        self.requeues = {}
+        self.on_success = on_success
+        self.memories = {memory['sid']: memory for memory in memories}
+        self.pending = deque(memory['sid'] for memory in memories)
+        self.leases = {}
+        self.downloaded = set()
+        self.failed = {}
+        self.reissued = 0
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        if not self.pending:
+            self._finished.set()
+
+    def lease(self, worker: str, count: int) -> List[Dict]:
+        """Lease up to `count` memories to a worker.
+
+        Args:
+            worker: Worker ID
+            count: Maximum number of memories
+
+        Returns:
+            Leased memories (empty if nothing is pending right now)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._reclaim_expired(now)
+            leased = []
+            while self.pending and len(leased) < count:
+                sid = self.pending.popleft()
+                self.leases[sid] = {'worker': worker, 'expires_at': now + self.lease_seconds}
+                leased.append(self.memories[sid])
+            return leased
+
+    def report(self, worker: str, sid: str, success: bool, message: str = '', retry: bool = False) -> bool:
+        """Record a worker's result for a leased memory.
+
+        A success is always accepted, even after the lease expired. A failure
+        is only accepted from the worker currently holding the lease, so a
+        slow worker cannot fail a memory another worker is downloading.
+        A retryable failure is queued again until it was handed out
+        max_requeues more times.
+
+        Args:
+            worker: Worker ID
+            sid: Session ID
+            success: Whether the download succeeded
+            message: Result message from the worker
+            retry: Whether the failure may succeed on another attempt
+
+        Returns:
+            True if the result was recorded
+        """
+        with self._lock:
+            if sid not in self.memories or sid in self.downloaded or sid in self.failed:
+                return False
+            lease = self.leases.get(sid)
+            if not success and (lease is None or lease['worker'] != worker):
+                return False
+
+            self.leases.pop(sid, None)
+            if sid in self.pending:
+                self.pending.remove(sid)
+            if success:
+                self.downloaded.add(sid)
+            elif retry and self.requeues.get(sid, 0) < self.max_requeues:
+                self.requeues[sid] = self.requeues.get(sid, 0) + 1
+                self.pending.append(sid)
+            else:
+                self.failed[sid] = message
+
+            # Any report shows the worker is alive - extend its other leases
+            expires_at = time.monotonic() + self.lease_seconds
+            for held in self.leases.values():
+                if held['worker'] == worker:
+                    held['expires_at'] = expires_at
+
+            if not self.pending and not self.leases:
+                self._finished.set()
+
+        if success and self.on_success is not None:
+            self.on_success(self.memories[sid])
+        return True
+
+    def _reclaim_expired(self, now: float):
+        """Put memories whose lease expired back at the front of the queue (lock must be held)."""
+        expired = [sid for sid, lease in self.leases.items() if lease['expires_at'] <= now]
+        for sid in reversed(expired):
+            del self.leases[sid]
+            self.pending.appendleft(sid)
+        self.reissued += len(expired)
+
+    @property
+    def finished(self) -> bool:
+        """True once every memory was reported as downloaded or failed."""
+        return self._finished.is_set()
+
+    def wait_finished(self, timeout: float) -> bool:
+        """Wait until every memory was reported.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if finished
+        """
+        return self._finished.wait(timeout)
+
+    def status(self) -> Dict:
+        """Get the queue counts.
+
+        Returns:
+            Dictionary with total, pending, leased, downloaded, failed, reissued, requeued and finished
+        """
+        with self._lock:
+            self._reclaim_expired(time.monotonic())
+            return {
+                'total': len(self.memories),
+                'pending': len(self.pending),
+                'leased': len(self.leases),
+                'downloaded': len(self.downloaded),
+                'failed': len(self.failed),
+                'reissued': self.reissued,
+                'requeued': sum(self.requeues.values()),
+                'finished': self.finished
+            }
+
+
+class _CoordinatorHandler(BaseHTTPRequestHandler):
+    """JSON request handler of the coordinator protocol."""
+
+    def do_GET(self):
+        if self.path == '/status':
+            self._send_json(200, self.server.queue.status())
+        else:
+            self._send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            worker = str(request['worker'])
+            if self.path == '/lease':
+                memories = self.server.queue.lease(worker, max(1, int(request.get('count', 1))))
+                self._send_json(200, {'memories': memories, 'finished': self.server.queue.finished,
+                                      'lease_seconds': self.server.queue.lease_seconds})
+            elif self.path == '/report':
+                accepted = self.server.queue.report(worker, str(request['sid']), bool(request['success']),
+                                                    str(request.get('message', '')), bool(request.get('retry')))
+                self._send_json(200, {'accepted': accepted})
+            else:
+                self._send_json(404, {'error': f"Unknown path {self.path}"})
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {'error': f"Bad request: {e}"})
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Progress is reported by the coordinator loop, not per request
+        pass
+
+
+class CoordinatorServer(ThreadingHTTPServer):
+    """HTTP server handing out the memories of a LeaseQueue."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], queue: LeaseQueue):
+        """Initialize the server.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free port
+            queue: Queue of memories to hand out
+        """
+        super().__init__(address, _CoordinatorHandler)
+        self.queue = queue
+
+    @property
+    def url(self) -> str:
+        """URL workers connect to."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class CoordinatorClient:
+    """Worker side of the coordinator protocol."""
+
+    def __init__(self, url: str, worker: str, timeout: float = 30):
+        """Initialize the client.
+
+        Args:
+            url: Coordinator URL, e.g. http://192.168.1.10:8765
+            worker: ID of this worker
+            timeout: Request timeout in seconds
+        """
+        self.url = url.rstrip('/')
+        self.worker = worker
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def lease(self, count: int) -> Tuple[List[Dict], bool]:
+        """Lease a batch of memories.
+
+        Args:
+            count: Maximum number of memories
+
+        Returns:
+            (memories, finished) - finished is True once the coordinator has no work left
+
+        Raises:
+            requests.RequestException: Coordinator not reachable or answered with an error
+        """
+        data = self._post('/lease', {'worker': self.worker, 'count': count})
+        return data['memories'], data['finished']
+
+    def report(self, sid: str, success: bool, message: str, retry: bool = False) -> bool:
+        """Report the result of a leased memory.
+
+        Args:
+            sid: Session ID
+            success: Whether the download succeeded
+            message: Result message
+            retry: Whether the failure may succeed on another attempt
+
+        Returns:
+            True if the coordinator recorded the result
+
+        Raises:
+            requests.RequestException: Coordinator not reachable or answered with an error
+        """
+        data = self._post('/report', {'worker': self.worker, 'sid': sid, 'success': success, 'message': message,
+                                      'retry': retry})
+        return data['accepted']
+
+    def status(self) -> Dict:
+        """Get the coordinator's queue counts.
+
+        Returns:
+            Dictionary from LeaseQueue.status()
+        """
+        response = self.session.get(f"{self.url}/status", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, path: str, payload: Dict) -> Dict:
+        response = self.session.post(f"{self.url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
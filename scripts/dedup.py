@@ -0,0 +1,217 @@
+"""
+Content deduplication for downloaded memories.
+
+Exports often contain the same media saved several times under different
+SIDs. Every file is hashed (SHA-256) while it streams to disk, and the
+ContentIndex maps each hash to the first file stored with that content.
+A later download with the same content is replaced by:
+
+- a hardlink, when both memories have identical date and location, so the
+  shared inode carries exactly the timestamps and metadata each file needs
+- a reflink (copy-on-write clone) where the filesystem supports it, so the
+  new file gets its own inode and its own timestamps and GPS metadata
+"""
+
+import json
+import os
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from json_store import read_json_object, write_json_atomic, merge_entries
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linux ioctl that clones a file's extents (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+# Index changes (added or dropped entries) collected before the index is saved
+CONTENT_INDEX_SAVE_INTERVAL = 50
+
+
+def hash_file(file_path: Path, digest=None, chunk_size: int = 64 * 1024):
+    """Feed a file's contents into a hash object in chunks.
+
+    Args:
+        file_path: File to hash
+        digest: hashlib object to update (default: a new SHA-256)
+        chunk_size: Read size in bytes
+
+    Returns:
+        The updated hash object
+    """
+    if digest is None:
+        digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest
+
+
+def reflink(source: Path, dest: Path) -> bool:
+    """Create dest as a copy-on-write clone of source.
+
+    Args:
+        source: Existing file
+        dest: New file to create
+
+    Returns:
+        True if the clone was created, False if the filesystem does not support it
+    """
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(dest, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if dest.exists():
+            dest.unlink()
+        return False
+
+
+class ContentIndex:
+    """Persistent SHA-256 -> stored file index used to deduplicate downloads.
+
+    All methods that read or modify the index hold an internal lock, so a
+    single index can be shared by concurrent download workers. Index changes
+    are saved in batches of CONTENT_INDEX_SAVE_INTERVAL; call save() when a
+    run ends.
+    """
+
+    def __init__(self, index_file: str = "content_index.json"):
+        """Initialize the content index.
+
+        Args:
+            index_file: Path to JSON file for storing the index
+        """
+        self.index_file = index_file
+        self._lock = threading.RLock()
+        self.entries = self._load_index()
+        # Digests added or dropped since the last save
+        self._changed = set()
+
+    def _load_index(self) -> Dict:
+        """Load the index from its JSON file (a broken index is rebuilt, not fatal)."""
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not load content index {self.index_file}: {e}")
+        return {}
+
+    def save(self):
+        """Save the index to its JSON file, keeping entries other processes (shards) saved meanwhile."""
+        with self._lock:
+            self.entries = merge_entries(read_json_object(self.index_file), self.entries, self._changed)
+            try:
+                write_json_atomic(self.index_file, self.entries)
+                self._changed.clear()
+            except OSError as e:
+                print(f"Warning: Failed to save content index: {e}")
+
+    def find(self, digest: str) -> Optional[Dict]:
+        """Find the stored file for a content hash.
+
+        Entries whose file was deleted or changed since it was indexed
+        (e.g. by timezone conversion) are dropped.
+
+        Args:
+            digest: SHA-256 hex digest of the downloaded content
+
+        Returns:
+            Index entry (path, date, location, pristine, size, mtime_ns) or None
+        """
+        with self._lock:
+            entry = self.entries.get(digest)
+            if not entry:
+                return None
+            try:
+                stat = os.stat(entry['path'])
+            except OSError:
+                stat = None
+            if stat is None or stat.st_size != entry['size'] or stat.st_mtime_ns != entry['mtime_ns']:
+                del self.entries[digest]
+                self._changed.add(digest)
+                self._save_if_due()
+                return None
+            return dict(entry)
+
+    def add(self, digest: str, file_path: Path, memory: Dict, pristine: bool):
+        """Record the stored file for a content hash (the first one wins).
+
+        Call this after timestamps and metadata have been written, so the
+        recorded size and mtime match the final file.
+
+        Args:
+            digest: SHA-256 hex digest of the downloaded content
+            file_path: Final path of the stored file
+            memory: Memory dictionary the file belongs to
+            pristine: True if the file still holds exactly the downloaded bytes
+        """
+        with self._lock:
+            if self.find(digest):
+                return
+            stat = os.stat(file_path)
+            self.entries[digest] = {
+                'path': str(file_path),
+                'date': memory.get('date'),
+                'location': memory.get('location', ''),
+                'pristine': pristine,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns
+            }
+            self._changed.add(digest)
+            self._save_if_due()
+
+    def _save_if_due(self):
+        """Save the index once enough changes have collected (lock must be held)."""
+        if len(self._changed) >= CONTENT_INDEX_SAVE_INTERVAL:
+            self.save()
+
+    def link_duplicate(self, digest: str, part_file: Path, output_path: Path, memory: Dict) -> Optional[str]:
+        """Replace a freshly downloaded file with a link to identical stored content.
+
+        Args:
+            digest: SHA-256 hex digest of part_file
+            part_file: Fully downloaded file, not yet moved into place
+            output_path: Final destination path
+            memory: Memory dictionary the file belongs to
+
+        Returns:
+            'hardlink' or 'reflink' if part_file was replaced (and removed), None otherwise
+        """
+        entry = self.find(digest)
+        if not entry:
+            return None
+
+        existing = Path(entry['path'])
+        if existing == output_path:
+            return None
+        link_file = output_path.parent / f".{output_path.name}.link"
+
+        same_metadata = (entry['date'] == memory.get('date')
+                         and entry['location'] == memory.get('location', ''))
+        if same_metadata:
+            try:
+                os.link(existing, link_file)
+                os.replace(link_file, output_path)
+                part_file.unlink()
+                return 'hardlink'
+            except OSError:
+                if link_file.exists():
+                    link_file.unlink()
+
+        # A clone copies the stored bytes, so they must still be the downloaded ones
+        if entry['pristine'] and reflink(existing, link_file):
+            os.replace(link_file, output_path)
+            part_file.unlink()
+            return 'reflink'
+
+        return None
@@ -0,0 +1,99 @@
+"""
+Exception types raised by the download path.
+
+They subclass ValueError so existing `except ValueError` handlers keep working,
+while callers that care can tell throttling and server errors apart from
+other failures without matching on error message strings. DiskFullError is
+the exception: it is not a failure of one memory and stops the whole run.
+"""
+
+import errno
+from typing import Optional
+
+# errno values of a full file system or an exhausted disk quota (EDQUOT does not exist on Windows)
+DISK_FULL_ERRNOS = {errno.ENOSPC, getattr(errno, 'EDQUOT', errno.ENOSPC)}
+
+
+class DownloadError(ValueError):
+    """Base class for errors raised while downloading a memory."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RateLimitedError(DownloadError):
+    """Server answered HTTP 429 Too Many Requests."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message, status_code=429)
+        self.retry_after = retry_after
+
+
+class ServerError(DownloadError):
+    """Server answered with an HTTP 5xx status."""
+
+    def __init__(self, message: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(message, status_code=status_code)
+        self.retry_after = retry_after
+
+
+class TransferInterruptedError(DownloadError):
+    """The response body stopped before the whole file arrived.
+
+    The bytes received so far are kept as a partial file that the next
+    attempt resumes with an HTTP Range request.
+    """
+
+    def __init__(self, message: str, bytes_received: int = 0):
+        super().__init__(message)
+        self.bytes_received = bytes_received
+
+
+class ErrorPageError(DownloadError):
+    """Server answered with an HTML error page instead of the media file.
+
+    Snapchat serves these when it throttles downloads, so they are retried
+    like rate limiting rather than counted as a broken memory.
+    """
+
+
+class LinkExpiredError(DownloadError):
+    """The download link of a memory was rejected (HTTP 403/410).
+
+    Signed URLs expire. For a resolved CDN URL the cached URL is dropped and
+    the next attempt resolves the export link again; a pre-signed export
+    link is retried later or replaced with --refresh-links.
+    """
+
+
+class OversizedBodyError(DownloadError):
+    """The response body was larger than the server announced (Content-Length).
+
+    A proxy or a mixed-up connection delivered the wrong bytes, so the file
+    is discarded and downloaded again.
+    """
+
+
+class DiskFullError(OSError):
+    """The output file system ran out of space or quota.
+
+    Every further download would fail the same way, so the run stops instead
+    of using up the retry budgets of the remaining memories.
+    """
+
+
+def is_disk_full(error: Optional[BaseException]) -> bool:
+    """Check whether an error (or the error that caused it) means the disk is full.
+
+    Args:
+        error: Exception raised while downloading or storing a memory
+
+    Returns:
+        True for ENOSPC/EDQUOT
+    """
+    while error is not None:
+        if isinstance(error, DiskFullError) or (isinstance(error, OSError) and error.errno in DISK_FULL_ERRNOS):
+            return True
+        error = error.__cause__
+    return False
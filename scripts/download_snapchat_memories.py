@@ -22,14 +22,48 @@ Usage:
     Options:
         --html PATH              Path to memories_history.html
         --output PATH            Output directory for memories
-        --delay SECONDS          Delay between downloads (default: 2.0)
+        --staging-dir PATH       Directory for temporary ZIP downloads
+        --delay SECONDS          Maximum delay between requests (default: 2.0)
+        --max-rate N             Maximum requests per second (default: 5.0)
+        --jobs N                 Number of parallel downloads (default: 1)
+        --pipeline [STAGE=N,...] Download through fetch, unpack, metadata and composite
+                                 stages with their own workers (replaces --jobs;
+                                 default: fetch=4,unpack=2,metadata=2,composite=1)
+        --pipeline-queue N       Items waiting in front of each pipeline stage (default: 8)
+        --max-bandwidth MB/S     Cap total download bandwidth (default: unlimited)
+        --bandwidth-burst MB     Burst allowance above --max-bandwidth
+        --pool-size N            Keep-alive connections per host (default: 10 or --jobs)
+        --pool-hosts N           Hosts to keep connections open for (default: 10)
+        --connect-retries N      Retries of failed connection attempts (default: 2)
+        --retry-backoff SECONDS  Backoff factor between connection retries (default: 0.5)
+        --no-dedup               Don't link duplicate content, keep full copies
+        --blob-cache DIR         Keep original downloads in DIR and restore from there
+        --blob-cache-size GB     Size cap of the blob cache (default: 10)
+        --incremental            Only download memories new since the last export
+        --preflight              Check sizes and free space before downloading
+        --schedule POLICY        Download order: html, newest-first, smallest-first,
+                                 interleaved, failures-last (default: html)
+        --timing-log PATH        Append the per-download timing breakdown to PATH (default: off)
         --verify                 Verify downloads without downloading
+        --refresh-links PATH     Import fresh links from a newer memories_history.html
         --apply-overlays         Composite overlays onto media
+        --composite-on-download  Composite overlays while downloading instead of in a
+                                 later --apply-overlays pass (not with --pipeline)
         --images-only            Only composite images
         --videos-only            Only composite videos
         --verify-composites      Verify composited files
         --rebuild-cache          Rebuild overlay pairs cache
         --convert-timezone       Convert all files from UTC to local timezone
+        --since YYYY-MM-DD       Only memories captured on or after this date
+        --until YYYY-MM-DD       Only memories captured on or before this date
+        --type image|video       Only memories of this media type
+        --sids-from FILE         Only memories whose SIDs are listed in FILE
+        --shard I/N              Only process shard I of N (own progress files)
+        --merge-shards N         Merge the state files of N shards
+        --coordinate [HOST:]PORT Hand out memories to --worker processes
+        --worker URL             Download memories handed out by a coordinator
+        --lease-seconds SECONDS  Time a worker may hold memories (default: 600)
+        --lease-batch N          Memories a worker takes at once (default: 10)
 
 Examples:
     # Download all memories
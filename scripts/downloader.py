@@ -2,21 +2,90 @@
 Download and organize Snapchat memories.
 """
 
+import io
 import os
 import time
+import socket
+import hashlib
 import zipfile
-import shutil
+import threading
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Tuple, List, Iterator, Optional
 
 from snap_config import check_exiftool, check_pywin32, check_pillow, check_ffmpeg
 from snap_parser import parse_html_file
 from progress import ProgressTracker
-from metadata import set_file_timestamps, add_gps_metadata, update_existing_file_metadata
+from metadata import (
+    set_file_timestamps,
+    add_gps_metadata,
+    update_existing_file_metadata,
+    parse_location,
+    is_valid_gps_coordinates
+)
 from compositor import find_overlay_pairs, composite_image, composite_video
 from error_logger import ErrorLogger
+from download_errors import (
+    RateLimitedError,
+    ServerError,
+    TransferInterruptedError,
+    ErrorPageError,
+    LinkExpiredError,
+    OversizedBodyError,
+    DiskFullError,
+    is_disk_full
+)
+from rate_limiter import RateController, TokenBucket, parse_retry_after
+from dedup import ContentIndex, hash_file
+from scheduler import schedule
+from retry_queue import (
+    DeferredQueue,
+    classify_failure,
+    budget_exhausted,
+    PERMANENT,
+    THROTTLED,
+    CIRCUIT_OPEN,
+    RETRY_COOLDOWNS
+)
+from circuit_breaker import CircuitBreaker
+from url_resolver import URLCache, needs_resolution, resolve_url, RESOLVE_BATCH_SIZE
+from export_index import ExportIndex, fingerprint_export
+from memory_filter import MemoryFilter
+from blob_cache import BlobCache, DEFAULT_BLOB_CACHE_SIZE
+from sharding import PROGRESS_FILE, ERROR_LOG_FILE, TIMEZONE_FILE
+from coordinator import (
+    LeaseQueue,
+    CoordinatorServer,
+    CoordinatorClient,
+    DEFAULT_COORDINATOR_PORT,
+    DEFAULT_LEASE_SECONDS,
+    DEFAULT_LEASE_BATCH,
+    WORKER_POLL_INTERVAL,
+    worker_state_file
+)
+from pipeline import Pipeline, Stage, PIPELINE_STAGES, DEFAULT_QUEUE_SIZE
+from timing import StageTimer, TimingLog, take_connect_time
+from http_pool import (
+    PooledHTTPAdapter,
+    ConnectionStats,
+    DEFAULT_POOL_CONNECTIONS,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_CONNECT_RETRIES,
+    DEFAULT_RETRY_BACKOFF
+)
+from preflight import (
+    probe_size,
+    PROBE_MAX_DELAY,
+    PROBE_MAX_RATE,
+    estimate_sizes,
+    check_free_space,
+    preallocate,
+    format_duration,
+    TransferProgress
+)
 from timezone_converter import (
     utc_to_local,
     utc_to_gps_timezone,
@@ -30,6 +99,32 @@ from timezone_converter import (
 from timezone_tracker import TimezoneConversionTracker
 
 
+# Size of the chunks streamed from the network to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def format_size(num_bytes: float) -> str:
+    """Format a byte count for display.
+
+    Args:
+        num_bytes: Number of bytes
+
+    Returns:
+        Human-readable size such as '1.5 MB'
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(num_bytes) < 1024 or unit == 'GB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{int(num_bytes)} B"
+        num_bytes /= 1024
+
+
+def _copy_chunks(chunks: Iterator[bytes], buffer: io.BytesIO) -> Iterator[bytes]:
+    """Pass chunks through while also writing them to a buffer."""
+    for chunk in chunks:
+        buffer.write(chunk)
+        yield chunk
+
+
 class SnapchatDownloader:
     """Download and organize Snapchat memories.
 
@@ -41,18 +136,67 @@ class SnapchatDownloader:
     - Overlay compositing
     """
 
-    def __init__(self, html_file: str, output_dir: str = "memories"):
+    def __init__(self, html_file: str, output_dir: str = "memories", staging_dir: Optional[str] = None,
+                 dedup: bool = True, timing_log: Optional[str] = None,
+                 memory_filter: Optional[MemoryFilter] = None, blob_cache_dir: Optional[str] = None,
+                 blob_cache_size: int = DEFAULT_BLOB_CACHE_SIZE):
         """Initialize the downloader with configuration.
 
         Args:
             html_file: Path to memories_history.html
             output_dir: Output directory for downloaded memories
+            staging_dir: Directory for temporary ZIP downloads, e.g. a tmpfs
+                         mount (default: output_dir)
+            dedup: Replace files whose content was already downloaded with
+                   hardlinks/reflinks
+            timing_log: JSONL file the per-download timing breakdown is appended to
+                        (default: the breakdown is only summarized at the end of a run)
+            memory_filter: Restrict every operation to the selected memories
+                           (default: all memories). With a shard, the
+                           progress, error and timezone files are the shard's own
+            blob_cache_dir: Keep the original payloads in this directory and
+                            restore from it instead of downloading again
+                            (default: no blob cache)
+            blob_cache_size: Size cap of the blob cache in bytes
         """
         self.html_file = html_file
         self.output_dir = Path(output_dir)
-        self.progress_tracker = ProgressTracker()
-        self.error_logger = ErrorLogger()
-        self.session = requests.Session()
+        self.staging_dir = Path(staging_dir) if staging_dir else self.output_dir
+        self.memory_filter = memory_filter or MemoryFilter()
+
+        shard = self.memory_filter.shard
+        if shard is not None:
+            shard.seed_progress(PROGRESS_FILE)
+            shard.seed_timezone_conversions(TIMEZONE_FILE)
+            self.progress_tracker = ProgressTracker(shard.state_file(PROGRESS_FILE))
+            self.error_logger = ErrorLogger(shard.state_file(ERROR_LOG_FILE))
+            self.timezone_file = shard.state_file(TIMEZONE_FILE)
+        else:
+            self.progress_tracker = ProgressTracker(PROGRESS_FILE)
+            self.error_logger = ErrorLogger(ERROR_LOG_FILE)
+            self.timezone_file = TIMEZONE_FILE
+        self.http_adapter = PooledHTTPAdapter()
+        self._http_pool_config = (DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, DEFAULT_CONNECT_RETRIES,
+                                  DEFAULT_RETRY_BACKOFF)
+        self.session = self._new_session()
+        self._thread_local = threading.local()
+        self.rate_controller = RateController()
+        self._stats_lock = threading.Lock()
+        self.download_stats = self._new_download_stats()
+        self.content_index = ContentIndex() if dedup else None
+        self.transfer_progress = None
+        self._remaining_sizes = {}
+        self._export_diff = None
+        self.bandwidth_limiter = None
+        self._run_start = time.monotonic()
+        self.retry_cooldowns = dict(RETRY_COOLDOWNS)
+        self.circuit_breaker = CircuitBreaker()
+        self.timing_log = TimingLog(timing_log)
+        self.url_cache = URLCache()
+        self.blob_cache = BlobCache(blob_cache_dir, blob_cache_size) if blob_cache_dir else None
+        self.composite_on_download = False
+        self._composite_jobs = None
+        self._composite_futures = []
 
         # Check for optional dependencies
         self.has_exiftool = check_exiftool()
@@ -64,21 +208,89 @@ class SnapchatDownloader:
         # Create output directories
         self._create_output_dirs()
 
+    @staticmethod
+    def _new_download_stats() -> Dict:
+        """Create zeroed per-run download statistics."""
+        return {'resumed': 0, 'resumed_bytes': 0, 'deduplicated': 0, 'dedup_bytes': 0, 'bytes': 0,
+                'cached': 0, 'cached_bytes': 0, 'composited': 0, 'composite_failures': 0,
+                'deferred': 0, 'recovered': 0, 'circuit_failures': 0}
+
     def _create_output_dirs(self):
         """Create all necessary output directories."""
         self.output_dir.mkdir(exist_ok=True)
         (self.output_dir / "images").mkdir(exist_ok=True)
         (self.output_dir / "videos").mkdir(exist_ok=True)
         (self.output_dir / "overlays").mkdir(exist_ok=True)
-
-    def download_all(self, delay: float = 2.0):
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    def download_all(self, delay: float = 2.0, jobs: int = 1, max_rate: float = 5.0,
+                     preflight: bool = False, schedule_policy: str = 'html',
+                     max_bandwidth: Optional[float] = None, bandwidth_burst: Optional[float] = None,
+                     pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: Optional[int] = None,
+                     connect_retries: int = DEFAULT_CONNECT_RETRIES,
+                     retry_backoff: float = DEFAULT_RETRY_BACKOFF, incremental: bool = False,
+                     pipeline: Optional[Dict[str, int]] = None, pipeline_queue: int = DEFAULT_QUEUE_SIZE,
+                     composite_on_download: bool = False):
         """Download all memories with progress tracking.
 
+        Requests are paced by an adaptive rate controller shared by all workers.
+        It starts at one request per `delay` seconds, speeds up while responses
+        are healthy and backs off on 429/5xx responses.
+
         Args:
-            delay: Delay between downloads in seconds
+            delay: Maximum delay between requests in seconds (upper bound for pacing)
+            jobs: Number of downloads to run concurrently (1 = sequential)
+            max_rate: Maximum request rate in requests per second
+            preflight: Probe all download sizes first, check free space and
+                       show a byte-based ETA
+            schedule_policy: Download order, one of scheduler.SCHEDULE_POLICIES
+            max_bandwidth: Sustained bandwidth cap for all transfers together, in
+                           bytes per second (None = unlimited)
+            bandwidth_burst: Bytes that may be received above the sustained rate
+                             after idle time (default: one second's worth)
+            pool_connections: Number of hosts to keep a connection pool for
+            pool_maxsize: Keep-alive connections kept open per host
+                          (default: DEFAULT_POOL_MAXSIZE or `jobs`, whichever is larger)
+            connect_retries: Retries of a failed connection attempt (DNS, TCP, TLS)
+            retry_backoff: Backoff factor between connection retries in seconds
+            incremental: Only download memories that are new since the last
+                         imported export; skip an export that was imported before
+            pipeline: Worker threads per stage to download through the staged
+                      pipeline (see pipeline.PIPELINE_STAGES); replaces `jobs`
+                      (default: no pipeline)
+            pipeline_queue: Items that may wait in front of each pipeline stage
+            composite_on_download: Composite overlays as soon as a ZIP is
+                                   extracted instead of in a later pass (the
+                                   pipeline has its own composite stage)
         """
+        if pipeline:
+            jobs = pipeline['fetch']
+        if pool_maxsize is None:
+            pool_maxsize = max(DEFAULT_POOL_MAXSIZE, jobs)
+        self._configure_http_pool(pool_connections, pool_maxsize, connect_retries, retry_backoff)
+        self.rate_controller = RateController(max_delay=delay, max_rate=max_rate)
+        self.bandwidth_limiter = TokenBucket(max_bandwidth, bandwidth_burst) if max_bandwidth else None
+        self.download_stats = self._new_download_stats()
+        self.transfer_progress = None
+        self._remaining_sizes = {}
+        self.timing_log.reset()
+        self.composite_on_download = composite_on_download and not pipeline
+
+        self._export_diff = None
+        if incremental:
+            export_index = ExportIndex()
+            fingerprint = fingerprint_export(self.html_file)
+            if export_index.is_imported(fingerprint):
+                imported = export_index.exports[fingerprint]['imported'][:10]
+                print(f"\nIncremental: this export was already imported on {imported}, nothing new to download.")
+                print("Run without --incremental to retry memories that are still not downloaded.")
+                return
+
         # Parse HTML to get list of memories
-        memories = parse_html_file(self.html_file)
+        memories = self._load_memories()
+        if incremental:
+            memories = self._diff_export(memories, export_index, fingerprint)
+        memories = self._filter_memories(memories)
 
         # Calculate what needs to be downloaded
         total = len(memories)
@@ -103,15 +315,15 @@ class SnapchatDownloader:
                     break
 
             if not needs_gps_backfill:
+                self._record_export()
                 return  # Exit early - no backfill needed
 
             print("Detected missing GPS data in progress file.")
             print("Backfilling GPS coordinates from HTML (one-time operation)...\n")
 
-        # Download each memory
-        downloaded_count = 0
-        failed_count = 0
+        # Skip already downloaded memories, collect the rest
         skipped_count = 0
+        pending = []
 
         for i, memory in enumerate(memories, 1):
             sid = memory['sid']
@@ -132,33 +344,935 @@ class SnapchatDownloader:
                 skipped_count += 1
                 continue
 
-            print(f"[{i}/{total}] Downloading {memory['date']} - {memory['media_type']}...", end=" ")
+            pending.append((i, memory))
 
-            success, message = self._download_memory(memory, delay)
-            print(message)
+        if preflight and pending and not self._run_preflight(pending, jobs):
+            return
 
-            if success:
-                downloaded_count += 1
-            else:
-                failed_count += 1
+        pending = schedule(pending, schedule_policy, self.progress_tracker, self._remaining_sizes or None)
+        if schedule_policy != 'html':
+            print(f"Download order: {schedule_policy}\n")
+        pending = self._prioritize_resolved(pending)
 
-            # Rate limiting
-            if i < total:
-                time.sleep(delay)
+        # Download each pending memory
+        start_time = time.time()
+        self._run_start = time.monotonic()
+        if self.composite_on_download:
+            self._start_composite_on_download()
+        try:
+            # Progress is saved in batches during the run and once more when it ends
+            with self.progress_tracker.batched_saves():
+                if pipeline:
+                    results = self._download_pipelined(pending, total, pipeline, pipeline_queue)
+                elif jobs > 1:
+                    results = self._download_concurrently(pending, total, jobs)
+                else:
+                    results = self._download_sequentially(pending, total)
+        except DiskFullError as e:
+            print(f"\n{'='*60}")
+            print(f"ERROR: The output drive is full - downloads stopped!")
+            print(f"{'='*60}")
+            print(f"{e}")
+            print(f"Output directory: {self.output_dir}")
+            print(f"\nFree up space or choose another --output directory, then run again.")
+            print(f"The failed write does not count against any memory's retry budget.")
+            print(f"{'='*60}\n")
+            return
+        finally:
+            if self.composite_on_download:
+                self._finish_composite_on_download()
+            # Index changes are saved in batches; keep the rest of this run's
+            if self.blob_cache is not None:
+                self.blob_cache.save()
+            if self.content_index is not None:
+                self.content_index.save()
+        elapsed = time.time() - start_time
+
+        downloaded_count = len([success for success in results if success])
+        failed_count = len(results) - downloaded_count
+
+        if results:
+            self.progress_tracker.record_schedule_run(schedule_policy, len(results),
+                                                      self.download_stats['bytes'], elapsed)
+
+        self._record_export()
 
         # Print summary
-        self._print_download_summary(downloaded_count, failed_count, skipped_count, total)
+        self._print_download_summary(downloaded_count, failed_count, skipped_count, total, elapsed,
+                                     schedule_policy)
+
+    def _download_sequentially(self, pending: List[Tuple[int, Dict]], total: int) -> List[bool]:
+        """Download pending memories one at a time.
+
+        Memories that fail with a transient or throttled error are deferred
+        and retried after their cool-down, in between fresh memories.
+
+        Args:
+            pending: List of (index, memory) tuples to download
+            total: Total number of memories (for progress display)
+
+        Returns:
+            List of success flags, one per pending memory
+        """
+        results = []
+        fresh = deque(pending)
+        retry_queue = DeferredQueue(self.retry_cooldowns)
+
+        while fresh or retry_queue:
+            item = self._next_pending(fresh, retry_queue)
+            if item is None:
+                # Only memories in their cool-down are left
+                retry_queue.wait()
+                continue
+
+            i, memory = item
+            action = "Retrying" if retry_queue.deferrals(memory['sid']) else "Downloading"
+            print(f"[{i}/{total}] {action} {memory['date']} - {memory['media_type']}...", end=" ")
+
+            success, message, error = self._try_download(memory, time.monotonic())
+            message, finished = self._settle(retry_queue, item, success, message, error)
+            status = self._transfer_status(memory) if finished else ""
+            print(f"{message} {self._rate_status()}{status}")
+            if finished:
+                results.append(success)
+
+        return results
+
+    def _download_concurrently(self, pending: List[Tuple[int, Dict]], total: int,
+                               jobs: int) -> List[bool]:
+        """Download pending memories with a bounded pool of worker threads.
+
+        At most `jobs` memories are in flight. Free workers take deferred
+        memories whose cool-down has ended first, then fresh ones.
+
+        Args:
+            pending: List of (index, memory) tuples to download
+            total: Total number of memories (for progress display)
+            jobs: Number of worker threads
+
+        Returns:
+            List of success flags, one per pending memory
+        """
+        print(f"Downloading with {jobs} parallel workers...\n")
+        results = []
+        fresh = deque(pending)
+        retry_queue = DeferredQueue(self.retry_cooldowns)
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {}
+            while fresh or retry_queue or futures:
+                # Fill free worker slots
+                while len(futures) < jobs:
+                    item = self._next_pending(fresh, retry_queue)
+                    if item is None:
+                        break
+                    futures[executor.submit(self._download_worker, item[1], time.monotonic())] = item
+
+                if not futures:
+                    retry_queue.wait()
+                    continue
+
+                timeout = retry_queue.time_until_ready() if len(futures) < jobs else None
+                finished, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = futures.pop(future)
+                    i, memory = item
+                    success, message, error = future.result()
+                    message, done = self._settle(retry_queue, item, success, message, error)
+                    status = ""
+                    if done:
+                        results.append(success)
+                        status = self._transfer_status(memory)
+                    print(f"[{i}/{total}] ({len(results)}/{len(pending)} done) {memory['date']} - "
+                          f"{memory['media_type']}... {message} "
+                          f"{self._rate_status()}{status}",
+                          flush=True)
+
+        return results
+
+    def _download_pipelined(self, pending: List[Tuple[int, Dict]], total: int, stage_workers: Dict[str, int],
+                            queue_size: int = DEFAULT_QUEUE_SIZE) -> List[bool]:
+        """Download pending memories through the staged pipeline.
+
+        Fetch workers only download payloads; unpacking, storing with
+        metadata and compositing run in their own worker pools behind
+        bounded queues (see pipeline.py). A failed fetch is deferred like in
+        _download_concurrently: the feeder hands it to the fetch stage again
+        once its cool-down has ended, and the fetch workers take other
+        memories in the meantime.
+
+        Args:
+            pending: List of (index, memory) tuples to download
+            total: Total number of memories (for progress display)
+            stage_workers: Worker threads per stage; composite=0 skips compositing
+            queue_size: Capacity of the queue in front of each stage
+
+        Returns:
+            List of success flags, one per pending memory
+        """
+        composite = stage_workers.get('composite', 0) > 0
+        workers = ", ".join(f"{name} {stage_workers.get(name, 0)}" for name in PIPELINE_STAGES)
+        print(f"Downloading through the staged pipeline (workers: {workers})...\n")
+        if composite:
+            self._prepare_compositing()
+
+        self._pipeline_run = {
+            'total': total, 'composite': composite, 'results': {}, 'disk_full': None,
+            # Deferred fetches, shared by the feeder and the fetch workers under 'ready'
+            'retry_queue': DeferredQueue(self.retry_cooldowns), 'ready': threading.Condition(),
+            'in_flight': 0, 'queued_at': {}
+        }
+        stages = [
+            Stage('fetch', self._fetch_stage, stage_workers['fetch'], queue_size),
+            Stage('unpack', self._unpack_stage, stage_workers['unpack'], queue_size),
+            Stage('metadata', self._metadata_stage, stage_workers['metadata'], queue_size),
+        ]
+        if composite:
+            stages.append(Stage('composite', self._composite_stage, stage_workers['composite'], queue_size))
+
+        pipeline = Pipeline(stages)
+        pipeline.run(self._feed_pipeline(pending))
+        pipeline.print_report()
+        if self._pipeline_run['disk_full'] is not None:
+            raise self._pipeline_run['disk_full']
+        return list(self._pipeline_run['results'].values())
+
+    def _feed_pipeline(self, pending: List[Tuple[int, Dict]]) -> Iterator[Tuple[int, Dict]]:
+        """Hand memories to the fetch stage: deferred ones whose cool-down has ended first, then fresh ones.
+
+        Ends once no memory is fresh, deferred or being fetched, or when the disk is full.
+
+        Args:
+            pending: List of (index, memory) tuples to download
+
+        Yields:
+            (index, memory) tuples for the fetch stage
+        """
+        run = self._pipeline_run
+        fresh = deque(pending)
+        retry_queue = run['retry_queue']
+        while True:
+            with run['ready']:
+                while True:
+                    if run['disk_full'] is not None:
+                        return
+                    item = retry_queue.pop_ready()
+                    if item is None and fresh:
+                        item = fresh.popleft()
+                    if item is not None:
+                        run['in_flight'] += 1
+                        break
+                    if not retry_queue and not run['in_flight']:
+                        return
+                    # Wait for a cool-down to end or a fetch to be settled
+                    run['ready'].wait(retry_queue.time_until_ready())
+            self._resolve_ahead(item, fresh)
+            run['queued_at'][item[1]['sid']] = time.monotonic()
+            yield item
+
+    def _fetch_stage(self, item: Tuple[int, Dict]) -> List[Dict]:
+        """Pipeline stage: make one download attempt for a memory's payload.
+
+        Args:
+            item: (index, memory) tuple
+
+        Returns:
+            The fetched payload, or nothing if the memory failed, was deferred or needed no download
+        """
+        i, memory = item
+        run = self._pipeline_run
+        payloads = []
+        try:
+            if run['disk_full'] is not None:
+                return []
+            success, message, error = self._download_worker(memory, run['queued_at'].pop(memory['sid'], None),
+                                                            handoff=payloads.append)
+            with run['ready']:
+                # A deferred memory is back in the retry queue before it stops counting as in flight
+                message, done = self._settle(run['retry_queue'], item, success, message, error)
+        except DiskFullError as e:
+            with run['ready']:
+                run['disk_full'] = e
+            return []
+        finally:
+            with run['ready']:
+                run['in_flight'] -= 1
+                run['ready'].notify_all()
+
+        status = ""
+        if done:
+            status = self._transfer_status(memory)
+            if not payloads:
+                # Failed, already downloaded or restored from the blob cache - nothing left to process
+                self._settle_pipelined(memory, success)
+        print(f"[{i}/{run['total']}] {memory['date']} - {memory['media_type']}... {message} "
+              f"{self._rate_status()}{status}", flush=True)
+        return payloads
+
+    def _unpack_stage(self, payload: Dict) -> List[Dict]:
+        """Pipeline stage: extract a ZIP payload next to its final locations.
+
+        Args:
+            payload: Payload handed off by the fetch stage
+
+        Returns:
+            The payload with a 'files' list of (part_file, output_path, digest, is_overlay)
+        """
+        if self._pipeline_run['disk_full'] is not None:
+            self._drop_pipelined(payload, [])
+            return []
+        if payload['media_type'] != 'zip':
+            payload['files'] = [(payload['part_file'], payload['output_path'], payload['digest'], False)]
+            return [payload]
+
+        files = []
+        try:
+            with zipfile.ZipFile(payload['part_file'], 'r') as zip_ref:
+                members = [file_info for file_info in zip_ref.infolist() if not file_info.is_dir()]
+                for index, file_info in enumerate(members):
+                    files.append(self._unpack_zip_member(zip_ref, file_info, index, payload['memory'],
+                                                         payload['sid'], payload['timer']))
+            payload['part_file'].unlink()
+        except Exception as e:
+            self._fail_pipelined(payload, 'unpack', e, files)
+            return []
+
+        payload['files'] = files
+        return [payload]
+
+    def _metadata_stage(self, payload: Dict) -> List[Dict]:
+        """Pipeline stage: move unpacked files into place, apply metadata and mark the memory as downloaded.
+
+        Args:
+            payload: Payload from the unpack stage
+
+        Returns:
+            An overlay pair for the composite stage, if the memory has one and compositing is on
+        """
+        memory, sid = payload['memory'], payload['sid']
+        if self._pipeline_run['disk_full'] is not None:
+            self._drop_pipelined(payload, payload['files'])
+            return []
+        try:
+            for part_file, output_path, digest, _ in payload['files']:
+                self._store_file(part_file, output_path, memory, digest, payload['timer'])
+        except Exception as e:
+            self._fail_pipelined(payload, 'metadata', e, payload['files'])
+            return []
+
+        self.progress_tracker.mark_downloaded(sid, memory)
+        self._record_pipelined_timing(payload, True)
+        self._settle_pipelined(memory, True)
+
+        if not self._pipeline_run['composite']:
+            return []
+        bases = [output_path for _, output_path, _, is_overlay in payload['files'] if not is_overlay]
+        overlays = [output_path for _, output_path, _, is_overlay in payload['files'] if is_overlay]
+        media_type = 'video' if memory['media_type'].lower() == 'video' else 'image'
+        # Composites are keyed by the SID prefix in the filenames, like find_overlay_pairs() does
+        if not bases or not overlays or self.progress_tracker.is_composited(sid[:8], media_type):
+            return []
+        return [{'sid': sid[:8], 'media_type': media_type, 'base_file': bases[0], 'overlay_file': overlays[0]}]
+
+    def _composite_stage(self, pair: Dict) -> List:
+        """Pipeline stage: composite an overlay onto its base media.
+
+        Args:
+            pair: Overlay pair from the metadata stage
+
+        Returns:
+            Nothing (last stage)
+        """
+        available = self.has_pillow if pair['media_type'] == 'image' else self.has_ffmpeg
+        if available:
+            self._composite_pair(pair)
+        return []
+
+    def _prepare_compositing(self):
+        """Create the composite directories and say which media types cannot be composited."""
+        (self.output_dir / "composited" / "images").mkdir(parents=True, exist_ok=True)
+        (self.output_dir / "composited" / "videos").mkdir(parents=True, exist_ok=True)
+        if not self.has_pillow:
+            print("Compositing images skipped - Pillow not installed")
+        if not self.has_ffmpeg:
+            print("Compositing videos skipped - FFmpeg not installed")
+
+    def _start_composite_on_download(self):
+        """Set up --composite-on-download for a run: directories and the background video job runner."""
+        self._prepare_compositing()
+        self._composite_futures = []
+        # ffmpeg uses several cores by itself, so video composites run one at a time
+        self._composite_jobs = ThreadPoolExecutor(max_workers=1) if self.has_ffmpeg else None
+
+    def _finish_composite_on_download(self):
+        """Wait for video composites still running and save their results."""
+        if self._composite_jobs is not None:
+            running = len([future for future in self._composite_futures if not future.done()])
+            if running:
+                print(f"\nWaiting for {running} video composites to finish...", flush=True)
+            self._composite_jobs.shutdown(wait=True)
+            self._composite_jobs = None
+        self._composite_futures = []
+        self.progress_tracker.save_progress()
+
+    def _composite_on_download(self, memory: Dict, sid: str, stored: List[Tuple[Path, bool]],
+                               data: Dict[Path, bytes]):
+        """Composite a just-extracted overlay onto its base media (--composite-on-download).
+
+        Images are composited right away from the bytes that were just
+        extracted, so neither file is read back and decoded from disk in a
+        later pass. Video composites are handed to ffmpeg in the background
+        and the download goes on. Either way the result is recorded in the
+        progress file, so --apply-overlays has nothing left to scan for.
+
+        Args:
+            memory: Memory dictionary
+            sid: Session ID
+            stored: (output_path, is_overlay) of every extracted member
+            data: Contents of extracted members that were kept in memory, by output path
+        """
+        bases = [output_path for output_path, is_overlay in stored if not is_overlay]
+        overlays = [output_path for output_path, is_overlay in stored if is_overlay]
+        if not bases or not overlays:
+            return
+
+        media_type = 'video' if memory['media_type'].lower() == 'video' else 'image'
+        # Composites are keyed by the SID prefix in the filenames, like find_overlay_pairs() does
+        pair = {'sid': sid[:8], 'media_type': media_type, 'base_file': bases[0], 'overlay_file': overlays[0]}
+        if self.progress_tracker.is_composited(pair['sid'], media_type):
+            return
+
+        if media_type == 'image':
+            if self.has_pillow:
+                self._composite_pair(pair, data.get(bases[0]), data.get(overlays[0]))
+        elif self._composite_jobs is not None:
+            self._composite_futures.append(self._composite_jobs.submit(self._composite_pair, pair))
+
+    def _composite_pair(self, pair: Dict, base_data: Optional[bytes] = None,
+                        overlay_data: Optional[bytes] = None) -> bool:
+        """Composite one overlay pair during a download run and record the result.
+
+        Args:
+            pair: Overlay pair with sid (8-character prefix), media_type, base_file and overlay_file
+            base_data: Contents of the base image if still in memory
+            overlay_data: Contents of the overlay if still in memory
+
+        Returns:
+            True if the composite was written
+        """
+        if pair['media_type'] == 'image':
+            success, message = composite_image(pair['base_file'], pair['overlay_file'], self.output_dir,
+                                               has_exiftool=self.has_exiftool, error_logger=self.error_logger,
+                                               base_data=base_data, overlay_data=overlay_data)
+        else:
+            success, message = composite_video(pair['base_file'], pair['overlay_file'], self.output_dir,
+                                               has_exiftool=self.has_exiftool, error_logger=self.error_logger)
+
+        if success:
+            self.progress_tracker.mark_composited(pair['sid'], pair['media_type'], str(pair['base_file']),
+                                                  str(pair['overlay_file']))
+        else:
+            self.progress_tracker.record_composite_failure(pair['sid'], pair['media_type'], str(pair['base_file']),
+                                                           str(pair['overlay_file']), message)
+            print(f"\n    Compositing {pair['base_file'].name} failed: {message}", flush=True)
+        with self._stats_lock:
+            self.download_stats['composited' if success else 'composite_failures'] += 1
+        return success
+
+    def _settle_pipelined(self, memory: Dict, success: bool):
+        """Record the final outcome of a memory in a pipelined run."""
+        with self._stats_lock:
+            self._pipeline_run['results'][memory['sid']] = success
+
+    def _record_pipelined_timing(self, payload: Dict, success: bool, failure_class: Optional[str] = None):
+        """Add the timing breakdown of a fetched memory to the timing log once its last stage is done.
+
+        Args:
+            payload: Payload of the memory, carrying the StageTimer of its fetch
+            success: Whether the memory was stored
+            failure_class: Failure class if it could not be processed
+        """
+        timer = payload['timer']
+        self.timing_log.record(payload['sid'], payload['memory']['media_type'], timer, success, timer.num_bytes, failure_class)
+
+    def _drop_pipelined(self, payload: Dict, files: List[Tuple]):
+        """Remove the temporary files of a fetched memory that is not processed further.
+
+        Args:
+            payload: Payload of the memory
+            files: Unpacked (part_file, output_path, digest, is_overlay) entries to remove
+        """
+        for part_file, *_ in files:
+            if part_file.exists():
+                part_file.unlink()
+        self._cleanup_temp_files(payload['sid'])
+
+    def _fail_pipelined(self, payload: Dict, stage: str, error: Exception, files: List[Tuple]):
+        """Record a fetched memory that could not be processed and remove its temporary files.
+
+        Args:
+            payload: Payload of the memory
+            stage: Stage that failed
+            error: The exception
+            files: Unpacked (part_file, output_path, digest, is_overlay) entries to remove
+        """
+        memory, sid = payload['memory'], payload['sid']
+        self._drop_pipelined(payload, files)
+        if self.blob_cache is not None:
+            # A payload that could not be processed must not be restored later
+            self.blob_cache.invalidate(sid)
+        if is_disk_full(error):
+            # Stop the run without counting the failure against the memory
+            with self._pipeline_run['ready']:
+                self._pipeline_run['disk_full'] = DiskFullError(f"No space left on the output drive ({error})")
+                self._pipeline_run['ready'].notify_all()
+            return
+
+        failure_class = classify_failure(error)
+        error_msg = str(error)
+        self._record_pipelined_timing(payload, False, failure_class)
+        self.progress_tracker.record_failure(sid, memory, error_msg, error, failure_class)
+        self.error_logger.log_download_error(
+            sid=sid,
+            url=memory['download_url'],
+            error_message=error_msg,
+            exception=error,
+            additional_context={
+                'failure_class': failure_class,
+                'stage': stage,
+                'media_type': memory.get('media_type', 'unknown'),
+                'date': memory.get('date', 'unknown')
+            }
+        )
+        self._settle_pipelined(memory, False)
+        print(f"    {sid[:8]}... {stage} failed: Error: {error_msg}", flush=True)
+
+    def _next_pending(self, fresh: deque, retry_queue: DeferredQueue) -> Optional[Tuple[int, Dict]]:
+        """Pick the next memory to download.
+
+        Deferred memories whose cool-down has ended go first, so retries are
+        not starved by a long list of fresh memories.
+
+        Args:
+            fresh: Memories not tried yet in this run
+            retry_queue: Deferred memories
+
+        Returns:
+            (index, memory) tuple, or None if only cooling-down memories are left
+        """
+        item = retry_queue.pop_ready()
+        if item is None and fresh:
+            item = fresh.popleft()
+        if item is not None:
+            self._resolve_ahead(item, fresh)
+        return item
+
+    def _resolve_ahead(self, item: Tuple[int, Dict], fresh: deque):
+        """Resolve the link of a memory about to be downloaded, together with the next few.
+
+        Workers then only transfer files instead of waiting for link resolution.
+
+        Args:
+            item: (index, memory) tuple about to be downloaded
+            fresh: Memories not tried yet in this run
+        """
+        if self._needs_resolving(item[1]):
+            upcoming = [memory for _, memory in list(fresh)[:RESOLVE_BATCH_SIZE - 1]
+                        if self._needs_resolving(memory)]
+            self._resolve_batch([item[1]] + upcoming)
+
+    def _needs_resolving(self, memory: Dict) -> bool:
+        """Check whether a memory's link must be resolved before it can be downloaded.
+
+        Args:
+            memory: Memory dictionary
+
+        Returns:
+            True for POST links without a valid cached download URL
+        """
+        return (needs_resolution(memory) and self.url_cache.get(memory['sid']) is None
+                and not self._is_cached(memory['sid']))
+
+    def _is_cached(self, sid: str) -> bool:
+        """Check whether a memory can be restored from the blob cache."""
+        return self.blob_cache is not None and sid in self.blob_cache.entries
+
+    def _resolve_batch(self, memories: List[Dict], rate_controller: Optional[RateController] = None):
+        """Resolve a batch of export links to CDN URLs concurrently.
+
+        Failures are not recorded here: the download attempt resolves the
+        link again and reports the error.
+
+        Args:
+            memories: Memories with POST links
+            rate_controller: Paces the requests (default: the download rate controller)
+        """
+        rate_controller = rate_controller or self.rate_controller
+        with ThreadPoolExecutor(max_workers=len(memories)) as executor:
+            list(executor.map(lambda memory: self._resolve_memory(memory, rate_controller), memories))
+        self.url_cache.save()
+
+    def _resolve_memory(self, memory: Dict, rate_controller: Optional[RateController] = None) -> bool:
+        """Resolve one export link and cache the download URL.
+
+        Args:
+            memory: Memory dictionary with a POST link
+            rate_controller: Paces the request (default: the download rate controller)
+
+        Returns:
+            True if the URL was resolved
+        """
+        rate_controller = rate_controller or self.rate_controller
+        rate_controller.acquire()
+        try:
+            url, expires_at = resolve_url(self._get_session(), memory)
+        except (RateLimitedError, ServerError) as e:
+            rate_controller.on_backoff(e.retry_after)
+            return False
+        except (requests.RequestException, ValueError):
+            return False
+        rate_controller.on_success()
+        self.url_cache.put(memory['sid'], url, expires_at)
+        return True
+
+    def _download_url(self, memory: Dict) -> str:
+        """Get the URL a memory's file is downloaded from.
+
+        POST links use the cached CDN URL, or are resolved on the spot if the
+        resolution batch failed or the URL expired since.
+
+        Args:
+            memory: Memory dictionary
+
+        Returns:
+            Download URL
+
+        Raises:
+            Exception: Resolution failed (see url_resolver.resolve_url)
+        """
+        if not needs_resolution(memory):
+            return memory['download_url']
+
+        url = self.url_cache.get(memory['sid'])
+        if url is None:
+            url, expires_at = resolve_url(self._get_session(), memory)
+            self.url_cache.put(memory['sid'], url, expires_at)
+            self.url_cache.save()
+        return url
+
+    def _prioritize_resolved(self, pending: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+        """Move memories with a cached download URL to the front, soonest expiry first.
+
+        URLs resolved in an earlier run (or by the pre-flight pass) are used
+        before they expire. The other memories keep their scheduled order.
+
+        Args:
+            pending: List of (index, memory) tuples in scheduled order
+
+        Returns:
+            Reordered list of (index, memory) tuples
+        """
+        cached = [item for item in pending
+                  if needs_resolution(item[1]) and self.url_cache.get(item[1]['sid']) is not None]
+        if not cached:
+            return pending
+
+        cached.sort(key=lambda item: self.url_cache.expires_at(item[1]['sid']))
+        cached_sids = {memory['sid'] for _, memory in cached}
+        print(f"Downloading {len(cached)} memories with already resolved links first, before they expire\n")
+        return cached + [item for item in pending if item[1]['sid'] not in cached_sids]
+
+    def _settle(self, retry_queue: DeferredQueue, item: Tuple[int, Dict], success: bool, message: str,
+                error: Optional[Exception]) -> Tuple[str, bool]:
+        """Decide whether a download attempt is final or deferred for a retry.
+
+        Args:
+            retry_queue: Deferred memories
+            item: (index, memory) tuple that was attempted
+            success: Whether the attempt succeeded
+            message: Result message of the attempt
+            error: Exception of a failed attempt
 
-    def _download_memory(self, memory: Dict, retry_delay: float = 5.0) -> Tuple[bool, str]:
-        """Download a single memory with retry logic.
+        Returns:
+            (message for the progress line, True if the memory is done for this run)
+        """
+        if success:
+            if retry_queue.deferrals(item[1]['sid']):
+                with self._stats_lock:
+                    self.download_stats['recovered'] += 1
+            return message, True
+
+        cooldown = self._defer_retry(retry_queue, item, error)
+        if cooldown is None:
+            return message, True
+        if cooldown <= 0:
+            return f"{message}. Resuming...", False
+        return f"{message}. Retrying in {format_duration(cooldown)}", False
+
+    def _defer_retry(self, retry_queue: DeferredQueue, item: Tuple[int, Dict],
+                     error: Optional[Exception]) -> Optional[float]:
+        """Queue a failed memory for a retry if its failure class allows it.
+
+        Args:
+            retry_queue: Deferred memories
+            item: (index, memory) tuple that failed
+            error: Exception of the failed attempt
+
+        Returns:
+            Cool-down in seconds, or None if the failure is final
+        """
+        if error is None:
+            return None
+        failure_class = classify_failure(error)
+        sid = item[1]['sid']
+        if (failure_class == PERMANENT or budget_exhausted(self.progress_tracker, sid)
+                or not retry_queue.can_defer(sid)):
+            return None
+
+        # An interrupted transfer made progress - resume it right away
+        delay = 0.0 if isinstance(error, TransferInterruptedError) else None
+        with self._stats_lock:
+            self.download_stats['deferred'] += 1
+        return retry_queue.defer(item, failure_class, getattr(error, 'retry_after', None), delay)
+
+    def _run_preflight(self, pending: List[Tuple[int, Dict]], jobs: int) -> bool:
+        """Probe the size of every pending memory and check free disk space.
+
+        POST links are resolved in batches first, then the probes run
+        concurrently. Both are paced by a rate controller of their own, so
+        the pass is not held to the download pace. Sizes the server does not
+        reveal, and links that could not be resolved, are estimated from the
+        average of the same media type.
+
+        Args:
+            pending: List of (index, memory) tuples to download
+            jobs: Number of download workers (probes use at least 4)
+
+        Returns:
+            True if the download can start, False if there is not enough free space
+        """
+        memories = [memory for _, memory in pending]
+        print(f"Pre-flight: probing sizes of {len(memories)} memories...")
+
+        start_time = time.time()
+        max_delay = 0 if self.rate_controller.unlimited else PROBE_MAX_DELAY
+        probe_controller = RateController(max_delay=max_delay, max_rate=PROBE_MAX_RATE)
+        unresolved = [memory for memory in memories if self._needs_resolving(memory)]
+        for start in range(0, len(unresolved), RESOLVE_BATCH_SIZE):
+            self._resolve_batch(unresolved[start:start + RESOLVE_BATCH_SIZE], probe_controller)
+
+        with ThreadPoolExecutor(max_workers=max(jobs, 4)) as executor:
+            probed = dict(zip((m['sid'] for m in memories),
+                              executor.map(lambda memory: self._probe_memory(memory, probe_controller), memories)))
+        elapsed = time.time() - start_time
+
+        sizes = estimate_sizes(memories, probed)
+        unknown = len([size for size in probed.values() if size is None])
+
+        # Bytes already in partial files don't have to be downloaded again
+        for memory in memories:
+            partial = self._load_partial(memory['sid'])
+            if partial:
+                sizes[memory['sid']] = max(0, sizes[memory['sid']] - partial['offset'])
+        remaining = sum(sizes.values())
+
+        print(f"Pre-flight: sized {len(memories) - unknown}/{len(memories)} memories in {elapsed:.1f}s")
+        estimate_note = f" ({unknown} estimated)" if unknown else ""
+        print(f"Download size: {format_size(remaining)}{estimate_note}")
+
+        enough, free = check_free_space(self.output_dir, remaining)
+        if not enough:
+            print(f"\n{'='*60}")
+            print(f"ERROR: Not enough free disk space!")
+            print(f"{'='*60}")
+            print(f"Output directory: {self.output_dir}")
+            print(f"Needed: {format_size(remaining)} (plus safety margin)")
+            print(f"Free: {format_size(free)}")
+            print(f"\nFree up space or choose another --output directory.")
+            print(f"{'='*60}\n")
+            return False
+
+        print(f"Free space: {format_size(free)} - OK\n")
+        self._remaining_sizes = sizes
+        self.transfer_progress = TransferProgress(remaining)
+        return True
+
+    def _probe_memory(self, memory: Dict, rate_controller: RateController) -> Optional[int]:
+        """Probe the download size of one memory (a failed probe is not an error).
+
+        POST links must have been resolved already; one that is not is left
+        unprobed instead of being resolved here.
+
+        Args:
+            memory: Memory dictionary
+            rate_controller: Paces the probe requests
+
+        Returns:
+            Size in bytes, or None if unknown
+        """
+        url = self.url_cache.get(memory['sid']) if needs_resolution(memory) else memory['download_url']
+        if url is None:
+            return None
+        rate_controller.acquire()
+        try:
+            size = probe_size(self._get_session(), url)
+        except (RateLimitedError, ServerError) as e:
+            rate_controller.on_backoff(e.retry_after)
+            return None
+        except (requests.RequestException, ValueError):
+            return None
+        rate_controller.on_success()
+        return size
+
+    def _rate_status(self) -> str:
+        """Describe the current request rate and the bandwidth achieved so far.
+
+        Returns:
+            Progress suffix like "[1.50 req/s, 2.3 MB/s]"
+        """
+        elapsed = time.monotonic() - self._run_start
+        byte_rate = self.download_stats['bytes'] / elapsed if elapsed > 0 else 0
+        return f"[{self.rate_controller.current_rate:.2f} req/s, {format_size(byte_rate)}/s]"
+
+    def _transfer_status(self, memory: Dict) -> str:
+        """Count a finished memory's bytes and describe the overall byte progress.
+
+        Args:
+            memory: Memory that just finished (successfully or not)
+
+        Returns:
+            Progress suffix like " [1.2 GB/3.4 GB, ETA 5m 10s]", or "" without pre-flight
+        """
+        if self.transfer_progress is None:
+            return ""
+
+        self.transfer_progress.record(self._remaining_sizes.get(memory['sid'], 0))
+        eta = self.transfer_progress.eta()
+        eta_text = format_duration(eta) if eta is not None else "?"
+        return (f" [{format_size(self.transfer_progress.done_bytes)}/"
+                f"{format_size(self.transfer_progress.total_bytes)}, ETA {eta_text}]")
+
+    def _download_worker(self, memory: Dict, queued_at: Optional[float] = None,
+                         handoff: Optional[Callable[[Dict], None]] = None) -> Tuple[bool, str, Optional[Exception]]:
+        """Download one memory inside a worker thread.
+
+        Args:
+            memory: Memory dictionary from HTML parser
+            queued_at: time.monotonic() when the memory was handed to the pool
+            handoff: Passed to _attempt_download to process the payload elsewhere
+
+        Returns:
+            (success, message, error)
+        """
+        try:
+            return self._try_download(memory, queued_at, handoff)
+        except DiskFullError:
+            raise
+        except Exception as e:
+            return False, f"Error: {e}", e
+
+    def _get_session(self) -> requests.Session:
+        """Get the HTTP session for the current thread.
+
+        requests.Session is not guaranteed to be thread-safe, so worker
+        threads each get their own session. The main thread uses self.session.
+        All sessions share the connection pool of self.http_adapter.
+
+        Returns:
+            requests.Session for the calling thread
+        """
+        if threading.current_thread() is threading.main_thread():
+            return self.session
+
+        session = getattr(self._thread_local, 'session', None)
+        if session is None:
+            session = self._new_session()
+            self._thread_local.session = session
+        return session
+
+    def _new_session(self) -> requests.Session:
+        """Create an HTTP session that uses the shared connection pool.
+
+        Returns:
+            requests.Session with self.http_adapter mounted
+        """
+        session = requests.Session()
+        session.mount('http://', self.http_adapter)
+        session.mount('https://', self.http_adapter)
+        return session
+
+    def _configure_http_pool(self, pool_connections: int, pool_maxsize: int, connect_retries: int,
+                             retry_backoff: float):
+        """Apply connection pool settings for a run and reset its reuse statistics.
+
+        The pool is only rebuilt when the settings change, so keep-alive
+        connections survive from one run to the next.
+
+        Args:
+            pool_connections: Number of hosts to keep a connection pool for
+            pool_maxsize: Keep-alive connections kept open per host
+            connect_retries: Retries of a failed connection attempt
+            retry_backoff: Backoff factor between connection retries in seconds
+        """
+        config = (pool_connections, pool_maxsize, connect_retries, retry_backoff)
+        if config != self._http_pool_config:
+            self.http_adapter.close()
+            self.http_adapter = PooledHTTPAdapter(*config)
+            self.session = self._new_session()
+            # Worker threads of earlier runs are gone; new ones mount the new adapter
+            self._thread_local = threading.local()
+            self._http_pool_config = config
+        self.http_adapter.stats = ConnectionStats()
+
+    def _download_memory(self, memory: Dict, max_attempts: int = 3) -> Tuple[bool, str]:
+        """Download a single memory, waiting out retry cool-downs in place.
+
+        download_all does not use this - it defers failed memories and keeps
+        downloading others. This is for callers that need one memory now.
 
         Args:
             memory: Memory dictionary from HTML parser
-            retry_delay: Base delay for exponential backoff
+            max_attempts: Maximum number of attempts in this call
 
         Returns:
             (success, message)
         """
+        retry_queue = DeferredQueue(self.retry_cooldowns)
+        item = (0, memory)
+
+        for attempt in range(max_attempts):
+            success, message, error = self._try_download(memory)
+            if success or attempt == max_attempts - 1:
+                return success, message
+
+            cooldown = self._defer_retry(retry_queue, item, error)
+            if cooldown is None:
+                return success, message
+            print(f"    {message}. Retrying in {format_duration(cooldown)}...")
+            retry_queue.wait()
+            retry_queue.pop_ready()
+
+        return False, "Error: Max retries exceeded"
+
+    def _try_download(self, memory: Dict, queued_at: Optional[float] = None,
+                      handoff: Optional[Callable[[Dict], None]] = None) -> Tuple[bool, str, Optional[Exception]]:
+        """Make one download attempt and record a failure with its class.
+
+        Each attempt waits for the circuit breaker and the rate controller
+        first. Throttled responses and server errors slow the controller down.
+        Failures while the circuit is open are recorded as 'circuit-open' and
+        do not count against the memory's retry budgets. The attempt's timing
+        breakdown is added to the timing log; a payload handed off to the
+        pipeline is recorded by the metadata stage once it has been stored.
+
+        Args:
+            memory: Memory dictionary from HTML parser
+            queued_at: time.monotonic() when the memory was queued (default: now)
+            handoff: Passed to _attempt_download to process the payload elsewhere
+
+        Returns:
+            (success, message, error) - error is the exception of a failed attempt
+        """
         sid = memory['sid']
 
         # Check if already downloaded
@@ -167,217 +1281,790 @@ class SnapchatDownloader:
                 self.output_dir, memory, sid,
                 self.has_exiftool, self.has_pywin32
             )
-            return True, "Already downloaded"
-
-        # Check if previously failed too many times
-        fail_count = self.progress_tracker.get_failure_count(sid)
-        if fail_count >= 5:
-            return False, f"Skipped (failed {fail_count} times)"
+            return True, "Already downloaded", None
+
+        # Check if previously failed too often
+        exhausted = budget_exhausted(self.progress_tracker, sid)
+        if exhausted:
+            failures = self.progress_tracker.get_failure_count(sid, exhausted)
+            return False, f"Skipped (retry budget used up: {failures} {exhausted} failures)", None
+
+        # Restoring from the blob cache needs neither the network nor a request slot
+        if self.blob_cache is not None:
+            entry = self.blob_cache.get(sid)
+            if entry is not None:
+                try:
+                    return (*self._restore_cached(memory, sid, entry), None)
+                except Exception as e:
+                    print(f"\n    Blob cache entry of {sid[:8]}... unusable ({e}), downloading instead", flush=True)
+                    self._cleanup_temp_files(sid)
+                    self.blob_cache.invalidate(sid)
+
+        if queued_at is None:
+            queued_at = time.monotonic()
+        probe = self.circuit_breaker.acquire()
+        if probe:
+            print(f"\n    Circuit breaker: sending probe request ({sid[:8]}...)", flush=True)
+        try:
+            self.rate_controller.acquire()
 
-        # Retry logic for rate limiting
-        max_retries = 3
-        for attempt in range(max_retries):
+            timer = StageTimer()
+            timer.add('queue', time.monotonic() - queued_at)
             try:
-                return self._attempt_download(memory, sid)
-            except ValueError as e:
+                success, message = self._attempt_download(memory, sid, timer, handoff)
+                self.circuit_breaker.record_success()
+                if handoff is None:
+                    self.timing_log.record(sid, memory['media_type'], timer, True, timer.num_bytes)
+                return success, message, None
+            except Exception as e:
+                self._check_disk_full(e)
+                failure_class = classify_failure(e)
+                if failure_class == THROTTLED or isinstance(e, ServerError):
+                    self.rate_controller.on_backoff(getattr(e, 'retry_after', None))
+
+                recorded_class = failure_class
+                if failure_class == PERMANENT:
+                    # A problem with this memory only, the server itself is answering
+                    self.circuit_breaker.record_success()
+                elif not self._record_circuit_failure():
+                    recorded_class = CIRCUIT_OPEN
+                    with self._stats_lock:
+                        self.download_stats['circuit_failures'] += 1
+
                 error_msg = str(e)
-                # Check if it's a rate limit error
-                if '429' in error_msg or 'Too Many Requests' in error_msg or 'rate limit' in error_msg.lower():
-                    if attempt < max_retries - 1:
-                        wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                        print(f"    Rate limited. Waiting {wait_time:.0f}s before retry...")
-                        time.sleep(wait_time)
-                        continue
-                # Re-raise if not rate limit or final attempt
-                raise
+                self.timing_log.record(sid, memory['media_type'], timer, False, timer.num_bytes, recorded_class)
+                self.progress_tracker.record_failure(sid, memory, error_msg, e, recorded_class)
+                self.error_logger.log_download_error(
+                    sid=sid,
+                    url=memory['download_url'],
+                    error_message=error_msg,
+                    exception=e,
+                    additional_context={
+                        'failure_class': recorded_class,
+                        'media_type': memory.get('media_type', 'unknown'),
+                        'date': memory.get('date', 'unknown')
+                    }
+                )
+                return False, f"Error: {error_msg}", e
+        finally:
+            if probe:
+                # A probe that ended without recording its outcome must not block the other workers
+                self.circuit_breaker.release_probe()
 
-        # If all retries failed
-        error_msg = "Max retries exceeded"
-        self.progress_tracker.record_failure(sid, memory, error_msg)
-        self.error_logger.log_download_error(
-            sid=sid,
-            url=memory['download_url'],
-            error_message=error_msg,
-            additional_context={'retry_attempts': max_retries}
-        )
-        return False, f"Error: {error_msg}"
+    def _check_disk_full(self, error: Exception):
+        """Stop the run if a download failed because the output drive is full.
+
+        The failure is not recorded against the memory, so the next run tries
+        it again with its full retry budget.
+
+        Args:
+            error: Exception of a failed download or processing step
+
+        Raises:
+            DiskFullError: The error was ENOSPC/EDQUOT
+        """
+        if is_disk_full(error):
+            raise DiskFullError(f"No space left on the output drive ({error})") from error
+
+    def _record_circuit_failure(self) -> bool:
+        """Report a systemic failure to the circuit breaker.
 
-    def _attempt_download(self, memory: Dict, sid: str) -> Tuple[bool, str]:
+        Returns:
+            True if the failure counts against the memory
+        """
+        breaker = self.circuit_breaker
+        trips = breaker.trip_count
+        counted = breaker.record_failure()
+        if breaker.trip_count != trips:
+            print(f"\n    Circuit breaker open: most recent downloads failed. "
+                  f"Pausing all downloads for {format_duration(breaker.current_cooldown)}...", flush=True)
+        return counted
+
+    def _attempt_download(self, memory: Dict, sid: str, timer: Optional[StageTimer] = None,
+                          handoff: Optional[Callable[[Dict], None]] = None) -> Tuple[bool, str]:
         """Single download attempt.
 
+        The response is streamed to disk in fixed-size chunks, so memory use
+        stays constant regardless of file size. The payload type is sniffed
+        from the first bytes while streaming.
+
+        If an earlier attempt left a partial file, the download resumes with an
+        HTTP Range request. Servers that ignore the range, or whose ETag changed,
+        get a full re-fetch instead.
+
         Args:
             memory: Memory dictionary
             sid: Session ID
+            timer: Collects the connect, TTFB, transfer, disk write, ZIP
+                   extract and metadata durations of this attempt
+            handoff: Called with the fetched payload (memory, sid, part_file,
+                     media_type, output_path, digest) instead of processing it
+                     here; the memory is then not marked as downloaded yet
 
         Returns:
             (success, message)
+
+        Raises:
+            Exception: Any failure. Temporary files are removed, except the
+                       partial file of an interrupted or throttled transfer.
         """
+        response = None
+        partial = self._load_partial(sid)
         try:
-            # Download the file
-            response = self.session.get(memory['download_url'], timeout=60)
-
-            # Check for rate limiting
+            # Download the file (resuming a partial file if there is one)
+            headers = {}
+            if partial:
+                headers['Range'] = f"bytes={partial['offset']}-"
+                if partial.get('etag'):
+                    headers['If-Range'] = partial['etag']
+
+            resolve_start = time.perf_counter()
+            url = self._download_url(memory)
+            if timer is not None:
+                timer.add('resolve', time.perf_counter() - resolve_start)
+
+            take_connect_time()
+            request_start = time.perf_counter()
+            response = self._get_session().get(url, timeout=60, stream=True, headers=headers)
+            if timer is not None:
+                # get() returns once the headers arrived; whatever was not connection setup is TTFB
+                connect_time = take_connect_time()
+                timer.add('connect', connect_time)
+                timer.add('ttfb', max(0.0, time.perf_counter() - request_start - connect_time))
+
+            # Check for rate limiting and server errors
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
             if response.status_code == 429:
-                raise ValueError(f"HTTP 429 Too Many Requests - Rate limited by server")
+                raise RateLimitedError("HTTP 429 Too Many Requests - Rate limited by server", retry_after)
+            if response.status_code >= 500:
+                raise ServerError(f"HTTP {response.status_code} server error", response.status_code, retry_after)
+
+            if response.status_code in (403, 410):
+                if needs_resolution(memory):
+                    # The signed URL expired - resolve the export link again on the next attempt
+                    self.url_cache.invalidate(sid)
+                    self.url_cache.save()
+                    raise LinkExpiredError(f"Download link expired (HTTP {response.status_code}), "
+                                           f"it will be resolved again", response.status_code)
+                # Pre-signed export links expire too; retried later, or fixed with --refresh-links
+                raise LinkExpiredError(f"Download link rejected (HTTP {response.status_code}), "
+                                       f"it may have expired", response.status_code)
+
+            if partial and response.status_code == 416:
+                # Range not satisfiable - the partial file is unusable, start over
+                self._cleanup_temp_files(sid)
+                raise TransferInterruptedError("Partial file rejected by server (HTTP 416), restarting download")
 
             response.raise_for_status()
+            self.rate_controller.on_success()
 
             # Check if we got an HTML error page
             content_type = response.headers.get('content-type', '')
             if 'text/html' in content_type:
-                raise ValueError(f"Received HTML error page instead of media (likely rate limited or error)")
-
-            # Save to temporary file
-            temp_file = self.output_dir / f"temp_{sid}.download"
-            with open(temp_file, 'wb') as f:
-                f.write(response.content)
+                raise ErrorPageError(f"Received HTML error page instead of media (likely rate limited or error)")
+
+            # Only a 206 that continues exactly where the partial file ends can be appended
+            if partial and not self._is_matching_resume(response, partial):
+                self._cleanup_temp_files(sid)
+                if response.status_code == 206:
+                    raise TransferInterruptedError("Server could not continue the partial file, restarting download")
+                partial = None
+
+            chunks = self._metered(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), timer)
+            if partial:
+                header = b''
+                offset = partial['offset']
+                media_type, ext = partial['media_type'], partial['ext']
+            else:
+                # Sniff the payload type from the first bytes of the stream
+                header, chunks = self._read_stream_header(chunks)
+                offset = 0
+                media_type, ext = self._sniff_payload(header, content_type)
+
+            if not media_type:
+                bad_file = self.output_dir / f"bad_{sid}.dat"
+                self._write_stream(bad_file, header, chunks)
+                raise ValueError(f"Downloaded file is not a ZIP or recognized media. Saved to {bad_file}")
+
+            # Stream the body into the partial file
+            if media_type == 'zip':
+                part_file = self._part_file_path(self.staging_dir, sid)
+            else:
+                output_path = self._direct_media_path(memory, media_type, ext)
+                part_file = self._part_file_path(output_path.parent, sid)
+
+            # Hash the content as it streams; a resumed file's existing bytes come first
+            digest = hashlib.sha256()
+            if offset > 0:
+                hash_file(part_file, digest, DOWNLOAD_CHUNK_SIZE)
+
+            transfer = {
+                'path': str(part_file),
+                'media_type': media_type,
+                'ext': ext,
+                'etag': response.headers.get('etag') or (partial or {}).get('etag'),
+                'size': self._expected_size(response, offset)
+            }
+            self._receive_body(sid, part_file, header, chunks, offset, transfer, digest, timer)
+            if self.blob_cache is not None:
+                self.blob_cache.put(sid, part_file, media_type, ext, digest.hexdigest())
+
+            if partial:
+                with self._stats_lock:
+                    self.download_stats['resumed'] += 1
+                    self.download_stats['resumed_bytes'] += offset
+
+            if handoff is not None:
+                # A later pipeline stage unpacks and stores the payload
+                handoff({
+                    'memory': memory,
+                    'sid': sid,
+                    'part_file': part_file,
+                    'media_type': media_type,
+                    'output_path': None if media_type == 'zip' else output_path,
+                    'digest': digest.hexdigest(),
+                    'timer': timer
+                })
+                return True, "Resumed" if partial else "Fetched"
 
             # Process the downloaded file
-            if zipfile.is_zipfile(temp_file):
-                temp_file.rename(self.output_dir / f"temp_{sid}.zip")
-                temp_zip = self.output_dir / f"temp_{sid}.zip"
-                self._extract_and_save_zip(temp_zip, memory, sid)
-                temp_zip.unlink()
+            if media_type == 'zip':
+                self._extract_and_save_zip(part_file, memory, sid, timer)
+                part_file.unlink()
             else:
-                media_type = self._detect_media_type(temp_file, content_type)
-                if media_type:
-                    self._save_direct_media(temp_file, memory, sid, media_type)
-                    temp_file.unlink()
-                else:
-                    bad_file = self.output_dir / f"bad_{sid}.dat"
-                    temp_file.rename(bad_file)
-                    raise ValueError(f"Downloaded file is not a ZIP or recognized media. Saved to {bad_file}")
+                self._store_file(part_file, output_path, memory, digest.hexdigest(), timer)
 
             # Mark as downloaded
             self.progress_tracker.mark_downloaded(sid, memory)
-            return True, "Downloaded successfully"
+            return True, "Resumed successfully" if partial else "Downloaded successfully"
 
-        except Exception as e:
-            error_msg = str(e)
-            self.progress_tracker.record_failure(sid, memory, error_msg, e)
-            self.error_logger.log_download_error(
-                sid=sid,
-                url=memory['download_url'],
-                error_message=error_msg,
-                exception=e,
-                additional_context={
-                    'media_type': memory.get('media_type', 'unknown'),
-                    'date': memory.get('date', 'unknown')
-                }
+        except (RateLimitedError, ServerError, TransferInterruptedError):
+            # The retry resumes from the partial file, so keep it
+            raise
+
+        except Exception:
+            self._cleanup_temp_files(sid)
+            if self.blob_cache is not None:
+                # A payload that could not be processed must not be restored later
+                self.blob_cache.invalidate(sid)
+            raise
+
+        finally:
+            if response is not None:
+                response.close()
+
+    def _restore_cached(self, memory: Dict, sid: str, entry: Dict) -> Tuple[bool, str]:
+        """Recreate a memory's files from its cached payload.
+
+        Args:
+            memory: Memory dictionary
+            sid: Session ID
+            entry: Blob cache entry from BlobCache.get()
+
+        Returns:
+            (success, message)
+
+        Raises:
+            Exception: The blob is missing or could not be processed
+        """
+        if entry['media_type'] == 'zip':
+            part_file = self._part_file_path(self.staging_dir, sid)
+            self.blob_cache.restore(entry, part_file)
+            self._extract_and_save_zip(part_file, memory, sid)
+            part_file.unlink()
+        else:
+            output_path = self._direct_media_path(memory, entry['media_type'], entry['ext'])
+            part_file = self._part_file_path(output_path.parent, sid)
+            self.blob_cache.restore(entry, part_file)
+            self._store_file(part_file, output_path, memory, entry['sha256'])
+
+        self.progress_tracker.mark_downloaded(sid, memory)
+        with self._stats_lock:
+            self.download_stats['cached'] += 1
+            self.download_stats['cached_bytes'] += entry['size']
+        return True, "Restored from blob cache"
+
+    def _receive_body(self, sid: str, part_file: Path, header: bytes, chunks: Iterator[bytes],
+                      offset: int, transfer: Dict, digest=None, timer: Optional[StageTimer] = None):
+        """Stream a response body into a partial file and validate its size.
+
+        If the transfer breaks off (connection drop, timeout, Ctrl-C) or ends
+        short of Content-Length, the partial file is recorded in the progress
+        file so the next attempt can resume it.
+
+        Args:
+            sid: Session ID
+            part_file: Partial file to write (appended to when offset > 0)
+            header: Bytes already read from the stream
+            chunks: Iterator over the remaining chunks
+            offset: Bytes already present in the partial file
+            transfer: Partial download record (path, media_type, ext, etag, size)
+            digest: Optional hashlib object updated with the received bytes
+            timer: Optional StageTimer for the disk write time
+
+        Raises:
+            TransferInterruptedError: The body ended early; the partial file is kept
+            OversizedBodyError: The body is larger than the server announced
+        """
+        try:
+            self._write_stream(part_file, header, chunks, append=offset > 0, digest=digest,
+                               size=transfer['size'], timer=timer)
+        except (requests.ConnectionError, requests.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            received = part_file.stat().st_size if part_file.exists() else 0
+            if received == 0:
+                raise
+            self.progress_tracker.record_partial(sid, transfer)
+            raise TransferInterruptedError(
+                f"Transfer interrupted after {format_size(received)} ({e.__class__.__name__})", received
+            ) from e
+        except KeyboardInterrupt:
+            if part_file.exists() and part_file.stat().st_size > 0:
+                self.progress_tracker.record_partial(sid, transfer)
+            raise
+
+        received = part_file.stat().st_size
+        expected = transfer['size']
+        if expected is not None and received < expected:
+            self.progress_tracker.record_partial(sid, transfer)
+            raise TransferInterruptedError(
+                f"Transfer incomplete: {format_size(received)} of {format_size(expected)}", received
             )
-            # Clean up temp files
-            for temp_name in [f"temp_{sid}.zip", f"temp_{sid}.download"]:
-                temp_path = self.output_dir / temp_name
-                if temp_path.exists():
-                    temp_path.unlink()
-            return False, f"Error: {error_msg}"
+        if expected is not None and received > expected:
+            raise OversizedBodyError(f"Downloaded {received} bytes but server announced {expected} (Content-Length)")
 
-    def _detect_media_type(self, file_path: Path, content_type: str) -> str:
-        """Detect if file is a video or image.
+    def _load_partial(self, sid: str) -> Optional[Dict]:
+        """Get a resumable partial download for a memory, if one exists.
 
         Args:
-            file_path: Path to file
+            sid: Session ID
+
+        Returns:
+            Partial download record with 'offset' set to the bytes on disk, or None
+        """
+        partial = self.progress_tracker.get_partial(sid)
+        if not partial:
+            return None
+
+        part_file = Path(partial['path'])
+        if not part_file.exists() or part_file.stat().st_size == 0:
+            self.progress_tracker.clear_partial(sid)
+            return None
+
+        return {**partial, 'offset': part_file.stat().st_size}
+
+    def _is_matching_resume(self, response, partial: Dict) -> bool:
+        """Check that a response continues a partial file.
+
+        Args:
+            response: HTTP response to a Range request
+            partial: Partial download record with 'offset'
+
+        Returns:
+            True if the response is a 206 starting at the partial file's end
+            and its ETag (if any) matches the one recorded for the partial file
+        """
+        if response.status_code != 206:
+            return False
+
+        content_range = response.headers.get('content-range', '')
+        if not content_range.startswith(f"bytes {partial['offset']}-"):
+            return False
+
+        etag = response.headers.get('etag')
+        if etag and partial.get('etag') and etag != partial['etag']:
+            return False
+
+        return True
+
+    def _expected_size(self, response, offset: int) -> Optional[int]:
+        """Get the full file size announced by the server.
+
+        Args:
+            response: HTTP response (200 or 206)
+            offset: Bytes already on disk when the response is a resume
+
+        Returns:
+            Total file size in bytes, or None if the server did not say
+        """
+        content_range = response.headers.get('content-range', '')
+        if '/' in content_range:
+            total = content_range.rsplit('/', 1)[1].strip()
+            if total.isdigit():
+                return int(total)
+
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit():
+            return int(content_length) + offset
+
+        return None
+
+    def _metered(self, chunks: Iterator[bytes], timer: Optional[StageTimer] = None) -> Iterator[bytes]:
+        """Count received bytes and apply the --max-bandwidth cap.
+
+        Args:
+            chunks: Iterator over response body chunks
+            timer: Optional StageTimer; the time spent waiting for each chunk
+                   counts as transfer time (bandwidth cap pauses do not)
+
+        Yields:
+            The same chunks, delayed as needed to stay under the bandwidth cap
+        """
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            if timer is not None:
+                timer.add('transfer', time.perf_counter() - start)
+            if chunk is None:
+                return
+            if timer is not None:
+                timer.add_bytes(len(chunk))
+            with self._stats_lock:
+                self.download_stats['bytes'] += len(chunk)
+            if self.bandwidth_limiter is not None:
+                self.bandwidth_limiter.consume(len(chunk))
+            yield chunk
+
+    def _read_stream_header(self, chunks: Iterator[bytes], size: int = 12) -> Tuple[bytes, Iterator[bytes]]:
+        """Read the first bytes of a chunk stream without losing any data.
+
+        Args:
+            chunks: Iterator of response body chunks
+            size: Minimum number of header bytes wanted
+
+        Returns:
+            (buffered bytes, iterator over the remaining chunks). The buffered
+            bytes may be longer than `size`, or shorter if the body is short.
+        """
+        buffered = b''
+        for chunk in chunks:
+            if chunk:
+                buffered += chunk
+            if len(buffered) >= size:
+                break
+        return buffered, chunks
+
+    def _write_stream(self, file_path: Path, header: bytes, chunks: Iterator[bytes],
+                      append: bool = False, digest=None, size: Optional[int] = None,
+                      timer: Optional[StageTimer] = None) -> int:
+        """Write buffered header bytes plus the remaining chunks to a file.
+
+        Args:
+            file_path: Destination path
+            header: Bytes already read from the stream
+            chunks: Iterator over the remaining chunks
+            append: Append to an existing file instead of replacing it
+            digest: Optional hashlib object updated with every byte written
+            size: Expected file size; a new file is preallocated to it
+            timer: Optional StageTimer; time spent in write calls counts as
+                   disk write time
+
+        Returns:
+            Number of bytes written
+        """
+        written = 0
+        write_time = 0.0
+        with open(file_path, 'ab' if append else 'wb') as f:
+            start = time.perf_counter()
+            preallocated = not append and size is not None and preallocate(f, size)
+            try:
+                f.write(header)
+                write_time += time.perf_counter() - start
+                written += len(header)
+                if digest is not None:
+                    digest.update(header)
+                for chunk in chunks:
+                    if chunk:
+                        start = time.perf_counter()
+                        f.write(chunk)
+                        write_time += time.perf_counter() - start
+                        written += len(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+            finally:
+                # Drop preallocated space that was not filled (short or broken transfer)
+                if preallocated:
+                    f.truncate(f.tell())
+                if timer is not None:
+                    timer.add('disk_write', write_time)
+        return written
+
+    def _cleanup_temp_files(self, sid: str):
+        """Remove temporary and partial download files for a memory.
+
+        Args:
+            sid: Session ID
+        """
+        temp_paths = [
+            self._part_file_path(self.staging_dir, sid),
+            self._part_file_path(self.output_dir / "images", sid),
+            self._part_file_path(self.output_dir / "videos", sid),
+        ]
+        for temp_path in temp_paths:
+            if temp_path.exists():
+                temp_path.unlink()
+        self.progress_tracker.clear_partial(sid)
+
+    def _part_file_path(self, directory: Path, sid: str) -> Path:
+        """Get the in-progress download path for a memory in a directory.
+
+        Partial files live next to their final destination so that finishing
+        a download is a single atomic rename on the same filesystem.
+
+        Args:
+            directory: Destination directory
+            sid: Session ID
+
+        Returns:
+            Path to the hidden partial file
+        """
+        return directory / f".{sid}.part"
+
+    def _sniff_payload(self, header: bytes, content_type: str) -> Tuple[Optional[str], Optional[str]]:
+        """Detect what a download contains from its first bytes.
+
+        Args:
+            header: First bytes of the payload (at least 12 if available)
             content_type: HTTP content-type header
 
         Returns:
-            'video', 'image', or None
+            (media_type, extension) where media_type is 'zip', 'video',
+            'image' or None if the payload is not recognized
         """
+        # ZIP archives (memory + overlay) - local file header or empty archive
+        if header[:4] in (b'PK\x03\x04', b'PK\x05\x06'):
+            return 'zip', 'zip'
+
+        # Extension from magic bytes
+        if header[4:8] == b'ftyp':
+            ext = 'mp4'
+        elif header[:2] == b'\xff\xd8':
+            ext = 'jpg'
+        elif header[:8] == b'\x89PNG\r\n\x1a\n':
+            ext = 'png'
+        else:
+            ext = None
+
         # Check content-type header first
         if 'video' in content_type:
-            return 'video'
+            return 'video', ext or 'mp4'
         elif 'image' in content_type:
-            return 'image'
-
-        # Check magic bytes
-        with open(file_path, 'rb') as f:
-            header = f.read(12)
+            return 'image', ext or 'jpg'
 
         # Video signatures
         if header[4:8] == b'ftyp':  # MP4/MOV
-            return 'video'
+            return 'video', ext
         elif header[:4] == b'RIFF' and header[8:12] == b'AVI ':
-            return 'video'
+            return 'video', 'mp4'
         elif header[:3] == b'\x1a\x45\xdf':  # WebM/MKV
-            return 'video'
+            return 'video', 'mp4'
         # Image signatures
         elif header[:2] == b'\xff\xd8':  # JPEG
-            return 'image'
+            return 'image', ext
         elif header[:8] == b'\x89PNG\r\n\x1a\n':
-            return 'image'
+            return 'image', ext
         elif header[:2] in (b'II', b'MM'):  # TIFF
-            return 'image'
+            return 'image', 'jpg'
         elif header[:6] in (b'GIF87a', b'GIF89a'):
-            return 'image'
+            return 'image', 'jpg'
 
-        return None
+        return None, None
 
-    def _extract_and_save_zip(self, temp_zip: Path, memory: Dict, sid: str):
+    def _extract_and_save_zip(self, zip_path: Path, memory: Dict, sid: str,
+                              timer: Optional[StageTimer] = None):
         """Extract and save files from ZIP archive.
 
+        Members are copied in chunks straight into their final directories.
+        When a ZIP holds several members (media + overlay) they are extracted
+        in parallel.
+
         Args:
-            temp_zip: Path to temporary ZIP file
+            zip_path: Path to the downloaded ZIP file (in the staging directory)
             memory: Memory dictionary
             sid: Session ID
+            timer: Optional StageTimer; extraction time of parallel members is summed
         """
-        with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
-            for file_info in zip_ref.filelist:
-                filename = file_info.filename
-                is_overlay = 'overlay' in filename
-                ext = filename.split('.')[-1]
-
-                # Determine output directory
-                if is_overlay:
-                    output_subdir = self.output_dir / "overlays"
-                elif memory['media_type'].lower() == 'image':
-                    output_subdir = self.output_dir / "images"
-                else:
-                    output_subdir = self.output_dir / "videos"
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            members = [file_info for file_info in zip_ref.infolist() if not file_info.is_dir()]
+
+            # With --composite-on-download, image members are kept in memory while they are extracted
+            composite = self.composite_on_download and any(
+                'overlay' in file_info.filename for file_info in members
+            ) and len(members) > 1
+            buffers = {}
+            if composite and memory['media_type'].lower() == 'image':
+                buffers = {index: io.BytesIO() for index in range(len(members))}
+
+            if len(members) > 1:
+                with ThreadPoolExecutor(max_workers=len(members)) as executor:
+                    futures = [
+                        executor.submit(self._extract_zip_member, zip_ref, file_info, index, memory, sid,
+                                        timer, buffers.get(index))
+                        for index, file_info in enumerate(members)
+                    ]
+                    stored = [future.result() for future in futures]
+            else:
+                stored = [self._extract_zip_member(zip_ref, file_info, index, memory, sid, timer)
+                          for index, file_info in enumerate(members)]
 
-                # Create new filename
-                new_filename = self._format_filename(memory, ext, is_overlay)
-                output_path = output_subdir / new_filename
+        if composite:
+            data = {output_path: buffers[index].getvalue() for index, (output_path, _) in enumerate(stored)
+                    if index in buffers}
+            self._composite_on_download(memory, sid, stored, data)
 
-                # Extract
-                with zip_ref.open(file_info) as source, open(output_path, 'wb') as target:
-                    target.write(source.read())
+    def _extract_zip_member(self, zip_ref: zipfile.ZipFile, file_info: zipfile.ZipInfo, index: int,
+                            memory: Dict, sid: str, timer: Optional[StageTimer] = None,
+                            buffer: Optional[io.BytesIO] = None) -> Tuple[Path, bool]:
+        """Extract one ZIP member to its final location.
 
-                # Set timestamps and GPS
-                set_file_timestamps(output_path, memory, self.has_pywin32)
-                add_gps_metadata(output_path, memory, self.has_exiftool)
+        Args:
+            zip_ref: Open ZIP archive
+            file_info: Member to extract
+            index: Position of the member in the archive (keeps temp names unique)
+            memory: Memory dictionary
+            sid: Session ID
+            timer: Optional StageTimer for the extract and metadata time
+            buffer: Also collect the member's contents here
 
-    def _save_direct_media(self, temp_file: Path, memory: Dict, sid: str, media_type: str):
-        """Save a direct media file (not in ZIP).
+        Returns:
+            (output_path, is_overlay)
+        """
+        part_file = None
+        try:
+            part_file, output_path, digest, is_overlay = self._unpack_zip_member(zip_ref, file_info, index, memory,
+                                                                                 sid, timer, buffer)
+            self._store_file(part_file, output_path, memory, digest, timer)
+            return output_path, is_overlay
+        finally:
+            if part_file is not None and part_file.exists():
+                part_file.unlink()
+
+    def _unpack_zip_member(self, zip_ref: zipfile.ZipFile, file_info: zipfile.ZipInfo, index: int,
+                           memory: Dict, sid: str, timer: Optional[StageTimer] = None,
+                           buffer: Optional[io.BytesIO] = None) -> Tuple[Path, Path, str, bool]:
+        """Extract one ZIP member to a partial file next to its final location.
 
         Args:
-            temp_file: Path to temporary file
+            zip_ref: Open ZIP archive
+            file_info: Member to extract
+            index: Position of the member in the archive (keeps temp names unique)
             memory: Memory dictionary
             sid: Session ID
-            media_type: 'video' or 'image'
+            timer: Optional StageTimer for the extract time
+            buffer: Also collect the member's contents here, e.g. to composite
+                    it without reading the file back
+
+        Returns:
+            (part_file, output_path, digest, is_overlay)
+
+        Raises:
+            Exception: The member could not be extracted; no partial file is left
         """
-        # Determine extension
-        with open(temp_file, 'rb') as f:
-            header = f.read(12)
+        filename = file_info.filename
+        is_overlay = 'overlay' in filename
+        ext = filename.split('.')[-1]
 
-        if header[4:8] == b'ftyp':
-            ext = 'mp4'
-        elif header[:2] == b'\xff\xd8':
-            ext = 'jpg'
-        elif header[:8] == b'\x89PNG\r\n\x1a\n':
-            ext = 'png'
-        else:
-            ext = 'mp4' if media_type == 'video' else 'jpg'
+        digest = hashlib.sha256()
 
         # Determine output directory
-        output_subdir = self.output_dir / ("videos" if media_type == 'video' else "images")
+        if is_overlay:
+            output_subdir = self.output_dir / "overlays"
+        elif memory['media_type'].lower() == 'image':
+            output_subdir = self.output_dir / "images"
+        else:
+            output_subdir = self.output_dir / "videos"
 
-        # Create filename and copy
-        new_filename = self._format_filename(memory, ext, is_overlay=False)
+        # Create new filename
+        new_filename = self._format_filename(memory, ext, is_overlay)
         output_path = output_subdir / new_filename
-        shutil.copy2(temp_file, output_path)
 
-        # Set timestamps and GPS
-        set_file_timestamps(output_path, memory, self.has_pywin32)
-        add_gps_metadata(output_path, memory, self.has_exiftool)
+        # Extract in chunks next to the destination; storing it moves it into place
+        part_file = output_subdir / f".{sid}.{index}.part"
+        try:
+            start = time.perf_counter()
+            with zip_ref.open(file_info) as source:
+                chunks = iter(lambda: source.read(DOWNLOAD_CHUNK_SIZE), b'')
+                if buffer is not None:
+                    chunks = _copy_chunks(chunks, buffer)
+                self._write_stream(part_file, b'', chunks, digest=digest, size=file_info.file_size)
+            if timer is not None:
+                timer.add('zip_extract', time.perf_counter() - start)
+        except Exception:
+            if part_file.exists():
+                part_file.unlink()
+            raise
+        return part_file, output_path, digest.hexdigest(), is_overlay
+
+    def _direct_media_path(self, memory: Dict, media_type: str, ext: str) -> Path:
+        """Get the final path for a direct media file (not in ZIP).
+
+        Args:
+            memory: Memory dictionary
+            media_type: 'video' or 'image'
+            ext: File extension sniffed from the payload
+
+        Returns:
+            Destination path inside images/ or videos/
+        """
+        output_subdir = self.output_dir / ("videos" if media_type == 'video' else "images")
+        return output_subdir / self._format_filename(memory, ext, is_overlay=False)
+
+    def _store_file(self, part_file: Path, output_path: Path, memory: Dict, digest: Optional[str] = None,
+                    timer: Optional[StageTimer] = None):
+        """Move a fully written file into place and apply its timestamps and GPS.
+
+        If the same content was downloaded before, the file is replaced by a
+        hardlink (identical date and location) or a reflink instead.
+
+        Args:
+            part_file: Fully written file in the destination directory
+            output_path: Final destination path
+            memory: Memory dictionary
+            digest: SHA-256 hex digest of part_file, enables deduplication
+            timer: Optional StageTimer for the metadata time
+        """
+        size = part_file.stat().st_size
+        method = None
+        if self.content_index is not None and digest:
+            method = self.content_index.link_duplicate(digest, part_file, output_path, memory)
+
+        if method:
+            with self._stats_lock:
+                self.download_stats['deduplicated'] += 1
+                self.download_stats['dedup_bytes'] += size
+        else:
+            # Atomic rename - the final name never points at a half-written file
+            os.replace(part_file, output_path)
+
+        # A hardlink shares the stored file's inode, which already has this date and GPS
+        if method != 'hardlink':
+            start = time.perf_counter()
+            set_file_timestamps(output_path, memory, self.has_pywin32)
+            add_gps_metadata(output_path, memory, self.has_exiftool)
+            if timer is not None:
+                timer.add('metadata', time.perf_counter() - start)
+
+        if method is None and self.content_index is not None and digest:
+            self.content_index.add(digest, output_path, memory,
+                                   pristine=not self._writes_gps(output_path, memory))
+
+    def _writes_gps(self, file_path: Path, memory: Dict) -> bool:
+        """Check whether add_gps_metadata rewrites this file's contents.
+
+        Args:
+            file_path: Media file path
+            memory: Memory dictionary
+
+        Returns:
+            True if exiftool embeds GPS coordinates into the file
+        """
+        if not self.has_exiftool:
+            return False
+        if file_path.suffix.lower() not in ['.jpg', '.jpeg', '.mp4', '.mov', '.avi']:
+            return False
+        coords = parse_location(memory)
+        return is_valid_gps_coordinates(coords) and coords != (0.0, 0.0)
 
     def _format_filename(self, memory: Dict, extension: str, is_overlay: bool = False) -> str:
         """Create a filename from memory metadata.
@@ -403,7 +2090,8 @@ class SnapchatDownloader:
         else:
             return f"{date_part}_{time_part}_{media_type}_{sid_short}.{extension}"
 
-    def _print_download_summary(self, downloaded: int, failed: int, skipped: int, total: int):
+    def _print_download_summary(self, downloaded: int, failed: int, skipped: int, total: int,
+                                elapsed: float = 0.0, schedule_policy: str = 'html'):
         """Print download summary statistics.
 
         Args:
@@ -411,13 +2099,50 @@ class SnapchatDownloader:
             failed: Number of failed downloads
             skipped: Number of skipped files
             total: Total number of files
+            elapsed: Time spent downloading in seconds
+            schedule_policy: Download order used for this run
         """
+        attempted = downloaded + failed
+        throughput = attempted / elapsed if elapsed > 0 else 0
+
         print(f"\n{'='*60}")
         print(f"Download complete!")
         print(f"Downloaded: {downloaded}")
         print(f"Failed: {failed}")
         print(f"Skipped: {skipped}")
         print(f"Total: {total}")
+        if attempted > 0:
+            print(f"Elapsed: {elapsed:.1f}s ({throughput:.2f} memories/s)")
+            print(f"Final request rate: {self.rate_controller.current_rate:.2f} req/s "
+                  f"({self.rate_controller.backoff_count} backoffs)")
+            byte_rate = self.download_stats['bytes'] / elapsed if elapsed > 0 else 0
+            print(f"Data received: {format_size(self.download_stats['bytes'])} ({format_size(byte_rate)}/s)")
+        if self.download_stats['resumed'] > 0:
+            print(f"Resumed: {self.download_stats['resumed']} "
+                  f"({format_size(self.download_stats['resumed_bytes'])} reused from partial files)")
+        if self.download_stats['deferred'] > 0:
+            print(f"Deferred retries: {self.download_stats['deferred']} "
+                  f"({self.download_stats['recovered']} memories recovered)")
+        connections = self.http_adapter.stats
+        if connections.requests > 0:
+            print(f"Connections: {connections.new_connections} opened for {connections.requests} requests "
+                  f"({connections.reuse_ratio:.0%} reused keep-alive connections)")
+        if self.circuit_breaker.trip_count > 0:
+            print(f"Circuit breaker: tripped {self.circuit_breaker.trip_count} times "
+                  f"({self.download_stats['circuit_failures']} failures not counted against memories)")
+        if self.download_stats['cached'] > 0:
+            print(f"Restored from blob cache: {self.download_stats['cached']} "
+                  f"({format_size(self.download_stats['cached_bytes'])} not downloaded again)")
+        if self.download_stats['composited'] or self.download_stats['composite_failures']:
+            failures = self.download_stats['composite_failures']
+            print(f"Composited during download: {self.download_stats['composited']}"
+                  + (f" ({failures} failed, retry with --apply-overlays)" if failures else ""))
+        if self.download_stats['deduplicated'] > 0:
+            print(f"Duplicates: {self.download_stats['deduplicated']} "
+                  f"({format_size(self.download_stats['dedup_bytes'])} saved with hardlinks/reflinks)")
+        if attempted > 0:
+            self._print_schedule_stats(schedule_policy)
+        self.timing_log.print_summary()
         print(f"{'='*60}\n")
 
         if failed > 0:
@@ -442,15 +2167,275 @@ class SnapchatDownloader:
             print("  Or for videos only: python download_snapchat_memories.py --apply-overlays --videos-only")
             print()
 
+    def _print_schedule_stats(self, current_policy: str):
+        """Print throughput per scheduling policy over all recorded runs.
+
+        Args:
+            current_policy: Policy used for this run (marked with *)
+        """
+        schedule_stats = self.progress_tracker.get_schedule_stats()
+        if not schedule_stats:
+            return
+
+        print(f"Throughput by download order (all runs):")
+        for policy, stats in sorted(schedule_stats.items()):
+            seconds = stats['seconds']
+            item_rate = stats['memories'] / seconds if seconds > 0 else 0
+            byte_rate = stats['bytes'] / seconds if seconds > 0 else 0
+            marker = '*' if policy == current_policy else ' '
+            print(f"  {marker} {policy:<15} {item_rate:6.2f} memories/s  {format_size(byte_rate):>9}/s  "
+                  f"({stats['runs']} run{'s' if stats['runs'] != 1 else ''})")
+
     def verify_downloads(self) -> Dict:
         """Verify all downloads are complete.
 
         Returns:
             Dictionary with verification results
         """
-        memories = parse_html_file(self.html_file)
+        memories = self._filter_memories(parse_html_file(self.html_file))
         return self.progress_tracker.verify_downloads(memories)
 
+    def _load_memories(self) -> List[Dict]:
+        """Parse the HTML export, using links refreshed from a newer export where recorded.
+
+        Returns:
+            List of memory dictionaries
+        """
+        memories = parse_html_file(self.html_file)
+        for memory in memories:
+            link = self.progress_tracker.get_link(memory['sid'])
+            if link and not self.progress_tracker.is_downloaded(memory['sid']):
+                memory['download_url'] = link['download_url']
+                memory['is_get_request'] = link['is_get_request']
+        return memories
+
+    def _filter_memories(self, memories: List[Dict]) -> List[Dict]:
+        """Apply the memory filter to parsed memories and report the selection.
+
+        Args:
+            memories: Memory dictionaries
+
+        Returns:
+            Memories selected by the filter
+        """
+        if not self.memory_filter.active:
+            return memories
+        selected = self.memory_filter.apply(memories)
+        print(f"Filter ({self.memory_filter.describe()}): {len(selected)} of {len(memories)} memories selected")
+        return selected
+
+    def _filter_pairs(self, pairs: List[Dict]) -> List[Dict]:
+        """Apply the memory filter to overlay pairs.
+
+        Args:
+            pairs: Overlay pairs from find_overlay_pairs()
+
+        Returns:
+            Pairs of selected memories
+        """
+        allowed = self.memory_filter.short_sids(self.progress_tracker.progress['downloaded'])
+        if allowed is None:
+            return pairs
+        selected = [pair for pair in pairs if pair['sid'] in allowed]
+        print(f"Filter ({self.memory_filter.describe()}): {len(selected)} of {len(pairs)} overlay pairs selected")
+        return selected
+
+    def _diff_export(self, memories: List[Dict], export_index: ExportIndex, fingerprint: str) -> List[Dict]:
+        """Reduce an export to the memories no earlier export contained.
+
+        Memories of earlier exports are dropped without touching their files
+        or progress entries. The export is recorded by _record_export() once
+        the run is done.
+
+        Args:
+            memories: All memories of the export
+            export_index: Index of earlier exports
+            fingerprint: Fingerprint of this export
+
+        Returns:
+            New memories, in export order
+        """
+        new_sids = export_index.new_sids(memories)
+        remaining = [memory for memory in memories if memory['sid'] in new_sids]
+        print(f"Incremental: {len(memories) - len(remaining)} memories from earlier exports skipped, "
+              f"{len(remaining)} new")
+
+        self._export_diff = (export_index, fingerprint, memories, new_sids)
+        return remaining
+
+    def _record_export(self):
+        """Record the export diffed by _diff_export() in the export index.
+
+        New memories that are neither downloaded nor out of retries (including
+        ones the memory filter left out) stay new for the next incremental
+        run, and the export only counts as imported once none are left.
+        """
+        if self._export_diff is None:
+            return
+        export_index, fingerprint, memories, new_sids = self._export_diff
+        self._export_diff = None
+        outstanding = {sid for sid in new_sids if not self.progress_tracker.is_downloaded(sid)
+                       and not budget_exhausted(self.progress_tracker, sid)}
+        export_index.record(fingerprint, self.html_file, memories, outstanding)
+
+    def refresh_links(self, new_html_file: str) -> Dict:
+        """Import fresh download links from a newer export for memories not downloaded yet.
+
+        Rows are matched to this export by SID. Downloaded memories are left
+        alone; pending and failed ones get the new link, and failures caused
+        by the old link expiring are forgotten so they are retried.
+
+        Args:
+            new_html_file: Path to the newer memories_history.html
+
+        Returns:
+            Dictionary with counts: refreshed, already_downloaded, cleared_failures,
+            not_in_export (rows of the newer export missing from this one)
+        """
+        known_sids = {memory['sid'] for memory in parse_html_file(self.html_file)}
+        results = {'refreshed': 0, 'already_downloaded': 0, 'cleared_failures': 0, 'not_in_export': 0}
+
+        for memory in self._filter_memories(parse_html_file(new_html_file)):
+            sid = memory['sid']
+            if self.progress_tracker.is_downloaded(sid):
+                results['already_downloaded'] += 1
+                continue
+            if sid not in known_sids:
+                results['not_in_export'] += 1
+                continue
+
+            self.progress_tracker.set_link(sid, memory)
+            results['cleared_failures'] += self.progress_tracker.clear_link_failures(sid)
+            # A CDN URL resolved from the old link is no better than the old link
+            self.url_cache.invalidate(sid)
+            results['refreshed'] += 1
+
+        self.url_cache.save()
+        return results
+
+    def coordinate(self, host: str = '127.0.0.1', port: int = DEFAULT_COORDINATOR_PORT,
+                   lease_seconds: float = DEFAULT_LEASE_SECONDS, status_interval: float = 30.0) -> Dict:
+        """Hand out the pending memories of this export to workers until all are done.
+
+        Workers report every memory they download; this machine's progress
+        file records them, so it holds the state of the whole export. Workers
+        keep their own progress and error files, so they can run in this
+        directory too.
+
+        Args:
+            host: Address to listen on ('0.0.0.0' for other machines)
+            port: Port to listen on (0 picks a free port)
+            lease_seconds: Seconds a worker may hold memories without reporting
+            status_interval: Seconds between status lines
+
+        Returns:
+            Final queue counts from LeaseQueue.status()
+        """
+        memories = self._filter_memories(self._load_memories())
+        pending = [memory for memory in memories if not self.progress_tracker.is_downloaded(memory['sid'])]
+        queue = LeaseQueue(pending, lease_seconds,
+                           on_success=lambda memory: self.progress_tracker.mark_downloaded(memory['sid'], memory))
+        server = CoordinatorServer((host, port), queue)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(f"Coordinator listening on {server.url} with {len(pending)} of {len(memories)} memories to hand out")
+        print(f"Start workers with: --worker {server.url}  (leases expire after {format_duration(lease_seconds)})\n")
+        try:
+            with self.progress_tracker.batched_saves():
+                while not queue.wait_finished(status_interval):
+                    status = queue.status()
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {status['downloaded']} downloaded, "
+                          f"{status['failed']} failed, {status['leased']} leased, {status['pending']} pending"
+                          f" ({status['reissued']} expired leases and {status['requeued']} failures handed out "
+                          f"again)", flush=True)
+        except KeyboardInterrupt:
+            print("\nCoordinator stopped, leased memories stay pending in the progress file")
+        finally:
+            server.shutdown()
+            server.server_close()
+        return queue.status()
+
+    def run_worker(self, coordinator_url: str, batch_size: int = DEFAULT_LEASE_BATCH, jobs: int = 1,
+                   delay: float = 2.0, max_rate: float = 5.0, worker_id: Optional[str] = None,
+                   poll_interval: float = WORKER_POLL_INTERVAL,
+                   pool_connections: int = DEFAULT_POOL_CONNECTIONS, pool_maxsize: Optional[int] = None,
+                   connect_retries: int = DEFAULT_CONNECT_RETRIES,
+                   retry_backoff: float = DEFAULT_RETRY_BACKOFF) -> Dict:
+        """Download memories leased from a coordinator until it has no work left.
+
+        The worker records its downloads and errors in its own state files
+        (see coordinator.worker_state_file), so it does not overwrite the
+        coordinator's when both run in the same directory.
+
+        Args:
+            coordinator_url: URL of the coordinator, e.g. http://192.168.1.10:8765
+            batch_size: Memories to lease at once
+            jobs: Leased memories downloaded in parallel
+            delay: Maximum delay between download requests in seconds
+            max_rate: Maximum download requests per second
+            worker_id: ID reported to the coordinator (default: hostname and process ID)
+            poll_interval: Seconds to wait when all remaining memories are leased to other workers
+            pool_connections: Number of hosts to keep a connection pool for
+            pool_maxsize: Keep-alive connections kept open per host
+                          (default: DEFAULT_POOL_MAXSIZE or `jobs`, whichever is larger)
+            connect_retries: Retries of a failed connection attempt (DNS, TCP, TLS)
+            retry_backoff: Backoff factor between connection retries in seconds
+
+        Returns:
+            Dictionary with downloaded and failed counts of this worker
+        """
+        client = CoordinatorClient(coordinator_url, worker_id or f"{socket.gethostname()}-{os.getpid()}")
+        self.progress_tracker = ProgressTracker(worker_state_file(PROGRESS_FILE, client.worker))
+        self.error_logger = ErrorLogger(worker_state_file(ERROR_LOG_FILE, client.worker))
+        if pool_maxsize is None:
+            pool_maxsize = max(DEFAULT_POOL_MAXSIZE, jobs)
+        self._configure_http_pool(pool_connections, pool_maxsize, connect_retries, retry_backoff)
+        self.rate_controller = RateController(max_delay=delay, max_rate=max_rate)
+        results = {'downloaded': 0, 'failed': 0}
+        print(f"Worker {client.worker} taking memories from {client.url}")
+        print(f"Worker state: {self.progress_tracker.progress_file}, {self.error_logger.log_file}")
+
+        def download(memory: Dict) -> Tuple[bool, str]:
+            sid = memory['sid']
+            try:
+                success, message = self._download_memory(memory)
+            except DiskFullError as e:
+                # Hand the memory back right away instead of letting its lease expire
+                client.report(sid, False, f"Disk full: {e}", retry=True)
+                raise
+            # Failures within the memory's retry budgets may succeed on another attempt
+            retry = not success and budget_exhausted(self.progress_tracker, sid) is None
+            client.report(sid, success, message, retry=retry)
+            status = 'OK' if success else ('RETRY LATER' if retry else 'FAILED')
+            print(f"  {status} {sid[:8]}... {message}", flush=True)
+            return success, message
+
+        with self.progress_tracker.batched_saves(), ThreadPoolExecutor(max_workers=jobs) as executor:
+            while True:
+                try:
+                    memories, finished = client.lease(batch_size)
+                    if not memories:
+                        if finished:
+                            break
+                        time.sleep(poll_interval)
+                        continue
+                    for success, _ in executor.map(download, memories):
+                        results['downloaded' if success else 'failed'] += 1
+                except requests.RequestException as e:
+                    print(f"Coordinator no longer reachable ({e}), stopping")
+                    break
+                except DiskFullError as e:
+                    print(f"\nERROR: The output drive is full - worker stopped! ({e})")
+                    print("Its leased memories were handed back to the coordinator.")
+                    break
+        if self.blob_cache is not None:
+            self.blob_cache.save()
+        if self.content_index is not None:
+            self.content_index.save()
+
+        print(f"\nWorker done: {results['downloaded']} downloaded, {results['failed']} failed")
+        return results
+
     def composite_all_overlays(self, images_only: bool = False, videos_only: bool = False,
                                 rebuild_cache: bool = False):
         """Composite all overlays onto their base media files.
@@ -481,6 +2466,8 @@ class SnapchatDownloader:
             print("="*60 + "\n")
             return
 
+        pairs = self._filter_pairs(pairs)
+
         # Filter by type
         if images_only:
             pairs = [p for p in pairs if p['media_type'] == 'image']
@@ -681,7 +2668,7 @@ class SnapchatDownloader:
         Returns:
             Dictionary with composite verification results
         """
-        pairs = find_overlay_pairs(self.output_dir)
+        pairs = self._filter_pairs(find_overlay_pairs(self.output_dir))
 
         # Separate by type
         image_pairs = [p for p in pairs if p['media_type'] == 'image']
@@ -796,7 +2783,7 @@ class SnapchatDownloader:
 
         # Backfill GPS data from HTML before converting
         print(f"[{datetime.now().strftime('%H:%M:%S')}] Checking for missing GPS data in progress file...")
-        memories = parse_html_file(self.html_file)
+        memories = self._filter_memories(parse_html_file(self.html_file))
 
         backfilled_sids = set()
         backfilled_count = 0
@@ -821,7 +2808,7 @@ class SnapchatDownloader:
             print(f"[{datetime.now().strftime('%H:%M:%S')}] No GPS data backfill needed")
 
         # Initialize timezone conversion tracker
-        tz_tracker = TimezoneConversionTracker()
+        tz_tracker = TimezoneConversionTracker(self.timezone_file)
 
         # Get system timezone info for fallback
         local_dt, local_str = utc_to_local("2025-01-01 00:00:00 UTC")
@@ -863,6 +2850,8 @@ class SnapchatDownloader:
             self.output_dir / "composited" / "videos"
         ]
 
+        allowed_sids = self.memory_filter.short_sids(self.progress_tracker.progress['downloaded'])
+
         total_files = 0
         converted_files = 0
         skipped_files = 0
@@ -875,6 +2864,8 @@ class SnapchatDownloader:
             print(f"\n[{datetime.now().strftime('%H:%M:%S')}] Processing {folder.relative_to(self.output_dir)}...")
 
             for file_path in folder.glob("*.*"):
+                if allowed_sids is not None and parse_filename_for_sid(file_path.name) not in allowed_sids:
+                    continue
                 if file_path.is_file():
                     total_files += 1
 
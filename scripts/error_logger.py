@@ -7,13 +7,18 @@ with timestamps, command context, and full error details.
 
 import json
 import os
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional, Any
 
 
 class ErrorLogger:
-    """Centralized error logging for download and composite operations."""
+    """Centralized error logging for download and composite operations.
+
+    Logging and saving are serialized by an internal lock, so one logger can
+    be shared by concurrent download workers.
+    """
 
     def __init__(self, log_file: str = "errors.json"):
         """Initialize error logger.
@@ -22,6 +27,7 @@ class ErrorLogger:
             log_file: Path to JSON file for storing error logs
         """
         self.log_file = log_file
+        self._lock = threading.RLock()
         self.logs = self._load_logs()
 
     def _load_logs(self) -> Dict:
@@ -96,8 +102,9 @@ class ErrorLogger:
         if additional_context:
             error_entry['additional_context'] = additional_context
 
-        self.logs['download_errors'].append(error_entry)
-        self._save_logs()
+        with self._lock:
+            self.logs['download_errors'].append(error_entry)
+            self._save_logs()
 
     def log_composite_error(
         self,
@@ -140,8 +147,9 @@ class ErrorLogger:
         if additional_context:
             error_entry['additional_context'] = additional_context
 
-        self.logs['composite_errors'].append(error_entry)
-        self._save_logs()
+        with self._lock:
+            self.logs['composite_errors'].append(error_entry)
+            self._save_logs()
 
     def log_general_error(
         self,
@@ -169,8 +177,9 @@ class ErrorLogger:
         if additional_context:
             error_entry['additional_context'] = additional_context
 
-        self.logs['other_errors'].append(error_entry)
-        self._save_logs()
+        with self._lock:
+            self.logs['other_errors'].append(error_entry)
+            self._save_logs()
 
     def get_summary(self) -> Dict[str, int]:
         """Get summary statistics of logged errors.
@@ -211,9 +220,10 @@ class ErrorLogger:
 
     def clear_logs(self):
         """Clear all error logs."""
-        self.logs = {
-            'download_errors': [],
-            'composite_errors': [],
-            'other_errors': []
-        }
-        self._save_logs()
+        with self._lock:
+            self.logs = {
+                'download_errors': [],
+                'composite_errors': [],
+                'other_errors': []
+            }
+            self._save_logs()
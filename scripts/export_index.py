@@ -0,0 +1,123 @@
+"""
+Export history for incremental Snapchat memories downloads.
+
+Every memories_history.html contains all memories ever saved, so after the
+first export most rows are already downloaded. The export index remembers a
+fingerprint of every imported export and the set of SIDs seen so far. An
+export that was imported before is skipped outright; a new one is diffed
+against the SID set, and only its new SIDs are downloaded.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from json_store import read_json_object, write_json_atomic
+
+# Size of the chunks read while fingerprinting an export
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+
+
+def fingerprint_export(html_file: str) -> str:
+    """Compute the SHA-256 fingerprint of an export file.
+
+    Args:
+        html_file: Path to memories_history.html
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(html_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(FINGERPRINT_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExportIndex:
+    """Persistent record of imported exports and the SIDs they contained."""
+
+    def __init__(self, index_file: str = "export_index.json"):
+        """Initialize the export index.
+
+        Args:
+            index_file: Path to JSON file for storing the index
+        """
+        self.index_file = index_file
+        self._lock = threading.RLock()
+        data = self._load_index()
+        self.exports = data.get('exports', {})
+        self.sids = set(data.get('sids', []))
+
+    def _load_index(self) -> Dict:
+        """Load the index from its JSON file (a broken index is rebuilt, not fatal)."""
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not load export index {self.index_file}: {e}")
+        return {}
+
+    def save(self):
+        """Save the index to its JSON file, adding exports and SIDs other processes (shards) saved meanwhile."""
+        with self._lock:
+            saved = read_json_object(self.index_file) or {}
+            self.exports = {**saved.get('exports', {}), **self.exports}
+            self.sids |= set(saved.get('sids', []))
+            try:
+                write_json_atomic(self.index_file, {'exports': self.exports, 'sids': sorted(self.sids)}, indent=None)
+            except OSError as e:
+                print(f"Warning: Failed to save export index: {e}")
+
+    def is_imported(self, fingerprint: str) -> bool:
+        """Check whether an export with this fingerprint was fully imported before.
+
+        Args:
+            fingerprint: Export fingerprint from fingerprint_export()
+
+        Returns:
+            True if the same export was imported and none of its memories are outstanding
+        """
+        return fingerprint in self.exports
+
+    def new_sids(self, memories: List[Dict]) -> Set[str]:
+        """Get the SIDs of an export that no earlier export contained.
+
+        Args:
+            memories: Memories parsed from the export
+
+        Returns:
+            Set of new SIDs
+        """
+        with self._lock:
+            return {memory['sid'] for memory in memories} - self.sids
+
+    def record(self, fingerprint: str, html_file: str, memories: List[Dict],
+               outstanding: Optional[Set[str]] = None):
+        """Remember an imported export and its SIDs.
+
+        Args:
+            fingerprint: Export fingerprint from fingerprint_export()
+            html_file: Path the export was read from
+            memories: Memories parsed from the export
+            outstanding: New SIDs that still need to be downloaded; they stay
+                         new, and the export is only recorded once none are left
+        """
+        outstanding = outstanding or set()
+        with self._lock:
+            new = self.new_sids(memories) - outstanding
+            if not outstanding:
+                self.exports[fingerprint] = {
+                    'file': html_file,
+                    'imported': datetime.now().isoformat(),
+                    'memories': len(memories),
+                    'new': len(new)
+                }
+            self.sids |= new
+            self.save()
@@ -0,0 +1,106 @@
+"""
+Shared HTTP connection pool for Snapchat memories downloads.
+
+All download threads share one PooledHTTPAdapter, so a keep-alive
+connection opened by one worker can be reused by any other and by later
+runs, instead of every thread paying for its own TLS handshakes. The
+adapter also applies urllib3-level retries for failed connection attempts
+and counts how many requests reused a pooled connection.
+"""
+
+import threading
+from typing import Optional
+
+from urllib3.util.retry import Retry
+
+from timing import TimedHTTPAdapter, connection_count
+
+# Hosts to keep a connection pool for (download links may redirect to several CDN hosts)
+DEFAULT_POOL_CONNECTIONS = 10
+# Keep-alive connections kept open per host (raised to the number of parallel jobs)
+DEFAULT_POOL_MAXSIZE = 10
+# Retries of a failed connection attempt (DNS, TCP, TLS) before the request fails
+DEFAULT_CONNECT_RETRIES = 2
+# urllib3 backoff factor: the first retry is immediate, then 0.5 -> 1s, 2s, 4s, ...
+DEFAULT_RETRY_BACKOFF = 0.5
+
+
+def connect_retry(retries: int = DEFAULT_CONNECT_RETRIES, backoff: float = DEFAULT_RETRY_BACKOFF) -> Retry:
+    """Build the urllib3 retry policy for the download connections.
+
+    Only connection failures are retried: the request never reached the
+    server, so retrying is always safe. Read errors and HTTP statuses are left
+    to the downloader's own resume, backoff and retry handling.
+
+    Args:
+        retries: Retries of a failed connection attempt
+        backoff: urllib3 backoff factor in seconds
+
+    Returns:
+        urllib3 Retry object
+    """
+    return Retry(total=retries, connect=retries, read=False, status=0, other=0,
+                 backoff_factor=backoff, raise_on_status=False)
+
+
+class ConnectionStats:
+    """Thread-safe counters of requests and newly opened connections."""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    def record(self, new_connections: int):
+        """Count one request.
+
+        Args:
+            new_connections: Connections opened while sending it (0 = pooled
+                             connection reused)
+        """
+        with self._lock:
+            self.requests += 1
+            self.new_connections += new_connections
+            if new_connections == 0:
+                self.reused += 1
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Share of requests sent over an already open connection."""
+        with self._lock:
+            return self.reused / self.requests if self.requests else 0.0
+
+
+class PooledHTTPAdapter(TimedHTTPAdapter):
+    """Timed HTTP adapter with configurable pool sizes, connect retries and reuse stats.
+
+    One instance can be mounted into the sessions of all worker threads:
+    urllib3's pool manager is thread-safe.
+    """
+
+    def __init__(self, pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 connect_retries: int = DEFAULT_CONNECT_RETRIES,
+                 retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+                 stats: Optional[ConnectionStats] = None):
+        """Initialize the adapter.
+
+        Args:
+            pool_connections: Number of hosts to keep a connection pool for
+            pool_maxsize: Keep-alive connections kept open per host
+            connect_retries: Retries of a failed connection attempt
+            retry_backoff: Backoff factor between connection retries in seconds
+            stats: Counters to update (default: a new ConnectionStats)
+        """
+        self.stats = stats if stats is not None else ConnectionStats()
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                         max_retries=connect_retry(connect_retries, retry_backoff))
+
+    def send(self, request, **kwargs):
+        """Send a request and count whether it needed a new connection."""
+        before = connection_count()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            self.stats.record(connection_count() - before)
@@ -0,0 +1,85 @@
+"""
+JSON files shared by concurrent download processes.
+
+Shards of one export (see sharding.py) run as separate processes in the same
+working directory and share the URL cache, the content index, the blob cache
+index and the export index. Two things keep these files intact:
+
+- write_json_atomic() writes a temporary file next to the target and renames
+  it over the target, so a reader never sees a half-written file
+- merge_entries() starts from the file as another process last saved it and
+  applies only this process's own changes, so a save neither drops entries
+  other processes added in the meantime nor brings back entries they removed
+"""
+
+import os
+import json
+import tempfile
+from typing import Dict, Iterable, Optional
+
+
+def read_json_object(path: str) -> Optional[Dict]:
+    """Read a JSON object from a file.
+
+    Args:
+        path: File to read
+
+    Returns:
+        The object, or None if the file is missing, unreadable or not a JSON object
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def write_json_atomic(path: str, data: Dict, indent: Optional[int] = 2):
+    """Write a JSON object so readers see either the old or the new file, never a partial one.
+
+    The temporary file has a unique name, so processes saving the same file
+    at the same time do not write into each other's temporary file.
+
+    Args:
+        path: File to write
+        data: JSON-serializable object
+        indent: Indentation passed to json.dump (None for a compact file)
+
+    Raises:
+        OSError: The file could not be written
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_file = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+        os.replace(temp_file, path)
+    except BaseException:
+        try:
+            os.remove(temp_file)
+        except OSError:
+            pass
+        raise
+
+
+def merge_entries(saved: Optional[Dict], entries: Dict, changed: Iterable[str]) -> Dict:
+    """Apply this process's changes to the entries another process may have saved since.
+
+    Args:
+        saved: Entries as currently saved in the file (None if the file could not be read)
+        entries: Entries held by this process
+        changed: Keys this process added, updated or removed since its last save
+
+    Returns:
+        Merged entries; without a readable file, this process's entries
+    """
+    if saved is None:
+        return dict(entries)
+    merged = dict(saved)
+    for key in changed:
+        if key in entries:
+            merged[key] = entries[key]
+        else:
+            merged.pop(key, None)
+    return merged
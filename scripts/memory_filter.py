@@ -0,0 +1,156 @@
+"""
+Selective runs over a subset of Snapchat memories.
+
+A MemoryFilter narrows the work set of every operation (download,
+verification, compositing, timezone conversion) by capture date, media type,
+an explicit SID list and the shard of a sharded run, before any per-memory
+I/O happens.
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set
+
+from sharding import Shard
+
+# Media types accepted by --type
+MEDIA_TYPES = ('image', 'video')
+# Length of the SID prefix used in filenames
+SHORT_SID_LENGTH = 8
+
+
+def parse_date(value: str) -> date:
+    """Parse a YYYY-MM-DD date from the command line.
+
+    Args:
+        value: Date string
+
+    Returns:
+        Parsed date
+
+    Raises:
+        ValueError: If the string is not a valid YYYY-MM-DD date
+    """
+    return date.fromisoformat(value.strip())
+
+
+def load_sids(sids_file: str) -> Set[str]:
+    """Read a SID list, one SID per line.
+
+    Blank lines and lines starting with # are ignored. Full SIDs and the
+    8-character prefixes used in filenames are both accepted.
+
+    Args:
+        sids_file: Path to the SID list
+
+    Returns:
+        Set of SIDs (lowercase)
+    """
+    with open(sids_file, 'r', encoding='utf-8') as f:
+        return {line.strip().lower() for line in f if line.strip() and not line.lstrip().startswith('#')}
+
+
+class MemoryFilter:
+    """Date range, media type, SID list and shard filter for memories.
+
+    Memories are the dictionaries produced by the HTML parser, or progress
+    entries with a 'sid' added: only 'sid', 'date' and 'media_type' are read.
+    An empty filter matches everything.
+    """
+
+    def __init__(self, since: Optional[date] = None, until: Optional[date] = None,
+                 media_types: Optional[Iterable[str]] = None, sids: Optional[Iterable[str]] = None,
+                 shard: Optional[Shard] = None):
+        """Initialize the filter.
+
+        Args:
+            since: First capture date to include (UTC)
+            until: Last capture date to include (UTC, inclusive)
+            media_types: Media types to include ('image', 'video')
+            sids: SIDs or 8-character SID prefixes to include
+            shard: Only include the SIDs of this shard
+        """
+        self.since = since.isoformat() if since else None
+        self.until = until.isoformat() if until else None
+        self.media_types = {media_type.lower() for media_type in media_types} if media_types else None
+        self.sids = {sid.lower() for sid in sids} if sids is not None else None
+        self.shard = shard
+
+    @property
+    def active(self) -> bool:
+        """True if the filter excludes anything at all."""
+        return any(value is not None for value in (self.since, self.until, self.media_types, self.sids, self.shard))
+
+    def matches(self, memory: Dict) -> bool:
+        """Check whether a memory is selected.
+
+        Args:
+            memory: Memory dictionary with sid, date and media_type
+
+        Returns:
+            True if the memory passes every criterion
+        """
+        # Dates are 'YYYY-MM-DD HH:MM:SS UTC', so the ISO day compares as a string
+        day = memory.get('date', '')[:10]
+        if self.since is not None and day < self.since:
+            return False
+        if self.until is not None and day > self.until:
+            return False
+        if self.media_types is not None and memory.get('media_type', '').lower() not in self.media_types:
+            return False
+        if self.sids is not None:
+            sid = memory['sid'].lower()
+            if sid not in self.sids and sid[:SHORT_SID_LENGTH] not in self.sids:
+                return False
+        if self.shard is not None and not self.shard.contains(memory['sid']):
+            return False
+        return True
+
+    def apply(self, memories: List[Dict]) -> List[Dict]:
+        """Select the matching memories, keeping their order.
+
+        Args:
+            memories: Memory dictionaries
+
+        Returns:
+            Matching memories (the same list if the filter is empty)
+        """
+        if not self.active:
+            return memories
+        return [memory for memory in memories if self.matches(memory)]
+
+    def short_sids(self, entries: Dict[str, Dict]) -> Optional[Set[str]]:
+        """Get the filename SID prefixes of the selected progress entries.
+
+        Downloaded files and overlay pairs only carry the SID prefix, so
+        file-based operations are filtered through the progress entries
+        that hold the date and media type.
+
+        Args:
+            entries: Progress entries keyed by full SID
+
+        Returns:
+            Set of 8-character SID prefixes, or None if the filter is empty
+        """
+        if not self.active:
+            return None
+        return {sid[:SHORT_SID_LENGTH] for sid, entry in entries.items()
+                if self.matches(dict(entry, sid=sid))}
+
+    def describe(self) -> str:
+        """Describe the filter for progress output.
+
+        Returns:
+            Human-readable list of the active criteria
+        """
+        criteria = []
+        if self.since:
+            criteria.append(f"since {self.since}")
+        if self.until:
+            criteria.append(f"until {self.until}")
+        if self.media_types:
+            criteria.append("/".join(sorted(self.media_types)) + "s only")
+        if self.sids is not None:
+            criteria.append(f"{len(self.sids)} listed SIDs")
+        if self.shard is not None:
+            criteria.append(f"shard {self.shard}")
+        return ", ".join(criteria) if criteria else "all memories"
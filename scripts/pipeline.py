@@ -0,0 +1,243 @@
+"""
+Staged processing pipeline for Snapchat memories downloads.
+
+A download is split into stages that run in their own worker threads:
+
+- fetch: request the memory and stream the payload to a partial file
+- unpack: extract ZIP members next to their final destination
+- metadata: move files into place, set timestamps and GPS, mark as downloaded
+- composite: put the overlay onto its base media
+
+Stages hand items to the next stage through bounded queues. A slow stage
+fills its input queue and then blocks the stage in front of it
+(backpressure), so fast fetches cannot pile up unprocessed payloads in the
+staging directory while metadata tools or ffmpeg are busy.
+
+Every stage records how its workers spent their time - busy, waiting for
+input, or blocked on the full queue of the next stage - and the report
+at the end of a run shows which stage limits throughput.
+"""
+
+import time
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Stages of a pipelined download run, in order
+PIPELINE_STAGES = ('fetch', 'unpack', 'metadata', 'composite')
+# Worker threads per stage (composite=0 turns compositing off)
+DEFAULT_STAGE_WORKERS = {'fetch': 4, 'unpack': 2, 'metadata': 2, 'composite': 1}
+# Items that may wait in front of each stage before the previous stage blocks
+DEFAULT_QUEUE_SIZE = 8
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+def parse_stage_workers(value: str) -> Dict[str, int]:
+    """Parse per-stage worker counts like 'fetch=6,metadata=3'.
+
+    Stages that are not mentioned keep their default worker count.
+
+    Args:
+        value: Comma-separated STAGE=N pairs (empty for the defaults)
+
+    Returns:
+        Worker count for every stage in PIPELINE_STAGES
+
+    Raises:
+        ValueError: Unknown stage, invalid count, or no workers for a required stage
+    """
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    for part in filter(None, (part.strip() for part in value.split(','))):
+        name, sep, count = part.partition('=')
+        name = name.strip().lower()
+        if not sep or name not in PIPELINE_STAGES:
+            raise ValueError(f"Invalid stage '{part}' (expected STAGE=N with STAGE one of "
+                             f"{', '.join(PIPELINE_STAGES)})")
+        if not count.strip().isdigit():
+            raise ValueError(f"Invalid worker count in '{part}'")
+        workers[name] = int(count)
+
+    for name in PIPELINE_STAGES:
+        if name != 'composite' and workers[name] < 1:
+            raise ValueError(f"The {name} stage needs at least 1 worker")
+    return workers
+
+
+class Stage:
+    """One stage of a Pipeline and the time its workers spent.
+
+    The stage function takes one item and returns the items for the next
+    stage (any number, including none). Exceptions are counted and the item
+    is dropped, so stage functions should record their own failures.
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Optional[Iterable]], workers: int = 1,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        """Initialize the stage.
+
+        Args:
+            name: Stage name for the report
+            func: Processes one item, returns the items for the next stage
+            workers: Number of worker threads
+            queue_size: Capacity of the queue in front of this stage
+        """
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+        self.busy = 0.0
+        self.idle = 0.0
+        self.blocked = 0.0
+        self.items = 0
+        self.errors = 0
+        self.peak_queue = 0
+        self._lock = threading.Lock()
+
+    def utilisation(self, elapsed: float) -> Dict[str, float]:
+        """Get the share of the workers' time spent in each state.
+
+        Args:
+            elapsed: Wall-clock duration of the run in seconds
+
+        Returns:
+            Dictionary with busy, idle and blocked fractions (0 to 1)
+        """
+        capacity = self.workers * elapsed
+        if capacity <= 0:
+            return {'busy': 0.0, 'idle': 0.0, 'blocked': 0.0}
+        return {
+            'busy': min(1.0, self.busy / capacity),
+            'idle': min(1.0, self.idle / capacity),
+            'blocked': min(1.0, self.blocked / capacity)
+        }
+
+
+class Pipeline:
+    """Stages connected by bounded queues, each with its own worker threads."""
+
+    def __init__(self, stages: List[Stage]):
+        """Initialize the pipeline.
+
+        Args:
+            stages: Stages in processing order (all need at least one worker)
+        """
+        self.stages = stages
+        self.elapsed = 0.0
+
+    def run(self, items: Iterable) -> float:
+        """Push items through every stage and wait until all are processed.
+
+        The calling thread feeds the first stage and blocks while its queue
+        is full.
+
+        Args:
+            items: Input items of the first stage
+
+        Returns:
+            Wall-clock duration of the run in seconds
+        """
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        finished = [0] * len(self.stages)
+        threads = []
+        for position, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(position, queues, finished),
+                                          name=f"{stage.name}-{number + 1}", daemon=True)
+                threads.append(thread)
+
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for item in items:
+            self._put(queues[0], item, self.stages[0])
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.monotonic() - start
+        return self.elapsed
+
+    def _work(self, position: int, queues: List[queue.Queue], finished: List[int]):
+        """Worker loop of one stage; the last worker to finish closes the next stage's input."""
+        stage = self.stages[position]
+        inbox = queues[position]
+        outbox = queues[position + 1] if position + 1 < len(queues) else None
+        next_stage = self.stages[position + 1] if outbox is not None else None
+        idle = busy = blocked = 0.0
+
+        while True:
+            start = time.perf_counter()
+            item = inbox.get()
+            idle += time.perf_counter() - start
+            if item is _DONE:
+                break
+
+            start = time.perf_counter()
+            try:
+                outputs = list(stage.func(item) or ())
+            except Exception as e:
+                print(f"\n    {stage.name} stage error: {e}", flush=True)
+                outputs = []
+                with stage._lock:
+                    stage.errors += 1
+            busy += time.perf_counter() - start
+
+            if outbox is not None:
+                for output in outputs:
+                    blocked += self._put(outbox, output, next_stage)
+            with stage._lock:
+                stage.items += 1
+
+        with stage._lock:
+            stage.busy += busy
+            stage.idle += idle
+            stage.blocked += blocked
+            finished[position] += 1
+            last = finished[position] == stage.workers
+        if last and outbox is not None:
+            for _ in range(next_stage.workers):
+                outbox.put(_DONE)
+
+    def _put(self, target: queue.Queue, item: Any, stage: Stage) -> float:
+        """Put an item into a stage's queue, blocking while it is full.
+
+        Returns:
+            Seconds spent blocked
+        """
+        start = time.perf_counter()
+        target.put(item)
+        waited = time.perf_counter() - start
+        depth = target.qsize()
+        with stage._lock:
+            stage.peak_queue = max(stage.peak_queue, depth)
+        return waited
+
+    def bottleneck(self) -> Optional[Stage]:
+        """Get the stage whose workers were busy the largest share of the run.
+
+        Returns:
+            Busiest stage, or None before the first run
+        """
+        if self.elapsed <= 0 or not self.stages:
+            return None
+        return max(self.stages, key=lambda stage: stage.utilisation(self.elapsed)['busy'])
+
+    def print_report(self):
+        """Print per-stage utilisation of the last run."""
+        print(f"\nPipeline stages ({self.elapsed:.1f}s):")
+        print(f"  {'stage':<10} {'workers':>7} {'items':>6} {'busy':>6} {'waiting':>8} {'blocked':>8} "
+              f"{'peak queue':>11}")
+        for stage in self.stages:
+            share = stage.utilisation(self.elapsed)
+            errors = f"  ({stage.errors} errors)" if stage.errors else ""
+            print(f"  {stage.name:<10} {stage.workers:>7} {stage.items:>6} {share['busy']:>6.0%} "
+                  f"{share['idle']:>8.0%} {share['blocked']:>8.0%} "
+                  f"{stage.peak_queue:>5}/{stage.queue_size:<5}{errors}")
+
+        bottleneck = self.bottleneck()
+        if bottleneck is not None and bottleneck.items:
+            print(f"  Busiest stage: {bottleneck.name} "
+                  f"({bottleneck.utilisation(self.elapsed)['busy']:.0%} of its workers' time) - "
+                  f"more {bottleneck.name} workers may raise throughput")
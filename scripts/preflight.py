@@ -0,0 +1,214 @@
+"""
+Pre-flight sizing for Snapchat memories downloads.
+
+Before downloading, the size of every pending memory can be probed with
+cheap HEAD requests (falling back to a one-byte Range GET). The sizes give:
+
+- the total number of bytes to download
+- a free-space check before the run starts instead of a full disk halfway
+- a byte-based ETA, which stays accurate when videos and images are mixed
+
+Files whose size is known are also preallocated on disk to reduce
+fragmentation.
+"""
+
+import os
+import errno
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from download_errors import RateLimitedError, ServerError
+from rate_limiter import parse_retry_after
+
+# Extra free space required on top of the estimated download size
+FREE_SPACE_MARGIN = 0.05
+# Longest delay between pre-flight probes; probes are cheap HEAD requests and
+# have their own rate controller, so they don't run at the download pace
+PROBE_MAX_DELAY = 0.1
+# Highest pre-flight probe rate in requests per second
+PROBE_MAX_RATE = 20.0
+
+
+def probe_size(session, url: str, timeout: float = 15) -> Optional[int]:
+    """Get the size of a download without fetching its body.
+
+    Tries a HEAD request first. Servers that reject HEAD or omit
+    Content-Length get a GET for the first byte only, whose Content-Range
+    carries the full size.
+
+    Args:
+        session: requests.Session to use
+        url: Download URL
+        timeout: Request timeout in seconds
+
+    Returns:
+        Size in bytes, or None if the server did not reveal it
+
+    Raises:
+        RateLimitedError: Server answered HTTP 429
+        ServerError: Server answered with an HTTP 5xx status
+    """
+    response = session.head(url, timeout=timeout, allow_redirects=True)
+    raise_for_throttling(response)
+    if response.status_code == 200 and 'text/html' not in response.headers.get('content-type', ''):
+        length = response.headers.get('content-length')
+        if length and length.isdigit() and int(length) > 0:
+            return int(length)
+
+    response = session.get(url, timeout=timeout, stream=True, headers={'Range': 'bytes=0-0'})
+    try:
+        raise_for_throttling(response)
+        if response.status_code == 206:
+            total = response.headers.get('content-range', '').rpartition('/')[2]
+            if total.isdigit():
+                return int(total)
+    finally:
+        response.close()
+    return None
+
+
+def raise_for_throttling(response):
+    """Raise the download error types for 429 and 5xx responses.
+
+    Args:
+        response: requests.Response of a probe or resolution request
+
+    Raises:
+        RateLimitedError: HTTP 429
+        ServerError: HTTP 5xx
+    """
+    retry_after = parse_retry_after(response.headers.get('retry-after'))
+    if response.status_code == 429:
+        raise RateLimitedError("HTTP 429 Too Many Requests - Rate limited by server", retry_after)
+    if response.status_code >= 500:
+        raise ServerError(f"HTTP {response.status_code} server error", response.status_code, retry_after)
+
+
+def estimate_sizes(memories: List[Dict], sizes: Dict[str, Optional[int]]) -> Dict[str, int]:
+    """Fill in unknown sizes with the average size of the same media type.
+
+    Args:
+        memories: Memories that were probed
+        sizes: Probed sizes by SID (None where unknown)
+
+    Returns:
+        Size in bytes for every SID (estimated where the probe failed)
+    """
+    known_by_type = {}
+    for memory in memories:
+        size = sizes.get(memory['sid'])
+        if size is not None:
+            known_by_type.setdefault(memory['media_type'].lower(), []).append(size)
+
+    all_known = [size for values in known_by_type.values() for size in values]
+    overall_average = sum(all_known) // len(all_known) if all_known else 0
+
+    estimated = {}
+    for memory in memories:
+        size = sizes.get(memory['sid'])
+        if size is None:
+            same_type = known_by_type.get(memory['media_type'].lower())
+            size = sum(same_type) // len(same_type) if same_type else overall_average
+        estimated[memory['sid']] = size
+    return estimated
+
+
+def check_free_space(directory: Path, required: int) -> Tuple[bool, int]:
+    """Check that a directory's filesystem can hold the download.
+
+    Args:
+        directory: Directory the files will be written to
+        required: Bytes that will be written
+
+    Returns:
+        (enough_space, free_bytes)
+    """
+    free = shutil.disk_usage(directory).free
+    return free >= required * (1 + FREE_SPACE_MARGIN), free
+
+
+def preallocate(f, size: int) -> bool:
+    """Reserve disk space for a file that is about to be written.
+
+    The file grows to `size` bytes, so the writer must truncate it to the
+    bytes actually written when it finishes.
+
+    Args:
+        f: File object opened for writing, positioned at 0
+        size: Expected final size in bytes
+
+    Returns:
+        True if the space was reserved, False if the platform or filesystem
+        does not support preallocation
+
+    Raises:
+        OSError: The disk does not have enough free space (ENOSPC)
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return False
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+        return True
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+        return False
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration for progress output (e.g. '1h 05m', '3m 20s').
+
+    Args:
+        seconds: Duration in seconds
+
+    Returns:
+        Short human-readable duration
+    """
+    seconds = int(max(0, seconds))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+
+class TransferProgress:
+    """Thread-safe byte counter that turns completed downloads into an ETA."""
+
+    def __init__(self, total_bytes: int):
+        """Initialize the byte counter.
+
+        Args:
+            total_bytes: Bytes expected for the whole run
+        """
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.start_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, num_bytes: int):
+        """Count a finished (or abandoned) memory's bytes as done.
+
+        Args:
+            num_bytes: Size of the memory in bytes
+        """
+        with self._lock:
+            self.done_bytes += num_bytes
+
+    def eta(self) -> Optional[float]:
+        """Estimate the remaining time from the byte rate so far.
+
+        Returns:
+            Seconds remaining, or None before any bytes were counted
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.start_time
+            if self.done_bytes <= 0 or elapsed <= 0:
+                return None
+            byte_rate = self.done_bytes / elapsed
+            return max(0, self.total_bytes - self.done_bytes) / byte_rate
@@ -4,12 +4,27 @@ Progress tracking and verification for Snapchat memories downloads.
 
 import json
 import os
-from typing import Dict, List
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
 from datetime import datetime
 
+from json_store import write_json_atomic
+
+# Error types that mean the download link stopped working, not the memory
+LINK_EXPIRY_ERROR_TYPES = ('LinkExpiredError', 'ErrorPageError')
+# Changes collected before the progress file is saved while saves are batched
+PROGRESS_SAVE_INTERVAL = 25
+
 
 class ProgressTracker:
-    """Track download progress and failed attempts."""
+    """Track download progress and failed attempts.
+
+    All methods that modify or save the progress data hold an internal lock,
+    so a single tracker can be shared by concurrent download workers. Every
+    change is saved right away, except inside batched_saves().
+    """
 
     def __init__(self, progress_file: str = "download_progress.json"):
         """Initialize progress tracker.
@@ -18,7 +33,10 @@ class ProgressTracker:
             progress_file: Path to JSON file for storing progress
         """
         self.progress_file = progress_file
+        self._lock = threading.RLock()
         self.progress = self._load_progress()
+        self._batch_depth = 0
+        self._unsaved = 0
 
     def _load_progress(self) -> Dict:
         """Load download progress from JSON file."""
@@ -59,13 +77,52 @@ class ProgressTracker:
         }
 
     def save_progress(self):
-        """Save download progress to JSON file."""
+        """Save download progress to JSON file.
+
+        The file is replaced atomically, so an interrupted save leaves the
+        previous version intact.
+        """
+        with self._lock:
+            try:
+                write_json_atomic(self.progress_file, self.progress)
+                self._unsaved = 0
+            except Exception as e:
+                print(f"ERROR: Failed to save progress file: {e}")
+                raise
+
+    @contextmanager
+    def batched_saves(self):
+        """Save changes in batches while the block runs, e.g. a download run.
+
+        Inside the block the file is saved after every PROGRESS_SAVE_INTERVAL
+        changes instead of after each one, and once more when the block is
+        left (also on an exception or interrupt). If that last save fails
+        while an exception is raised, the original exception is kept.
+        """
+        with self._lock:
+            self._batch_depth += 1
         try:
-            with open(self.progress_file, 'w', encoding='utf-8') as f:
-                json.dump(self.progress, f, indent=2)
-        except Exception as e:
-            print(f"ERROR: Failed to save progress file: {e}")
+            yield
+        except BaseException:
+            try:
+                self._end_batch()
+            except OSError:
+                pass  # save_progress() already reported it
             raise
+        self._end_batch()
+
+    def _end_batch(self):
+        """Leave batched_saves() and save what is left once no batch is open."""
+        with self._lock:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._unsaved:
+                self.save_progress()
+
+    def _save_change(self):
+        """Save after a change, or count it while saves are batched (lock must be held)."""
+        self._unsaved += 1
+        if self._batch_depth == 0 or self._unsaved >= PROGRESS_SAVE_INTERVAL:
+            self.save_progress()
 
     def is_downloaded(self, sid: str) -> bool:
         """Check if a memory has been downloaded.
@@ -85,22 +142,27 @@ class ProgressTracker:
             sid: Session ID
             memory: Memory dictionary with date and media_type
         """
-        self.progress['downloaded'][sid] = {
-            'date': memory['date'],  # Always UTC
-            'media_type': memory['media_type'],
-            'location': memory.get('location', None),  # Store GPS coordinates
-            'timestamp': datetime.now().isoformat(),
-            'timezone_converted': False,  # Track if converted to local timezone
-            'local_date': None  # Will be set when timezone is converted
-        }
+        with self._lock:
+            self.progress['downloaded'][sid] = {
+                'date': memory['date'],  # Always UTC
+                'media_type': memory['media_type'],
+                'location': memory.get('location', None),  # Store GPS coordinates
+                'timestamp': datetime.now().isoformat(),
+                'timezone_converted': False,  # Track if converted to local timezone
+                'local_date': None  # Will be set when timezone is converted
+            }
+
+            # Remove from failed list if present
+            if sid in self.progress['failed']:
+                del self.progress['failed'][sid]
 
-        # Remove from failed list if present
-        if sid in self.progress['failed']:
-            del self.progress['failed'][sid]
+            # A finished download has no partial file left to resume
+            self.progress.get('partial', {}).pop(sid, None)
 
-        self.save_progress()
+            self._save_change()
 
-    def record_failure(self, sid: str, memory: Dict, error_msg: str, exception: Exception = None):
+    def record_failure(self, sid: str, memory: Dict, error_msg: str, exception: Exception = None,
+                       failure_class: Optional[str] = None):
         """Record a failed download attempt.
 
         Args:
@@ -108,37 +170,197 @@ class ProgressTracker:
             memory: Memory dictionary
             error_msg: Error message
             exception: Optional exception object
+            failure_class: Optional failure class ('permanent', 'transient', 'throttled')
         """
-        if sid not in self.progress['failed']:
-            self.progress['failed'][sid] = {
-                'count': 0,
-                'errors': [],
-                'url': memory['download_url']
+        with self._lock:
+            if sid not in self.progress['failed']:
+                self.progress['failed'][sid] = {
+                    'count': 0,
+                    'errors': [],
+                    'url': memory['download_url']
+                }
+
+            self.progress['failed'][sid]['count'] += 1
+            error_record = {
+                'timestamp': datetime.now().isoformat(),
+                'error': error_msg
             }
+            if exception:
+                error_record['error_type'] = type(exception).__name__
+            if failure_class:
+                error_record['class'] = failure_class
+                class_counts = self.progress['failed'][sid].setdefault('class_counts', {})
+                class_counts[failure_class] = class_counts.get(failure_class, 0) + 1
 
-        self.progress['failed'][sid]['count'] += 1
-        error_record = {
-            'timestamp': datetime.now().isoformat(),
-            'error': error_msg
-        }
-        if exception:
-            error_record['error_type'] = type(exception).__name__
-
-        self.progress['failed'][sid]['errors'].append(error_record)
-        self.save_progress()
+            self.progress['failed'][sid]['errors'].append(error_record)
+            self._save_change()
 
-    def get_failure_count(self, sid: str) -> int:
+    def get_failure_count(self, sid: str, failure_class: Optional[str] = None) -> int:
         """Get the number of times a download has failed.
 
         Args:
             sid: Session ID
+            failure_class: Only count failures of this class. Failures recorded
+                           before classes existed count as 'transient'.
 
         Returns:
             Number of failed attempts
         """
-        if sid in self.progress['failed']:
-            return self.progress['failed'][sid].get('count', 0)
-        return 0
+        if sid not in self.progress['failed']:
+            return 0
+
+        entry = self.progress['failed'][sid]
+        if failure_class is None:
+            return entry.get('count', 0)
+
+        class_counts = entry.get('class_counts', {})
+        if failure_class == 'transient':
+            unclassified = entry.get('count', 0) - sum(class_counts.values())
+            return class_counts.get('transient', 0) + max(0, unclassified)
+        return class_counts.get(failure_class, 0)
+
+    def record_partial(self, sid: str, partial: Dict):
+        """Record an interrupted download that can be resumed later.
+
+        Args:
+            sid: Session ID
+            partial: Dictionary describing the partial file:
+                     path, media_type, ext, etag (optional), size (optional)
+        """
+        with self._lock:
+            if 'partial' not in self.progress:
+                self.progress['partial'] = {}
+
+            self.progress['partial'][sid] = {
+                **partial,
+                'timestamp': datetime.now().isoformat()
+            }
+            self._save_change()
+
+    def get_partial(self, sid: str) -> Optional[Dict]:
+        """Get the resumable partial download recorded for a SID.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            Partial download dictionary or None
+        """
+        return self.progress.get('partial', {}).get(sid)
+
+    def clear_partial(self, sid: str):
+        """Forget the partial download recorded for a SID.
+
+        Args:
+            sid: Session ID
+        """
+        with self._lock:
+            if sid in self.progress.get('partial', {}):
+                del self.progress['partial'][sid]
+                self._save_change()
+
+    def set_link(self, sid: str, memory: Dict):
+        """Replace the download link of a memory with one from a newer export.
+
+        Args:
+            sid: Session ID
+            memory: Memory dictionary from the newer export
+        """
+        with self._lock:
+            if 'links' not in self.progress:
+                self.progress['links'] = {}
+
+            self.progress['links'][sid] = {
+                'download_url': memory['download_url'],
+                'is_get_request': memory.get('is_get_request', True),
+                'refreshed': datetime.now().isoformat()
+            }
+            if sid in self.progress['failed']:
+                self.progress['failed'][sid]['url'] = memory['download_url']
+            self._save_change()
+
+    def get_link(self, sid: str) -> Optional[Dict]:
+        """Get the refreshed download link recorded for a SID.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            Dictionary with download_url and is_get_request, or None
+        """
+        return self.progress.get('links', {}).get(sid)
+
+    def clear_link_failures(self, sid: str) -> int:
+        """Forget failures caused by an expired link (403/410, HTML error pages).
+
+        Other failures keep counting against the memory's retry budgets.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            Number of failures removed
+        """
+        with self._lock:
+            entry = self.progress['failed'].get(sid)
+            if entry is None:
+                return 0
+
+            expired = [error for error in entry['errors'] if self._is_link_expiry(error)]
+            if not expired:
+                return 0
+
+            entry['errors'] = [error for error in entry['errors'] if not self._is_link_expiry(error)]
+            entry['count'] = max(0, entry['count'] - len(expired))
+            class_counts = entry.get('class_counts', {})
+            for error in expired:
+                failure_class = error.get('class')
+                if failure_class in class_counts:
+                    class_counts[failure_class] -= 1
+                    if class_counts[failure_class] <= 0:
+                        del class_counts[failure_class]
+
+            if entry['count'] == 0:
+                del self.progress['failed'][sid]
+            self._save_change()
+            return len(expired)
+
+    @staticmethod
+    def _is_link_expiry(error: Dict) -> bool:
+        """Check whether a recorded failure was caused by an expired link."""
+        if error.get('error_type') in LINK_EXPIRY_ERROR_TYPES:
+            return True
+        return error.get('error_type') == 'HTTPError' and re.search(r'\b(403|410)\b', error['error']) is not None
+
+    def record_schedule_run(self, policy: str, memories: int, num_bytes: int, seconds: float):
+        """Add one download run to the throughput totals of a scheduling policy.
+
+        Args:
+            policy: Scheduling policy name
+            memories: Memories attempted in the run
+            num_bytes: Bytes received in the run
+            seconds: Time spent downloading
+        """
+        with self._lock:
+            if 'schedule_stats' not in self.progress:
+                self.progress['schedule_stats'] = {}
+
+            stats = self.progress['schedule_stats'].setdefault(
+                policy, {'runs': 0, 'memories': 0, 'bytes': 0, 'seconds': 0.0}
+            )
+            stats['runs'] += 1
+            stats['memories'] += memories
+            stats['bytes'] += num_bytes
+            stats['seconds'] += seconds
+            self._save_change()
+
+    def get_schedule_stats(self) -> Dict:
+        """Get the throughput totals recorded for each scheduling policy.
+
+        Returns:
+            Dictionary of policy name -> {runs, memories, bytes, seconds}
+        """
+        return self.progress.get('schedule_stats', {})
 
     def is_composited(self, sid: str, media_type: str) -> bool:
         """Check if a file has been composited.
@@ -165,31 +387,32 @@ class ProgressTracker:
             base_file: Path to base file
             overlay_file: Path to overlay file
         """
-        if 'composited' not in self.progress:
-            self.progress['composited'] = {'images': {}, 'videos': {}}
-
-        # Ensure both images and videos keys exist
-        if 'images' not in self.progress['composited']:
-            self.progress['composited']['images'] = {}
-        if 'videos' not in self.progress['composited']:
-            self.progress['composited']['videos'] = {}
-
-        composited_dict = self.progress['composited']['images' if media_type == 'image' else 'videos']
-        composited_dict[sid] = {
-            'timestamp': datetime.now().isoformat(),
-            'base_file': str(base_file),
-            'overlay_file': str(overlay_file)
-        }
+        with self._lock:
+            if 'composited' not in self.progress:
+                self.progress['composited'] = {'images': {}, 'videos': {}}
+
+            # Ensure both images and videos keys exist
+            if 'images' not in self.progress['composited']:
+                self.progress['composited']['images'] = {}
+            if 'videos' not in self.progress['composited']:
+                self.progress['composited']['videos'] = {}
+
+            composited_dict = self.progress['composited']['images' if media_type == 'image' else 'videos']
+            composited_dict[sid] = {
+                'timestamp': datetime.now().isoformat(),
+                'base_file': str(base_file),
+                'overlay_file': str(overlay_file)
+            }
 
-        # Remove from failed composites if present
-        if 'failed_composites' not in self.progress:
-            self.progress['failed_composites'] = {'images': {}, 'videos': {}}
+            # Remove from failed composites if present
+            if 'failed_composites' not in self.progress:
+                self.progress['failed_composites'] = {'images': {}, 'videos': {}}
 
-        failed_dict = self.progress['failed_composites']['images' if media_type == 'image' else 'videos']
-        if sid in failed_dict:
-            del failed_dict[sid]
+            failed_dict = self.progress['failed_composites']['images' if media_type == 'image' else 'videos']
+            if sid in failed_dict:
+                del failed_dict[sid]
 
-        self.save_progress()
+            self._save_change()
 
     def record_composite_failure(self, sid: str, media_type: str, base_file: str, overlay_file: str, error_msg: str):
         """Record a failed composite attempt.
@@ -201,31 +424,32 @@ class ProgressTracker:
             overlay_file: Path to overlay file
             error_msg: Error message
         """
-        if 'failed_composites' not in self.progress:
-            self.progress['failed_composites'] = {'images': {}, 'videos': {}}
-
-        # Ensure both images and videos keys exist
-        if 'images' not in self.progress['failed_composites']:
-            self.progress['failed_composites']['images'] = {}
-        if 'videos' not in self.progress['failed_composites']:
-            self.progress['failed_composites']['videos'] = {}
-
-        failed_dict = self.progress['failed_composites']['images' if media_type == 'image' else 'videos']
-
-        if sid not in failed_dict:
-            failed_dict[sid] = {
-                'count': 0,
-                'errors': [],
-                'base_file': str(base_file),
-                'overlay_file': str(overlay_file)
-            }
-
-        failed_dict[sid]['count'] += 1
-        failed_dict[sid]['errors'].append({
-            'timestamp': datetime.now().isoformat(),
-            'error': error_msg
-        })
-        self.save_progress()
+        with self._lock:
+            if 'failed_composites' not in self.progress:
+                self.progress['failed_composites'] = {'images': {}, 'videos': {}}
+
+            # Ensure both images and videos keys exist
+            if 'images' not in self.progress['failed_composites']:
+                self.progress['failed_composites']['images'] = {}
+            if 'videos' not in self.progress['failed_composites']:
+                self.progress['failed_composites']['videos'] = {}
+
+            failed_dict = self.progress['failed_composites']['images' if media_type == 'image' else 'videos']
+
+            if sid not in failed_dict:
+                failed_dict[sid] = {
+                    'count': 0,
+                    'errors': [],
+                    'base_file': str(base_file),
+                    'overlay_file': str(overlay_file)
+                }
+
+            failed_dict[sid]['count'] += 1
+            failed_dict[sid]['errors'].append({
+                'timestamp': datetime.now().isoformat(),
+                'error': error_msg
+            })
+            self._save_change()
 
     def get_composite_failure_count(self, sid: str, media_type: str) -> int:
         """Get the number of times a composite has failed.
@@ -265,10 +489,11 @@ class ProgressTracker:
             sid: Session ID
             local_date: Date/time in local timezone (same format as UTC date)
         """
-        if sid in self.progress['downloaded']:
-            self.progress['downloaded'][sid]['timezone_converted'] = True
-            self.progress['downloaded'][sid]['local_date'] = local_date
-            self.save_progress()
+        with self._lock:
+            if sid in self.progress['downloaded']:
+                self.progress['downloaded'][sid]['timezone_converted'] = True
+                self.progress['downloaded'][sid]['local_date'] = local_date
+                self._save_change()
 
     def get_utc_date(self, sid: str) -> str:
         """Get the UTC date for a SID.
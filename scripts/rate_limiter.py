@@ -0,0 +1,158 @@
+"""
+Adaptive request rate control for Snapchat memories downloads.
+
+The RateController uses AIMD (additive increase, multiplicative decrease):
+every healthy response raises the allowed request rate by a small step, and
+every 429 or 5xx response cuts it by a constant factor. Retry-After headers
+pause all requests until the server says it is ready again.
+
+The TokenBucket caps bandwidth (bytes per second) across all transfers.
+"""
+
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse an HTTP Retry-After header.
+
+    Args:
+        value: Header value, either delay-seconds or an HTTP-date
+
+    Returns:
+        Seconds to wait (never negative), or None if missing/unparseable
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateController:
+    """Thread-safe AIMD controller for the request rate of all download workers."""
+
+    def __init__(self, max_delay: float = 2.0, max_rate: float = 5.0,
+                 increase_step: float = 0.1, decrease_factor: float = 0.5):
+        """Initialize the rate controller.
+
+        Args:
+            max_delay: Longest delay between requests in seconds (the old fixed
+                       --delay). The controller starts here and never goes slower,
+                       except while honoring a Retry-After pause. 0 disables pacing.
+            max_rate: Highest request rate allowed, in requests per second
+            increase_step: Requests/s added after each healthy response
+            decrease_factor: Multiplier applied to the rate on 429/5xx responses
+        """
+        self.unlimited = max_delay <= 0
+        self.min_rate = 1.0 / max_delay if not self.unlimited else max_rate
+        self.max_rate = max(max_rate, self.min_rate)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self.rate = self.min_rate
+        self.backoff_count = 0
+
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+
+    @property
+    def current_rate(self) -> float:
+        """Current allowed request rate in requests per second."""
+        return self.rate
+
+    def acquire(self):
+        """Block until the caller may send its next request."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._paused_until)
+            if not self.unlimited:
+                start = max(start, self._next_slot)
+                self._next_slot = start + 1.0 / self.rate
+
+        wait = start - now
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        """Record a healthy response: raise the rate additively."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_backoff(self, retry_after: Optional[float] = None):
+        """Record a 429/5xx response: cut the rate and honor Retry-After.
+
+        Args:
+            retry_after: Seconds the server asked us to wait, if any
+        """
+        with self._lock:
+            self.backoff_count += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            # Requests already scheduled at the old rate must wait for the new one
+            if not self.unlimited:
+                self._next_slot = max(self._next_slot, now + 1.0 / self.rate)
+
+
+class TokenBucket:
+    """Thread-safe token bucket that caps the combined bandwidth of all transfers.
+
+    Tokens are bytes. The bucket refills at the sustained rate and holds at
+    most `burst` bytes, so transfers can briefly run faster after an idle
+    period but average out at the sustained rate.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """Initialize the token bucket.
+
+        Args:
+            rate: Sustained rate in bytes per second
+            burst: Bucket capacity in bytes (default: one second at the sustained rate)
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self.tokens = self.capacity
+
+        self._lock = threading.Lock()
+        self._last_refill = time.monotonic()
+
+    def consume(self, num_bytes: int):
+        """Take tokens for bytes just received, sleeping if the bucket is empty.
+
+        A request larger than the available tokens puts the bucket into debt,
+        so callers wait in arrival order and no transfer starves.
+
+        Args:
+            num_bytes: Number of bytes received
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            self.tokens -= num_bytes
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
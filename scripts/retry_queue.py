@@ -0,0 +1,206 @@
+"""
+Failure classification and deferred retries for Snapchat memories downloads.
+
+Every failed download attempt is sorted into one of three classes:
+
+- permanent: retrying will not help (404 and other 4xx, unrecognized payload)
+- transient: network trouble, a server hiccup or a local file system error (timeouts,
+  resets, 5xx, truncated ZIP, expired link (403/410), locked file)
+- throttled: the server is pushing back (429, 503, HTML error pages)
+
+Transient and throttled memories go to a DeferredQueue and are retried after
+a cool-down while fresh memories keep downloading. Each class has its own
+retry budget, counted over all runs in the progress file. A full disk is not
+classified at all: the downloader stops the run (see download_errors.DiskFullError).
+"""
+
+import heapq
+import time
+import zipfile
+import requests
+from typing import Dict, Optional, Tuple
+
+from download_errors import (
+    RateLimitedError,
+    ServerError,
+    TransferInterruptedError,
+    ErrorPageError,
+    LinkExpiredError,
+    OversizedBodyError,
+)
+
+PERMANENT = 'permanent'
+TRANSIENT = 'transient'
+THROTTLED = 'throttled'
+# Failures seen while the circuit breaker was open: recorded, but never counted against a budget
+CIRCUIT_OPEN = 'circuit-open'
+
+# Failed attempts allowed per class (over all runs) before a memory is skipped
+RETRY_BUDGETS = {PERMANENT: 1, TRANSIENT: 5, THROTTLED: 10}
+
+# Cool-down before a deferred retry in seconds, doubled for every further failure in the run
+RETRY_COOLDOWNS = {TRANSIENT: 5.0, THROTTLED: 30.0}
+MAX_COOLDOWN = 300.0
+
+# Deferrals of one memory within a run before it is given up until the next run
+MAX_DEFERRALS = 20
+
+
+def classify_failure(error: BaseException) -> str:
+    """Sort a download failure into permanent, transient or throttled.
+
+    Args:
+        error: Exception raised by the download attempt
+
+    Returns:
+        PERMANENT, TRANSIENT or THROTTLED
+    """
+    if isinstance(error, (RateLimitedError, ErrorPageError)):
+        return THROTTLED
+    if isinstance(error, ServerError):
+        return THROTTLED if error.status_code == 503 else TRANSIENT
+    if isinstance(error, (TransferInterruptedError, LinkExpiredError, OversizedBodyError)):
+        return TRANSIENT
+
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        if status == 429:
+            return THROTTLED
+        # Signed and pre-signed links expire; a fresh or resolved-again link works
+        if status in (403, 410):
+            return TRANSIENT
+        if status is not None and 400 <= status < 500 and status != 408:
+            return PERMANENT
+        return TRANSIENT
+    # Connection errors, timeouts, broken chunked encoding
+    if isinstance(error, (requests.RequestException, ConnectionError, TimeoutError)):
+        return TRANSIENT
+    # A truncated download is not a broken memory
+    if isinstance(error, zipfile.BadZipFile):
+        return TRANSIENT
+
+    # Local file system errors (locked files, full disk, flaky network shares) are not the memory's fault
+    if isinstance(error, OSError):
+        return TRANSIENT
+    # Unrecognized payloads repeat on every attempt
+    if isinstance(error, ValueError):
+        return PERMANENT
+    return TRANSIENT
+
+
+def budget_exhausted(progress_tracker, sid: str, budgets: Dict[str, int] = RETRY_BUDGETS) -> Optional[str]:
+    """Check whether a memory has used up the retry budget of any failure class.
+
+    Args:
+        progress_tracker: ProgressTracker with the recorded failures
+        sid: Session ID
+        budgets: Allowed failed attempts per class
+
+    Returns:
+        Name of the exhausted class, or None if the memory may be tried again
+    """
+    for failure_class, budget in budgets.items():
+        if progress_tracker.get_failure_count(sid, failure_class) >= budget:
+            return failure_class
+    return None
+
+
+class DeferredQueue:
+    """Memories waiting for a retry, ordered by the end of their cool-down.
+
+    Items are (index, memory) tuples like the pending list of download_all.
+    The queue is used by the thread that hands out work, so it has no lock.
+    """
+
+    def __init__(self, cooldowns: Optional[Dict[str, float]] = None, max_cooldown: float = MAX_COOLDOWN):
+        """Initialize the deferred queue.
+
+        Args:
+            cooldowns: Base cool-down in seconds per failure class
+            max_cooldown: Upper bound for a single cool-down in seconds
+        """
+        self.cooldowns = cooldowns if cooldowns is not None else dict(RETRY_COOLDOWNS)
+        self.max_cooldown = max_cooldown
+        self._heap = []
+        self._counter = 0
+        self._deferrals = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def can_defer(self, sid: str) -> bool:
+        """Check whether a memory may be deferred once more in this run.
+
+        Failures while the circuit breaker is open don't use up retry budgets,
+        so this keeps a CDN that never recovers from looping the run forever.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            True if the memory has been deferred fewer than MAX_DEFERRALS times
+        """
+        return self._deferrals.get(sid, 0) < MAX_DEFERRALS
+
+    def deferrals(self, sid: str) -> int:
+        """Number of times a memory was deferred in this run.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            Deferral count (0 for fresh memories)
+        """
+        return self._deferrals.get(sid, 0)
+
+    def defer(self, item: Tuple[int, Dict], failure_class: str, retry_after: Optional[float] = None,
+              delay: Optional[float] = None) -> float:
+        """Queue a memory for a later retry.
+
+        Args:
+            item: (index, memory) tuple
+            failure_class: TRANSIENT or THROTTLED
+            retry_after: Seconds the server asked us to wait, if any
+            delay: Explicit cool-down, overrides the class default
+
+        Returns:
+            Cool-down in seconds before the memory becomes ready again
+        """
+        sid = item[1]['sid']
+        self._deferrals[sid] = self._deferrals.get(sid, 0) + 1
+
+        if delay is None:
+            base = self.cooldowns.get(failure_class, 0.0)
+            delay = min(self.max_cooldown, base * 2 ** (self._deferrals[sid] - 1))
+            if retry_after:
+                delay = max(delay, retry_after)
+
+        self._counter += 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._counter, item))
+        return delay
+
+    def time_until_ready(self) -> Optional[float]:
+        """Seconds until the next memory's cool-down ends.
+
+        Returns:
+            Seconds (0 if one is ready now), or None if the queue is empty
+        """
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def pop_ready(self) -> Optional[Tuple[int, Dict]]:
+        """Take the next memory whose cool-down has ended.
+
+        Returns:
+            (index, memory) tuple, or None if nothing is ready yet
+        """
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def wait(self):
+        """Sleep until the next memory's cool-down ends."""
+        remaining = self.time_until_ready()
+        if remaining:
+            time.sleep(remaining)
@@ -0,0 +1,79 @@
+"""
+Download scheduling policies for Snapchat memories.
+
+A policy decides in which order the pending memories are downloaded:
+
+- html: the order of memories_history.html (default)
+- newest-first: most recent memories first, to save them before links expire
+- smallest-first: smallest downloads first, to maximize memories per hour
+- interleaved: alternate images and videos, so network and post-processing
+  (metadata, ZIP extraction) both stay busy
+- failures-last: memories that failed in earlier runs go to the end of the queue
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from progress import ProgressTracker
+
+SCHEDULE_POLICIES = ('html', 'newest-first', 'smallest-first', 'interleaved', 'failures-last')
+
+
+def schedule(pending: List[Tuple[int, Dict]], policy: str, progress_tracker: ProgressTracker,
+             sizes: Optional[Dict[str, int]] = None) -> List[Tuple[int, Dict]]:
+    """Order pending memories according to a scheduling policy.
+
+    All policies are stable: memories that compare equal keep their HTML order.
+
+    Args:
+        pending: List of (index, memory) tuples in HTML order
+        policy: One of SCHEDULE_POLICIES
+        progress_tracker: Progress state (failure counts for failures-last)
+        sizes: Download sizes by SID from the pre-flight pass, if it ran.
+               Without sizes, smallest-first puts images before videos.
+
+    Returns:
+        New list of (index, memory) tuples in download order
+
+    Raises:
+        ValueError: Unknown policy
+    """
+    if policy == 'html':
+        return list(pending)
+
+    if policy == 'newest-first':
+        # Dates are 'YYYY-MM-DD HH:MM:SS UTC', so string order is chronological
+        return sorted(pending, key=lambda item: item[1]['date'], reverse=True)
+
+    if policy == 'smallest-first':
+        if sizes:
+            return sorted(pending, key=lambda item: sizes.get(item[1]['sid'], 0))
+        return sorted(pending, key=lambda item: item[1]['media_type'].lower() == 'video')
+
+    if policy == 'interleaved':
+        return _interleave_media_types(pending)
+
+    if policy == 'failures-last':
+        return sorted(pending, key=lambda item: progress_tracker.get_failure_count(item[1]['sid']))
+
+    raise ValueError(f"Unknown scheduling policy: {policy} (choose from {', '.join(SCHEDULE_POLICIES)})")
+
+
+def _interleave_media_types(pending: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+    """Alternate images and videos, appending the rest of the longer list.
+
+    Args:
+        pending: List of (index, memory) tuples
+
+    Returns:
+        Interleaved list of (index, memory) tuples
+    """
+    videos = [item for item in pending if item[1]['media_type'].lower() == 'video']
+    images = [item for item in pending if item[1]['media_type'].lower() != 'video']
+
+    ordered = []
+    for position in range(max(len(images), len(videos))):
+        if position < len(images):
+            ordered.append(images[position])
+        if position < len(videos):
+            ordered.append(videos[position])
+    return ordered
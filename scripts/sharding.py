@@ -0,0 +1,352 @@
+"""
+Sharding one Snapchat export across several processes or machines.
+
+`--shard i/N` selects a deterministic subset of the export's SIDs by
+hashing them, so N processes started with the same export and shard count
+split the work without overlap and without talking to each other. Every
+shard keeps its own state files next to the normal ones:
+
+- download_progress.shard-i-of-N.json
+- errors.shard-i-of-N.json
+- timezone_conversions.shard-i-of-N.json
+
+A shard's progress starts as a copy of the shared progress for its SIDs.
+merge_shards() folds the shard files back into the shared files, which
+are then the single consistent state for the next (sharded or unsharded)
+run.
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from json_store import write_json_atomic
+
+# Shared state files that get a per-shard copy
+PROGRESS_FILE = "download_progress.json"
+ERROR_LOG_FILE = "errors.json"
+TIMEZONE_FILE = "timezone_conversions.json"
+# Suffix appended to shard files after they were merged
+MERGED_SUFFIX = ".merged"
+
+
+def shard_of(sid: str, count: int) -> int:
+    """Get the shard a SID belongs to.
+
+    Uses SHA-256 rather than hash(), which differs between Python processes.
+
+    Args:
+        sid: Session ID
+        count: Number of shards
+
+    Returns:
+        Shard number from 1 to count
+    """
+    digest = hashlib.sha256(sid.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+class Shard:
+    """One of N deterministic, non-overlapping subsets of an export."""
+
+    def __init__(self, index: int, count: int):
+        """Initialize the shard.
+
+        Args:
+            index: Shard number from 1 to count
+            count: Number of shards
+
+        Raises:
+            ValueError: If the numbers are out of range
+        """
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Shard {index}/{count} does not exist (use 1/N to N/N)")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """Parse 'i/N' from the command line.
+
+        Args:
+            value: Shard as 'i/N'
+
+        Returns:
+            Shard
+
+        Raises:
+            ValueError: If the value is not 'i/N' with 1 <= i <= N
+        """
+        index, sep, count = value.partition('/')
+        if not sep or not index.strip().isdigit() or not count.strip().isdigit():
+            raise ValueError(f"Invalid shard '{value}' (expected i/N, e.g. 2/4)")
+        return cls(int(index), int(count))
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    def contains(self, sid: str) -> bool:
+        """Check whether a SID belongs to this shard.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            True if this shard handles the SID
+        """
+        return shard_of(sid, self.count) == self.index
+
+    def state_file(self, path: str) -> str:
+        """Get this shard's copy of a state file.
+
+        Args:
+            path: Shared state file, e.g. download_progress.json
+
+        Returns:
+            Path like download_progress.shard-2-of-4.json
+        """
+        return shard_state_file(path, self.index, self.count)
+
+    def seed_progress(self, progress_file: str = PROGRESS_FILE):
+        """Start this shard's progress from the shared progress of its SIDs.
+
+        Does nothing if the shard already has a progress file or there is
+        no shared one. Composite records are copied whole, because they are
+        keyed by SID prefix; they only ever mark work as done.
+
+        Args:
+            progress_file: Shared progress file
+        """
+        def select(progress: Dict) -> Dict:
+            seeded = {}
+            for key, section in progress.items():
+                if key in ('downloaded', 'failed', 'partial', 'links'):
+                    seeded[key] = {sid: entry for sid, entry in section.items() if self.contains(sid)}
+                elif key in ('composited', 'failed_composites'):
+                    seeded[key] = section
+            return seeded
+
+        self._seed(progress_file, select)
+
+    def seed_timezone_conversions(self, tracking_file: str = TIMEZONE_FILE):
+        """Start this shard's timezone tracking from the shared conversions of its SIDs.
+
+        Args:
+            tracking_file: Shared timezone conversion tracking file
+        """
+        def select(tracking: Dict) -> Dict:
+            conversions = tracking.get('conversions', {})
+            return {'conversions': {sid: entry for sid, entry in conversions.items() if self.contains(sid)}}
+
+        self._seed(tracking_file, select)
+
+    def _seed(self, path: str, select: Callable[[Dict], Dict]):
+        """Write this shard's copy of a state file from the shared one, if it has none yet."""
+        shard_path = self.state_file(path)
+        if os.path.exists(shard_path):
+            return
+        shared = _load_json(path)
+        if shared is not None:
+            write_json_atomic(shard_path, select(shared))
+
+
+def shard_state_file(path: str, index: int, count: int) -> str:
+    """Get the name of a shard's copy of a state file.
+
+    Args:
+        path: Shared state file
+        index: Shard number
+        count: Number of shards
+
+    Returns:
+        Path with '.shard-<index>-of-<count>' before the extension
+    """
+    file_path = Path(path)
+    return str(file_path.with_name(f"{file_path.stem}.shard-{index}-of-{count}{file_path.suffix}"))
+
+
+def _load_json(path: str) -> Optional[Dict]:
+    """Load a JSON object, or None if the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} is not a JSON object")
+    return data
+
+
+def _newest(first: Dict, second: Dict, field: str) -> Dict:
+    """Pick the entry with the later timestamp field (the second one on a tie)."""
+    return first if first.get(field, '') > second.get(field, '') else second
+
+
+def merge_progress(states: List[Dict]) -> Dict:
+    """Merge progress states of the same export into one.
+
+    - downloaded: union; an entry already converted to local time wins
+    - failed/failed_composites: the entry with the most attempts wins
+      (shards start from a copy of the shared state, so counts are not added)
+    - partial/links: the newest entry wins
+    - composited: union
+    - schedule_stats: totals are added (shards do not copy them)
+
+    Failures, partial files and refreshed links of memories that some
+    state has downloaded are dropped, as are failed composites of
+    composited files.
+
+    Args:
+        states: Progress dictionaries, the shared state first
+
+    Returns:
+        Merged progress dictionary
+    """
+    merged = {
+        'downloaded': {},
+        'failed': {},
+        'composited': {'images': {}, 'videos': {}},
+        'failed_composites': {'images': {}, 'videos': {}}
+    }
+
+    for state in states:
+        for sid, entry in state.get('downloaded', {}).items():
+            current = merged['downloaded'].get(sid)
+            if current is None or (entry.get('timezone_converted') and not current.get('timezone_converted')):
+                merged['downloaded'][sid] = entry
+
+        for sid, entry in state.get('failed', {}).items():
+            current = merged['failed'].get(sid)
+            if current is None or entry.get('count', 0) > current.get('count', 0):
+                merged['failed'][sid] = entry
+
+        for key, field in (('partial', 'timestamp'), ('links', 'refreshed')):
+            for sid, entry in state.get(key, {}).items():
+                current = merged.setdefault(key, {}).get(sid)
+                merged[key][sid] = entry if current is None else _newest(current, entry, field)
+
+        for media_key in ('images', 'videos'):
+            merged['composited'][media_key].update(state.get('composited', {}).get(media_key, {}))
+            for sid, entry in state.get('failed_composites', {}).get(media_key, {}).items():
+                current = merged['failed_composites'][media_key].get(sid)
+                if current is None or entry.get('count', 0) > current.get('count', 0):
+                    merged['failed_composites'][media_key][sid] = entry
+
+        for policy, stats in state.get('schedule_stats', {}).items():
+            totals = merged.setdefault('schedule_stats', {}).setdefault(
+                policy, {'runs': 0, 'memories': 0, 'bytes': 0, 'seconds': 0.0}
+            )
+            for field in totals:
+                totals[field] += stats.get(field, 0)
+
+    for key in ('failed', 'partial', 'links'):
+        if key in merged:
+            merged[key] = {sid: entry for sid, entry in merged[key].items() if sid not in merged['downloaded']}
+    for media_key in ('images', 'videos'):
+        composited = merged['composited'][media_key]
+        merged['failed_composites'][media_key] = {
+            sid: entry for sid, entry in merged['failed_composites'][media_key].items() if sid not in composited
+        }
+    return merged
+
+
+def merge_error_logs(logs: List[Dict]) -> Dict:
+    """Merge error logs, dropping entries that appear in several logs.
+
+    Args:
+        logs: Error log dictionaries
+
+    Returns:
+        Merged error log with every category sorted by timestamp
+    """
+    merged = {'download_errors': [], 'composite_errors': [], 'other_errors': []}
+    seen = set()
+    for log in logs:
+        for category, entries in log.items():
+            for entry in entries:
+                key = (category, json.dumps(entry, sort_keys=True))
+                if key not in seen:
+                    seen.add(key)
+                    merged.setdefault(category, []).append(entry)
+    for entries in merged.values():
+        entries.sort(key=lambda entry: entry.get('timestamp', ''))
+    return merged
+
+
+def merge_timezone_conversions(trackings: List[Dict]) -> Dict:
+    """Merge timezone conversion tracking; the newest conversion of a SID wins.
+
+    Args:
+        trackings: Timezone conversion tracking dictionaries
+
+    Returns:
+        Merged tracking dictionary
+    """
+    conversions = {}
+    for tracking in trackings:
+        for sid, entry in tracking.get('conversions', {}).items():
+            current = conversions.get(sid)
+            conversions[sid] = entry if current is None else _newest(current, entry, 'converted_at')
+    return {'conversions': conversions}
+
+
+def merge_shards(count: int, progress_file: str = PROGRESS_FILE, error_file: str = ERROR_LOG_FILE,
+                 timezone_file: str = TIMEZONE_FILE) -> Dict:
+    """Fold the state files of N shards back into the shared state files.
+
+    Merged shard files are renamed with a '.merged' suffix, so a later
+    sharded run starts again from the shared state.
+
+    Args:
+        count: Number of shards the export was split into
+        progress_file: Shared progress file
+        error_file: Shared error log
+        timezone_file: Shared timezone conversion tracking file
+
+    Returns:
+        Dictionary with shards (merged shard numbers), missing (shard
+        numbers without any state file), downloaded, failed, errors and
+        conversions counts of the merged state
+    """
+    mergers = (
+        (progress_file, merge_progress),
+        (error_file, merge_error_logs),
+        (timezone_file, merge_timezone_conversions),
+    )
+
+    found = set()
+    merged_states = {}
+    shard_files = []
+    for path, merge in mergers:
+        states = []
+        shared = _load_json(path)
+        if shared is not None:
+            states.append(shared)
+        for index in range(1, count + 1):
+            shard_path = shard_state_file(path, index, count)
+            state = _load_json(shard_path)
+            if state is not None:
+                states.append(state)
+                shard_files.append(shard_path)
+                found.add(index)
+        merged_states[path] = merge(states) if states else None
+
+    # Write everything before retiring any shard file, so a failure loses nothing
+    for path, merged in merged_states.items():
+        if merged is not None:
+            write_json_atomic(path, merged)
+    for shard_path in shard_files:
+        os.replace(shard_path, shard_path + MERGED_SUFFIX)
+
+    progress = merged_states[progress_file] or {}
+    errors = merged_states[error_file] or {}
+    tracking = merged_states[timezone_file] or {}
+    return {
+        'shards': sorted(found),
+        'missing': [index for index in range(1, count + 1) if index not in found],
+        'downloaded': len(progress.get('downloaded', {})),
+        'failed': len(progress.get('failed', {})),
+        'errors': sum(len(entries) for entries in errors.values()),
+        'conversions': len(tracking.get('conversions', {}))
+    }
@@ -41,6 +41,8 @@ class MemoriesParser(HTMLParser):
             match = re.search(r"downloadMemories\('(.+?)',\s*this,\s*(true|false)\)", onclick)
             if match:
                 self.current_row['download_url'] = match.group(1)
+                # false: the link must be POSTed first to get the signed CDN URL
+                self.current_row['is_get_request'] = match.group(2) == 'true'
 
     def handle_data(self, data):
         if self.current_tag == 'td' and self.in_table_row:
@@ -80,6 +82,8 @@ def parse_html_file(html_file: str) -> List[Dict]:
         - media_type: 'Image' or 'Video'
         - location: GPS coordinates string
         - download_url: URL to download the memory
+        - is_get_request: True if download_url can be fetched directly, False if
+          it must be POSTed first to get the CDN URL (see url_resolver)
         - sid: Session ID (unique identifier)
     """
     print(f"Parsing {html_file}...")
@@ -0,0 +1,221 @@
+"""
+Per-download timing instrumentation for Snapchat memories downloads.
+
+Every download attempt gets a StageTimer that collects how long it spent in
+each stage:
+
+- queue: waiting for a worker, the circuit breaker and the rate controller
+- resolve: POSTing an export link for its CDN URL, when the batch ahead of the
+  downloads did not resolve it already
+- connect: opening a new connection (DNS, TCP, TLS); 0 when a pooled one is reused
+- ttfb: waiting for the response headers after the request was sent
+- transfer: reading the response body from the network
+- disk_write: writing the body to the partial file
+- zip_extract: unpacking ZIP members (summed when members are unpacked in parallel)
+- metadata: setting timestamps and GPS data
+
+TimingLog keeps the records of a run in memory and prints p50/p95/p99 per
+stage at the end of it. Records are only written to a JSONL file when one is
+given (--timing-log).
+"""
+
+import json
+import time
+import threading
+from typing import Dict, List, Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+STAGES = ('queue', 'resolve', 'connect', 'ttfb', 'transfer', 'disk_write', 'zip_extract', 'metadata')
+
+# Connection setup time of the current thread, collected by the timed connection classes
+_connect_times = threading.local()
+
+
+def _add_connect_time(seconds: float):
+    _connect_times.total = getattr(_connect_times, 'total', 0.0) + seconds
+    _connect_times.count = getattr(_connect_times, 'count', 0) + 1
+
+
+def take_connect_time() -> float:
+    """Get and reset the connection setup time spent by the current thread.
+
+    Returns:
+        Seconds spent opening connections since the last call
+    """
+    total = getattr(_connect_times, 'total', 0.0)
+    _connect_times.total = 0.0
+    return total
+
+
+def connection_count() -> int:
+    """Number of connections the current thread has opened so far.
+
+    Returns:
+        Connection count (never reset)
+    """
+    return getattr(_connect_times, 'count', 0)
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_time(time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report their setup time (see take_connect_time)."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class StageTimer:
+    """Thread-safe accumulator of stage durations for one download attempt."""
+
+    def __init__(self):
+        self.stages = {stage: 0.0 for stage in STAGES}
+        self.num_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        """Add time spent in a stage.
+
+        Args:
+            stage: One of STAGES
+            seconds: Duration in seconds
+        """
+        with self._lock:
+            self.stages[stage] += seconds
+
+    def add_bytes(self, num_bytes: int):
+        """Count bytes received from the network.
+
+        Args:
+            num_bytes: Number of bytes
+        """
+        with self._lock:
+            self.num_bytes += num_bytes
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile.
+
+    Args:
+        values: Sample values
+        pct: Percentile between 0 and 100
+
+    Returns:
+        The percentile value (0.0 for an empty list)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(-(-pct * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class TimingLog:
+    """Collect download timing records, summarize a run and optionally append them to a JSONL file."""
+
+    def __init__(self, log_file: Optional[str] = None):
+        """Initialize the timing log.
+
+        Args:
+            log_file: Path of the JSONL file records are appended to (None keeps them in memory only)
+        """
+        self.log_file = log_file
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, sid: str, media_type: str, timer: StageTimer, success: bool,
+               num_bytes: int = 0, failure_class: Optional[str] = None):
+        """Record the timing breakdown of one download attempt.
+
+        Args:
+            sid: Session ID
+            media_type: Media type of the memory
+            timer: Stage durations of the attempt
+            success: Whether the attempt succeeded
+            num_bytes: Bytes received
+            failure_class: Failure class of a failed attempt
+        """
+        entry = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sid': sid,
+            'media_type': media_type,
+            'success': success,
+            'bytes': num_bytes,
+            **{stage: round(seconds, 6) for stage, seconds in timer.stages.items()},
+            'total': round(sum(timer.stages.values()), 6)
+        }
+        if failure_class:
+            entry['failure_class'] = failure_class
+
+        with self._lock:
+            self.records.append(entry)
+            if not self.log_file:
+                return
+            try:
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except OSError as e:
+                print(f"Warning: Failed to write timing log: {e}")
+
+    def reset(self):
+        """Forget the records of the previous run (the JSONL file, if any, is kept)."""
+        with self._lock:
+            self.records = []
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Compute p50/p95/p99 for every stage and the total over this run.
+
+        Returns:
+            Dictionary of stage -> {'p50', 'p95', 'p99'} in seconds
+        """
+        with self._lock:
+            records = list(self.records)
+
+        result = {}
+        for stage in STAGES + ('total',):
+            values = [record[stage] for record in records]
+            result[stage] = {f"p{pct}": percentile(values, pct) for pct in (50, 95, 99)}
+        return result
+
+    def print_summary(self):
+        """Print the percentile table for this run."""
+        if not self.records:
+            return
+
+        details = f", details in {self.log_file}" if self.log_file else ""
+        print(f"Timing per download (ms, {len(self.records)} attempts{details}):")
+        print(f"  {'stage':<12} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for stage, values in self.summary().items():
+            print(f"  {stage:<12} {values['p50'] * 1000:8.0f} {values['p95'] * 1000:8.0f} "
+                  f"{values['p99'] * 1000:8.0f}")
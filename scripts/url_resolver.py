@@ -0,0 +1,207 @@
+"""
+Two-phase URL resolution for Snapchat memories downloads.
+
+The export's download links come in two kinds, told apart by the last
+argument of downloadMemories('URL', this, true|false):
+
+- true: the link itself is fetched with a GET
+- false: the link is POSTed first (query string as form body) and the
+  response body is the signed CDN URL the file is downloaded from
+
+Resolving a link is a cheap request, so it runs in small concurrent batches
+just ahead of the downloads and the transfers go straight to the CDN.
+Resolved URLs are cached with their expiry, so a later run can use them
+while they are still valid.
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Optional, Tuple
+
+from download_errors import ErrorPageError
+from preflight import raise_for_throttling
+from json_store import read_json_object, write_json_atomic, merge_entries
+
+# Assumed lifetime in seconds of a signed URL that does not state its expiry
+DEFAULT_URL_TTL = 3600
+# URLs expiring within this many seconds are resolved again instead of used
+EXPIRY_MARGIN = 120
+# Links resolved together, just ahead of the downloads
+RESOLVE_BATCH_SIZE = 8
+
+
+def needs_resolution(memory: Dict) -> bool:
+    """Check whether a memory's link must be POSTed to get its download URL.
+
+    Args:
+        memory: Memory dictionary from the HTML parser
+
+    Returns:
+        True for downloadMemories(..., false) links
+    """
+    return not memory.get('is_get_request', True)
+
+
+def parse_expiry(url: str) -> Optional[float]:
+    """Read the expiry time of a signed URL from its query string.
+
+    Understands `Expires=<epoch>` (CloudFront style) and the
+    X-Amz-Date/X-Amz-Expires and X-Goog-Date/X-Goog-Expires pairs.
+
+    Args:
+        url: Signed download URL
+
+    Returns:
+        Expiry as a Unix timestamp, or None if the URL does not state one
+    """
+    params = {key.lower(): values[0] for key, values in parse_qs(urlparse(url).query).items()}
+
+    expires = params.get('expires', '')
+    if expires.isdigit():
+        return float(expires)
+
+    for prefix in ('x-amz-', 'x-goog-'):
+        signed_at = params.get(f"{prefix}date")
+        lifetime = params.get(f"{prefix}expires", '')
+        if signed_at and lifetime.isdigit():
+            try:
+                start = datetime.strptime(signed_at, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            return start.timestamp() + int(lifetime)
+    return None
+
+
+def resolve_url(session, memory: Dict, timeout: float = 30) -> Tuple[str, float]:
+    """POST a memory's export link and return the CDN URL it points to.
+
+    Args:
+        session: requests.Session to use
+        memory: Memory dictionary with a downloadMemories(..., false) link
+        timeout: Request timeout in seconds
+
+    Returns:
+        (download URL, expiry as a Unix timestamp)
+
+    Raises:
+        RateLimitedError: Server answered HTTP 429
+        ServerError: Server answered with an HTTP 5xx status
+        ErrorPageError: Response did not contain a URL
+        requests.HTTPError: Any other HTTP error status
+    """
+    base, _, query = memory['download_url'].partition('?')
+    response = session.post(base, data=query, timeout=timeout,
+                            headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    raise_for_throttling(response)
+    response.raise_for_status()
+
+    url = response.text.strip()
+    if not url.startswith(('https://', 'http://')):
+        raise ErrorPageError("Link resolution returned no download URL (likely rate limited or error)")
+
+    expires_at = parse_expiry(url)
+    if expires_at is None:
+        expires_at = time.time() + DEFAULT_URL_TTL
+    return url, expires_at
+
+
+class URLCache:
+    """Persistent SID -> resolved download URL cache with expiry.
+
+    All methods hold an internal lock, so one cache can be shared by the
+    resolution batches and the download workers.
+    """
+
+    def __init__(self, cache_file: str = "resolved_urls.json"):
+        """Initialize the URL cache.
+
+        Args:
+            cache_file: Path to JSON file for storing resolved URLs
+        """
+        self.cache_file = cache_file
+        self._lock = threading.RLock()
+        self.entries = self._load_cache()
+        # SIDs put or invalidated since the last save
+        self._changed = set()
+
+    def _load_cache(self) -> Dict:
+        """Load the cache from its JSON file (a broken cache is discarded, not fatal)."""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not load URL cache {self.cache_file}: {e}")
+        return {}
+
+    def save(self):
+        """Save the cache to its JSON file, dropping expired URLs.
+
+        URLs other processes (shards) saved in the meantime are kept.
+        """
+        with self._lock:
+            now = time.time()
+            merged = merge_entries(read_json_object(self.cache_file), self.entries, self._changed)
+            self.entries = {sid: entry for sid, entry in merged.items() if entry['expires_at'] > now}
+            try:
+                write_json_atomic(self.cache_file, self.entries)
+                self._changed.clear()
+            except OSError as e:
+                print(f"Warning: Failed to save URL cache: {e}")
+
+    def get(self, sid: str, margin: float = EXPIRY_MARGIN) -> Optional[str]:
+        """Get a memory's resolved URL if it stays valid for at least `margin` seconds.
+
+        Args:
+            sid: Session ID
+            margin: Seconds the URL must still be valid for
+
+        Returns:
+            Download URL, or None if not resolved or about to expire
+        """
+        with self._lock:
+            entry = self.entries.get(sid)
+            if entry is None or entry['expires_at'] - margin <= time.time():
+                return None
+            return entry['url']
+
+    def expires_at(self, sid: str) -> Optional[float]:
+        """Get the expiry of a memory's cached URL.
+
+        Args:
+            sid: Session ID
+
+        Returns:
+            Unix timestamp, or None if nothing is cached
+        """
+        with self._lock:
+            entry = self.entries.get(sid)
+            return entry['expires_at'] if entry else None
+
+    def put(self, sid: str, url: str, expires_at: float):
+        """Cache a resolved URL.
+
+        Args:
+            sid: Session ID
+            url: Download URL
+            expires_at: Expiry as a Unix timestamp
+        """
+        with self._lock:
+            self.entries[sid] = {'url': url, 'expires_at': expires_at}
+            self._changed.add(sid)
+
+    def invalidate(self, sid: str):
+        """Forget a memory's URL, e.g. after the CDN rejected it.
+
+        Args:
+            sid: Session ID
+        """
+        with self._lock:
+            self.entries.pop(sid, None)
+            self._changed.add(sid)
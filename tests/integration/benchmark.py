@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Download throughput benchmark for the Snapchat Memories Downloader.
+
+Generates a synthetic export whose links point at a local CDN stand-in
+(cdn_server.py), then runs SnapchatDownloader.download_all once for every
+combination of --jobs and --delays. Every run starts from a fresh working
+directory in its own process, so no run resumes from another's progress
+file, and CPU time and peak RSS belong to that run alone.
+
+The JSON report holds the benchmark settings and one entry per run:
+
+- memories_per_sec, mb_per_sec: throughput over the run's wall-clock time
+- latency_p50, latency_p95: seconds per download attempt (see timing.py)
+- cpu_seconds, cpu_percent: CPU time of the download process (all threads)
+- peak_rss_mb: peak resident memory of the download process
+- requests: requests the server received
+
+Pass an earlier report with --baseline to see how the throughput changed.
+
+Usage:
+    python benchmark.py --memories 200 --sizes lognormal:400KB:1.0 --jobs 1,4,8 --delays 0,0.5
+    python benchmark.py --jobs 4 --latency 0.05 --bandwidth 2048 --baseline benchmark_report.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows - peak RSS is not reported there
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'scripts'))
+
+from cdn_server import CDNServer, synthetic_payload, write_export
+
+# Version of the report layout, bumped when fields change meaning
+REPORT_VERSION = 1
+# Size distribution of the synthetic memories by default
+DEFAULT_SIZES = 'lognormal:400KB:1.0'
+# Smallest payload generated, whatever the distribution says
+MIN_PAYLOAD_SIZE = 1024
+# Byte multipliers of the size suffixes
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """Parse a size like '500KB' or '2MB' into bytes.
+
+    Args:
+        value: Number with an optional B/KB/MB/GB suffix (bytes without one)
+
+    Returns:
+        Size in bytes
+
+    Raises:
+        ValueError: Not a valid size
+    """
+    text = value.strip().upper()
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            number, multiplier = text[:-len(unit)], SIZE_UNITS[unit]
+            break
+    else:
+        number, multiplier = text, 1
+    try:
+        size = float(number) * multiplier
+    except ValueError:
+        raise ValueError(f"Invalid size '{value}'") from None
+    if size <= 0:
+        raise ValueError(f"Size must be positive: '{value}'")
+    return int(size)
+
+
+class SizeDistribution:
+    """Payload sizes of the synthetic memories.
+
+    Specs:
+    - fixed:SIZE - every payload has the same size
+    - uniform:MIN:MAX - sizes spread evenly between MIN and MAX
+    - lognormal:MEDIAN:SIGMA - mostly small payloads with a long tail of
+      large ones, like a real export
+    """
+
+    def __init__(self, spec: str):
+        """Initialize the distribution.
+
+        Args:
+            spec: Distribution spec, e.g. 'uniform:100KB:2MB'
+
+        Raises:
+            ValueError: Unknown distribution or invalid parameters
+        """
+        self.spec = spec
+        kind, _, params = spec.partition(':')
+        self.kind = kind.strip().lower()
+        values = params.split(':') if params else []
+
+        if self.kind == 'fixed' and len(values) == 1:
+            self.params = (parse_size(values[0]),)
+        elif self.kind == 'uniform' and len(values) == 2:
+            low, high = parse_size(values[0]), parse_size(values[1])
+            if low > high:
+                raise ValueError(f"Minimum above maximum in '{spec}'")
+            self.params = (low, high)
+        elif self.kind == 'lognormal' and len(values) == 2:
+            try:
+                sigma = float(values[1])
+            except ValueError:
+                raise ValueError(f"Invalid sigma in '{spec}'") from None
+            self.params = (parse_size(values[0]), sigma)
+        else:
+            raise ValueError(f"Invalid size distribution '{spec}' (expected fixed:SIZE, uniform:MIN:MAX "
+                             f"or lognormal:MEDIAN:SIGMA)")
+
+    def sample(self, rng: random.Random) -> int:
+        """Draw one payload size.
+
+        Args:
+            rng: Random number generator
+
+        Returns:
+            Size in bytes (at least MIN_PAYLOAD_SIZE)
+        """
+        if self.kind == 'fixed':
+            size = self.params[0]
+        elif self.kind == 'uniform':
+            size = rng.randint(*self.params)
+        else:
+            median, sigma = self.params
+            size = int(rng.lognormvariate(math.log(median), sigma))
+        return max(MIN_PAYLOAD_SIZE, size)
+
+
+def generate_export(server: CDNServer, path: Path, count: int, sizes: SizeDistribution,
+                    video_sizes: Optional[SizeDistribution] = None, video_share: float = 0.2,
+                    overlay_share: float = 0.0, seed: int = 0) -> Dict:
+    """Publish synthetic memories on the server and write their export HTML.
+
+    Args:
+        server: Running CDN stand-in
+        path: memories_history.html to write
+        count: Number of memories
+        sizes: Size distribution of images (and videos without video_sizes)
+        video_sizes: Size distribution of videos
+        video_share: Share of memories that are videos
+        overlay_share: Share of memories delivered as a ZIP with an overlay
+        seed: Seed for sizes, media types and payloads
+
+    Returns:
+        Dictionary with memories, images, videos, overlays and bytes
+    """
+    rng = random.Random(seed)
+    memories = []
+    summary = {'memories': count, 'images': 0, 'videos': 0, 'overlays': 0, 'bytes': 0}
+    for i in range(count):
+        is_video = rng.random() < video_share
+        overlay = rng.random() < overlay_share
+        size = (video_sizes or sizes).sample(rng) if is_video else sizes.sample(rng)
+        body = synthetic_payload('video' if is_video else 'image', size, overlay=overlay, seed=seed * 1_000_003 + i)
+        sid = f"{rng.getrandbits(128):032x}"
+        date = time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(1577836800 + i * 3600))
+        memories.append(server.add_memory(sid, 'Video' if is_video else 'Image', body, date))
+
+        summary['videos' if is_video else 'images'] += 1
+        summary['overlays'] += overlay
+        summary['bytes'] += len(body)
+
+    write_export(path, memories)
+    return summary
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB (None where it cannot be measured)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_download(html_file: str, workdir: str, jobs: int, delay: float, max_rate: float,
+                 verbose: bool = False) -> Dict:
+    """Download an export once and measure the run.
+
+    Runs in a child process started by run_benchmark.
+
+    Args:
+        html_file: Export HTML to download
+        workdir: Empty working directory for the output and state files
+        jobs: Concurrent downloads
+        delay: Maximum delay between requests (download_all's delay)
+        max_rate: Maximum request rate
+        verbose: Show the downloader's output
+
+    Returns:
+        Measurements of the run
+    """
+    from downloader import SnapchatDownloader
+
+    os.chdir(workdir)
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+        downloader = SnapchatDownloader(html_file, "memories")
+        cpu_start = time.process_time()
+        start = time.monotonic()
+        downloader.download_all(delay=delay, jobs=jobs, max_rate=max_rate)
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu_start
+
+    latency = downloader.timing_log.summary()['total']
+    received = downloader.download_stats['bytes']
+    downloaded = len(downloader.progress_tracker.progress['downloaded'])
+    peak_rss = _peak_rss_mb()
+    return {
+        'downloaded': downloaded,
+        'failed': len(downloader.progress_tracker.progress['failed']),
+        'seconds': round(elapsed, 3),
+        'memories_per_sec': round(downloaded / elapsed, 3) if elapsed > 0 else 0.0,
+        'mb_per_sec': round(received / (1024 * 1024) / elapsed, 3) if elapsed > 0 else 0.0,
+        'bytes': received,
+        'latency_p50': round(latency['p50'], 4),
+        'latency_p95': round(latency['p95'], 4),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_percent': round(cpu / elapsed * 100, 1) if elapsed > 0 else 0.0,
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None
+    }
+
+
+def run_benchmark(jobs: List[int], delays: List[float], memories: int = 100, sizes: str = DEFAULT_SIZES,
+                  video_sizes: Optional[str] = None, video_share: float = 0.2, overlay_share: float = 0.0,
+                  max_rate: float = 5.0, latency: float = 0.0, bandwidth: Optional[float] = None,
+                  seed: int = 0, verbose: bool = False) -> Dict:
+    """Run download_all for every combination of jobs and delays.
+
+    Args:
+        jobs: Concurrency settings to compare
+        delays: Delay settings to compare
+        memories: Number of synthetic memories
+        sizes: Size distribution spec of images (see SizeDistribution)
+        video_sizes: Size distribution spec of videos (default: sizes)
+        video_share: Share of memories that are videos
+        overlay_share: Share of memories delivered as a ZIP with an overlay
+        max_rate: Maximum request rate of the downloader
+        latency: Server delay before every response in seconds
+        bandwidth: Server bandwidth per response in bytes per second (None = unlimited)
+        seed: Seed of the synthetic export
+        verbose: Show the downloader's output
+
+    Returns:
+        Report dictionary (see module docstring)
+
+    Raises:
+        ValueError: Invalid size distribution
+    """
+    image_distribution = SizeDistribution(sizes)
+    video_distribution = SizeDistribution(video_sizes) if video_sizes else None
+    # A fresh interpreter per run, so peak RSS is not inherited from this process
+    context = multiprocessing.get_context('spawn')
+
+    report = {
+        'version': REPORT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'settings': {
+            'memories': memories, 'sizes': sizes, 'video_sizes': video_sizes or sizes,
+            'video_share': video_share, 'overlay_share': overlay_share, 'max_rate': max_rate,
+            'latency': latency, 'bandwidth': bandwidth, 'seed': seed
+        },
+        'runs': []
+    }
+
+    with tempfile.TemporaryDirectory(prefix="snap_benchmark_") as temp_dir, \
+            CDNServer(latency=latency, bandwidth=bandwidth) as server:
+        html_file = Path(temp_dir) / "memories_history.html"
+        report['export'] = generate_export(server, html_file, memories, image_distribution, video_distribution,
+                                           video_share, overlay_share, seed)
+        print(f"Synthetic export: {memories} memories, {report['export']['bytes'] / (1024 * 1024):.1f} MB "
+              f"served from {server.url}")
+
+        for job_count in jobs:
+            for delay in delays:
+                workdir = Path(temp_dir) / f"jobs{job_count}_delay{delay}"
+                workdir.mkdir()
+                server.clear_log()
+                print(f"  jobs={job_count} delay={delay}...", end=' ', flush=True)
+                with context.Pool(1) as pool:
+                    result = pool.apply(run_download, (str(html_file), str(workdir), job_count, delay,
+                                                       max_rate, verbose))
+                result = {'jobs': job_count, 'delay': delay, **result, 'requests': len(server.requests)}
+                report['runs'].append(result)
+                print(f"{result['memories_per_sec']:.1f} memories/s, {result['mb_per_sec']:.1f} MB/s")
+
+    return report
+
+
+def compare_runs(report: Dict, baseline: Dict) -> Dict[tuple, float]:
+    """Get the throughput change of every run against the same settings in a baseline.
+
+    Args:
+        report: Report of this benchmark
+        baseline: Earlier report
+
+    Returns:
+        Dictionary of (jobs, delay) -> relative change of memories/s (0.1 = 10% faster)
+    """
+    before = {(run['jobs'], run['delay']): run['memories_per_sec'] for run in baseline.get('runs', [])}
+    changes = {}
+    for run in report['runs']:
+        key = (run['jobs'], run['delay'])
+        if before.get(key):
+            changes[key] = run['memories_per_sec'] / before[key] - 1
+    return changes
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None):
+    """Print the runs of a report as a table.
+
+    Args:
+        report: Benchmark report
+        baseline: Earlier report to compare the throughput with
+    """
+    changes = compare_runs(report, baseline) if baseline else {}
+    if baseline and baseline.get('settings') != report['settings']:
+        print("\nNote: the baseline was run with different settings, the comparison may be misleading")
+
+    print(f"\n{'jobs':>5} {'delay':>6} {'memories/s':>11} {'MB/s':>7} {'p95 (ms)':>9} {'CPU':>6} "
+          f"{'peak RSS':>9}{'  vs baseline' if changes else ''}")
+    for run in report['runs']:
+        rss = f"{run['peak_rss_mb']:.0f} MB" if run['peak_rss_mb'] is not None else "n/a"
+        change = changes.get((run['jobs'], run['delay']))
+        line = (f"{run['jobs']:>5} {run['delay']:>6} {run['memories_per_sec']:>11.1f} {run['mb_per_sec']:>7.1f} "
+                f"{run['latency_p95'] * 1000:>9.0f} {run['cpu_percent']:>5.0f}% {rss:>9}")
+        if change is not None:
+            line += f"  {change:+.0%}"
+        if run['failed'] or run['downloaded'] < report['export']['memories']:
+            line += f"  ({run['downloaded']} downloaded, {run['failed']} failed)"
+        print(line)
+
+
+def _number_list(value: str, kind):
+    """Parse a comma-separated list for argparse."""
+    try:
+        numbers = [kind(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid list '{value}'") from None
+    if not numbers or any(number < 0 for number in numbers):
+        raise argparse.ArgumentTypeError(f"expected comma-separated non-negative numbers, got '{value}'")
+    return numbers
+
+
+def _distribution(value: str) -> str:
+    """Validate a size distribution spec for argparse."""
+    try:
+        SizeDistribution(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return value
+
+
+def main():
+    """Run the benchmark matrix given on the command line and write the report."""
+    parser = argparse.ArgumentParser(description='Download throughput benchmark against a local CDN stand-in')
+    parser.add_argument('--memories', type=int, default=100, help='Synthetic memories in the export (default: 100)')
+    parser.add_argument('--sizes', type=_distribution, default=DEFAULT_SIZES, metavar='DIST',
+                        help=f'Image size distribution: fixed:SIZE, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA '
+                             f'(default: {DEFAULT_SIZES})')
+    parser.add_argument('--video-sizes', type=_distribution, default=None, metavar='DIST',
+                        help='Video size distribution (default: same as --sizes)')
+    parser.add_argument('--video-share', type=float, default=0.2, metavar='SHARE',
+                        help='Share of memories that are videos (default: 0.2)')
+    parser.add_argument('--overlay-share', type=float, default=0.0, metavar='SHARE',
+                        help='Share of memories delivered as a ZIP with an overlay (default: 0)')
+    parser.add_argument('--jobs', type=lambda value: _number_list(value, int), default=[1, 4], metavar='N,N,...',
+                        help='Concurrency settings to compare (default: 1,4)')
+    parser.add_argument('--delays', type=lambda value: _number_list(value, float), default=[0.0],
+                        metavar='S,S,...', help='Delay settings to compare in seconds (default: 0)')
+    parser.add_argument('--max-rate', type=float, default=5.0,
+                        help='Maximum request rate of the downloader (default: 5.0)')
+    parser.add_argument('--latency', type=float, default=0.0, metavar='SECONDS',
+                        help='Server delay before every response (default: 0)')
+    parser.add_argument('--bandwidth', type=float, default=None, metavar='KB_PER_SEC',
+                        help='Server bandwidth per response in KB/s (default: unlimited)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic export (default: 0)')
+    parser.add_argument('--output', default='benchmark_report.json',
+                        help='JSON report to write (default: benchmark_report.json)')
+    parser.add_argument('--baseline', default=None, metavar='REPORT',
+                        help='Earlier report to compare the throughput with')
+    parser.add_argument('--verbose', action='store_true', help="Show the downloader's output")
+    args = parser.parse_args()
+
+    if args.memories < 1 or 0 in args.jobs:
+        parser.error("--memories and --jobs must be at least 1")
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"Cannot read baseline report: {e}")
+
+    report = run_benchmark(args.jobs, args.delays, memories=args.memories, sizes=args.sizes,
+                           video_sizes=args.video_sizes, video_share=args.video_share,
+                           overlay_share=args.overlay_share, max_rate=args.max_rate, latency=args.latency,
+                           bandwidth=args.bandwidth * 1024 if args.bandwidth else None, seed=args.seed,
+                           verbose=args.verbose)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print_report(report, baseline)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
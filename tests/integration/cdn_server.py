@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Threaded stand-in for Snapchat's export links and CDN, for load and fault testing.
+
+Unlike test_server.py, which serves files as fast as it can, this server
+behaves like a real CDN under load. Every fault can be configured and
+changed while the server is running:
+
+- latency: seconds before the response headers are sent
+- bandwidth: bytes per second for each response body
+- throttle_rate: share of requests answered with 429 and a Retry-After header
+- error_burst/error_every: runs of error_burst consecutive 503s, every error_every requests
+- truncate_rate: share of bodies cut off after half their Content-Length
+- error_page_rate: share of requests answered with an HTML error page (200, text/html)
+- link_lifetime: file URLs are signed and expire this many seconds after they were handed out (403 afterwards)
+
+Files are served with an ETag and support Range/If-Range (206, 416).
+Export links that must be POSTed (downloadMemories(..., false)) are
+answered with a signed file URL. Every request is recorded in
+`server.requests` for assertions.
+
+Usage:
+    python cdn_server.py --latency 0.2 --throttle-rate 0.1 --error-burst 3 --error-every 20
+
+Serves test_server_files/ on http://localhost:8000 like test_server.py, with
+the given faults.
+"""
+
+import io
+import sys
+import hmac
+import time
+import random
+import hashlib
+import argparse
+import threading
+import zipfile
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs, quote, unquote
+
+# Bytes written per chunk when a response body is sent
+SEND_CHUNK_SIZE = 16 * 1024
+# Body of the HTML error pages
+ERROR_PAGE = b"<html><body><h1>Something went wrong</h1><p>Please try again later.</p></body></html>"
+# Magic bytes the downloader sniffs the payload type from
+JPEG_HEADER = b'\xff\xd8\xff\xe0'
+MP4_HEADER = b'\x00\x00\x00\x20ftypisom'
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+def synthetic_payload(media_type: str, size: int, overlay: bool = False, seed: int = 0) -> bytes:
+    """Create a memory payload the downloader accepts.
+
+    The body is random, so no two payloads are deduplicated against each other.
+
+    Args:
+        media_type: 'image' or 'video'
+        size: Size of the media file in bytes
+        overlay: Wrap the media and an overlay PNG in a ZIP, like Snapchat does
+        seed: Seed of the random body
+
+    Returns:
+        JPEG, MP4 or ZIP bytes
+    """
+    rng = random.Random(seed)
+    header = JPEG_HEADER if media_type.lower() == 'image' else MP4_HEADER
+    media = header + rng.randbytes(max(0, size - len(header)))
+    if not overlay:
+        return media
+
+    extension = 'jpg' if media_type.lower() == 'image' else 'mp4'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr(f"media-main.{extension}", media)
+        zf.writestr("media-overlay.png", PNG_HEADER + rng.randbytes(256))
+    return buffer.getvalue()
+
+
+def write_export(path: Path, memories: List[Dict]) -> str:
+    """Write a memories_history.html for the given memories.
+
+    Args:
+        path: File to write
+        memories: Memory dictionaries with date, media_type, location, download_url and is_get_request
+
+    Returns:
+        Path of the written file
+    """
+    rows = "".join(
+        f"<tr><td>{memory['date']}</td><td>{memory['media_type']}</td><td>{memory.get('location', '')}</td>"
+        f"<td><a onclick=\"downloadMemories('{memory['download_url']}', this, "
+        f"{'true' if memory.get('is_get_request', True) else 'false'})\">Download</a></td></tr>"
+        for memory in memories
+    )
+    Path(path).write_text(f"<html><body><table>{rows}</table></body></html>", encoding='utf-8')
+    return str(path)
+
+
+class CDNServer(ThreadingHTTPServer):
+    """Threaded HTTP server serving memory payloads with configurable faults."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ('127.0.0.1', 0), latency: float = 0.0,
+                 bandwidth: Optional[float] = None, throttle_rate: float = 0.0, retry_after: float = 1.0,
+                 error_burst: int = 0, error_every: int = 0, truncate_rate: float = 0.0,
+                 error_page_rate: float = 0.0, link_lifetime: Optional[float] = None, seed: int = 0,
+                 verbose: bool = False):
+        """Initialize the server.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free port
+            latency: Seconds before the response headers are sent
+            bandwidth: Bytes per second for each response body (None = unlimited)
+            throttle_rate: Share of requests answered with HTTP 429
+            retry_after: Retry-After seconds sent with HTTP 429
+            error_burst: Consecutive HTTP 503 answers per burst (0 = no bursts)
+            error_every: A burst starts every this many file requests
+            truncate_rate: Share of bodies cut off after half their Content-Length
+            error_page_rate: Share of requests answered with an HTML error page
+            link_lifetime: Seconds a signed file URL stays valid (None = URLs are not signed)
+            seed: Seed for the random fault decisions
+            verbose: Print every request
+        """
+        super().__init__(address, _CDNHandler)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.error_burst = error_burst
+        self.error_every = error_every
+        self.truncate_rate = truncate_rate
+        self.error_page_rate = error_page_rate
+        self.link_lifetime = link_lifetime
+        self.verbose = verbose
+        self.files = {}
+        self.requests = []
+        self._secret = random.Random(seed).randbytes(16)
+        self._rng = random.Random(seed)
+        self._file_requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "CDNServer":
+        """Serve requests in a background thread.
+
+        Returns:
+            The server itself
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket."""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "CDNServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def publish(self, name: str, body: bytes, content_type: str = 'application/octet-stream'):
+        """Make a file available under /<name>.
+
+        Args:
+            name: Path of the file on the server, e.g. 'cdn/abc.zip'
+            body: File contents
+            content_type: Content-Type header
+        """
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        with self._lock:
+            self.files[name] = {'body': body, 'content_type': content_type, 'etag': etag}
+
+    def file_url(self, name: str, sid: str) -> str:
+        """Get the URL a file is downloaded from, signed if links expire.
+
+        Args:
+            name: Published file name
+            sid: Session ID of the memory
+
+        Returns:
+            File URL; with link_lifetime it carries Expires and Signature
+        """
+        url = f"{self.url}/{quote(name)}?sid={quote(sid)}"
+        if self.link_lifetime is None:
+            return url
+        expires = int(time.time() + self.link_lifetime)
+        return f"{url}&Expires={expires}&Signature={self._sign(name, sid, expires)}"
+
+    def add_memory(self, sid: str, media_type: str, body: bytes, date: str, location: str = '',
+                   resolve: bool = False) -> Dict:
+        """Publish a memory's payload and get its export entry.
+
+        Args:
+            sid: Session ID
+            media_type: 'Image' or 'Video'
+            body: Payload served for the memory
+            date: Capture date as 'YYYY-MM-DD HH:MM:SS UTC'
+            location: Location column of the export
+            resolve: The export link must be POSTed for the file URL (downloadMemories(..., false))
+
+        Returns:
+            Memory dictionary like the HTML parser produces
+        """
+        name = f"cdn/{sid}"
+        self.publish(name, body)
+        download_url = f"{self.url}/export/{quote(name)}?sid={quote(sid)}" if resolve else self.file_url(name, sid)
+        return {
+            'date': date,
+            'media_type': media_type,
+            'location': location,
+            'download_url': download_url,
+            'is_get_request': not resolve,
+            'sid': sid
+        }
+
+    def count(self, status: Optional[int] = None, fault: Optional[str] = None, method: Optional[str] = None) -> int:
+        """Count logged requests.
+
+        Args:
+            status: Only requests answered with this status
+            fault: Only requests that got this fault
+            method: Only requests with this HTTP method
+
+        Returns:
+            Number of matching requests
+        """
+        with self._lock:
+            return len([entry for entry in self.requests
+                        if (status is None or entry['status'] == status)
+                        and (fault is None or entry['fault'] == fault)
+                        and (method is None or entry['method'] == method)])
+
+    def clear_log(self):
+        """Forget all logged requests (the error burst counter keeps running)."""
+        with self._lock:
+            self.requests = []
+
+    def _sign(self, name: str, sid: str, expires: int) -> str:
+        message = f"{name}:{sid}:{expires}".encode('utf-8')
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()[:32]
+
+    def _check_signature(self, name: str, params: Dict[str, str]) -> Optional[str]:
+        """Get the fault of an unsigned, badly signed or expired file URL, or None if it is valid."""
+        if self.link_lifetime is None:
+            return None
+        expires = params.get('Expires', '')
+        if not expires.isdigit():
+            return 'unsigned'
+        if not hmac.compare_digest(params.get('Signature', ''), self._sign(name, params.get('sid', ''), int(expires))):
+            return 'bad_signature'
+        if int(expires) < time.time():
+            return 'expired'
+        return None
+
+    def _roll(self, rate: float) -> bool:
+        """Decide a random fault with the given probability."""
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _in_error_burst(self) -> bool:
+        """Count a file request and check whether it falls into an error burst."""
+        with self._lock:
+            position = self._file_requests
+            self._file_requests += 1
+        return self.error_burst > 0 and self.error_every > 0 and position % self.error_every < self.error_burst
+
+    def _log(self, entry: Dict):
+        with self._lock:
+            self.requests.append(entry)
+        if self.verbose:
+            fault = f" ({entry['fault']})" if entry['fault'] else ""
+            print(f"{entry['method']} {entry['path']} -> {entry['status']}{fault}, {entry['bytes']:,} bytes, "
+                  f"{entry['duration'] * 1000:.0f} ms", flush=True)
+
+
+class _CDNHandler(BaseHTTPRequestHandler):
+    """Request handler of CDNServer."""
+
+    # Keep-alive, so connection reuse behaves like against a real CDN
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_POST(self):
+        self._start = time.monotonic()
+        self._bytes = 0
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8')) if length else {}
+        path = unquote(urlparse(self.path).path)
+        name = path[len('/export/'):] if path.startswith('/export/') else None
+        sid = form.get('sid', [''])[0]
+        self._pause()
+
+        if name is None or name not in self.server.files:
+            return self._finish(404, b'Not found', fault=None, sid=sid)
+        if self.server._roll(self.server.throttle_rate):
+            return self._finish(429, b'Too many requests', fault='throttled', sid=sid,
+                                headers={'Retry-After': str(self.server.retry_after)})
+        self._finish(200, self.server.file_url(name, sid).encode('utf-8'), fault=None, sid=sid,
+                     content_type='text/plain')
+
+    def _handle(self, send_body: bool):
+        self._start = time.monotonic()
+        self._bytes = 0
+        parsed = urlparse(self.path)
+        name = unquote(parsed.path).lstrip('/')
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        sid = params.get('sid', '')
+        self._pause()
+
+        server = self.server
+        stored = server.files.get(name)
+        if stored is None:
+            return self._finish(404, b'Not found', None, sid, send_body=send_body)
+
+        fault = server._check_signature(name, params)
+        if fault:
+            return self._finish(403, b'Forbidden', fault, sid, send_body=send_body)
+        if server._in_error_burst():
+            return self._finish(503, b'Service unavailable', 'server_error', sid, send_body=send_body)
+        if server._roll(server.throttle_rate):
+            return self._finish(429, b'Too many requests', 'throttled', sid, send_body=send_body,
+                                headers={'Retry-After': str(server.retry_after)})
+        if server._roll(server.error_page_rate):
+            return self._finish(200, ERROR_PAGE, 'error_page', sid, send_body=send_body, content_type='text/html')
+
+        body = stored['body']
+        status = 200
+        headers = {'ETag': stored['etag'], 'Accept-Ranges': 'bytes'}
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == stored['etag']):
+            start, end = self._parse_range(range_header, len(body))
+            if start is None:
+                headers['Content-Range'] = f"bytes */{len(body)}"
+                return self._finish(416, b'', 'range_not_satisfiable', sid, send_body=send_body, headers=headers)
+            status = 206
+            headers['Content-Range'] = f"bytes {start}-{end}/{len(body)}"
+            body = body[start:end + 1]
+
+        truncate = send_body and server._roll(server.truncate_rate)
+        self._finish(status, body, 'truncated' if truncate else None, sid, send_body=send_body,
+                     content_type=stored['content_type'], headers=headers, truncate=truncate)
+
+    @staticmethod
+    def _parse_range(value: str, size: int) -> Tuple[Optional[int], Optional[int]]:
+        """Parse 'bytes=START-[END]' into inclusive offsets, or (None, None) if not satisfiable."""
+        unit, _, spec = value.partition('=')
+        first, _, last = spec.partition('-')
+        if unit.strip() != 'bytes' or not first.strip().isdigit():
+            return None, None
+        start = int(first)
+        end = int(last) if last.strip().isdigit() else size - 1
+        if start >= size or end < start:
+            return None, None
+        return start, min(end, size - 1)
+
+    def _pause(self):
+        if self.server.latency > 0:
+            time.sleep(self.server.latency)
+
+    def _finish(self, status: int, body: bytes, fault: Optional[str], sid: str, send_body: bool = True,
+                content_type: str = 'text/plain', headers: Optional[Dict[str, str]] = None,
+                truncate: bool = False):
+        """Send a response, log it, and cut the body short if asked to."""
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if truncate:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+        if send_body:
+            self._send_body(body[:len(body) // 2] if truncate else body)
+
+        self.server._log({
+            'time': time.time(),
+            'method': self.command,
+            'path': urlparse(self.path).path,
+            'sid': sid,
+            'status': status,
+            'fault': fault,
+            'range': self.headers.get('Range'),
+            'bytes': self._bytes,
+            'duration': time.monotonic() - self._start
+        })
+
+    def _send_body(self, body: bytes):
+        """Write the body in chunks, paced to the configured bandwidth."""
+        bandwidth = self.server.bandwidth
+        start = time.monotonic()
+        try:
+            for offset in range(0, len(body), SEND_CHUNK_SIZE):
+                chunk = body[offset:offset + SEND_CHUNK_SIZE]
+                self.wfile.write(chunk)
+                self._bytes += len(chunk)
+                if bandwidth:
+                    ahead = self._bytes / bandwidth - (time.monotonic() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the transfer
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        # Requests are logged by CDNServer._log
+        pass
+
+
+def main():
+    """Serve test_server_files/ with the faults given on the command line."""
+    parser = argparse.ArgumentParser(description='CDN stand-in for load and fault testing')
+    parser.add_argument('--host', default='localhost', help='Address to listen on (default: localhost)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--latency', type=float, default=0.0, metavar='SECONDS',
+                        help='Delay before every response (default: 0)')
+    parser.add_argument('--bandwidth', type=float, default=None, metavar='KB_PER_SEC',
+                        help='Bandwidth of every response body in KB/s (default: unlimited)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, metavar='SHARE',
+                        help='Share of requests answered with 429, e.g. 0.1 (default: 0)')
+    parser.add_argument('--retry-after', type=float, default=1.0, metavar='SECONDS',
+                        help='Retry-After sent with 429 (default: 1)')
+    parser.add_argument('--error-burst', type=int, default=0, metavar='N',
+                        help='Consecutive 503 answers per burst (default: 0)')
+    parser.add_argument('--error-every', type=int, default=0, metavar='N',
+                        help='A 503 burst starts every N file requests (default: 0)')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, metavar='SHARE',
+                        help='Share of bodies cut off halfway (default: 0)')
+    parser.add_argument('--error-page-rate', type=float, default=0.0, metavar='SHARE',
+                        help='Share of requests answered with an HTML error page (default: 0)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the random faults (default: 0)')
+    args = parser.parse_args()
+
+    server_dir = Path(__file__).parent / "test_server_files"
+    if not server_dir.exists():
+        print(f"Error: {server_dir} does not exist!")
+        print("Run 'python create_test_files.py' first to create test files.")
+        return
+
+    server = CDNServer((args.host, args.port), latency=args.latency,
+                       bandwidth=args.bandwidth * 1024 if args.bandwidth else None,
+                       throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                       error_burst=args.error_burst, error_every=args.error_every,
+                       truncate_rate=args.truncate_rate, error_page_rate=args.error_page_rate,
+                       seed=args.seed, verbose=True)
+    for path in sorted(server_dir.glob('*')):
+        server.publish(f"test_server_files/{path.name}", path.read_bytes())
+
+    print(f"Serving {len(server.files)} files from {server_dir} on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        server.server_close()
+        status_counts = {}
+        for entry in server.requests:
+            status_counts[entry['status']] = status_counts.get(entry['status'], 0) + 1
+        print(f"Requests by status: {dict(sorted(status_counts.items()))}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Integration tests for the download throughput benchmark.
+"""
+
+import sys
+import random
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from benchmark import (parse_size, SizeDistribution, generate_export, run_benchmark, compare_runs,
+                       MIN_PAYLOAD_SIZE)
+from cdn_server import CDNServer
+from snap_parser import parse_html_file
+
+pytestmark = pytest.mark.integration
+
+
+class TestSizes:
+    """Test size parsing and distributions."""
+
+    @pytest.mark.parametrize("value,expected", [('512', 512), ('4KB', 4096), ('1.5mb', 1572864), ('2GB', 2 ** 31)])
+    def test_parse_size(self, value, expected):
+        """Test sizes with and without unit suffixes."""
+        assert parse_size(value) == expected
+
+    @pytest.mark.parametrize("spec", ['fixed', 'fixed:abc', 'uniform:2MB:1MB', 'lognormal:1MB', 'normal:1MB:1'])
+    def test_invalid_distribution(self, spec):
+        """Test malformed distribution specs are rejected."""
+        with pytest.raises(ValueError):
+            SizeDistribution(spec)
+
+    def test_samples_stay_in_range(self):
+        """Test every distribution draws sizes within its bounds."""
+        rng = random.Random(1)
+
+        assert SizeDistribution('fixed:10KB').sample(rng) == 10240
+        assert all(1024 <= SizeDistribution('uniform:1KB:2KB').sample(rng) <= 2048 for _ in range(100))
+        sizes = [SizeDistribution('lognormal:100KB:1.0').sample(rng) for _ in range(500)]
+        assert min(sizes) >= MIN_PAYLOAD_SIZE
+        assert 60_000 < sorted(sizes)[250] < 160_000
+
+
+class TestBenchmark:
+    """Test export generation and benchmark runs."""
+
+    def test_generate_export(self, temp_working_dir):
+        """Test the export HTML lists every published memory with the requested mix."""
+        with CDNServer() as server:
+            summary = generate_export(server, temp_working_dir / "export.html", 40, SizeDistribution('fixed:2KB'),
+                                      video_share=0.5, overlay_share=0.5, seed=2)
+            memories = parse_html_file(str(temp_working_dir / "export.html"))
+
+        assert len(memories) == 40 == summary['images'] + summary['videos']
+        assert 0 < summary['videos'] < 40 and 0 < summary['overlays'] < 40
+        assert len({memory['sid'] for memory in memories}) == 40
+        assert all(memory['download_url'].startswith(server.url) for memory in memories)
+
+    def test_run_matrix(self, capsys):
+        """Test one run per jobs/delay combination with complete measurements."""
+        report = run_benchmark([1, 2], [0.0], memories=6, sizes='fixed:20KB', max_rate=100)
+
+        assert [(run['jobs'], run['delay']) for run in report['runs']] == [(1, 0.0), (2, 0.0)]
+        for run in report['runs']:
+            assert run['downloaded'] == 6 and run['failed'] == 0
+            assert run['memories_per_sec'] > 0 and run['mb_per_sec'] > 0
+            assert run['latency_p95'] >= run['latency_p50'] > 0
+            assert run['cpu_seconds'] > 0
+            assert run['requests'] == 6
+        assert report['settings']['memories'] == 6
+
+    def test_compare_runs(self):
+        """Test throughput changes are matched by jobs and delay."""
+        baseline = {'runs': [{'jobs': 1, 'delay': 0.0, 'memories_per_sec': 10.0},
+                             {'jobs': 4, 'delay': 0.0, 'memories_per_sec': 20.0}]}
+        report = {'runs': [{'jobs': 1, 'delay': 0.0, 'memories_per_sec': 12.0},
+                           {'jobs': 8, 'delay': 0.0, 'memories_per_sec': 30.0}]}
+
+        assert compare_runs(report, baseline) == {(1, 0.0): pytest.approx(0.2)}
@@ -0,0 +1,214 @@
+"""
+Integration tests for the CDN stand-in and the downloader's resilience against it.
+"""
+
+import sys
+import time
+from pathlib import Path
+import pytest
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'scripts'))
+
+from cdn_server import CDNServer, synthetic_payload, write_export
+from downloader import SnapchatDownloader
+from circuit_breaker import CircuitBreaker
+
+pytestmark = pytest.mark.integration
+
+
+@pytest.fixture
+def cdn():
+    """Start CDN stand-ins on free localhost ports."""
+    servers = []
+
+    def start(**faults):
+        server = CDNServer(**faults).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def publish(server, name="cdn/file", size=100_000):
+    body = synthetic_payload('image', size, seed=1)
+    server.publish(name, body)
+    return body, server.file_url(name, 'sid1')
+
+
+class TestCDNServer:
+    """Test the stand-in's responses and request log."""
+
+    def test_file_served_with_etag_and_logged(self, cdn):
+        """Test a plain download and its log entry."""
+        server = cdn()
+        body, url = publish(server)
+
+        response = requests.get(url)
+
+        assert response.status_code == 200
+        assert response.content == body
+        assert response.headers['ETag']
+        assert server.requests[0]['status'] == 200
+        assert server.requests[0]['bytes'] == len(body)
+        assert server.requests[0]['sid'] == 'sid1'
+
+    def test_range_requests(self, cdn):
+        """Test 206 for a range, 416 past the end and a full body when If-Range does not match."""
+        server = cdn()
+        body, url = publish(server)
+        etag = requests.head(url).headers['ETag']
+
+        partial = requests.get(url, headers={'Range': 'bytes=1000-', 'If-Range': etag})
+        beyond = requests.get(url, headers={'Range': f'bytes={len(body)}-'})
+        changed = requests.get(url, headers={'Range': 'bytes=1000-', 'If-Range': '"other"'})
+
+        assert partial.status_code == 206
+        assert partial.content == body[1000:]
+        assert partial.headers['Content-Range'] == f"bytes 1000-{len(body) - 1}/{len(body)}"
+        assert beyond.status_code == 416
+        assert changed.status_code == 200 and changed.content == body
+
+    def test_throttling_with_retry_after(self, cdn):
+        """Test 429 answers carry Retry-After and faults can be switched off while running."""
+        server = cdn(throttle_rate=1.0, retry_after=7)
+        _, url = publish(server)
+
+        throttled = requests.get(url)
+        server.throttle_rate = 0.0
+        served = requests.get(url)
+
+        assert throttled.status_code == 429
+        assert throttled.headers['Retry-After'] == '7'
+        assert served.status_code == 200
+        assert server.count(fault='throttled') == 1
+
+    def test_error_bursts(self, cdn):
+        """Test runs of 503 answers at a fixed interval."""
+        server = cdn(error_burst=2, error_every=5)
+        _, url = publish(server)
+
+        statuses = [requests.get(url).status_code for _ in range(10)]
+
+        assert statuses == [503, 503, 200, 200, 200] * 2
+
+    def test_truncated_body(self, cdn):
+        """Test a truncated body breaks off short of its Content-Length."""
+        server = cdn(truncate_rate=1.0)
+        body, url = publish(server)
+
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            requests.get(url)
+
+        assert server.requests[0]['fault'] == 'truncated'
+        assert server.requests[0]['bytes'] == len(body) // 2
+
+    def test_html_error_page(self, cdn):
+        """Test an error page is a 200 with an HTML body."""
+        server = cdn(error_page_rate=1.0)
+        _, url = publish(server)
+
+        response = requests.get(url)
+
+        assert response.status_code == 200
+        assert response.headers['Content-Type'] == 'text/html'
+        assert b'<html>' in response.content
+
+    def test_signed_urls_expire(self, cdn):
+        """Test signed URLs are accepted until they expire and cannot be tampered with."""
+        server = cdn(link_lifetime=3600)
+        _, url = publish(server)
+        server.link_lifetime = -10
+        expired = server.file_url("cdn/file", 'sid1')
+        server.link_lifetime = 3600
+
+        assert requests.get(url).status_code == 200
+        assert requests.get(url.replace('Signature=', 'Signature=0')).status_code == 403
+        assert requests.get(url.split('&Expires')[0]).status_code == 403
+        assert requests.get(expired).status_code == 403
+        assert server.count(fault='expired') == 1
+
+    def test_export_link_resolves_to_signed_url(self, cdn):
+        """Test POSTing an export link returns a working signed file URL."""
+        server = cdn(link_lifetime=3600)
+        memory = server.add_memory('sid1', 'Image', b'data', '2024-01-01 00:00:00 UTC', resolve=True)
+        base, _, query = memory['download_url'].partition('?')
+
+        resolved = requests.post(base, data=query, headers={'Content-Type': 'application/x-www-form-urlencoded'})
+
+        assert resolved.status_code == 200
+        assert 'Expires=' in resolved.text
+        assert requests.get(resolved.text).content == b'data'
+
+    def test_latency_and_bandwidth(self, cdn):
+        """Test responses are delayed and bodies paced to the configured bandwidth."""
+        server = cdn(latency=0.1, bandwidth=200_000)
+        body, url = publish(server, size=60_000)
+
+        start = time.monotonic()
+        assert requests.get(url).content == body
+        elapsed = time.monotonic() - start
+
+        assert elapsed >= 0.1 + 60_000 / 200_000 * 0.8
+
+
+class TestDownloaderAgainstCDN:
+    """Test the downloader's retry, resume and link handling over real HTTP."""
+
+    @pytest.fixture
+    def make_downloader(self, temp_working_dir, monkeypatch):
+        monkeypatch.setattr('downloader.check_exiftool', lambda: False)
+        monkeypatch.setattr('downloader.check_ffmpeg', lambda: False)
+
+        def make(memories):
+            html_file = write_export(temp_working_dir / "memories_history.html", memories)
+            downloader = SnapchatDownloader(html_file, str(temp_working_dir / "memories"))
+            downloader.retry_cooldowns = {'transient': 0.01, 'throttled': 0.01}
+            downloader.circuit_breaker = CircuitBreaker(cooldown=0.05, max_cooldown=0.1)
+            return downloader
+
+        return make
+
+    def test_all_memories_survive_faults(self, cdn, make_downloader):
+        """Test throttling, 5xx bursts, truncated bodies and error pages all end in complete files."""
+        server = cdn(throttle_rate=0.15, retry_after=0, error_burst=2, error_every=15, truncate_rate=0.15,
+                     error_page_rate=0.05, seed=3)
+        memories, payloads = [], {}
+        for i in range(16):
+            media_type = 'Video' if i % 4 == 0 else 'Image'
+            # Larger than a download chunk, so truncated bodies leave bytes to resume from
+            body = synthetic_payload(media_type, 160_000 + i * 1000, seed=i)
+            payloads[f"sid{i:04d}"] = body
+            memories.append(server.add_memory(f"sid{i:04d}", media_type, body, f"2024-01-{i + 1:02d} 12:00:00 UTC"))
+        downloader = make_downloader(memories)
+
+        downloader.download_all(delay=0, max_rate=1000, jobs=4)
+
+        assert all(downloader.progress_tracker.is_downloaded(m['sid']) for m in memories)
+        stored = {path.stem.split('_')[-1]: path.read_bytes()
+                  for path in downloader.output_dir.rglob("*_sid*.*")}
+        assert stored == {sid[:8]: body for sid, body in payloads.items()}
+        assert server.count(fault='throttled') and server.count(fault='server_error')
+        assert server.count(fault='truncated')
+        # Truncated transfers were resumed, not downloaded again from the start
+        assert server.count(status=206) == server.count(fault='truncated')
+
+    def test_expired_link_resolved_again(self, cdn, make_downloader):
+        """Test a cached file URL that expired is resolved again through the export link."""
+        server = cdn(link_lifetime=3600)
+        memory = server.add_memory('sid0001', 'Image', synthetic_payload('image', 5000), '2024-01-01 00:00:00 UTC',
+                                   resolve=True)
+        downloader = make_downloader([memory])
+        server.link_lifetime = -10
+        downloader.url_cache.put(memory['sid'], server.file_url(f"cdn/{memory['sid']}", memory['sid']),
+                                 time.time() + 3600)
+        server.link_lifetime = 3600
+
+        downloader.download_all(delay=0, max_rate=1000)
+
+        assert downloader.progress_tracker.is_downloaded(memory['sid'])
+        assert server.count(fault='expired') == 1
+        assert server.count(method='POST') == 1
@@ -0,0 +1,151 @@
+"""
+Unit tests for blob_cache module.
+"""
+
+import sys
+import json
+from pathlib import Path
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from blob_cache import BlobCache, place_file
+
+
+def make_payload(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(name.encode()[:1] * size)
+    return path
+
+
+class TestPlaceFile:
+    """Test creating files from cached blobs."""
+
+    def test_hardlink_on_same_filesystem(self, tmp_path):
+        """Test a blob on the same filesystem is linked, not copied."""
+        source = make_payload(tmp_path, "a.jpg", 10)
+        dest = tmp_path / "b.jpg"
+
+        assert place_file(source, dest) == 'hardlink'
+        assert dest.stat().st_ino == source.stat().st_ino
+
+
+class TestBlobCache:
+    """Test storing, restoring and evicting payloads."""
+
+    def test_put_get_restore(self, tmp_path):
+        """Test a cached payload is restored with its type and digest."""
+        cache = BlobCache(str(tmp_path / "cache"))
+        source = make_payload(tmp_path, "a.jpg", 100)
+        assert cache.put('sid-a', source, 'image', 'jpg', 'digest')
+        source.unlink()
+
+        entry = cache.get('sid-a')
+        assert entry['media_type'] == 'image'
+        assert entry['sha256'] == 'digest'
+        cache.restore(entry, tmp_path / "restored.jpg")
+        assert (tmp_path / "restored.jpg").read_bytes() == b'a' * 100
+        assert cache.get('missing') is None
+
+    def test_lru_eviction(self, tmp_path):
+        """Test the least recently used payload is evicted above the size cap."""
+        cache = BlobCache(str(tmp_path / "cache"), max_bytes=250)
+        cache.put('a', make_payload(tmp_path, "a.jpg", 100), 'image', 'jpg', 'x')
+        cache.put('b', make_payload(tmp_path, "b.jpg", 100), 'image', 'jpg', 'x')
+        cache.get('a')
+        cache.put('c', make_payload(tmp_path, "c.jpg", 100), 'image', 'jpg', 'x')
+
+        assert set(cache.entries) == {'a', 'c'}
+        assert cache.total_bytes == 200
+        assert not (tmp_path / "cache" / "b.jpg").exists()
+
+    def test_oversized_payload_not_cached(self, tmp_path):
+        """Test a payload larger than the cap is skipped instead of emptying the cache."""
+        cache = BlobCache(str(tmp_path / "cache"), max_bytes=150)
+        cache.put('a', make_payload(tmp_path, "a.jpg", 100), 'image', 'jpg', 'x')
+
+        assert not cache.put('b', make_payload(tmp_path, "b.mp4", 200), 'video', 'mp4', 'x')
+        assert set(cache.entries) == {'a'}
+
+    def test_invalidate(self, tmp_path):
+        """Test an invalidated payload is deleted."""
+        cache = BlobCache(str(tmp_path / "cache"))
+        cache.put('a', make_payload(tmp_path, "a.zip", 10), 'zip', 'zip', 'x')
+        cache.invalidate('a')
+        cache.invalidate('missing')
+
+        assert cache.get('a') is None
+        assert cache.total_bytes == 0
+        assert not (tmp_path / "cache" / "a.zip").exists()
+
+    def test_index_persisted_in_lru_order(self, tmp_path):
+        """Test the index survives a restart, keeps the LRU order and drops missing blobs."""
+        cache_dir = tmp_path / "cache"
+        cache = BlobCache(str(cache_dir))
+        for name in ('a', 'b', 'c'):
+            cache.put(name, make_payload(tmp_path, f"{name}.jpg", 10), 'image', 'jpg', 'x')
+        cache.get('a')
+        cache.save()
+        (cache_dir / "b.jpg").unlink()
+
+        reloaded = BlobCache(str(cache_dir))
+        assert list(reloaded.entries) == ['c', 'a']
+        assert reloaded.total_bytes == 20
+
+    def test_concurrent_saves_merged(self, tmp_path):
+        """Test two processes sharing the cache keep each other's blobs, removals and size cap."""
+        cache_dir = tmp_path / "cache"
+        first, second = BlobCache(str(cache_dir), max_bytes=250), BlobCache(str(cache_dir), max_bytes=250)
+
+        first.put('a', make_payload(tmp_path, "a.jpg", 100), 'image', 'jpg', 'x')
+        first.put('b', make_payload(tmp_path, "b.jpg", 100), 'image', 'jpg', 'x')
+        first.invalidate('b')
+        first.save()
+        second.put('c', make_payload(tmp_path, "c.jpg", 100), 'image', 'jpg', 'x')
+        second.put('d', make_payload(tmp_path, "d.jpg", 100), 'image', 'jpg', 'x')
+        second.save()
+
+        # 'b' stays removed, and 'a' was evicted to keep the shared cache under its cap
+        assert list(BlobCache(str(cache_dir)).entries) == ['c', 'd']
+        assert second.total_bytes == 200
+        assert not (cache_dir / "a.jpg").exists()
+
+    def test_truncated_index_does_not_drop_entries(self, tmp_path):
+        """Test a save over a half-written index keeps this process's blobs."""
+        cache_dir = tmp_path / "cache"
+        cache = BlobCache(str(cache_dir))
+        cache.put('a', make_payload(tmp_path, "a.jpg", 10), 'image', 'jpg', 'x')
+        cache.save()
+        (cache_dir / "index.json").write_text('{"a": {"fi')
+
+        cache.put('b', make_payload(tmp_path, "b.jpg", 10), 'image', 'jpg', 'x')
+        cache.save()
+
+        assert list(BlobCache(str(cache_dir)).entries) == ['a', 'b']
+
+    def test_index_saved_in_batches(self, tmp_path, monkeypatch):
+        """Test the index is written once per batch of changes, not on every put or hit."""
+        monkeypatch.setattr('blob_cache.BLOB_INDEX_SAVE_INTERVAL', 3)
+        index_file = tmp_path / "cache" / "index.json"
+        cache = BlobCache(str(tmp_path / "cache"))
+        cache.put('a', make_payload(tmp_path, "a.jpg", 10), 'image', 'jpg', 'x')
+        cache.put('b', make_payload(tmp_path, "b.jpg", 10), 'image', 'jpg', 'x')
+
+        cache.get('a')
+
+        assert not index_file.exists()
+        cache.put('c', make_payload(tmp_path, "c.jpg", 10), 'image', 'jpg', 'x')
+        assert list(json.loads(index_file.read_text())) == ['b', 'a', 'c']
+        cache.invalidate('b')
+        assert list(json.loads(index_file.read_text())) == ['b', 'a', 'c']
+        cache.save()
+        assert list(json.loads(index_file.read_text())) == ['a', 'c']
+
+    def test_broken_index(self, tmp_path, capsys):
+        """Test a corrupt index starts an empty cache with a warning."""
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        (cache_dir / "index.json").write_text("{broken")
+
+        assert len(BlobCache(str(cache_dir)).entries) == 0
+        assert "Could not load blob cache index" in capsys.readouterr().out
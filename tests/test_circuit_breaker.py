@@ -0,0 +1,118 @@
+"""
+Unit tests for circuit_breaker module.
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def tripped_breaker(cooldown=0.05):
+    breaker = CircuitBreaker(window=4, min_requests=4, threshold=0.75, cooldown=cooldown)
+    breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure()
+    return breaker
+
+
+class TestCircuitBreaker:
+    """Test tripping, probing and closing."""
+
+    def test_failures_below_threshold_counted(self):
+        """Test isolated failures count and keep the circuit closed."""
+        breaker = CircuitBreaker(window=10, min_requests=4, threshold=0.5)
+        for _ in range(3):
+            breaker.record_success()
+        assert breaker.record_failure() is True
+        assert breaker.state == CLOSED
+
+    def test_not_tripped_before_min_requests(self):
+        """Test a few early failures cannot trip the breaker."""
+        breaker = CircuitBreaker(window=10, min_requests=5, threshold=0.5)
+        for _ in range(4):
+            assert breaker.record_failure() is True
+        assert breaker.state == CLOSED
+
+    def test_trips_on_error_rate(self):
+        """Test the failure that crosses the threshold opens the circuit and is not counted."""
+        breaker = tripped_breaker()
+        assert breaker.state == OPEN
+        assert breaker.trip_count == 1
+        # In-flight failures after the trip are not counted either
+        assert breaker.record_failure() is False
+
+    def test_acquire_blocks_until_cooldown_then_probes(self):
+        """Test the first caller after the cool-down becomes the probe."""
+        breaker = tripped_breaker(cooldown=0.1)
+        start = time.monotonic()
+        assert breaker.acquire() is True
+        assert time.monotonic() - start >= 0.09
+        assert breaker.state == HALF_OPEN
+
+    def test_probe_success_closes_and_releases_workers(self):
+        """Test other workers wait for the probe and resume when it succeeds."""
+        breaker = tripped_breaker(cooldown=0.0)
+        assert breaker.acquire() is True
+
+        released = []
+        worker = threading.Thread(target=lambda: released.append(breaker.acquire()))
+        worker.start()
+        time.sleep(0.05)
+        assert released == []
+
+        breaker.record_success()
+        worker.join(timeout=1)
+        assert released == [False]
+        assert breaker.state == CLOSED
+        assert breaker.error_rate == 0.0
+
+    def test_probe_failure_doubles_cooldown(self):
+        """Test a failed probe reopens the circuit for longer."""
+        breaker = tripped_breaker(cooldown=0.01)
+        breaker.acquire()
+        assert breaker.record_failure() is False
+        assert breaker.state == OPEN
+        assert breaker.current_cooldown == 0.02
+
+    def test_released_probe_handed_to_next_worker(self):
+        """Test a probe given up without an outcome lets a waiting worker probe instead."""
+        breaker = tripped_breaker(cooldown=0.0)
+        assert breaker.acquire() is True
+
+        probes = []
+        worker = threading.Thread(target=lambda: probes.append(breaker.acquire()))
+        worker.start()
+        time.sleep(0.05)
+        assert probes == []
+
+        breaker.release_probe()
+        worker.join(timeout=1)
+        assert probes == [True]
+        assert breaker.state == HALF_OPEN
+        assert breaker.current_cooldown == 0.0
+
+    def test_release_after_outcome_does_nothing(self):
+        """Test releasing a probe that already recorded its outcome keeps that outcome."""
+        breaker = tripped_breaker(cooldown=0.0)
+        breaker.acquire()
+        breaker.record_success()
+        breaker.release_probe()
+        assert breaker.state == CLOSED
+
+    def test_lost_probe_times_out(self):
+        """Test workers send another probe when one never reports back."""
+        breaker = tripped_breaker(cooldown=0.0)
+        breaker.probe_timeout = 0.05
+        assert breaker.acquire() is True
+
+        probes = []
+        worker = threading.Thread(target=lambda: probes.append(breaker.acquire()))
+        worker.start()
+        worker.join(timeout=1)
+        assert probes == [True]
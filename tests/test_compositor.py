@@ -41,7 +41,8 @@ class TestFindOverlayPairs:
         (videos_dir / "2023-01-15_143000_Video_xyz78901.mp4").write_text("video")
         (overlays_dir / "2023-01-15_143000_Video_xyz78901_overlay.png").write_text("overlay")
 
-        pairs = find_overlay_pairs(output_dir, use_cache=False)
+        pairs = find_overlay_pairs(output_dir, pairs_cache_file=str(tmp_path / "overlay_pairs.json"),
+                                   use_cache=False)
 
         assert len(pairs) == 2
 
@@ -60,7 +61,8 @@ class TestFindOverlayPairs:
         output_dir = tmp_path / "memories"
         output_dir.mkdir()
 
-        pairs = find_overlay_pairs(output_dir, use_cache=False)
+        pairs = find_overlay_pairs(output_dir, pairs_cache_file=str(tmp_path / "overlay_pairs.json"),
+                                   use_cache=False)
 
         assert len(pairs) == 0
 
@@ -76,7 +78,8 @@ class TestFindOverlayPairs:
         # Create overlay without base
         (overlays_dir / "2023-01-15_143000_Image_abc12345_overlay.png").write_text("overlay")
 
-        pairs = find_overlay_pairs(output_dir, use_cache=False)
+        pairs = find_overlay_pairs(output_dir, pairs_cache_file=str(tmp_path / "overlay_pairs.json"),
+                                   use_cache=False)
 
         assert len(pairs) == 0
 
@@ -94,7 +97,8 @@ class TestFindOverlayPairs:
         # Overlay with UTC timezone
         (overlays_dir / "2023-01-15_143000_Image_abc12345_overlay.png").write_text("overlay")
 
-        pairs = find_overlay_pairs(output_dir, use_cache=False)
+        pairs = find_overlay_pairs(output_dir, pairs_cache_file=str(tmp_path / "overlay_pairs.json"),
+                                   use_cache=False)
 
         # Should find pair despite different timestamps (same SID)
         assert len(pairs) == 1
@@ -157,7 +161,8 @@ class TestFindOverlayPairs:
         (overlays_dir / "2023-01-15_overlay.png").write_text("overlay")
         (overlays_dir / "no_type_abc12345_overlay.png").write_text("overlay")
 
-        pairs = find_overlay_pairs(output_dir, use_cache=False)
+        pairs = find_overlay_pairs(output_dir, pairs_cache_file=str(tmp_path / "overlay_pairs.json"),
+                                   use_cache=False)
 
         assert len(pairs) == 0
 
@@ -225,6 +230,32 @@ class TestCompositeImage:
         result_img = Image.open(output_file)
         assert result_img.size == (200, 200)
 
+    def test_composite_image_from_memory(self, tmp_path):
+        """Test compositing from in-memory contents does not read the files."""
+        pytest.importorskip("PIL")
+        from PIL import Image
+        import io
+
+        output_dir = tmp_path / "memories"
+        composited_dir = output_dir / "composited" / "images"
+        composited_dir.mkdir(parents=True)
+
+        base_data = io.BytesIO()
+        Image.new('RGB', (100, 100), color='red').save(base_data, 'JPEG')
+        overlay_data = io.BytesIO()
+        Image.new('RGBA', (100, 100), color=(0, 0, 255, 128)).save(overlay_data, 'PNG')
+
+        # Only the base file's name and timestamps are used; its contents are not an image
+        base_file = tmp_path / "base.jpg"
+        base_file.write_bytes(b"not read")
+        overlay_file = tmp_path / "missing_overlay.png"
+
+        success, message = composite_image(base_file, overlay_file, output_dir, has_exiftool=False,
+                                           base_data=base_data.getvalue(), overlay_data=overlay_data.getvalue())
+
+        assert success is True, message
+        assert Image.open(composited_dir / "base_composited.jpg").size == (100, 100)
+
     def test_composite_image_missing_pillow(self, tmp_path):
         """Test error when PIL is not available."""
         base_file = tmp_path / "base.jpg"
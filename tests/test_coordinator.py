@@ -0,0 +1,148 @@
+"""
+Unit tests for coordinator module.
+"""
+
+import sys
+import threading
+from pathlib import Path
+import pytest
+import requests
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from coordinator import LeaseQueue, CoordinatorServer, CoordinatorClient, worker_state_file
+
+
+def memories(count):
+    return [{'sid': f"sid{i}", 'download_url': f"https://example.com/{i}"} for i in range(count)]
+
+
+@pytest.fixture
+def serve():
+    """Start a coordinator for a queue on a free localhost port."""
+    servers = []
+
+    def start(queue):
+        server = CoordinatorServer(('127.0.0.1', 0), queue)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class TestLeaseQueue:
+    """Test leasing and reporting memories."""
+
+    def test_lease_in_batches_until_finished(self):
+        """Test memories are handed out once each and the queue finishes after all reports."""
+        downloaded = []
+        queue = LeaseQueue(memories(5), on_success=downloaded.append)
+
+        first = queue.lease('w1', 3)
+        second = queue.lease('w2', 3)
+        assert [m['sid'] for m in first + second] == [f"sid{i}" for i in range(5)]
+        assert queue.lease('w3', 3) == []
+
+        for memory in first:
+            assert queue.report('w1', memory['sid'], True)
+        for memory in second:
+            assert queue.report('w2', memory['sid'], False, "404")
+        assert queue.finished
+        assert [m['sid'] for m in downloaded] == ['sid0', 'sid1', 'sid2']
+        assert queue.failed == {'sid3': '404', 'sid4': '404'}
+
+    def test_retryable_failure_handed_out_again(self):
+        """Test a retryable failure is queued again until its requeues are used up."""
+        queue = LeaseQueue(memories(2), max_requeues=2)
+        queue.lease('w1', 2)
+
+        assert queue.report('w1', 'sid0', False, "timeout", retry=True)
+        assert [m['sid'] for m in queue.lease('w2', 5)] == ['sid0']
+        assert queue.report('w2', 'sid0', False, "timeout", retry=True)
+        queue.lease('w1', 5)
+        assert queue.report('w1', 'sid0', False, "timeout", retry=True)
+        assert queue.report('w1', 'sid1', False, "404")
+
+        assert queue.failed == {'sid0': 'timeout', 'sid1': '404'}
+        assert queue.status()['requeued'] == 2
+        assert queue.finished
+
+    def test_empty_queue_finished(self):
+        """Test a queue without memories is finished right away."""
+        assert LeaseQueue([]).finished
+
+    def test_expired_lease_reissued(self):
+        """Test memories of a silent worker go to the next worker."""
+        queue = LeaseQueue(memories(2), lease_seconds=0)
+        queue.lease('dead', 2)
+
+        assert [m['sid'] for m in queue.lease('alive', 2)] == ['sid0', 'sid1']
+        assert queue.reissued == 2
+
+    def test_stale_reports(self):
+        """Test a late success still counts but a late failure does not override the new lease."""
+        queue = LeaseQueue(memories(2), lease_seconds=0)
+        queue.lease('slow', 2)
+        queue.lease('fast', 2)
+
+        assert not queue.report('slow', 'sid0', False, "timeout")
+        assert queue.report('slow', 'sid1', True)
+        assert not queue.report('fast', 'sid1', True)
+        assert not queue.report('fast', 'unknown', True)
+        assert queue.status()['downloaded'] == 1
+
+    def test_report_renews_worker_leases(self):
+        """Test a reporting worker keeps the rest of its batch."""
+        queue = LeaseQueue(memories(2), lease_seconds=60)
+        queue.lease('w1', 2)
+        queue.leases['sid1']['expires_at'] = 0
+
+        queue.report('w1', 'sid0', True)
+
+        assert queue.lease('w2', 2) == []
+        assert queue.status()['leased'] == 1
+
+
+class TestProtocol:
+    """Test the HTTP protocol on localhost."""
+
+    def test_lease_report_status(self, serve):
+        """Test a client leases, reports and sees the coordinator finish."""
+        client = CoordinatorClient(serve(LeaseQueue(memories(2))), 'w1')
+
+        leased, finished = client.lease(5)
+        assert [m['sid'] for m in leased] == ['sid0', 'sid1']
+        assert not finished
+        assert client.report('sid0', True, "ok")
+        assert client.report('sid1', False, "404")
+        assert client.lease(5) == ([], True)
+        assert client.status()['failed'] == 1
+
+    def test_retry_reported(self, serve):
+        """Test a retryable failure sent over the protocol puts the memory back in the queue."""
+        client = CoordinatorClient(serve(LeaseQueue(memories(1))), 'w1')
+        client.lease(1)
+
+        assert client.report('sid0', False, "timeout", retry=True)
+        assert [m['sid'] for m in client.lease(1)[0]] == ['sid0']
+
+    def test_bad_request(self, serve):
+        """Test malformed requests are rejected with HTTP 400."""
+        url = serve(LeaseQueue(memories(1)))
+        response = requests.post(f"{url}/report", json={'worker': 'w1'})
+        assert response.status_code == 400
+        assert requests.get(f"{url}/nothing").status_code == 404
+
+
+class TestWorkerStateFile:
+    """Test worker state file names."""
+
+    def test_worker_suffix(self):
+        """Test the worker ID goes before the extension and cannot leave the directory."""
+        assert worker_state_file("download_progress.json", "host-42") == "download_progress.worker-host-42.json"
+        assert worker_state_file("errors.json", "a/b:c") == "errors.worker-a_b_c.json"
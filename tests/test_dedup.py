@@ -0,0 +1,162 @@
+"""
+Unit tests for dedup module.
+"""
+
+import sys
+import os
+import json
+import hashlib
+from pathlib import Path
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+import dedup
+from dedup import ContentIndex, hash_file, reflink
+
+
+MEMORY = {'date': '2023-01-01 14:30:00 UTC', 'location': 'Latitude, Longitude: 1.0, 2.0'}
+
+
+def write_file(path: Path, data: bytes) -> str:
+    """Write data to path and return its SHA-256 hex digest."""
+    path.write_bytes(data)
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestHashFile:
+    """Test chunked file hashing."""
+
+    def test_matches_hashlib(self, tmp_path):
+        """Test the digest equals hashing the whole content at once."""
+        data = os.urandom(200_000)
+        digest = write_file(tmp_path / "a.bin", data)
+        assert hash_file(tmp_path / "a.bin", chunk_size=4096).hexdigest() == digest
+
+    def test_continues_existing_digest(self, tmp_path):
+        """Test a passed-in hash object is updated, not replaced."""
+        (tmp_path / "b.bin").write_bytes(b'world')
+        digest = hashlib.sha256(b'hello ')
+        hash_file(tmp_path / "b.bin", digest)
+        assert digest.hexdigest() == hashlib.sha256(b'hello world').hexdigest()
+
+
+class TestReflink:
+    """Test copy-on-write cloning."""
+
+    def test_unsupported_returns_false(self, tmp_path, monkeypatch):
+        """Test a filesystem without clone support leaves no destination file."""
+        class NoClone:
+            @staticmethod
+            def ioctl(*args):
+                raise OSError(95, "Operation not supported")
+
+        monkeypatch.setattr(dedup, 'fcntl', NoClone)
+        (tmp_path / "src").write_bytes(b'data')
+
+        assert reflink(tmp_path / "src", tmp_path / "dst") is False
+        assert not (tmp_path / "dst").exists()
+
+
+class TestContentIndex:
+    """Test the persistent hash index."""
+
+    def test_add_find_and_persist(self, tmp_path):
+        """Test entries survive a reload."""
+        index_file = tmp_path / "index.json"
+        digest = write_file(tmp_path / "a.jpg", b'content')
+
+        index = ContentIndex(str(index_file))
+        index.add(digest, tmp_path / "a.jpg", MEMORY, pristine=True)
+        index.save()
+        entry = ContentIndex(str(index_file)).find(digest)
+
+        assert entry['path'] == str(tmp_path / "a.jpg")
+        assert entry['pristine'] is True
+
+    def test_changed_file_dropped(self, tmp_path):
+        """Test an entry whose file changed on disk is not used."""
+        index = ContentIndex(str(tmp_path / "index.json"))
+        digest = write_file(tmp_path / "a.jpg", b'content')
+        index.add(digest, tmp_path / "a.jpg", MEMORY, pristine=True)
+
+        (tmp_path / "a.jpg").write_bytes(b'changed content')
+
+        assert index.find(digest) is None
+        assert digest not in index.entries
+
+    def test_index_saved_in_batches(self, tmp_path, monkeypatch):
+        """Test the index is written once per batch of changes, not for every stored file."""
+        monkeypatch.setattr(dedup, 'CONTENT_INDEX_SAVE_INTERVAL', 3)
+        index_file = tmp_path / "index.json"
+        index = ContentIndex(str(index_file))
+        digests = [write_file(tmp_path / f"{i}.jpg", bytes([i]) * 10) for i in range(4)]
+        for i, digest in enumerate(digests[:2]):
+            index.add(digest, tmp_path / f"{i}.jpg", MEMORY, pristine=True)
+
+        assert not index_file.exists()
+        index.add(digests[2], tmp_path / "2.jpg", MEMORY, pristine=True)
+        assert len(json.loads(index_file.read_text())) == 3
+        index.add(digests[3], tmp_path / "3.jpg", MEMORY, pristine=True)
+        assert len(json.loads(index_file.read_text())) == 3
+        index.save()
+        assert len(json.loads(index_file.read_text())) == 4
+
+    def test_corrupt_index_starts_empty(self, tmp_path):
+        """Test a broken index file does not stop the download."""
+        index_file = tmp_path / "index.json"
+        index_file.write_text("{not json", encoding='utf-8')
+        assert ContentIndex(str(index_file)).entries == {}
+
+    def test_concurrent_saves_merged(self, tmp_path):
+        """Test two processes sharing the index keep each other's entries."""
+        index_file = tmp_path / "index.json"
+        first, second = ContentIndex(str(index_file)), ContentIndex(str(index_file))
+        digest_a = write_file(tmp_path / "a.jpg", b'a')
+        digest_b = write_file(tmp_path / "b.jpg", b'b')
+
+        first.add(digest_a, tmp_path / "a.jpg", MEMORY, pristine=True)
+        first.save()
+        second.add(digest_b, tmp_path / "b.jpg", MEMORY, pristine=True)
+        second.save()
+
+        assert set(ContentIndex(str(index_file)).entries) == {digest_a, digest_b}
+
+    def test_same_metadata_hardlinked(self, tmp_path):
+        """Test identical content with identical metadata becomes a hardlink."""
+        index = ContentIndex(str(tmp_path / "index.json"))
+        digest = write_file(tmp_path / "a.jpg", b'content')
+        index.add(digest, tmp_path / "a.jpg", MEMORY, pristine=False)
+        write_file(tmp_path / ".b.part", b'content')
+
+        method = index.link_duplicate(digest, tmp_path / ".b.part", tmp_path / "b.jpg", dict(MEMORY))
+
+        assert method == 'hardlink'
+        assert os.path.samefile(tmp_path / "a.jpg", tmp_path / "b.jpg")
+        assert not (tmp_path / ".b.part").exists()
+
+    def test_different_metadata_never_hardlinked(self, tmp_path, monkeypatch):
+        """Test a different date prevents sharing an inode."""
+        monkeypatch.setattr(dedup, 'reflink', lambda source, dest: False)
+        index = ContentIndex(str(tmp_path / "index.json"))
+        digest = write_file(tmp_path / "a.jpg", b'content')
+        index.add(digest, tmp_path / "a.jpg", MEMORY, pristine=True)
+        write_file(tmp_path / ".b.part", b'content')
+        other = dict(MEMORY, date='2024-05-05 10:00:00 UTC')
+
+        assert index.link_duplicate(digest, tmp_path / ".b.part", tmp_path / "b.jpg", other) is None
+        assert (tmp_path / ".b.part").exists()
+
+    def test_reflink_requires_pristine_source(self, tmp_path, monkeypatch):
+        """Test a file rewritten by exiftool is never cloned for another memory."""
+        calls = []
+        monkeypatch.setattr(dedup, 'reflink', lambda source, dest: calls.append(source) or True)
+        index = ContentIndex(str(tmp_path / "index.json"))
+        digest = write_file(tmp_path / "a.jpg", b'content')
+        index.add(digest, tmp_path / "a.jpg", MEMORY, pristine=False)
+        write_file(tmp_path / ".b.part", b'content')
+        other = dict(MEMORY, date='2024-05-05 10:00:00 UTC')
+
+        assert index.link_duplicate(digest, tmp_path / ".b.part", tmp_path / "b.jpg", other) is None
+        assert calls == []
@@ -0,0 +1,1621 @@
+"""
+Unit tests for downloader module (network access is replaced by a fake session).
+"""
+
+import sys
+import os
+import io
+import time
+import json
+import socket
+import hashlib
+import tracemalloc
+import zipfile
+import threading
+from datetime import date
+from pathlib import Path
+import pytest
+import requests
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from downloader import SnapchatDownloader, format_size
+from progress import ProgressTracker
+from error_logger import ErrorLogger
+from memory_filter import MemoryFilter
+from sharding import Shard
+from export_index import ExportIndex, fingerprint_export
+from coordinator import LeaseQueue, CoordinatorServer
+from download_errors import DiskFullError
+from rate_limiter import RateController
+from url_resolver import RESOLVE_BATCH_SIZE
+
+
+JPEG_BYTES = b'\xff\xd8\xff\xe0' + b'\x00' * 2048
+MP4_BYTES = b'\x00\x00\x00\x20ftypisom' + b'\x00' * 4096
+
+
+def make_zip(files: dict) -> bytes:
+    """Build an in-memory ZIP archive from {name: bytes}."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+class FakeResponse:
+    """Minimal stand-in for requests.Response."""
+
+    def __init__(self, body: bytes = b'', status_code: int = 200, headers: dict = None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {'content-type': 'application/octet-stream'}
+
+    @property
+    def content(self):
+        return self.body
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8')
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """Fake requests.Session serving canned responses keyed by URL."""
+
+    def __init__(self, routes: dict, latency: float = 0.0):
+        self.routes = routes
+        self.latency = latency
+        self.requests = []
+        self.request_kwargs = []
+        self.head_requests = []
+        self.posts = []
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self._lock:
+            self.requests.append(url)
+            self.request_kwargs.append(kwargs)
+        if self.latency:
+            time.sleep(self.latency)
+        route = self.routes[url]
+        return route() if callable(route) else route
+
+    def post(self, url, **kwargs):
+        with self._lock:
+            self.posts.append((url, kwargs.get('data')))
+        route = self.routes[url]
+        return route() if callable(route) else route
+
+    def head(self, url, **kwargs):
+        with self._lock:
+            self.head_requests.append(url)
+        route = self.routes[url]
+        response = route() if callable(route) else route
+        headers = dict(response.headers)
+        headers.setdefault('content-length', str(len(response.body)))
+        return FakeResponse(b'', response.status_code, headers)
+
+
+class RangeSession(FakeSession):
+    """Fake session serving one payload with HTTP Range support.
+
+    The first response can be cut off after `fail_after` bytes to simulate
+    a dropped connection.
+    """
+
+    def __init__(self, payload: bytes, etag: str = '"v1"', fail_after: int = None,
+                 honor_range: bool = True):
+        super().__init__({})
+        self.payload = payload
+        self.etag = etag
+        self.fail_after = fail_after
+        self.honor_range = honor_range
+
+    def get(self, url, **kwargs):
+        import requests
+
+        with self._lock:
+            self.requests.append(url)
+            self.request_kwargs.append(kwargs)
+
+        request_headers = kwargs.get('headers') or {}
+        range_header = request_headers.get('Range')
+        if_range = request_headers.get('If-Range')
+        if range_header and self.honor_range and if_range in (None, self.etag):
+            start = int(range_header.split('=')[1].rstrip('-'))
+            body = self.payload[start:]
+            status = 206
+            headers = {
+                'content-range': f"bytes {start}-{len(self.payload) - 1}/{len(self.payload)}",
+            }
+        else:
+            body = self.payload
+            status = 200
+            headers = {}
+        headers.update({
+            'content-type': 'application/octet-stream',
+            'content-length': str(len(body)),
+            'etag': self.etag
+        })
+
+        response = FakeResponse(body, status_code=status, headers=headers)
+        fail_after, self.fail_after = self.fail_after, None
+        if fail_after is not None:
+            def broken_iter(chunk_size=1, _body=body):
+                sent = 0
+                while sent < fail_after:
+                    step = min(chunk_size, fail_after - sent)
+                    yield _body[sent:sent + step]
+                    sent += step
+                raise requests.exceptions.ChunkedEncodingError("connection dropped")
+            response.iter_content = broken_iter
+        return response
+
+
+def make_memory(index: int, media_type: str = 'Image') -> dict:
+    """Build a memory dict like the HTML parser produces."""
+    sid = f"sid{index:05d}-aaaa-bbbb"
+    return {
+        'date': f"2023-01-{(index % 28) + 1:02d} 14:30:00 UTC",
+        'media_type': media_type,
+        'location': '',
+        'download_url': f"https://example.com/download?sid={sid}",
+        'sid': sid
+    }
+
+
+@pytest.fixture
+def downloader(temp_working_dir, monkeypatch):
+    """Create a downloader in a temp directory with optional tools disabled."""
+    monkeypatch.setattr('downloader.check_exiftool', lambda: False)
+    monkeypatch.setattr('downloader.check_ffmpeg', lambda: False)
+    html_file = temp_working_dir / "memories_history.html"
+    html_file.write_text("<html></html>", encoding='utf-8')
+    return SnapchatDownloader(str(html_file), str(temp_working_dir / "memories"))
+
+
+def use_session(downloader, session, monkeypatch):
+    """Route every thread's HTTP session to the fake session."""
+    downloader.session = session
+    monkeypatch.setattr(downloader, '_get_session', lambda: session)
+
+
+class TestAttemptDownload:
+    """Test single download attempts."""
+
+    def test_direct_image_saved(self, downloader, monkeypatch):
+        """Test a direct JPEG response is saved to images/."""
+        memory = make_memory(1)
+        use_session(downloader, FakeSession({memory['download_url']: FakeResponse(JPEG_BYTES)}), monkeypatch)
+
+        success, message = downloader._attempt_download(memory, memory['sid'])
+
+        assert success, message
+        files = list((downloader.output_dir / "images").glob("*.jpg"))
+        assert len(files) == 1
+        assert files[0].read_bytes() == JPEG_BYTES
+        assert downloader.progress_tracker.is_downloaded(memory['sid'])
+        # Written once in place - no temp copies or partial files left behind
+        assert not list(downloader.output_dir.rglob("*.download"))
+        assert not list(downloader.output_dir.rglob("*.part"))
+
+    def test_interrupted_direct_media_leaves_no_final_file(self, downloader, monkeypatch):
+        """Test a stream failure never exposes a half-written final file."""
+        memory = make_memory(8, 'Video')
+
+        class BrokenResponse(FakeResponse):
+            def iter_content(self, chunk_size=1):
+                yield MP4_BYTES
+                raise ConnectionError("connection reset")
+
+        use_session(downloader, FakeSession({memory['download_url']: BrokenResponse()}), monkeypatch)
+
+        with pytest.raises(ConnectionError, match="connection reset"):
+            downloader._attempt_download(memory, memory['sid'])
+
+        assert not list((downloader.output_dir / "videos").iterdir())
+
+    def test_zip_with_overlay_extracted(self, downloader, monkeypatch):
+        """Test a ZIP response is unpacked into videos/ and overlays/."""
+        memory = make_memory(2, 'Video')
+        payload = make_zip({'abc-main.mp4': MP4_BYTES, 'abc-overlay.png': b'\x89PNG\r\n\x1a\n' + b'\x00' * 64})
+        use_session(downloader, FakeSession({memory['download_url']: FakeResponse(payload)}), monkeypatch)
+
+        success, message = downloader._attempt_download(memory, memory['sid'])
+
+        assert success, message
+        videos = list((downloader.output_dir / "videos").glob("*.mp4"))
+        overlays = list((downloader.output_dir / "overlays").glob("*_overlay.png"))
+        assert len(videos) == 1 and videos[0].read_bytes() == MP4_BYTES
+        assert len(overlays) == 1
+        assert not list(downloader.output_dir.glob("temp_*"))
+
+    def test_html_error_page_recorded_as_failure(self, downloader, monkeypatch):
+        """Test an HTML error page is not saved and is recorded as a throttled failure."""
+        memory = make_memory(3)
+        response = FakeResponse(b'<html>error</html>', headers={'content-type': 'text/html'})
+        use_session(downloader, FakeSession({memory['download_url']: response}), monkeypatch)
+
+        success, message, error = downloader._try_download(memory)
+
+        assert not success
+        assert downloader.progress_tracker.get_failure_count(memory['sid']) == 1
+        assert downloader.progress_tracker.get_failure_count(memory['sid'], 'throttled') == 1
+        assert not list((downloader.output_dir / "images").iterdir())
+
+
+class TestStreaming:
+    """Test streamed downloads and payload sniffing."""
+
+    @pytest.mark.parametrize("header,content_type,expected", [
+        (b'PK\x03\x04' + b'\x00' * 8, 'application/zip', ('zip', 'zip')),
+        (JPEG_BYTES[:12], 'application/octet-stream', ('image', 'jpg')),
+        (b'\x89PNG\r\n\x1a\n\x00\x00\x00\x00', '', ('image', 'png')),
+        (MP4_BYTES[:12], '', ('video', 'mp4')),
+        (b'\x00' * 12, 'video/quicktime', ('video', 'mp4')),
+        (b'\x00' * 12, 'application/octet-stream', (None, None)),
+    ])
+    def test_sniff_payload(self, downloader, header, content_type, expected):
+        """Test payload type and extension detection from the first bytes."""
+        assert downloader._sniff_payload(header, content_type) == expected
+
+    def test_request_is_streamed(self, downloader, monkeypatch):
+        """Test the download is requested with stream=True."""
+        memory = make_memory(6)
+        session = FakeSession({memory['download_url']: FakeResponse(JPEG_BYTES)})
+        use_session(downloader, session, monkeypatch)
+
+        downloader._attempt_download(memory, memory['sid'])
+
+        assert session.request_kwargs[0].get('stream') is True
+
+    def test_large_download_memory_bounded(self, downloader, monkeypatch):
+        """Test peak memory stays far below the payload size."""
+        memory = make_memory(7, 'Video')
+        payload = MP4_BYTES + b'\x00' * (16 * 1024 * 1024)
+        use_session(downloader, FakeSession({memory['download_url']: FakeResponse(payload)}), monkeypatch)
+
+        tracemalloc.start()
+        try:
+            success, message = downloader._attempt_download(memory, memory['sid'])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert success, message
+        assert peak < 2 * 1024 * 1024
+        videos = list((downloader.output_dir / "videos").glob("*.mp4"))
+        assert videos[0].stat().st_size == len(payload)
+
+
+class TestZipExtraction:
+    """Test streamed ZIP extraction and the staging directory."""
+
+    def test_large_zip_member_memory_bounded(self, downloader, monkeypatch):
+        """Test ZIP members are copied in chunks, not read whole."""
+        memory = make_memory(9, 'Video')
+        media = MP4_BYTES + b'\x00' * (16 * 1024 * 1024)
+        payload = make_zip({'abc-main.mp4': media})
+        use_session(downloader, FakeSession({memory['download_url']: FakeResponse(payload)}), monkeypatch)
+
+        tracemalloc.start()
+        try:
+            success, message = downloader._attempt_download(memory, memory['sid'])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert success, message
+        assert peak < 2 * 1024 * 1024
+        videos = list((downloader.output_dir / "videos").glob("*.mp4"))
+        assert videos[0].stat().st_size == len(media)
+        assert not list(downloader.output_dir.rglob("*.part"))
+
+    def test_zip_staged_in_staging_dir(self, temp_working_dir, monkeypatch):
+        """Test the ZIP is downloaded to --staging-dir, members land in output_dir."""
+        monkeypatch.setattr('downloader.check_exiftool', lambda: False)
+        monkeypatch.setattr('downloader.check_ffmpeg', lambda: False)
+        html_file = temp_working_dir / "memories_history.html"
+        html_file.write_text("<html></html>", encoding='utf-8')
+        staging = temp_working_dir / "staging"
+        downloader = SnapchatDownloader(str(html_file), str(temp_working_dir / "memories"),
+                                        staging_dir=str(staging))
+        assert staging.is_dir()
+
+        memory = make_memory(10, 'Image')
+        payload = make_zip({'abc-main.jpg': JPEG_BYTES, 'abc-overlay.png': b'\x89PNG\r\n\x1a\n'})
+        use_session(downloader, FakeSession({memory['download_url']: FakeResponse(payload)}), monkeypatch)
+
+        staged = []
+        original_extract = downloader._extract_and_save_zip
+
+        def spy(zip_path, memory, sid, timer=None):
+            staged.append(Path(zip_path))
+            original_extract(zip_path, memory, sid, timer)
+
+        monkeypatch.setattr(downloader, '_extract_and_save_zip', spy)
+
+        success, message = downloader._attempt_download(memory, memory['sid'])
+
+        assert success, message
+        assert staged[0].parent == staging
+        assert not staged[0].exists()
+        assert len(list((downloader.output_dir / "images").glob("*.jpg"))) == 1
+        assert len(list((downloader.output_dir / "overlays").glob("*_overlay.png"))) == 1
+
+    def test_failed_member_leaves_no_temp_file(self, downloader, monkeypatch):
+        """Test a failed member extraction cleans up its temp file."""
+        memory = make_memory(11, 'Image')
+        zip_path = downloader.output_dir / "broken.zip"
+        zip_path.write_bytes(make_zip({'abc-main.jpg': JPEG_BYTES}))
+
+        def fail_replace(src, dst):
+            raise OSError("disk full")
+
+        monkeypatch.setattr('downloader.os.replace', fail_replace)
+
+        with pytest.raises(OSError):
+            downloader._extract_and_save_zip(zip_path, memory, memory['sid'])
+
+        assert not list((downloader.output_dir / "images").iterdir())
+
+
+class TestDeduplication:
+    """Test content hashing and duplicate linking during download."""
+
+    def test_duplicate_with_same_metadata_hardlinked(self, downloader, monkeypatch):
+        """Test the same content under a second SID is stored as a hardlink."""
+        first = make_memory(20)
+        second = dict(make_memory(21), date=first['date'])
+        use_session(downloader, FakeSession({
+            first['download_url']: lambda: FakeResponse(JPEG_BYTES),
+            second['download_url']: lambda: FakeResponse(JPEG_BYTES),
+        }), monkeypatch)
+
+        assert downloader._attempt_download(first, first['sid'])[0]
+        assert downloader._attempt_download(second, second['sid'])[0]
+
+        files = sorted((downloader.output_dir / "images").glob("*.jpg"))
+        assert len(files) == 2
+        assert os.path.samefile(files[0], files[1])
+        assert downloader.download_stats['deduplicated'] == 1
+        assert downloader.download_stats['dedup_bytes'] == len(JPEG_BYTES)
+
+    def test_duplicate_with_other_date_keeps_own_timestamps(self, downloader, monkeypatch):
+        """Test duplicates with different dates get separate inodes and mtimes."""
+        first = make_memory(22)
+        second = make_memory(23)
+        use_session(downloader, FakeSession({
+            first['download_url']: lambda: FakeResponse(JPEG_BYTES),
+            second['download_url']: lambda: FakeResponse(JPEG_BYTES),
+        }), monkeypatch)
+
+        assert downloader._attempt_download(first, first['sid'])[0]
+        assert downloader._attempt_download(second, second['sid'])[0]
+
+        files = sorted((downloader.output_dir / "images").glob("*.jpg"))
+        assert len(files) == 2
+        assert not os.path.samefile(files[0], files[1])
+        assert files[0].stat().st_mtime != files[1].stat().st_mtime
+        assert all(f.read_bytes() == JPEG_BYTES for f in files)
+
+    def test_resumed_download_hash_covers_whole_file(self, downloader, monkeypatch):
+        """Test the hash of a resumed file includes the bytes from the earlier attempt."""
+        import hashlib
+        memory = make_memory(24, 'Video')
+        payload = MP4_BYTES * 8
+        session = RangeSession(payload, fail_after=len(payload) // 2)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.RateController.acquire', lambda self: None)
+
+        success, message = downloader._download_memory(memory)
+
+        assert success, message
+        assert hashlib.sha256(payload).hexdigest() in downloader.content_index.entries
+
+    def test_index_saved_when_run_ends(self, downloader, temp_working_dir, monkeypatch):
+        """Test the batched content index is flushed at the end of a run."""
+        memories = [make_memory(27), make_memory(28)]
+        use_session(downloader, FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES))
+                                             for m in memories}), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+
+        downloader.download_all(delay=0)
+
+        index = json.loads((temp_working_dir / "content_index.json").read_text())
+        assert list(index) == [hashlib.sha256(JPEG_BYTES).hexdigest()]
+
+    def test_dedup_disabled(self, temp_working_dir, monkeypatch):
+        """Test dedup=False skips hashing bookkeeping entirely."""
+        monkeypatch.setattr('downloader.check_exiftool', lambda: False)
+        monkeypatch.setattr('downloader.check_ffmpeg', lambda: False)
+        html_file = temp_working_dir / "memories_history.html"
+        html_file.write_text("<html></html>", encoding='utf-8')
+        downloader = SnapchatDownloader(str(html_file), str(temp_working_dir / "memories"), dedup=False)
+        first = make_memory(25)
+        second = dict(make_memory(26), date=first['date'])
+        use_session(downloader, FakeSession({
+            first['download_url']: lambda: FakeResponse(JPEG_BYTES),
+            second['download_url']: lambda: FakeResponse(JPEG_BYTES),
+        }), monkeypatch)
+
+        assert downloader._attempt_download(first, first['sid'])[0]
+        assert downloader._attempt_download(second, second['sid'])[0]
+
+        files = sorted((downloader.output_dir / "images").glob("*.jpg"))
+        assert not os.path.samefile(files[0], files[1])
+        assert not (temp_working_dir / "content_index.json").exists()
+
+
+class TestResume:
+    """Test HTTP Range resume of interrupted downloads."""
+
+    PAYLOAD = MP4_BYTES + bytes(range(256)) * 800
+
+    def test_interrupted_download_resumes_in_same_run(self, downloader, monkeypatch):
+        """Test a dropped connection is resumed with a Range request."""
+        memory = make_memory(9, 'Video')
+        session = RangeSession(self.PAYLOAD, fail_after=70000)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.RateController.acquire', lambda self: None)
+
+        success, message = downloader._download_memory(memory)
+
+        assert success, message
+        assert session.request_kwargs[1]['headers']['Range'] == "bytes=70000-"
+        assert session.request_kwargs[1]['headers']['If-Range'] == '"v1"'
+        videos = list((downloader.output_dir / "videos").glob("*.mp4"))
+        assert videos[0].read_bytes() == self.PAYLOAD
+        assert downloader.download_stats['resumed'] == 1
+        assert downloader.download_stats['resumed_bytes'] == 70000
+        assert downloader.progress_tracker.get_failure_count(memory['sid']) == 0
+        assert downloader.progress_tracker.get_partial(memory['sid']) is None
+
+    def test_partial_kept_between_attempts(self, downloader, monkeypatch):
+        """Test an interrupted attempt keeps its partial file and records it."""
+        from download_errors import TransferInterruptedError
+
+        memory = make_memory(10, 'Video')
+        use_session(downloader, RangeSession(self.PAYLOAD, fail_after=70000), monkeypatch)
+
+        with pytest.raises(TransferInterruptedError):
+            downloader._attempt_download(memory, memory['sid'])
+
+        partial = downloader.progress_tracker.get_partial(memory['sid'])
+        assert partial['media_type'] == 'video'
+        assert partial['size'] == len(self.PAYLOAD)
+        assert Path(partial['path']).stat().st_size == 70000
+
+    def test_range_ignored_falls_back_to_full_fetch(self, downloader, monkeypatch):
+        """Test a server that ignores Range gets a clean full re-download."""
+        memory = make_memory(11, 'Video')
+        session = RangeSession(self.PAYLOAD, fail_after=70000, honor_range=False)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.RateController.acquire', lambda self: None)
+
+        success, message = downloader._download_memory(memory)
+
+        assert success, message
+        assert message == "Downloaded successfully"
+        videos = list((downloader.output_dir / "videos").glob("*.mp4"))
+        assert videos[0].read_bytes() == self.PAYLOAD
+        assert downloader.download_stats['resumed'] == 0
+
+    def test_changed_etag_restarts(self, downloader, monkeypatch):
+        """Test a partial file is discarded when the ETag no longer matches."""
+        memory = make_memory(12, 'Video')
+        session = RangeSession(self.PAYLOAD, fail_after=70000)
+        use_session(downloader, session, monkeypatch)
+
+        from download_errors import TransferInterruptedError
+        with pytest.raises(TransferInterruptedError):
+            downloader._attempt_download(memory, memory['sid'])
+
+        session.etag = '"v2"'
+        success, message = downloader._attempt_download(memory, memory['sid'])
+
+        assert success, message
+        assert message == "Downloaded successfully"
+        videos = list((downloader.output_dir / "videos").glob("*.mp4"))
+        assert videos[0].read_bytes() == self.PAYLOAD
+        assert downloader.download_stats['resumed'] == 0
+
+
+class TestRateControl:
+    """Test throttling and server errors go through the rate controller."""
+
+    def test_429_backs_off_and_retries(self, downloader, monkeypatch):
+        """Test a 429 slows the controller and the next attempt succeeds."""
+        memory = make_memory(4)
+        responses = iter([
+            FakeResponse(status_code=429, headers={'retry-after': '0'}),
+            FakeResponse(JPEG_BYTES),
+        ])
+        use_session(downloader, FakeSession({memory['download_url']: lambda: next(responses)}), monkeypatch)
+        downloader.rate_controller.rate = 4.0
+        downloader.retry_cooldowns = {'transient': 0, 'throttled': 0}
+
+        success, message = downloader._download_memory(memory)
+
+        assert success, message
+        assert downloader.rate_controller.backoff_count == 1
+        assert downloader.progress_tracker.get_failure_count(memory['sid']) == 0
+
+    def test_persistent_5xx_counts_each_attempt(self, downloader, monkeypatch):
+        """Test every 5xx attempt is recorded against the throttled budget."""
+        memory = make_memory(5)
+        monkeypatch.setattr('downloader.RateController.acquire', lambda self: None)
+        downloader.retry_cooldowns = {'transient': 0, 'throttled': 0}
+        use_session(downloader, FakeSession({memory['download_url']: lambda: FakeResponse(status_code=503)}),
+                    monkeypatch)
+
+        success, message = downloader._download_memory(memory)
+
+        assert not success
+        assert "503" in message
+        assert downloader.progress_tracker.get_failure_count(memory['sid'], 'throttled') == 3
+        assert downloader.rate_controller.backoff_count == 3
+
+
+class TestDeferredRetries:
+    """Test failed memories are deferred while fresh ones keep downloading."""
+
+    def _run(self, downloader, monkeypatch, memories, routes, jobs):
+        session = FakeSession(routes)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+        downloader.retry_cooldowns = {'transient': 0.05, 'throttled': 0.05}
+        downloader.download_all(delay=0, jobs=jobs)
+        return session
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_throttled_memory_retried_after_fresh_ones(self, downloader, monkeypatch, jobs):
+        """Test a 429 defers the memory instead of blocking the run."""
+        memories = [make_memory(i) for i in range(4)]
+        first_responses = iter([FakeResponse(status_code=429), FakeResponse(JPEG_BYTES)])
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+        routes[memories[0]['download_url']] = lambda: next(first_responses)
+
+        session = self._run(downloader, monkeypatch, memories, routes, jobs)
+
+        assert all(downloader.progress_tracker.is_downloaded(m['sid']) for m in memories)
+        # The retry comes after the fresh memories, not right after the 429
+        assert session.requests[-1] == memories[0]['download_url']
+        assert downloader.download_stats['deferred'] == 1
+        assert downloader.download_stats['recovered'] == 1
+
+    def test_permanent_failure_not_retried(self, downloader, monkeypatch):
+        """Test a 404 is tried once and recorded as permanent."""
+        memories = [make_memory(i) for i in range(2)]
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+        routes[memories[0]['download_url']] = lambda: FakeResponse(status_code=404)
+
+        session = self._run(downloader, monkeypatch, memories, routes, jobs=1)
+
+        assert session.requests.count(memories[0]['download_url']) == 1
+        assert downloader.progress_tracker.get_failure_count(memories[0]['sid'], 'permanent') == 1
+        assert downloader.download_stats['deferred'] == 0
+
+    def test_transient_budget_limits_retries(self, downloader, monkeypatch):
+        """Test a memory that keeps failing stops at the transient budget."""
+        memories = [make_memory(0)]
+        routes = {memories[0]['download_url']: lambda: FakeResponse(status_code=502)}
+        downloader.retry_cooldowns = {'transient': 0, 'throttled': 0}
+
+        session = self._run(downloader, monkeypatch, memories, routes, jobs=1)
+
+        assert len(session.requests) == 5
+        assert downloader.progress_tracker.get_failure_count(memories[0]['sid'], 'transient') == 5
+
+    def test_locked_file_retried(self, downloader, monkeypatch):
+        """Test a local file system error defers the memory instead of skipping it for good."""
+        memories = [make_memory(i) for i in range(2)]
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+        real_replace = os.replace
+        calls = {'count': 0}
+
+        def locked_once(src, dst):
+            calls['count'] += 1
+            if calls['count'] == 1:
+                raise PermissionError(13, "The process cannot access the file")
+            real_replace(src, dst)
+
+        monkeypatch.setattr('downloader.os.replace', locked_once)
+
+        self._run(downloader, monkeypatch, memories, routes, jobs=1)
+
+        assert all(downloader.progress_tracker.is_downloaded(m['sid']) for m in memories)
+        assert downloader.progress_tracker.get_failure_count(memories[0]['sid'], 'permanent') == 0
+        assert downloader.download_stats['recovered'] == 1
+
+    @pytest.mark.parametrize("options", [
+        {'jobs': 1},
+        {'jobs': 2},
+        {'pipeline': {'fetch': 2, 'unpack': 1, 'metadata': 1, 'composite': 0}, 'pipeline_queue': 1},
+    ])
+    def test_disk_full_stops_run(self, downloader, monkeypatch, capsys, options):
+        """Test ENOSPC stops the run without using up any memory's retry budget."""
+        memories = [make_memory(i) for i in range(12)]
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+        session = FakeSession(routes)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+
+        def disk_full(src, dst):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr('downloader.os.replace', disk_full)
+
+        downloader.download_all(delay=0, **options)
+
+        assert not any(downloader.progress_tracker.is_downloaded(m['sid']) for m in memories)
+        assert all(downloader.progress_tracker.get_failure_count(m['sid']) == 0 for m in memories)
+        assert len(session.requests) < len(memories)
+        assert not list(downloader.output_dir.rglob("*.part"))
+        assert "output drive is full" in capsys.readouterr().out
+
+
+class TestCircuitBreaker:
+    """Test the circuit breaker pauses downloads during an outage."""
+
+    @pytest.mark.parametrize("error,raised", [(KeyboardInterrupt(), KeyboardInterrupt),
+                                              (OSError(28, "No space left on device"), DiskFullError)])
+    def test_interrupted_probe_released(self, downloader, monkeypatch, error, raised):
+        """Test a probe that raises instead of recording an outcome does not leave the circuit half-open."""
+        from circuit_breaker import CircuitBreaker, OPEN
+
+        memory = make_memory(1)
+        downloader.circuit_breaker = CircuitBreaker(window=4, min_requests=4, threshold=0.75, cooldown=0.0)
+        for _ in range(4):
+            downloader.circuit_breaker.record_failure()
+
+        def interrupted(*args):
+            raise error
+
+        monkeypatch.setattr(downloader, '_attempt_download', interrupted)
+        with pytest.raises(raised):
+            downloader._try_download(memory)
+
+        assert downloader.circuit_breaker.state == OPEN
+        assert downloader.circuit_breaker.acquire() is True
+
+    def test_outage_failures_not_counted(self, downloader, monkeypatch, capsys):
+        """Test failures after the trip don't count and downloads resume after a probe."""
+        from circuit_breaker import CircuitBreaker, CLOSED
+
+        memories = [make_memory(i) for i in range(8)]
+        calls = {'count': 0}
+
+        def flaky():
+            calls['count'] += 1
+            return FakeResponse(status_code=502) if calls['count'] <= 6 else FakeResponse(JPEG_BYTES)
+
+        use_session(downloader, FakeSession({m['download_url']: flaky for m in memories}), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+        downloader.retry_cooldowns = {'transient': 0.01, 'throttled': 0.01}
+        downloader.circuit_breaker = CircuitBreaker(window=4, min_requests=4, threshold=0.75, cooldown=0.02)
+
+        downloader.download_all(delay=0)
+
+        assert all(downloader.progress_tracker.is_downloaded(m['sid']) for m in memories)
+        assert downloader.circuit_breaker.trip_count == 1
+        assert downloader.circuit_breaker.state == CLOSED
+        # The tripping failure and both failed probes were not counted
+        assert downloader.download_stats['circuit_failures'] == 3
+        output = capsys.readouterr().out
+        assert "Circuit breaker open" in output
+        assert "probe request" in output
+
+    def test_circuit_failures_excluded_from_budget(self, downloader):
+        """Test 'circuit-open' failures never exhaust a retry budget."""
+        from retry_queue import budget_exhausted
+
+        memory = make_memory(1)
+        for _ in range(30):
+            downloader.progress_tracker.record_failure(memory['sid'], memory, "502", None, 'circuit-open')
+
+        assert budget_exhausted(downloader.progress_tracker, memory['sid']) is None
+
+
+class TestBandwidthLimit:
+    """Test the --max-bandwidth cap."""
+
+    def test_cap_applies_across_workers(self, downloader, monkeypatch, capsys):
+        """Test parallel downloads together stay under the bandwidth cap."""
+        memories = [make_memory(i) for i in range(6)]
+        use_session(downloader, FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES))
+                                             for m in memories}), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+        total_bytes = 6 * len(JPEG_BYTES)
+
+        start = time.perf_counter()
+        downloader.download_all(delay=0, jobs=3, max_bandwidth=40_000, bandwidth_burst=2000)
+        elapsed = time.perf_counter() - start
+
+        assert elapsed >= (total_bytes - 2000) / 40_000 * 0.9
+        assert downloader.download_stats['bytes'] == total_bytes
+        assert "KB/s]" in capsys.readouterr().out
+
+
+class TestConcurrentDownloads:
+    """Test the --jobs worker pool."""
+
+    def _run(self, downloader, monkeypatch, memories, jobs, latency=0.0):
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+        session = FakeSession(routes, latency=latency)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+
+        start = time.perf_counter()
+        downloader.download_all(delay=0, jobs=jobs)
+        return time.perf_counter() - start, session
+
+    def test_all_memories_downloaded_concurrently(self, downloader, monkeypatch):
+        """Test every memory is downloaded exactly once with several workers."""
+        memories = [make_memory(i) for i in range(20)]
+
+        _, session = self._run(downloader, monkeypatch, memories, jobs=4)
+
+        assert sorted(session.requests) == sorted(m['download_url'] for m in memories)
+        for memory in memories:
+            assert downloader.progress_tracker.is_downloaded(memory['sid'])
+
+        # Progress file must be valid JSON containing every download
+        with open(downloader.progress_tracker.progress_file) as f:
+            saved = json.load(f)
+        assert len(saved['downloaded']) == 20
+
+    @pytest.mark.slow
+    def test_throughput_vs_sequential(self, downloader, monkeypatch, tmp_path):
+        """Compare worker-pool throughput against the sequential path."""
+        latency = 0.05
+        memories = [make_memory(i) for i in range(12)]
+
+        sequential_time, _ = self._run(downloader, monkeypatch, memories, jobs=1, latency=latency)
+
+        # Fresh state for the concurrent run
+        downloader.progress_tracker = ProgressTracker(str(tmp_path / "concurrent_progress.json"))
+        for sub in ("images", "videos"):
+            for f in (downloader.output_dir / sub).iterdir():
+                f.unlink()
+
+        concurrent_time, _ = self._run(downloader, monkeypatch, memories, jobs=4, latency=latency)
+
+        assert concurrent_time < sequential_time / 2
+
+
+class TestTiming:
+    """Test the per-download timing breakdown."""
+
+    def test_every_attempt_logged_with_summary(self, downloader, monkeypatch, capsys):
+        """Test successes and failures are logged and summarized at the end of the run."""
+        good = make_memory(1)
+        zipped = make_memory(2)
+        broken = make_memory(3)
+        use_session(downloader, FakeSession({
+            good['download_url']: lambda: FakeResponse(JPEG_BYTES, headers={'content-type': 'image/jpeg'}),
+            zipped['download_url']: lambda: FakeResponse(make_zip({'media.jpg': JPEG_BYTES,
+                                                                   'media-overlay.png': b'png'})),
+            broken['download_url']: lambda: FakeResponse(status_code=404),
+        }), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: [good, zipped, broken])
+
+        downloader.download_all(delay=0)
+
+        records = {record['sid']: record for record in downloader.timing_log.records}
+        assert records[good['sid']]['success'] is True
+        assert records[good['sid']]['bytes'] == len(JPEG_BYTES)
+        assert records[good['sid']]['disk_write'] > 0
+        assert records[good['sid']]['zip_extract'] == 0
+        assert records[zipped['sid']]['zip_extract'] > 0
+        assert records[zipped['sid']]['metadata'] > 0
+        assert records[broken['sid']]['success'] is False
+        assert records[broken['sid']]['failure_class'] == 'permanent'
+
+        out = capsys.readouterr().out
+        assert "Timing per download (ms, 3 attempts" in out
+        assert "p95" in out
+        # Without --timing-log nothing is written to the working directory
+        assert not list(Path.cwd().glob("*.jsonl"))
+
+    def test_timing_log_file_opt_in(self, temp_working_dir, monkeypatch):
+        """Test the timing breakdown is appended to the --timing-log file when one is given."""
+        monkeypatch.setattr('downloader.check_exiftool', lambda: False)
+        monkeypatch.setattr('downloader.check_ffmpeg', lambda: False)
+        log_file = temp_working_dir / "timings.jsonl"
+        downloader = SnapchatDownloader(str(temp_working_dir / "memories_history.html"),
+                                        str(temp_working_dir / "memories"), timing_log=str(log_file))
+        memory = make_memory(1)
+        use_session(downloader, FakeSession({memory['download_url']: lambda: FakeResponse(JPEG_BYTES)}), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: [memory])
+
+        downloader.download_all(delay=0)
+
+        records = [json.loads(line) for line in log_file.read_text().splitlines()]
+        assert [record['sid'] for record in records] == [memory['sid']]
+
+    def test_pipelined_timing_recorded_after_metadata(self, downloader, monkeypatch):
+        """Test a pipelined attempt's record includes the unpack and metadata stages."""
+        image = make_memory(1)
+        video = make_memory(2, 'Video')
+        broken = make_memory(3, 'Video')
+        use_session(downloader, FakeSession({
+            image['download_url']: lambda: FakeResponse(JPEG_BYTES),
+            video['download_url']: lambda: FakeResponse(make_zip({'abc-main.mp4': MP4_BYTES,
+                                                                  'abc-overlay.png': b'png'})),
+            broken['download_url']: lambda: FakeResponse(b'PK\x03\x04' + b'\x00' * 64),
+        }), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: [image, video, broken])
+
+        downloader.download_all(delay=0, pipeline={'fetch': 2, 'unpack': 1, 'metadata': 1, 'composite': 0})
+
+        records = {record['sid']: record for record in downloader.timing_log.records}
+        assert len(downloader.timing_log.records) == 3
+        assert records[image['sid']]['metadata'] > 0
+        assert records[video['sid']]['zip_extract'] > 0
+        assert records[video['sid']]['metadata'] > 0
+        assert records[video['sid']]['media_type'] == 'Video'
+        assert records[broken['sid']]['success'] is False
+
+    def test_queue_wait_measured_from_handout(self, downloader, monkeypatch):
+        """Test time spent before the attempt starts counts as queue wait."""
+        memory = make_memory(4)
+        use_session(downloader, FakeSession({memory['download_url']: FakeResponse(JPEG_BYTES)}), monkeypatch)
+
+        success, _, _ = downloader._try_download(memory, time.monotonic() - 0.5)
+
+        assert success
+        assert downloader.timing_log.records[-1]['queue'] >= 0.5
+
+
+def make_post_memory(index: int) -> dict:
+    """Build a memory whose link must be POSTed to get the CDN URL."""
+    memory = make_memory(index)
+    memory['download_url'] = f"https://app.example.com/dmd/memories?sid={memory['sid']}"
+    memory['is_get_request'] = False
+    return memory
+
+
+class TestURLResolution:
+    """Test two-phase resolution of downloadMemories(..., false) links."""
+
+    def test_links_resolved_in_batches_before_download(self, downloader, monkeypatch):
+        """Test POST links are resolved ahead of the transfers, one batch for several memories."""
+        memories = [make_post_memory(i) for i in range(3)]
+        session = FakeSession({f"https://cdn.example.com/{m['sid']}.jpg": (lambda: FakeResponse(JPEG_BYTES))
+                               for m in memories})
+
+        def resolve(url, **kwargs):
+            with session._lock:
+                session.posts.append((url, kwargs.get('data')))
+            sid = kwargs['data'].split('=')[1]
+            return FakeResponse(f"https://cdn.example.com/{sid}.jpg".encode())
+        session.post = resolve
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+        batches = []
+        original_batch = downloader._resolve_batch
+        monkeypatch.setattr(downloader, '_resolve_batch',
+                            lambda batch: (batches.append(len(batch)), original_batch(batch)))
+
+        downloader.download_all(delay=0)
+
+        assert batches == [3]
+        assert sorted(data for _, data in session.posts) == sorted(f"sid={m['sid']}" for m in memories)
+        assert session.requests == [f"https://cdn.example.com/{m['sid']}.jpg" for m in memories]
+        for memory in memories:
+            assert downloader.progress_tracker.is_downloaded(memory['sid'])
+        assert downloader.timing_log.records[0]['resolve'] < 0.05
+
+    def test_get_links_not_resolved(self, downloader, monkeypatch):
+        """Test downloadMemories(..., true) links are fetched directly."""
+        memory = dict(make_memory(5), is_get_request=True)
+        session = FakeSession({memory['download_url']: FakeResponse(JPEG_BYTES)})
+        use_session(downloader, session, monkeypatch)
+
+        success, message, _ = downloader._try_download(memory)
+
+        assert success, message
+        assert session.posts == []
+
+    def test_expired_link_resolved_again(self, downloader, monkeypatch):
+        """Test a 403 from the CDN drops the cached URL and the retry resolves it again."""
+        memory = make_post_memory(6)
+        cdn_url = f"https://cdn.example.com/{memory['sid']}.jpg"
+        downloader.url_cache.put(memory['sid'], cdn_url + "?old", time.time() + 3600)
+        session = FakeSession({
+            cdn_url + "?old": FakeResponse(status_code=403),
+            "https://app.example.com/dmd/memories": FakeResponse(cdn_url.encode()),
+            cdn_url: FakeResponse(JPEG_BYTES),
+        })
+        use_session(downloader, session, monkeypatch)
+
+        success, message, error = downloader._try_download(memory)
+        assert not success
+        assert "expired" in message
+        assert downloader.url_cache.get(memory['sid']) is None
+        failures = downloader.progress_tracker.progress['failed'][memory['sid']]
+        assert failures['class_counts'] == {'transient': 1}
+
+        success, message, _ = downloader._try_download(memory)
+        assert success, message
+        assert session.requests == [cdn_url + "?old", cdn_url]
+
+    @pytest.mark.parametrize("status", [403, 410])
+    def test_rejected_export_link_retried(self, downloader, monkeypatch, status):
+        """Test a 403/410 on a pre-signed GET link is transient, not abandoned after one try."""
+        memory = dict(make_memory(7), is_get_request=True)
+        responses = iter([FakeResponse(status_code=status), FakeResponse(JPEG_BYTES)])
+        session = FakeSession({memory['download_url']: lambda: next(responses)})
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: [memory])
+        downloader.retry_cooldowns = {'transient': 0.01, 'throttled': 0.01}
+
+        downloader.download_all(delay=0)
+
+        assert downloader.progress_tracker.is_downloaded(memory['sid'])
+        assert session.requests == [memory['download_url']] * 2
+        assert downloader.download_stats['recovered'] == 1
+
+    def test_cached_links_downloaded_first(self, downloader, monkeypatch, capsys):
+        """Test memories with a cached URL go first, the soonest-expiring one first."""
+        memories = [make_post_memory(i) for i in range(10, 14)]
+        downloader.url_cache.put(memories[3]['sid'], "https://cdn.example.com/late.jpg", time.time() + 3000)
+        downloader.url_cache.put(memories[2]['sid'], "https://cdn.example.com/soon.jpg", time.time() + 1000)
+        pending = list(enumerate(memories, 1))
+
+        ordered = downloader._prioritize_resolved(pending)
+
+        assert [memory['sid'] for _, memory in ordered] == [
+            memories[2]['sid'], memories[3]['sid'], memories[0]['sid'], memories[1]['sid']
+        ]
+        assert "2 memories with already resolved links first" in capsys.readouterr().out
+
+
+def write_export(path: Path, memories: list) -> str:
+    """Write a memories_history.html containing the given memories."""
+    rows = "".join(
+        f"<tr><td>{m['date']}</td><td>{m['media_type']}</td><td></td>"
+        f"<td><a onclick=\"downloadMemories('{m['download_url']}', this, "
+        f"{'false' if m.get('is_get_request') is False else 'true'})\">Download</a></td></tr>"
+        for m in memories
+    )
+    path.write_text(f"<html><table>{rows}</table></html>", encoding='utf-8')
+    return str(path)
+
+
+class TestRefreshLinks:
+    """Test importing fresh links from a newer export."""
+
+    def test_only_backlog_refreshed_and_fetched(self, downloader, temp_working_dir, monkeypatch):
+        """Test downloaded memories keep their state and the backlog uses the new links."""
+        done, expired, pending = make_memory(1), make_memory(2), make_memory(3)
+        downloader.html_file = write_export(temp_working_dir / "old.html", [done, expired, pending])
+        downloader.progress_tracker.mark_downloaded(done['sid'], done)
+        downloader.progress_tracker.record_failure(expired['sid'], expired, "403 Client Error: Forbidden",
+                                                   requests.HTTPError("403"), 'permanent')
+        downloader.url_cache.put(pending['sid'], "https://cdn.example.com/stale.jpg", time.time() + 3600)
+
+        fresh = [dict(m, download_url=m['download_url'].replace('example.com', 'new.example.com'))
+                 for m in (done, expired, pending)]
+        fresh.append(make_memory(4))
+        results = downloader.refresh_links(write_export(temp_working_dir / "new.html", fresh))
+
+        assert results == {'refreshed': 2, 'already_downloaded': 1, 'cleared_failures': 1, 'not_in_export': 1}
+        assert downloader.progress_tracker.get_link(done['sid']) is None
+        assert downloader.progress_tracker.get_failure_count(expired['sid']) == 0
+        assert downloader.url_cache.get(pending['sid']) is None
+
+        session = FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in fresh})
+        use_session(downloader, session, monkeypatch)
+        downloader.download_all(delay=0)
+
+        assert sorted(session.requests) == sorted(m['download_url'] for m in fresh[1:3])
+        assert downloader.progress_tracker.is_downloaded(expired['sid'])
+        assert downloader.progress_tracker.is_downloaded(pending['sid'])
+
+
+class TestIncrementalExport:
+    """Test downloading only memories new since the last export."""
+
+    def test_only_new_fetched(self, downloader, temp_working_dir, monkeypatch, capsys):
+        """Test memories of earlier exports are skipped without per-row output."""
+        old = [make_memory(i) for i in range(50)]
+        downloader.html_file = write_export(temp_working_dir / "old.html", old)
+        for memory in old[:-1]:
+            downloader.progress_tracker.mark_downloaded(memory['sid'], memory)
+        ExportIndex().record(fingerprint_export(downloader.html_file), downloader.html_file, old)
+
+        new = [make_memory(i) for i in range(50, 53)]
+        downloader.html_file = write_export(temp_working_dir / "new.html", old + new)
+        capsys.readouterr()
+        session = FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in old + new})
+        use_session(downloader, session, monkeypatch)
+        downloader.download_all(delay=0, incremental=True)
+
+        output = capsys.readouterr().out
+        assert sorted(session.requests) == sorted(m['download_url'] for m in new)
+        assert "50 memories from earlier exports skipped, 3 new" in output
+        assert "Skipping" not in output
+
+    def test_imported_export_skipped_before_parsing(self, downloader, temp_working_dir, monkeypatch, capsys):
+        """Test running again on a fully imported export neither parses nor fetches anything."""
+        memories = [make_memory(1), make_memory(2)]
+        downloader.html_file = write_export(temp_working_dir / "export.html", memories)
+        session = FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories})
+        use_session(downloader, session, monkeypatch)
+        downloader.download_all(delay=0, incremental=True)
+        assert len(session.requests) == 2
+
+        monkeypatch.setattr(downloader, '_load_memories', lambda: pytest.fail("export parsed again"))
+        capsys.readouterr()
+        downloader.download_all(delay=0, incremental=True)
+
+        assert "already imported" in capsys.readouterr().out
+        assert len(session.requests) == 2
+
+    def test_undownloaded_new_memories_stay_new(self, downloader, temp_working_dir, monkeypatch):
+        """Test an interrupted or failed import is picked up by the next incremental run."""
+        memories = [make_memory(1), make_memory(2)]
+        downloader.html_file = write_export(temp_working_dir / "export.html", memories)
+        with monkeypatch.context() as patch:
+            patch.setattr(downloader, '_download_sequentially', lambda pending, total: [False] * len(pending))
+            downloader.download_all(delay=0, incremental=True)
+
+        index = ExportIndex()
+        assert not index.is_imported(fingerprint_export(downloader.html_file))
+        assert index.new_sids(memories) == {m['sid'] for m in memories}
+
+        session = FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories})
+        use_session(downloader, session, monkeypatch)
+        downloader.download_all(delay=0, incremental=True)
+
+        assert sorted(session.requests) == sorted(m['download_url'] for m in memories)
+        assert ExportIndex().is_imported(fingerprint_export(downloader.html_file))
+
+
+class TestMemoryFilter:
+    """Test restricting operations to selected memories."""
+
+    def test_only_selected_downloaded(self, downloader, temp_working_dir, monkeypatch, capsys):
+        """Test filtered-out memories are neither fetched nor reported as skipped."""
+        memories = [make_memory(1), make_memory(2, 'Video'), make_memory(3, 'Video')]
+        downloader.html_file = write_export(temp_working_dir / "export.html", memories)
+        downloader.memory_filter = MemoryFilter(media_types=['video'], sids={memories[2]['sid'][:8]})
+        session = FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories})
+        use_session(downloader, session, monkeypatch)
+
+        downloader.download_all(delay=0)
+
+        assert session.requests == [memories[2]['download_url']]
+        assert "1 of 3 memories selected" in capsys.readouterr().out
+
+    def test_verification_filtered(self, downloader, temp_working_dir):
+        """Test verification only counts selected memories."""
+        memories = [make_memory(1), make_memory(2, 'Video')]
+        downloader.html_file = write_export(temp_working_dir / "export.html", memories)
+        downloader.memory_filter = MemoryFilter(media_types=['video'])
+
+        results = downloader.verify_downloads()
+
+        assert results['total'] == 1
+        assert [item['sid'] for item in results['missing']] == [memories[1]['sid']]
+
+    def test_overlay_pairs_filtered(self, downloader):
+        """Test overlay pairs are selected through their progress entries."""
+        old, recent = make_memory(1), make_memory(20)
+        for memory in (old, recent):
+            downloader.progress_tracker.mark_downloaded(memory['sid'], memory)
+        pairs = [{'sid': memory['sid'][:8], 'media_type': 'image'} for memory in (old, recent)]
+        downloader.memory_filter = MemoryFilter(since=date(2023, 1, 10))
+
+        assert downloader._filter_pairs(pairs) == [pairs[1]]
+
+
+class TestBlobCache:
+    """Test restoring downloads from the local blob cache."""
+
+    def make_cached_downloader(self, temp_working_dir, output_dir):
+        return SnapchatDownloader(str(temp_working_dir / "memories_history.html"), str(temp_working_dir / output_dir),
+                                  blob_cache_dir=str(temp_working_dir / "cache"))
+
+    def test_rebuild_served_from_cache(self, downloader, temp_working_dir, monkeypatch, capsys):
+        """Test a rebuild into a new output directory makes no requests."""
+        image, video = make_memory(1), make_memory(2, 'Video')
+        zip_payload = make_zip({'abc-main.mp4': MP4_BYTES, 'abc-overlay.png': b'\x89PNG\r\n\x1a\n' + b'\x00' * 64})
+        write_export(temp_working_dir / "memories_history.html", [image, video])
+        first = self.make_cached_downloader(temp_working_dir, "memories")
+        use_session(first, FakeSession({image['download_url']: (lambda: FakeResponse(JPEG_BYTES)),
+                                        video['download_url']: (lambda: FakeResponse(zip_payload))}), monkeypatch)
+        first.download_all(delay=0)
+
+        os.remove(first.progress_tracker.progress_file)
+        rebuilt = self.make_cached_downloader(temp_working_dir, "rebuilt")
+        session = FakeSession({})
+        use_session(rebuilt, session, monkeypatch)
+        capsys.readouterr()
+        rebuilt.download_all(delay=0)
+
+        assert session.requests == []
+        assert [f.read_bytes() for f in (rebuilt.output_dir / "images").glob("*.jpg")] == [JPEG_BYTES]
+        assert [f.read_bytes() for f in (rebuilt.output_dir / "videos").glob("*.mp4")] == [MP4_BYTES]
+        assert len(list((rebuilt.output_dir / "overlays").glob("*_overlay.png"))) == 1
+        assert rebuilt.progress_tracker.is_downloaded(video['sid'])
+        assert "Restored from blob cache: 2" in capsys.readouterr().out
+
+    def test_broken_blob_downloaded_again(self, temp_working_dir, monkeypatch):
+        """Test a cached payload that cannot be processed is dropped and fetched from the network."""
+        monkeypatch.setattr('downloader.check_exiftool', lambda: False)
+        monkeypatch.setattr('downloader.check_ffmpeg', lambda: False)
+        memory = make_memory(3, 'Video')
+        downloader = self.make_cached_downloader(temp_working_dir, "memories")
+        blob = temp_working_dir / "blob.zip"
+        blob.write_bytes(b'PK\x03\x04 not really a zip')
+        downloader.blob_cache.put(memory['sid'], blob, 'zip', 'zip', 'x')
+        session = FakeSession({memory['download_url']: (lambda: FakeResponse(MP4_BYTES))})
+        use_session(downloader, session, monkeypatch)
+
+        success, message, _ = downloader._try_download(memory)
+
+        assert success, message
+        assert session.requests == [memory['download_url']]
+        assert downloader.blob_cache.get(memory['sid'])['media_type'] == 'video'
+
+
+class TestSharding:
+    """Test running one shard of an export."""
+
+    def test_shard_downloads_own_memories_into_own_files(self, temp_working_dir, monkeypatch):
+        """Test a shard only fetches its SIDs and keeps its own progress and error files."""
+        monkeypatch.setattr('downloader.check_exiftool', lambda: False)
+        monkeypatch.setattr('downloader.check_ffmpeg', lambda: False)
+        memories = [make_memory(i) for i in range(12)]
+        html_file = write_export(temp_working_dir / "memories_history.html", memories)
+        shard = Shard(2, 3)
+        downloader = SnapchatDownloader(html_file, str(temp_working_dir / "memories"),
+                                        memory_filter=MemoryFilter(shard=shard))
+        session = FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories})
+        use_session(downloader, session, monkeypatch)
+
+        downloader.download_all(delay=0)
+
+        own = [m['download_url'] for m in memories if shard.contains(m['sid'])]
+        assert own and len(own) < len(memories)
+        assert sorted(session.requests) == sorted(own)
+        assert downloader.progress_tracker.progress_file == "download_progress.shard-2-of-3.json"
+        assert downloader.error_logger.log_file == "errors.shard-2-of-3.json"
+        assert not (temp_working_dir / "download_progress.json").exists()
+
+
+class TestCoordinator:
+    """Test coordinator and workers on one machine."""
+
+    def run_coordinated(self, downloader, temp_working_dir, memories, routes, monkeypatch, worker_ids=('w1', 'w2')):
+        downloader.html_file = write_export(temp_working_dir / "memories_history.html", memories)
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        results = {}
+        coordinator = threading.Thread(
+            target=lambda: results.setdefault('coordinator', downloader.coordinate('127.0.0.1', port,
+                                                                                  status_interval=0.1)))
+        coordinator.start()
+
+        session = FakeSession(routes)
+        workers = []
+        for name in worker_ids:
+            # Workers run in the coordinator's directory, as the CLI starts them
+            worker = SnapchatDownloader(downloader.html_file, str(temp_working_dir / name))
+            worker.retry_cooldowns = {'transient': 0.01, 'throttled': 0.01}
+            use_session(worker, session, monkeypatch)
+            workers.append(threading.Thread(target=lambda w=worker, n=name: results.setdefault(
+                n, w.run_worker(f"http://127.0.0.1:{port}", batch_size=3, delay=0, worker_id=n,
+                                poll_interval=0.05))))
+        for thread in workers:
+            thread.start()
+        for thread in workers + [coordinator]:
+            thread.join(timeout=30)
+        return session, results
+
+    def test_workers_share_one_queue(self, downloader, temp_working_dir, monkeypatch):
+        """Test two workers download every memory once and only the coordinator writes the shared files."""
+        memories = [make_memory(i) for i in range(8)]
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+
+        session, results = self.run_coordinated(downloader, temp_working_dir, memories, routes, monkeypatch)
+
+        assert sorted(session.requests) == sorted(m['download_url'] for m in memories)
+        assert results['w1']['downloaded'] + results['w2']['downloaded'] == 8
+        assert results['coordinator']['downloaded'] == 8
+        shared = json.loads((temp_working_dir / "download_progress.json").read_text())
+        assert set(shared['downloaded']) == {m['sid'] for m in memories}
+        for name in ('w1', 'w2'):
+            own = json.loads((temp_working_dir / f"download_progress.worker-{name}.json").read_text())
+            assert len(own['downloaded']) == results[name]['downloaded']
+
+    def test_transient_failure_leased_again(self, downloader, temp_working_dir, monkeypatch):
+        """Test a memory that failed with a transient error is handed out again instead of failing for good."""
+        memory = make_memory(1)
+        flaky = iter([FakeResponse(status_code=502)] * 3 + [FakeResponse(JPEG_BYTES)])
+
+        session, results = self.run_coordinated(downloader, temp_working_dir, [memory],
+                                                {memory['download_url']: lambda: next(flaky)}, monkeypatch,
+                                                worker_ids=('w1',))
+
+        assert len(session.requests) == 4
+        assert results['coordinator']['downloaded'] == 1
+        assert results['coordinator']['requeued'] == 1
+        assert downloader.progress_tracker.is_downloaded(memory['sid'])
+
+    def test_disk_full_hands_memories_back(self, downloader, temp_working_dir, monkeypatch):
+        """Test a worker whose disk is full stops and its memories are leased again right away."""
+        memories = [make_memory(i) for i in range(2)]
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+        downloader.html_file = write_export(temp_working_dir / "memories_history.html", memories)
+        queue = LeaseQueue(memories)
+        server = CoordinatorServer(('127.0.0.1', 0), queue)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        worker = SnapchatDownloader(downloader.html_file, str(temp_working_dir / "w1"))
+        use_session(worker, FakeSession(routes), monkeypatch)
+
+        def disk_full(src, dst):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr('downloader.os.replace', disk_full)
+        try:
+            results = worker.run_worker(server.url, batch_size=2, delay=0, worker_id='w1', poll_interval=0.05)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert results == {'downloaded': 0, 'failed': 0}
+        assert queue.status()['pending'] == 2 and queue.status()['leased'] == 0
+
+
+class TestPipeline:
+    """Test downloading through the staged pipeline."""
+
+    def test_stages_store_and_composite(self, downloader, monkeypatch, capsys):
+        """Test payloads are unpacked, stored, marked downloaded and composited by their own stages."""
+        images = [make_memory(i) for i in range(6)]
+        video = make_memory(6, 'Video')
+        zip_payload = make_zip({'abc-main.mp4': MP4_BYTES, 'abc-overlay.png': b'\x89PNG\r\n\x1a\n' + b'\x00' * 64})
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in images}
+        routes[video['download_url']] = lambda: FakeResponse(zip_payload)
+        use_session(downloader, FakeSession(routes), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: images + [video])
+        composited = []
+
+        def fake_composite(base, overlay, *args, **kwargs):
+            composited.append((base, overlay))
+            return True, "OK"
+
+        monkeypatch.setattr('downloader.composite_video', fake_composite)
+        downloader.has_ffmpeg = True
+
+        downloader.download_all(delay=0, pipeline={'fetch': 3, 'unpack': 1, 'metadata': 2, 'composite': 1},
+                                pipeline_queue=2)
+
+        assert all(downloader.progress_tracker.is_downloaded(m['sid']) for m in images + [video])
+        assert len(list((downloader.output_dir / "images").glob("*.jpg"))) == 6
+        assert [base.suffix for base, _ in composited] == ['.mp4']
+        assert composited[0][1].name.endswith("_overlay.png")
+        assert downloader.progress_tracker.is_composited(video['sid'][:8], 'video')
+        assert not list(downloader.output_dir.rglob("*.part"))
+        out = capsys.readouterr().out
+        assert "Pipeline stages" in out and "Busiest stage" in out
+        assert "Downloaded: 7" in out
+
+    def test_failed_fetch_deferred_within_class_budget(self, downloader, monkeypatch):
+        """Test fetches are retried through the deferred queue up to the transient budget, not 3 attempts."""
+        memories = [make_memory(i) for i in range(4)]
+        flaky = iter([FakeResponse(status_code=502)] * 4 + [FakeResponse(JPEG_BYTES)])
+        routes = {m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories}
+        routes[memories[0]['download_url']] = lambda: next(flaky)
+        session = FakeSession(routes)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+        downloader.retry_cooldowns = {'transient': 0.02, 'throttled': 0.02}
+
+        downloader.download_all(delay=0, pipeline={'fetch': 1, 'unpack': 1, 'metadata': 1, 'composite': 0})
+
+        assert all(downloader.progress_tracker.is_downloaded(m['sid']) for m in memories)
+        assert session.requests.count(memories[0]['download_url']) == 5
+        # The single fetch worker went on with the other memories during the first cool-down
+        assert session.requests.index(memories[3]['download_url']) < 4
+        assert downloader.download_stats['deferred'] == 4
+        assert downloader.download_stats['recovered'] == 1
+
+    def test_unpack_failure_recorded(self, downloader, monkeypatch, capsys):
+        """Test a payload that cannot be unpacked is recorded as failed and leaves no files."""
+        memory = make_memory(1, 'Video')
+        broken = FakeResponse(b'PK\x03\x04' + b'\x00' * 64)
+        use_session(downloader, FakeSession({memory['download_url']: broken}), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: [memory])
+
+        downloader.download_all(delay=0, pipeline={'fetch': 1, 'unpack': 1, 'metadata': 1, 'composite': 0})
+
+        assert not downloader.progress_tracker.is_downloaded(memory['sid'])
+        assert downloader.progress_tracker.get_failure_count(memory['sid']) == 1
+        assert not list(downloader.staging_dir.rglob("*.part"))
+        assert "unpack failed" in capsys.readouterr().out
+
+
+class TestCompositeOnDownload:
+    """Test compositing overlays while a ZIP is extracted."""
+
+    OVERLAY_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+    def _run(self, downloader, monkeypatch, memory, payload, composite_on_download=True):
+        use_session(downloader, FakeSession({memory['download_url']: (lambda: FakeResponse(payload))}), monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: [memory])
+        calls = []
+
+        def fake_composite(base, overlay, output_dir, **kwargs):
+            calls.append((base, overlay, kwargs))
+            return True, "Success"
+
+        monkeypatch.setattr('downloader.composite_image', fake_composite)
+        monkeypatch.setattr('downloader.composite_video', fake_composite)
+        downloader.has_pillow = True
+        downloader.has_ffmpeg = True
+        downloader.download_all(delay=0, composite_on_download=composite_on_download)
+        return calls
+
+    def test_image_composited_from_memory(self, downloader, monkeypatch, capsys):
+        """Test an image and its overlay are composited from the extracted bytes and recorded."""
+        memory = make_memory(1)
+        payload = make_zip({'abc-main.jpg': JPEG_BYTES, 'abc-overlay.png': self.OVERLAY_BYTES})
+
+        calls = self._run(downloader, monkeypatch, memory, payload)
+
+        assert len(calls) == 1
+        base, overlay, kwargs = calls[0]
+        assert base.parent.name == "images" and overlay.parent.name == "overlays"
+        assert kwargs['base_data'] == JPEG_BYTES
+        assert kwargs['overlay_data'] == self.OVERLAY_BYTES
+        assert downloader.progress_tracker.is_composited(memory['sid'][:8], 'image')
+        assert (downloader.output_dir / "composited" / "images").is_dir()
+        assert "Composited during download: 1" in capsys.readouterr().out
+
+    def test_video_composited_in_background(self, downloader, monkeypatch):
+        """Test a video composite runs from the stored files and is recorded before download_all returns."""
+        memory = make_memory(2, 'Video')
+        payload = make_zip({'abc-main.mp4': MP4_BYTES, 'abc-overlay.png': self.OVERLAY_BYTES})
+
+        calls = self._run(downloader, monkeypatch, memory, payload)
+
+        assert [call[0].suffix for call in calls] == ['.mp4']
+        assert 'base_data' not in calls[0][2]
+        assert downloader.progress_tracker.is_composited(memory['sid'][:8], 'video')
+
+    def test_off_by_default(self, downloader, monkeypatch):
+        """Test nothing is composited without the option."""
+        memory = make_memory(3)
+        payload = make_zip({'abc-main.jpg': JPEG_BYTES, 'abc-overlay.png': self.OVERLAY_BYTES})
+
+        calls = self._run(downloader, monkeypatch, memory, payload, composite_on_download=False)
+
+        assert calls == []
+        assert not downloader.progress_tracker.is_composited(memory['sid'][:8], 'image')
+
+
+class TestConnectionPool:
+    """Test the shared HTTP connection pool."""
+
+    def test_sessions_share_adapter(self, downloader):
+        """Test worker sessions use the same pooled adapter as the main session."""
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(downloader._get_session()))
+        thread.start()
+        thread.join()
+
+        assert sessions[0] is not downloader.session
+        assert sessions[0].get_adapter('https://example.com') is downloader.http_adapter
+        assert downloader.session.get_adapter('https://example.com') is downloader.http_adapter
+
+    def test_pool_rebuilt_only_when_settings_change(self, downloader, monkeypatch):
+        """Test the pool grows with --jobs and keeps its connections otherwise."""
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: [])
+        adapter = downloader.http_adapter
+
+        downloader.download_all(delay=0, jobs=4)
+        assert downloader.http_adapter is adapter
+
+        downloader.download_all(delay=0, jobs=16, connect_retries=5)
+        assert downloader.http_adapter is not adapter
+        assert downloader.http_adapter.poolmanager.connection_pool_kw['maxsize'] == 16
+        assert downloader.http_adapter.max_retries.connect == 5
+        assert downloader.session.get_adapter('https://example.com') is downloader.http_adapter
+
+    def test_reuse_reported_in_summary(self, downloader, capsys):
+        """Test the summary reports new connections and the reuse ratio."""
+        downloader.http_adapter.stats.record(1)
+        downloader.http_adapter.stats.record(0)
+        downloader.http_adapter.stats.record(0)
+        downloader.http_adapter.stats.record(0)
+
+        downloader._print_download_summary(4, 0, 0, 4, elapsed=1.0)
+
+        assert "Connections: 1 opened for 4 requests (75% reused" in capsys.readouterr().out
+
+
+class TestScheduling:
+    """Test --schedule download order and per-policy statistics."""
+
+    def test_newest_first_order_and_stats(self, downloader, monkeypatch, capsys):
+        """Test downloads follow the policy and the run is recorded for it."""
+        memories = [make_memory(i) for i in (3, 1, 2)]
+        session = FakeSession({m['download_url']: (lambda: FakeResponse(JPEG_BYTES)) for m in memories})
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+
+        downloader.download_all(delay=0, schedule_policy='newest-first')
+
+        expected = sorted(memories, key=lambda m: m['date'], reverse=True)
+        assert session.requests == [m['download_url'] for m in expected]
+        stats = downloader.progress_tracker.get_schedule_stats()['newest-first']
+        assert stats['memories'] == 3
+        assert stats['bytes'] == 3 * len(JPEG_BYTES)
+        assert "newest-first" in capsys.readouterr().out
+
+
+class TestPreflight:
+    """Test the --preflight sizing pass."""
+
+    def _setup(self, downloader, monkeypatch, memories, body=JPEG_BYTES):
+        routes = {m['download_url']: (lambda: FakeResponse(body)) for m in memories}
+        session = FakeSession(routes)
+        use_session(downloader, session, monkeypatch)
+        monkeypatch.setattr('downloader.parse_html_file', lambda _: memories)
+        return session
+
+    def test_preflight_probes_and_shows_eta(self, downloader, monkeypatch, capsys):
+        """Test every pending memory is probed and the progress line shows bytes and ETA."""
+        memories = [make_memory(i) for i in range(5)]
+        session = self._setup(downloader, monkeypatch, memories)
+
+        downloader.download_all(delay=0, preflight=True)
+
+        output = capsys.readouterr().out
+        assert sorted(session.head_requests) == sorted(m['download_url'] for m in memories)
+        assert f"Download size: {format_size(5 * len(JPEG_BYTES))}" in output
+        assert "ETA" in output
+        assert downloader.transfer_progress.done_bytes == 5 * len(JPEG_BYTES)
+        assert all(downloader.progress_tracker.is_downloaded(m['sid']) for m in memories)
+
+    def test_probes_not_paced_like_downloads(self, downloader, monkeypatch):
+        """Test the probes have their own rate controller instead of the download pace."""
+        memories = [make_memory(i) for i in range(6)]
+        self._setup(downloader, monkeypatch, memories)
+        downloader.rate_controller = RateController(max_delay=2.0)
+        monkeypatch.setattr(downloader.rate_controller, 'acquire',
+                            lambda: pytest.fail("probe paced by the download rate controller"))
+
+        start = time.monotonic()
+        assert downloader._run_preflight(list(enumerate(memories, 1)), jobs=1)
+
+        assert time.monotonic() - start < 2.0
+        assert set(downloader._remaining_sizes.values()) == {len(JPEG_BYTES)}
+
+    def test_post_links_resolved_in_batches_before_probing(self, downloader, monkeypatch):
+        """Test POST links are resolved in batches first, and an unresolved one is not resolved by its probe."""
+        memories = [make_post_memory(i) for i in range(RESOLVE_BATCH_SIZE + 2)]
+        unresolvable = memories[-1]
+        session = FakeSession({f"https://cdn.example.com/{m['sid']}.jpg": (lambda: FakeResponse(JPEG_BYTES))
+                               for m in memories})
+        events = []
+
+        def resolve(url, **kwargs):
+            sid = kwargs['data'].split('=')[1]
+            with session._lock:
+                events.append('post')
+            if sid == unresolvable['sid']:
+                return FakeResponse(status_code=404)
+            return FakeResponse(f"https://cdn.example.com/{sid}.jpg".encode())
+
+        original_head = session.head
+
+        def head(url, **kwargs):
+            with session._lock:
+                events.append('head')
+            return original_head(url, **kwargs)
+
+        session.post = resolve
+        session.head = head
+        use_session(downloader, session, monkeypatch)
+        batches = []
+        original_batch = downloader._resolve_batch
+        monkeypatch.setattr(downloader, '_resolve_batch',
+                            lambda batch, *args: (batches.append(len(batch)), original_batch(batch, *args)))
+
+        assert downloader._run_preflight(list(enumerate(memories, 1)), jobs=4)
+
+        assert batches == [RESOLVE_BATCH_SIZE, 2]
+        assert events == ['post'] * len(memories) + ['head'] * (len(memories) - 1)
+        assert downloader._remaining_sizes[unresolvable['sid']] == len(JPEG_BYTES)
+
+    def test_not_enough_space_aborts(self, downloader, monkeypatch, capsys):
+        """Test the run stops before downloading when the disk is too small."""
+        memories = [make_memory(i) for i in range(3)]
+        session = self._setup(downloader, monkeypatch, memories)
+        monkeypatch.setattr('downloader.check_free_space', lambda directory, required: (False, 100))
+
+        downloader.download_all(delay=0, preflight=True)
+
+        assert "Not enough free disk space" in capsys.readouterr().out
+        assert session.requests == []
+
+    def test_preallocated_file_truncated_on_short_body(self, downloader, monkeypatch):
+        """Test preallocated space is trimmed when the body ends early."""
+        memory = make_memory(40, 'Video')
+        response = FakeResponse(MP4_BYTES, headers={
+            'content-type': 'application/octet-stream',
+            'content-length': str(len(MP4_BYTES) * 4)
+        })
+        use_session(downloader, FakeSession({memory['download_url']: response}), monkeypatch)
+
+        from download_errors import TransferInterruptedError
+        with pytest.raises(TransferInterruptedError):
+            downloader._attempt_download(memory, memory['sid'])
+
+        partial = downloader.progress_tracker.get_partial(memory['sid'])
+        assert Path(partial['path']).stat().st_size == len(MP4_BYTES)
+
+
+class TestThreadSafety:
+    """Test that shared trackers survive concurrent use."""
+
+    def test_progress_tracker_concurrent_marks(self, tmp_path):
+        """Test concurrent mark_downloaded/record_failure keep a consistent file."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+
+        def work(n):
+            memory = make_memory(n)
+            if n % 2:
+                tracker.record_failure(memory['sid'], memory, "boom")
+            else:
+                tracker.mark_downloaded(memory['sid'], memory)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(40)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        with open(tmp_path / "progress.json") as f:
+            saved = json.load(f)
+        assert len(saved['downloaded']) == 20
+        assert len(saved['failed']) == 20
+
+    def test_error_logger_concurrent_logs(self, tmp_path):
+        """Test concurrent log_download_error calls are all persisted."""
+        logger = ErrorLogger(str(tmp_path / "errors.json"))
+
+        threads = [
+            threading.Thread(target=logger.log_download_error, args=(f"sid{n}", "url", "boom"))
+            for n in range(30)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        with open(tmp_path / "errors.json") as f:
+            saved = json.load(f)
+        assert len(saved['download_errors']) == 30
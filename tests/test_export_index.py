@@ -0,0 +1,88 @@
+"""
+Unit tests for export_index module.
+"""
+
+import sys
+import json
+from pathlib import Path
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from export_index import ExportIndex, fingerprint_export
+
+
+def memories(*sids):
+    return [{'sid': sid} for sid in sids]
+
+
+class TestFingerprintExport:
+    """Test export fingerprints."""
+
+    def test_same_content_same_fingerprint(self, tmp_path):
+        """Test the fingerprint depends on the contents only."""
+        first, second, other = tmp_path / "a.html", tmp_path / "b.html", tmp_path / "c.html"
+        first.write_text("<html>1</html>")
+        second.write_text("<html>1</html>")
+        other.write_text("<html>2</html>")
+
+        assert fingerprint_export(str(first)) == fingerprint_export(str(second))
+        assert fingerprint_export(str(first)) != fingerprint_export(str(other))
+
+
+class TestExportIndex:
+    """Test the record of imported exports."""
+
+    def test_new_sids(self, tmp_path):
+        """Test only SIDs missing from earlier exports are new."""
+        index = ExportIndex(str(tmp_path / "index.json"))
+        assert index.new_sids(memories('a', 'b')) == {'a', 'b'}
+
+        index.record('fp1', 'old.html', memories('a', 'b'))
+
+        assert index.is_imported('fp1')
+        assert not index.is_imported('fp2')
+        assert index.new_sids(memories('a', 'b', 'c')) == {'c'}
+
+    def test_persisted(self, tmp_path):
+        """Test the index survives a restart."""
+        index_file = tmp_path / "index.json"
+        ExportIndex(str(index_file)).record('fp1', 'old.html', memories('a', 'b'))
+        index = ExportIndex(str(index_file))
+        index.record('fp2', 'new.html', memories('a', 'b', 'c'))
+
+        data = json.loads(index_file.read_text())
+        assert data['sids'] == ['a', 'b', 'c']
+        assert data['exports']['fp1']['new'] == 2
+        assert data['exports']['fp2']['memories'] == 3
+        assert data['exports']['fp2']['new'] == 1
+
+    def test_outstanding_sids_stay_new(self, tmp_path):
+        """Test an export with SIDs still to download is not recorded as imported."""
+        index = ExportIndex(str(tmp_path / "index.json"))
+        index.record('fp1', 'export.html', memories('a', 'b'), outstanding={'b'})
+
+        assert not index.is_imported('fp1')
+        assert index.new_sids(memories('a', 'b')) == {'b'}
+        index.record('fp1', 'export.html', memories('a', 'b'))
+        assert index.is_imported('fp1')
+
+    def test_concurrent_saves_merged(self, tmp_path):
+        """Test two processes sharing the index keep each other's exports and SIDs."""
+        index_file = tmp_path / "index.json"
+        first, second = ExportIndex(str(index_file)), ExportIndex(str(index_file))
+
+        first.record('fp1', 'one.html', memories('a'))
+        second.record('fp2', 'two.html', memories('b'))
+
+        data = json.loads(index_file.read_text())
+        assert data['sids'] == ['a', 'b']
+        assert set(data['exports']) == {'fp1', 'fp2'}
+
+    def test_broken_index_file(self, tmp_path, capsys):
+        """Test a corrupt index is rebuilt with a warning."""
+        index_file = tmp_path / "index.json"
+        index_file.write_text("{broken")
+
+        assert ExportIndex(str(index_file)).sids == set()
+        assert "Could not load export index" in capsys.readouterr().out
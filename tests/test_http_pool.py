@@ -0,0 +1,131 @@
+"""
+Unit tests for http_pool module.
+"""
+
+import sys
+import socket
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+import pytest
+import requests
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from http_pool import PooledHTTPAdapter, ConnectionStats, connect_retry
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    """Serve a small body over HTTP/1.1 keep-alive on localhost."""
+    server = HTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def make_session(adapter):
+    session = requests.Session()
+    session.mount('http://', adapter)
+    return session
+
+
+class TestConnectionStats:
+    """Test request and connection counters."""
+
+    def test_empty_ratio(self):
+        """Test the reuse ratio is 0 before any request."""
+        assert ConnectionStats().reuse_ratio == 0.0
+
+    def test_reuse_ratio(self):
+        """Test requests without a new connection count as reused."""
+        stats = ConnectionStats()
+        stats.record(1)
+        stats.record(0)
+        stats.record(0)
+        stats.record(2)
+
+        assert stats.requests == 4
+        assert stats.new_connections == 3
+        assert stats.reused == 2
+        assert stats.reuse_ratio == 0.5
+
+
+class TestConnectRetry:
+    """Test the urllib3 retry policy."""
+
+    def test_only_connection_failures_retried(self):
+        """Test read errors and HTTP statuses are left to the downloader."""
+        retry = connect_retry(3, 0.25)
+        assert retry.total == 3
+        assert retry.connect == 3
+        assert retry.read is False
+        assert retry.status == 0
+        assert retry.backoff_factor == 0.25
+
+    def test_refused_connection_retried(self):
+        """Test a refused connection is attempted 1 + retries times."""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        adapter = PooledHTTPAdapter(connect_retries=2, retry_backoff=0)
+
+        with pytest.raises(requests.ConnectionError):
+            make_session(adapter).get(f"http://127.0.0.1:{port}/", timeout=5)
+
+        assert adapter.stats.requests == 1
+        assert adapter.stats.new_connections == 3
+
+
+class TestPooledHTTPAdapter:
+    """Test pool configuration and connection reuse."""
+
+    def test_pool_settings_applied(self):
+        """Test the pool sizes reach urllib3."""
+        adapter = PooledHTTPAdapter(pool_connections=3, pool_maxsize=16)
+        assert adapter._pool_connections == 3
+        assert adapter.poolmanager.connection_pool_kw['maxsize'] == 16
+
+    def test_keep_alive_reused(self, local_server):
+        """Test sequential requests reuse one connection."""
+        adapter = PooledHTTPAdapter()
+        session = make_session(adapter)
+
+        for _ in range(5):
+            session.get(local_server).content
+
+        assert adapter.stats.requests == 5
+        assert adapter.stats.new_connections == 1
+        assert adapter.stats.reuse_ratio == 0.8
+
+    def test_pool_shared_across_sessions(self, local_server):
+        """Test a connection opened by one thread's session is reused by another's."""
+        adapter = PooledHTTPAdapter()
+        make_session(adapter).get(local_server).content
+
+        def worker():
+            make_session(adapter).get(local_server).content
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        assert adapter.stats.requests == 2
+        assert adapter.stats.new_connections == 1
@@ -0,0 +1,63 @@
+"""
+Unit tests for json_store module.
+"""
+
+import sys
+import json
+from pathlib import Path
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from json_store import read_json_object, write_json_atomic, merge_entries
+
+
+class TestReadWrite:
+    """Test reading and atomically writing JSON objects."""
+
+    def test_round_trip_leaves_no_temp_file(self, tmp_path):
+        """Test a written object reads back and only the target file remains."""
+        path = tmp_path / "index.json"
+        write_json_atomic(str(path), {'a': 1})
+        write_json_atomic(str(path), {'b': 2})
+
+        assert read_json_object(str(path)) == {'b': 2}
+        assert [p.name for p in tmp_path.iterdir()] == ["index.json"]
+
+    def test_failed_write_keeps_old_file(self, tmp_path):
+        """Test an object that cannot be serialized leaves the previous file intact."""
+        path = tmp_path / "index.json"
+        write_json_atomic(str(path), {'a': 1})
+
+        with pytest.raises(TypeError):
+            write_json_atomic(str(path), {'a': object()})
+
+        assert json.loads(path.read_text()) == {'a': 1}
+        assert [p.name for p in tmp_path.iterdir()] == ["index.json"]
+
+    @pytest.mark.parametrize("content", [None, "{trunc", "[1, 2]"])
+    def test_unreadable_file(self, tmp_path, content):
+        """Test missing, truncated and non-object files read as None."""
+        path = tmp_path / "index.json"
+        if content is not None:
+            path.write_text(content)
+
+        assert read_json_object(str(path)) is None
+
+
+class TestMergeEntries:
+    """Test merging this process's changes into the saved entries."""
+
+    def test_changes_applied_to_saved_entries(self):
+        """Test other processes' entries are kept, and own additions and removals win."""
+        saved = {'theirs': 1, 'shared': 1, 'removed': 1}
+        entries = {'shared': 2, 'mine': 2, 'stale': 1}
+
+        merged = merge_entries(saved, entries, {'shared', 'mine', 'removed'})
+
+        assert merged == {'theirs': 1, 'shared': 2, 'mine': 2}
+
+    def test_unreadable_file_keeps_own_entries(self):
+        """Test a broken saved file does not wipe this process's entries."""
+        assert merge_entries(None, {'mine': 1}, set()) == {'mine': 1}
@@ -0,0 +1,100 @@
+"""
+Unit tests for memory_filter module.
+"""
+
+import sys
+from datetime import date
+from pathlib import Path
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from memory_filter import MemoryFilter, parse_date, load_sids
+from sharding import Shard
+
+
+def memory(sid, day, media_type='Image'):
+    return {'sid': sid, 'date': f"{day} 14:30:00 UTC", 'media_type': media_type}
+
+
+MEMORIES = [
+    memory('aaaaaaaa-1111', '2024-05-31'),
+    memory('bbbbbbbb-2222', '2024-06-01', 'Video'),
+    memory('cccccccc-3333', '2024-08-31', 'Image'),
+    memory('dddddddd-4444', '2024-09-01', 'Video'),
+]
+
+
+def sids(memories):
+    return [m['sid'][:8] for m in memories]
+
+
+class TestParsing:
+    """Test command-line value parsing."""
+
+    def test_parse_date(self):
+        """Test YYYY-MM-DD dates are parsed and others rejected."""
+        assert parse_date('2024-06-01') == date(2024, 6, 1)
+        with pytest.raises(ValueError):
+            parse_date('06/01/2024')
+
+    def test_load_sids(self, tmp_path):
+        """Test one SID per line with blank lines and comments ignored."""
+        sids_file = tmp_path / "sids.txt"
+        sids_file.write_text("# asked by support\nAAAAAAAA-1111\n\n  bbbbbbbb  \n")
+
+        assert load_sids(str(sids_file)) == {'aaaaaaaa-1111', 'bbbbbbbb'}
+
+
+class TestMemoryFilter:
+    """Test selecting memories."""
+
+    def test_empty_filter_matches_all(self):
+        """Test an empty filter returns the list unchanged."""
+        memory_filter = MemoryFilter()
+        assert not memory_filter.active
+        assert memory_filter.apply(MEMORIES) is MEMORIES
+        assert memory_filter.describe() == "all memories"
+
+    def test_date_range_inclusive(self):
+        """Test --since and --until include both boundary days."""
+        memory_filter = MemoryFilter(since=date(2024, 6, 1), until=date(2024, 8, 31))
+        assert sids(memory_filter.apply(MEMORIES)) == ['bbbbbbbb', 'cccccccc']
+
+    def test_media_type(self):
+        """Test media types are compared case-insensitively."""
+        memory_filter = MemoryFilter(media_types=['video'])
+        assert sids(memory_filter.apply(MEMORIES)) == ['bbbbbbbb', 'dddddddd']
+
+    def test_sid_list_full_and_prefix(self):
+        """Test full SIDs and filename prefixes both select a memory."""
+        memory_filter = MemoryFilter(sids={'aaaaaaaa-1111', 'cccccccc'})
+        assert sids(memory_filter.apply(MEMORIES)) == ['aaaaaaaa', 'cccccccc']
+
+    def test_empty_sid_list_selects_nothing(self):
+        """Test an empty SID file is a filter, not 'everything'."""
+        memory_filter = MemoryFilter(sids=set())
+        assert memory_filter.active
+        assert memory_filter.apply(MEMORIES) == []
+
+    def test_criteria_combined(self):
+        """Test all criteria must match."""
+        memory_filter = MemoryFilter(since=date(2024, 6, 1), media_types=['image'])
+        assert sids(memory_filter.apply(MEMORIES)) == ['cccccccc']
+        assert memory_filter.describe() == "since 2024-06-01, images only"
+
+    def test_shard(self):
+        """Test a shard selects exactly its own SIDs."""
+        shards = [MemoryFilter(shard=Shard(index, 2)) for index in (1, 2)]
+        selected = [sids(memory_filter.apply(MEMORIES)) for memory_filter in shards]
+
+        assert sorted(selected[0] + selected[1]) == sids(MEMORIES)
+        assert shards[0].describe() == "shard 1/2"
+
+    def test_short_sids_from_progress(self):
+        """Test progress entries are mapped to the SID prefixes used in filenames."""
+        entries = {m['sid']: {'date': m['date'], 'media_type': m['media_type']} for m in MEMORIES}
+
+        assert MemoryFilter().short_sids(entries) is None
+        assert MemoryFilter(media_types=['video']).short_sids(entries) == {'bbbbbbbb', 'dddddddd'}
@@ -0,0 +1,99 @@
+"""
+Unit tests for pipeline module.
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from pipeline import Pipeline, Stage, parse_stage_workers, DEFAULT_STAGE_WORKERS
+
+
+class TestParseStageWorkers:
+    """Test --pipeline worker counts."""
+
+    def test_defaults(self):
+        """Test an empty value keeps every default."""
+        assert parse_stage_workers('') == DEFAULT_STAGE_WORKERS
+
+    def test_override_some_stages(self):
+        """Test mentioned stages are changed and the others keep their defaults."""
+        workers = parse_stage_workers('fetch=6, Metadata=3,composite=0')
+
+        assert workers == dict(DEFAULT_STAGE_WORKERS, fetch=6, metadata=3, composite=0)
+
+    @pytest.mark.parametrize("value", ['download=2', 'fetch', 'fetch=x', 'fetch=-1', 'unpack=0'])
+    def test_invalid(self, value):
+        """Test unknown stages, bad counts and required stages without workers are rejected."""
+        with pytest.raises(ValueError):
+            parse_stage_workers(value)
+
+
+class TestPipeline:
+    """Test running items through stages."""
+
+    def test_every_item_reaches_the_last_stage(self):
+        """Test stages may emit several or no items and all of them are processed."""
+        seen = []
+        lock = threading.Lock()
+
+        def collect(item):
+            with lock:
+                seen.append(item)
+
+        pipeline = Pipeline([
+            Stage('split', lambda n: [n, n + 100], workers=3, queue_size=2),
+            Stage('drop_odd', lambda n: [n] if n % 2 == 0 else [], workers=2, queue_size=2),
+            Stage('collect', collect, workers=2, queue_size=2),
+        ])
+        pipeline.run(range(20))
+
+        assert sorted(seen) == sorted(n for i in range(20) for n in (i, i + 100) if n % 2 == 0)
+        assert [stage.items for stage in pipeline.stages] == [20, 40, 20]
+
+    def test_stage_error_drops_item(self, capsys):
+        """Test an exception in a stage is counted and the other items go on."""
+        def fail_on_three(n):
+            if n == 3:
+                raise ValueError("bad item")
+            return [n]
+
+        seen = []
+        pipeline = Pipeline([Stage('check', fail_on_three, workers=2), Stage('collect', seen.append)])
+        pipeline.run(range(6))
+
+        assert sorted(seen) == [0, 1, 2, 4, 5]
+        assert pipeline.stages[0].errors == 1
+        assert "check stage error: bad item" in capsys.readouterr().out
+
+    def test_backpressure_bounds_queue(self):
+        """Test a slow stage blocks the fast one in front of it instead of letting items pile up."""
+        pipeline = Pipeline([
+            Stage('fast', lambda n: [n], workers=1, queue_size=2),
+            Stage('slow', lambda n: time.sleep(0.02), workers=1, queue_size=2),
+        ])
+        pipeline.run(range(15))
+
+        fast, slow = pipeline.stages
+        assert slow.peak_queue <= 2
+        assert fast.utilisation(pipeline.elapsed)['blocked'] > 0.5
+        assert slow.utilisation(pipeline.elapsed)['busy'] > 0.5
+        assert pipeline.bottleneck() is slow
+
+    def test_report(self, capsys):
+        """Test the report lists every stage and names the busiest one."""
+        pipeline = Pipeline([
+            Stage('fetch', lambda n: [n], workers=2),
+            Stage('metadata', lambda n: time.sleep(0.01), workers=1),
+        ])
+        pipeline.run(range(5))
+        pipeline.print_report()
+
+        out = capsys.readouterr().out
+        assert "fetch" in out and "metadata" in out
+        assert "Busiest stage: metadata" in out
@@ -0,0 +1,151 @@
+"""
+Unit tests for preflight module.
+"""
+
+import sys
+import os
+from collections import namedtuple
+from pathlib import Path
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from preflight import (
+    probe_size,
+    estimate_sizes,
+    check_free_space,
+    preallocate,
+    format_duration,
+    TransferProgress
+)
+from download_errors import RateLimitedError
+
+
+class ProbeResponse:
+    """Minimal response for size probes."""
+
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ProbeSession:
+    """Fake session answering HEAD and GET with canned responses."""
+
+    def __init__(self, head_response, get_response=None):
+        self.head_response = head_response
+        self.get_response = get_response
+        self.get_headers = None
+
+    def head(self, url, **kwargs):
+        return self.head_response
+
+    def get(self, url, **kwargs):
+        self.get_headers = kwargs.get('headers')
+        return self.get_response
+
+
+class TestProbeSize:
+    """Test HEAD / Range size probes."""
+
+    def test_head_content_length(self):
+        """Test the size comes from Content-Length of a HEAD response."""
+        session = ProbeSession(ProbeResponse(headers={'content-length': '1234'}))
+        assert probe_size(session, "https://example.com/a") == 1234
+        assert session.get_headers is None
+
+    def test_range_fallback(self):
+        """Test a one-byte Range GET is used when HEAD gives no length."""
+        get_response = ProbeResponse(206, {'content-range': 'bytes 0-0/98765'})
+        session = ProbeSession(ProbeResponse(405), get_response)
+
+        assert probe_size(session, "https://example.com/a") == 98765
+        assert session.get_headers == {'Range': 'bytes=0-0'}
+        assert get_response.closed
+
+    def test_unknown_size(self):
+        """Test None when neither probe reveals the size."""
+        session = ProbeSession(ProbeResponse(405), ProbeResponse(200))
+        assert probe_size(session, "https://example.com/a") is None
+
+    def test_rate_limited(self):
+        """Test a 429 probe raises RateLimitedError with Retry-After."""
+        session = ProbeSession(ProbeResponse(429, {'retry-after': '3'}))
+        with pytest.raises(RateLimitedError) as exc_info:
+            probe_size(session, "https://example.com/a")
+        assert exc_info.value.retry_after == 3.0
+
+
+class TestEstimateSizes:
+    """Test filling in unknown sizes."""
+
+    def test_unknown_uses_same_media_type_average(self):
+        """Test a failed probe gets the average of its media type."""
+        memories = [
+            {'sid': 'a', 'media_type': 'Video'},
+            {'sid': 'b', 'media_type': 'Video'},
+            {'sid': 'c', 'media_type': 'Image'},
+            {'sid': 'd', 'media_type': 'Video'},
+        ]
+        sizes = estimate_sizes(memories, {'a': 100, 'b': 300, 'c': 10, 'd': None})
+        assert sizes == {'a': 100, 'b': 300, 'c': 10, 'd': 200}
+
+    def test_unknown_type_uses_overall_average(self):
+        """Test a media type with no known sizes falls back to the overall average."""
+        memories = [{'sid': 'a', 'media_type': 'Image'}, {'sid': 'b', 'media_type': 'Video'}]
+        assert estimate_sizes(memories, {'a': 50, 'b': None}) == {'a': 50, 'b': 50}
+
+
+class TestFreeSpace:
+    """Test the free-space check."""
+
+    def test_margin_applied(self, tmp_path, monkeypatch):
+        """Test the required size includes the safety margin."""
+        Usage = namedtuple('Usage', 'total used free')
+        monkeypatch.setattr('preflight.shutil.disk_usage', lambda path: Usage(0, 0, 1000))
+
+        assert check_free_space(tmp_path, 900) == (True, 1000)
+        assert check_free_space(tmp_path, 990) == (False, 1000)
+
+
+class TestPreallocate:
+    """Test disk space preallocation."""
+
+    @pytest.mark.skipif(not hasattr(os, 'posix_fallocate'), reason="posix_fallocate not available")
+    def test_file_grows_to_size(self, tmp_path):
+        """Test the file is extended to the expected size."""
+        with open(tmp_path / "f", 'wb') as f:
+            assert preallocate(f, 4096)
+        assert (tmp_path / "f").stat().st_size == 4096
+
+    def test_unknown_size_skipped(self, tmp_path):
+        """Test nothing is reserved for an empty or unknown size."""
+        with open(tmp_path / "f", 'wb') as f:
+            assert not preallocate(f, 0)
+
+
+class TestTransferProgress:
+    """Test byte-based ETA."""
+
+    def test_format_duration(self):
+        """Test short duration formatting."""
+        assert format_duration(42) == "42s"
+        assert format_duration(200) == "3m 20s"
+        assert format_duration(3900) == "1h 05m"
+
+    def test_eta_from_byte_rate(self, monkeypatch):
+        """Test the ETA scales with remaining bytes, not remaining items."""
+        clock = [100.0]
+        monkeypatch.setattr('preflight.time.monotonic', lambda: clock[0])
+        progress = TransferProgress(total_bytes=1000)
+        assert progress.eta() is None
+
+        clock[0] += 10
+        progress.record(250)
+
+        assert progress.eta() == pytest.approx(30.0)
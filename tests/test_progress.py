@@ -8,11 +8,13 @@ import os
 from pathlib import Path
 from datetime import datetime
 import pytest
+import requests
 
 # Add scripts directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
 
 from progress import ProgressTracker
+from download_errors import ErrorPageError, LinkExpiredError
 
 
 class TestProgressTrackerInit:
@@ -152,6 +154,47 @@ class TestDownloadTracking:
         assert tracker.progress['failed']['sid123']['errors'][0]['error_type'] == 'ValueError'
 
 
+class TestPartialTracking:
+    """Test tracking of resumable partial downloads."""
+
+    def test_record_and_get_partial(self, tmp_path):
+        """Test recording a partial download persists it."""
+        progress_file = str(tmp_path / "progress.json")
+        tracker = ProgressTracker(progress_file)
+
+        tracker.record_partial('sid123', {'path': 'videos/.sid123.part', 'media_type': 'video',
+                                          'ext': 'mp4', 'etag': '"abc"', 'size': 1000})
+
+        reloaded = ProgressTracker(progress_file)
+        partial = reloaded.get_partial('sid123')
+        assert partial['etag'] == '"abc"'
+        assert partial['size'] == 1000
+        assert 'timestamp' in partial
+
+    def test_clear_partial(self, tmp_path):
+        """Test clearing a partial download."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        tracker.record_partial('sid123', {'path': 'x', 'media_type': 'image', 'ext': 'jpg'})
+
+        tracker.clear_partial('sid123')
+
+        assert tracker.get_partial('sid123') is None
+
+    def test_mark_downloaded_clears_partial(self, tmp_path):
+        """Test a finished download forgets its partial file."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        tracker.record_partial('sid123', {'path': 'x', 'media_type': 'image', 'ext': 'jpg'})
+
+        tracker.mark_downloaded('sid123', {'date': '2023-01-15 14:30:00 UTC', 'media_type': 'Image'})
+
+        assert tracker.get_partial('sid123') is None
+
+    def test_get_partial_old_progress_file(self, tmp_path):
+        """Test progress files without a partial section still work."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        assert tracker.get_partial('sid123') is None
+
+
 class TestCompositeTracking:
     """Test composite tracking functionality."""
 
@@ -384,6 +427,57 @@ class TestSaveProgress:
         # Verify main file exists
         assert progress_file.exists()
 
+    def test_failed_save_keeps_previous_file(self, tmp_path, monkeypatch):
+        """Test a save that breaks off leaves the last complete progress file."""
+        progress_file = tmp_path / "progress.json"
+        tracker = ProgressTracker(str(progress_file))
+        tracker.mark_downloaded('sid1', {'date': '2023-01-15 14:30:00 UTC', 'media_type': 'Image'})
+
+        def interrupted(*args, **kwargs):
+            raise KeyboardInterrupt
+
+        monkeypatch.setattr('json_store.json.dump', interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            tracker.mark_downloaded('sid2', {'date': '2023-01-16 10:20:00 UTC', 'media_type': 'Image'})
+
+        assert list(json.loads(progress_file.read_text())['downloaded']) == ['sid1']
+        assert [p.name for p in tmp_path.iterdir()] == ["progress.json"]
+
+    def test_batched_saves(self, tmp_path, monkeypatch):
+        """Test changes inside batched_saves() are written in batches and when the block ends."""
+        monkeypatch.setattr('progress.PROGRESS_SAVE_INTERVAL', 3)
+        progress_file = tmp_path / "progress.json"
+        tracker = ProgressTracker(str(progress_file))
+        memory = {'date': '2023-01-15 14:30:00 UTC', 'media_type': 'Image'}
+
+        def saved():
+            return set(json.loads(progress_file.read_text())['downloaded']) if progress_file.exists() else set()
+
+        with tracker.batched_saves():
+            tracker.mark_downloaded('sid1', memory)
+            tracker.mark_downloaded('sid2', memory)
+            assert saved() == set()
+            tracker.mark_downloaded('sid3', memory)
+            assert saved() == {'sid1', 'sid2', 'sid3'}
+            tracker.mark_downloaded('sid4', memory)
+            assert len(saved()) == 3
+        assert len(saved()) == 4
+
+        tracker.mark_downloaded('sid5', memory)
+        assert len(saved()) == 5
+
+    def test_batched_saves_flushed_on_interrupt(self, tmp_path):
+        """Test changes of an interrupted run are saved."""
+        progress_file = tmp_path / "progress.json"
+        tracker = ProgressTracker(str(progress_file))
+
+        with pytest.raises(KeyboardInterrupt):
+            with tracker.batched_saves():
+                tracker.mark_downloaded('sid1', {'date': '2023-01-15 14:30:00 UTC', 'media_type': 'Image'})
+                raise KeyboardInterrupt
+
+        assert 'sid1' in json.loads(progress_file.read_text())['downloaded']
+
     def test_save_progress_valid_json(self, tmp_path):
         """Test that saved file is valid JSON."""
         progress_file = tmp_path / "progress.json"
@@ -436,3 +530,70 @@ class TestProgressTrackerEdgeCases:
         tracker = ProgressTracker(str(tmp_path / "progress.json"))
 
         assert tracker.is_timezone_converted('nonexistent') is False
+
+
+class TestScheduleStats:
+    """Test per-policy throughput totals."""
+
+    def test_runs_accumulate_per_policy(self, tmp_path):
+        """Test runs of the same policy add up and persist."""
+        progress_file = str(tmp_path / "progress.json")
+        tracker = ProgressTracker(progress_file)
+
+        tracker.record_schedule_run('newest-first', 10, 5000, 4.0)
+        tracker.record_schedule_run('newest-first', 5, 1000, 2.0)
+        tracker.record_schedule_run('html', 3, 300, 1.0)
+
+        stats = ProgressTracker(progress_file).get_schedule_stats()
+        assert stats['newest-first'] == {'runs': 2, 'memories': 15, 'bytes': 6000, 'seconds': 6.0}
+        assert stats['html']['runs'] == 1
+
+
+class TestRefreshedLinks:
+    """Test links imported from a newer export."""
+
+    MEMORY = {'date': '2023-01-15 14:30:00 UTC', 'media_type': 'Image',
+              'download_url': 'https://example.com/old?sid=sid1'}
+
+    def test_set_and_get_link(self, tmp_path):
+        """Test a refreshed link persists and updates the failed entry's URL."""
+        progress_file = str(tmp_path / "progress.json")
+        tracker = ProgressTracker(progress_file)
+        tracker.record_failure('sid1', self.MEMORY, "403 Client Error: Forbidden")
+
+        tracker.set_link('sid1', dict(self.MEMORY, download_url='https://example.com/new?sid=sid1',
+                                      is_get_request=False))
+
+        link = ProgressTracker(progress_file).get_link('sid1')
+        assert link['download_url'] == 'https://example.com/new?sid=sid1'
+        assert link['is_get_request'] is False
+        assert tracker.progress['failed']['sid1']['url'] == 'https://example.com/new?sid=sid1'
+        assert tracker.get_link('other') is None
+
+    def test_clear_link_failures(self, tmp_path):
+        """Test only expired-link failures are removed from the counters."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        tracker.record_failure('sid1', self.MEMORY, "403 Client Error: Forbidden for url",
+                               requests.HTTPError("403"), 'permanent')
+        tracker.record_failure('sid1', self.MEMORY, "Received HTML error page",
+                               ErrorPageError("html"), 'throttled')
+        tracker.record_failure('sid1', self.MEMORY, "Read timed out",
+                               requests.Timeout("timeout"), 'transient')
+
+        assert tracker.clear_link_failures('sid1') == 2
+
+        assert tracker.get_failure_count('sid1') == 1
+        assert tracker.get_failure_count('sid1', 'permanent') == 0
+        assert tracker.get_failure_count('sid1', 'throttled') == 0
+        assert tracker.get_failure_count('sid1', 'transient') == 1
+        assert tracker.clear_link_failures('sid1') == 0
+        assert tracker.clear_link_failures('unknown') == 0
+
+    def test_entry_removed_when_all_failures_cleared(self, tmp_path):
+        """Test a memory that only failed on its old link has no failure entry left."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        tracker.record_failure('sid1', self.MEMORY, "Download link expired (HTTP 410)",
+                               LinkExpiredError("expired", 410), 'transient')
+
+        assert tracker.clear_link_failures('sid1') == 1
+        assert 'sid1' not in tracker.progress['failed']
@@ -0,0 +1,123 @@
+"""
+Unit tests for rate_limiter module.
+"""
+
+import sys
+import time
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from rate_limiter import RateController, TokenBucket, parse_retry_after
+
+
+class TestParseRetryAfter:
+    """Test Retry-After header parsing."""
+
+    def test_seconds(self):
+        """Test delay-seconds form."""
+        assert parse_retry_after("7") == 7.0
+
+    def test_http_date(self):
+        """Test HTTP-date form."""
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+        wait = parse_retry_after(format_datetime(retry_at, usegmt=True))
+        assert 25 <= wait <= 31
+
+    def test_past_date_is_zero(self):
+        """Test a date in the past means no wait."""
+        retry_at = datetime.now(timezone.utc) - timedelta(seconds=30)
+        assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == 0.0
+
+    @pytest.mark.parametrize("value", [None, "", "soon"])
+    def test_missing_or_invalid(self, value):
+        """Test missing or garbage headers return None."""
+        assert parse_retry_after(value) is None
+
+
+class TestRateController:
+    """Test the AIMD rate controller."""
+
+    def test_starts_at_max_delay(self):
+        """Test the initial rate matches the --delay upper bound."""
+        controller = RateController(max_delay=2.0, max_rate=5.0)
+        assert controller.current_rate == pytest.approx(0.5)
+
+    def test_additive_increase_capped(self):
+        """Test healthy responses raise the rate up to max_rate."""
+        controller = RateController(max_delay=1.0, max_rate=1.5, increase_step=0.2)
+        controller.on_success()
+        assert controller.current_rate == pytest.approx(1.2)
+        for _ in range(10):
+            controller.on_success()
+        assert controller.current_rate == pytest.approx(1.5)
+
+    def test_multiplicative_decrease_floored(self):
+        """Test backoff halves the rate but never drops below 1/max_delay."""
+        controller = RateController(max_delay=1.0, max_rate=8.0)
+        controller.rate = 8.0
+        controller.on_backoff()
+        assert controller.current_rate == pytest.approx(4.0)
+        for _ in range(10):
+            controller.on_backoff()
+        assert controller.current_rate == pytest.approx(1.0)
+        assert controller.backoff_count == 11
+
+    def test_acquire_paces_requests(self):
+        """Test consecutive acquires are spaced by 1/rate."""
+        controller = RateController(max_delay=0.05, max_rate=20.0)
+        start = time.monotonic()
+        for _ in range(3):
+            controller.acquire()
+        assert time.monotonic() - start >= 0.09
+
+    def test_retry_after_pauses_even_when_unlimited(self):
+        """Test Retry-After is honored with pacing disabled."""
+        controller = RateController(max_delay=0)
+        controller.acquire()
+        controller.on_backoff(retry_after=0.1)
+        start = time.monotonic()
+        controller.acquire()
+        assert time.monotonic() - start >= 0.09
+
+
+class TestTokenBucket:
+    """Test the bandwidth token bucket."""
+
+    def test_burst_passes_without_waiting(self):
+        """Test a full bucket lets the burst through immediately."""
+        bucket = TokenBucket(rate=1000, burst=5000)
+        start = time.monotonic()
+        bucket.consume(5000)
+        assert time.monotonic() - start < 0.05
+
+    def test_sustained_rate_enforced(self):
+        """Test bytes beyond the burst are paced at the sustained rate."""
+        bucket = TokenBucket(rate=10_000, burst=1000)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.consume(1000)
+        # 1000 bytes from the bucket, 3000 at 10 kB/s
+        assert time.monotonic() - start >= 0.28
+
+    def test_shared_across_threads(self):
+        """Test concurrent transfers share one budget."""
+        bucket = TokenBucket(rate=20_000, burst=1000)
+
+        def transfer():
+            for _ in range(5):
+                bucket.consume(500)
+
+        threads = [threading.Thread(target=transfer) for _ in range(4)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 10 000 bytes total, 1000 from the bucket, 9000 at 20 kB/s
+        assert time.monotonic() - start >= 0.43
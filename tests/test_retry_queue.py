@@ -0,0 +1,152 @@
+"""
+Unit tests for retry_queue module.
+"""
+
+import sys
+import time
+import zipfile
+from pathlib import Path
+import pytest
+import requests
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from retry_queue import (
+    classify_failure,
+    budget_exhausted,
+    DeferredQueue,
+    PERMANENT,
+    TRANSIENT,
+    THROTTLED
+)
+from download_errors import (RateLimitedError, ServerError, TransferInterruptedError, ErrorPageError,
+                             LinkExpiredError, OversizedBodyError, DiskFullError, is_disk_full)
+from progress import ProgressTracker
+
+
+def http_error(status_code: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f"{status_code} Error", response=response)
+
+
+def item(sid: str):
+    return (1, {'sid': sid, 'download_url': f'https://example.com/{sid}', 'date': '', 'media_type': 'Image'})
+
+
+class TestClassifyFailure:
+    """Test sorting failures into classes."""
+
+    @pytest.mark.parametrize("error,expected", [
+        (RateLimitedError("429"), THROTTLED),
+        (ErrorPageError("html"), THROTTLED),
+        (ServerError("503", 503), THROTTLED),
+        (ServerError("502", 502), TRANSIENT),
+        (TransferInterruptedError("cut"), TRANSIENT),
+        (requests.ConnectionError("dns"), TRANSIENT),
+        (requests.Timeout("slow"), TRANSIENT),
+        (ConnectionError("reset"), TRANSIENT),
+        (zipfile.BadZipFile("truncated"), TRANSIENT),
+        (http_error(404), PERMANENT),
+        (http_error(403), TRANSIENT),
+        (http_error(410), TRANSIENT),
+        (http_error(401), PERMANENT),
+        (LinkExpiredError("expired", 403), TRANSIENT),
+        (http_error(408), TRANSIENT),
+        (ValueError("not a ZIP or recognized media"), PERMANENT),
+        (OversizedBodyError("more bytes than Content-Length"), TRANSIENT),
+        (OSError(28, "No space left on device"), TRANSIENT),
+        (PermissionError(13, "The process cannot access the file"), TRANSIENT),
+        (OSError(16, "Device or resource busy"), TRANSIENT),
+    ])
+    def test_classes(self, error, expected):
+        """Test each kind of failure gets the expected class."""
+        assert classify_failure(error) == expected
+
+    def test_disk_full_detected(self):
+        """Test ENOSPC and EDQUOT are recognized, also as the cause of another error."""
+        import errno
+
+        wrapped = ValueError("could not store file")
+        wrapped.__cause__ = OSError(errno.ENOSPC, "No space left on device")
+
+        assert is_disk_full(OSError(errno.ENOSPC, "No space left on device"))
+        assert is_disk_full(OSError(getattr(errno, 'EDQUOT', errno.ENOSPC), "Disk quota exceeded"))
+        assert is_disk_full(DiskFullError("full"))
+        assert is_disk_full(wrapped)
+        assert not is_disk_full(PermissionError(errno.EACCES, "Permission denied"))
+        assert not is_disk_full(None)
+
+
+class TestBudgetExhausted:
+    """Test per-class retry budgets."""
+
+    def test_per_class_budget(self, tmp_path):
+        """Test a class is exhausted only by its own failures."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        sid, memory = item('a')[1]['sid'], item('a')[1]
+
+        for _ in range(4):
+            tracker.record_failure(sid, memory, "timeout", failure_class=TRANSIENT)
+        assert budget_exhausted(tracker, sid) is None
+
+        tracker.record_failure(sid, memory, "404", failure_class=PERMANENT)
+        assert budget_exhausted(tracker, sid) == PERMANENT
+
+    def test_custom_budgets(self, tmp_path):
+        """Test budgets can be overridden."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        memory = item('a')[1]
+        tracker.record_failure('a', memory, "429", failure_class=THROTTLED)
+        assert budget_exhausted(tracker, 'a', {THROTTLED: 1}) == THROTTLED
+
+    def test_legacy_failures_count_as_transient(self, tmp_path):
+        """Test failures recorded before classes existed keep the old 5-attempt cutoff."""
+        tracker = ProgressTracker(str(tmp_path / "progress.json"))
+        memory = item('a')[1]
+        for _ in range(5):
+            tracker.record_failure('a', memory, "old error")
+        assert budget_exhausted(tracker, 'a') == TRANSIENT
+
+
+class TestDeferredQueue:
+    """Test the cool-down queue."""
+
+    def test_cooldown_doubles_per_deferral(self):
+        """Test repeated deferrals of one memory back off exponentially."""
+        queue = DeferredQueue({TRANSIENT: 2.0})
+        assert queue.defer(item('a'), TRANSIENT) == 2.0
+        assert queue.defer(item('a'), TRANSIENT) == 4.0
+        assert queue.deferrals('a') == 2
+
+    def test_retry_after_extends_cooldown(self):
+        """Test the server's Retry-After wins over a shorter cool-down."""
+        queue = DeferredQueue({THROTTLED: 1.0})
+        assert queue.defer(item('a'), THROTTLED, retry_after=10.0) == 10.0
+
+    def test_cooldown_capped(self):
+        """Test cool-downs never exceed max_cooldown."""
+        queue = DeferredQueue({THROTTLED: 100.0}, max_cooldown=150.0)
+        queue.defer(item('a'), THROTTLED)
+        assert queue.defer(item('a'), THROTTLED) == 150.0
+
+    def test_pop_ready_respects_cooldown(self):
+        """Test memories only come out after their cool-down, earliest first."""
+        queue = DeferredQueue()
+        queue.defer(item('slow'), THROTTLED, delay=0.2)
+        queue.defer(item('fast'), TRANSIENT, delay=0.05)
+
+        assert queue.pop_ready() is None
+        assert 0 < queue.time_until_ready() <= 0.05
+
+        queue.wait()
+        assert queue.pop_ready()[1]['sid'] == 'fast'
+        assert queue.pop_ready() is None
+        assert len(queue) == 1
+
+    def test_explicit_delay_zero_ready_now(self):
+        """Test an interrupted transfer can be re-queued without a cool-down."""
+        queue = DeferredQueue()
+        queue.defer(item('a'), TRANSIENT, delay=0.0)
+        assert queue.pop_ready()[1]['sid'] == 'a'
@@ -0,0 +1,83 @@
+"""
+Unit tests for scheduler module.
+"""
+
+import sys
+from pathlib import Path
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from scheduler import schedule, SCHEDULE_POLICIES
+from progress import ProgressTracker
+
+
+def make_pending():
+    """Build (index, memory) tuples in HTML order."""
+    memories = [
+        ('a', '2023-03-01 10:00:00 UTC', 'Video'),
+        ('b', '2024-01-01 10:00:00 UTC', 'Image'),
+        ('c', '2022-06-01 10:00:00 UTC', 'Image'),
+        ('d', '2023-09-01 10:00:00 UTC', 'Video'),
+        ('e', '2021-01-01 10:00:00 UTC', 'Image'),
+    ]
+    return [
+        (i, {'sid': sid, 'date': date, 'media_type': media_type})
+        for i, (sid, date, media_type) in enumerate(memories, 1)
+    ]
+
+
+def sids(ordered):
+    return [memory['sid'] for _, memory in ordered]
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return ProgressTracker(str(tmp_path / "progress.json"))
+
+
+class TestSchedule:
+    """Test scheduling policies."""
+
+    def test_html_keeps_order(self, tracker):
+        """Test the default policy keeps the export order."""
+        assert sids(schedule(make_pending(), 'html', tracker)) == ['a', 'b', 'c', 'd', 'e']
+
+    def test_newest_first(self, tracker):
+        """Test most recent memories come first."""
+        assert sids(schedule(make_pending(), 'newest-first', tracker)) == ['b', 'd', 'a', 'c', 'e']
+
+    def test_smallest_first_with_sizes(self, tracker):
+        """Test pre-flight sizes decide the order."""
+        sizes = {'a': 500, 'b': 20, 'c': 300, 'd': 10, 'e': 40}
+        assert sids(schedule(make_pending(), 'smallest-first', tracker, sizes)) == ['d', 'b', 'e', 'c', 'a']
+
+    def test_smallest_first_without_sizes(self, tracker):
+        """Test images go before videos when sizes are unknown."""
+        assert sids(schedule(make_pending(), 'smallest-first', tracker)) == ['b', 'c', 'e', 'a', 'd']
+
+    def test_interleaved(self, tracker):
+        """Test images and videos alternate, leftovers at the end."""
+        assert sids(schedule(make_pending(), 'interleaved', tracker)) == ['b', 'a', 'c', 'd', 'e']
+
+    def test_failures_last(self, tracker):
+        """Test previously failed memories move to the end, fewest failures first."""
+        memories = {memory['sid']: dict(memory, download_url='https://example.com')
+                    for _, memory in make_pending()}
+        tracker.record_failure('a', memories['a'], "boom")
+        tracker.record_failure('a', memories['a'], "boom")
+        tracker.record_failure('c', memories['c'], "boom")
+
+        assert sids(schedule(make_pending(), 'failures-last', tracker)) == ['b', 'd', 'e', 'c', 'a']
+
+    @pytest.mark.parametrize("policy", SCHEDULE_POLICIES)
+    def test_every_policy_keeps_all_memories(self, tracker, policy):
+        """Test no policy drops or duplicates memories."""
+        ordered = schedule(make_pending(), policy, tracker)
+        assert sorted(sids(ordered)) == ['a', 'b', 'c', 'd', 'e']
+
+    def test_unknown_policy(self, tracker):
+        """Test an unknown policy is rejected."""
+        with pytest.raises(ValueError):
+            schedule(make_pending(), 'random', tracker)
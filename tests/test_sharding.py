@@ -0,0 +1,163 @@
+"""
+Unit tests for sharding module.
+"""
+
+import sys
+import json
+from pathlib import Path
+import pytest
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from sharding import (
+    Shard,
+    shard_of,
+    shard_state_file,
+    merge_progress,
+    merge_error_logs,
+    merge_timezone_conversions,
+    merge_shards
+)
+
+SIDS = [f"sid{i:05d}-aaaa-bbbb" for i in range(200)]
+
+
+def write_json(path, data):
+    Path(path).write_text(json.dumps(data), encoding='utf-8')
+
+
+def read_json(path):
+    return json.loads(Path(path).read_text(encoding='utf-8'))
+
+
+class TestShardSelection:
+    """Test splitting SIDs into shards."""
+
+    def test_every_sid_in_exactly_one_shard(self):
+        """Test shards do not overlap and cover every SID roughly evenly."""
+        shards = [Shard(index, 4) for index in range(1, 5)]
+        counts = [sum(shard.contains(sid) for sid in SIDS) for shard in shards]
+
+        assert sum(counts) == len(SIDS)
+        assert min(counts) > len(SIDS) / 8
+        for sid in SIDS:
+            assert sum(shard.contains(sid) for shard in shards) == 1
+
+    def test_deterministic(self):
+        """Test the shard of a SID is fixed (not Python's randomized hash())."""
+        assert shard_of("9ce001ca-1111-2222", 4) == shard_of("9ce001ca-1111-2222", 4)
+        assert [shard_of(sid, 1) for sid in SIDS[:5]] == [1] * 5
+
+    def test_parse(self):
+        """Test 'i/N' parsing and range checks."""
+        shard = Shard.parse("2/4")
+        assert (shard.index, shard.count) == (2, 4)
+        assert str(shard) == "2/4"
+        for value in ("0/4", "5/4", "2", "a/b", "1/0"):
+            with pytest.raises(ValueError):
+                Shard.parse(value)
+
+    def test_state_file(self):
+        """Test shard files sit next to the shared ones."""
+        assert shard_state_file("download_progress.json", 2, 4) == "download_progress.shard-2-of-4.json"
+        assert Shard(1, 3).state_file("data/errors.json") == str(Path("data/errors.shard-1-of-3.json"))
+
+
+class TestSeeding:
+    """Test starting a shard from the shared state."""
+
+    def test_progress_seeded_with_shard_sids(self, temp_working_dir):
+        """Test a new shard copies the shared progress of its own SIDs only."""
+        shard = Shard(1, 2)
+        mine = next(sid for sid in SIDS if shard.contains(sid))
+        other = next(sid for sid in SIDS if not shard.contains(sid))
+        write_json("download_progress.json", {
+            'downloaded': {mine: {'date': 'x'}, other: {'date': 'y'}},
+            'failed': {},
+            'composited': {'images': {'abcd1234': {}}, 'videos': {}},
+            'failed_composites': {'images': {}, 'videos': {}},
+            'schedule_stats': {'html': {'runs': 1}}
+        })
+
+        shard.seed_progress()
+
+        seeded = read_json("download_progress.shard-1-of-2.json")
+        assert list(seeded['downloaded']) == [mine]
+        assert seeded['composited']['images'] == {'abcd1234': {}}
+        assert 'schedule_stats' not in seeded
+
+    def test_existing_shard_file_kept(self, temp_working_dir):
+        """Test seeding never overwrites a shard's own progress."""
+        write_json("download_progress.json", {'downloaded': {SIDS[0]: {}}})
+        write_json("download_progress.shard-1-of-1.json", {'downloaded': {}})
+
+        Shard(1, 1).seed_progress()
+
+        assert read_json("download_progress.shard-1-of-1.json") == {'downloaded': {}}
+
+
+class TestMerging:
+    """Test folding shard state back together."""
+
+    def test_merge_progress(self):
+        """Test downloads win over failures and failure counts are not added up."""
+        shared = {
+            'downloaded': {'a': {'timezone_converted': False}},
+            'failed': {'b': {'count': 2}, 'c': {'count': 1}},
+            'composited': {'images': {}, 'videos': {}},
+            'failed_composites': {'images': {'x': {'count': 1}}, 'videos': {}},
+            'schedule_stats': {'html': {'runs': 1, 'memories': 10, 'bytes': 100, 'seconds': 1.0}}
+        }
+        shard = {
+            'downloaded': {'a': {'timezone_converted': True}, 'c': {}},
+            'failed': {'b': {'count': 3}, 'c': {'count': 1}},
+            'partial': {'c': {'offset': 5}},
+            'composited': {'images': {'x': {}}, 'videos': {}},
+            'failed_composites': {'images': {'x': {'count': 1}}, 'videos': {}},
+            'schedule_stats': {'html': {'runs': 2, 'memories': 5, 'bytes': 50, 'seconds': 2.0}}
+        }
+
+        merged = merge_progress([shared, shard])
+
+        assert merged['downloaded']['a'] == {'timezone_converted': True}
+        assert merged['failed'] == {'b': {'count': 3}}
+        assert merged['partial'] == {}
+        assert merged['failed_composites']['images'] == {}
+        assert merged['schedule_stats']['html'] == {'runs': 3, 'memories': 15, 'bytes': 150, 'seconds': 3.0}
+
+    def test_merge_error_logs_deduplicated(self):
+        """Test errors present in several logs are kept once, in time order."""
+        first = {'timestamp': '2024-01-02', 'sid': 'a'}
+        second = {'timestamp': '2024-01-01', 'sid': 'b'}
+        merged = merge_error_logs([{'download_errors': [first]}, {'download_errors': [first, second]}])
+
+        assert merged['download_errors'] == [second, first]
+        assert merged['composite_errors'] == []
+
+    def test_merge_timezone_conversions(self):
+        """Test the newest conversion of a SID wins."""
+        old = {'converted_at': '2024-01-01', 'utc_offset': '+01:00'}
+        new = {'converted_at': '2024-02-01', 'utc_offset': '+02:00'}
+        merged = merge_timezone_conversions([{'conversions': {'a': new}}, {'conversions': {'a': old, 'b': old}}])
+
+        assert merged['conversions'] == {'a': new, 'b': old}
+
+    def test_merge_shards(self, temp_working_dir):
+        """Test shard files are merged into the shared files and retired."""
+        write_json("download_progress.json", {'downloaded': {'a': {}}, 'failed': {'b': {'count': 1}}})
+        write_json("download_progress.shard-1-of-2.json", {'downloaded': {'b': {}}, 'failed': {}})
+        write_json("errors.shard-1-of-2.json", {'download_errors': [{'timestamp': '1'}]})
+        write_json("timezone_conversions.shard-1-of-2.json", {'conversions': {'b': {}}})
+
+        results = merge_shards(2)
+
+        assert results == {'shards': [1], 'missing': [2], 'downloaded': 2, 'failed': 0,
+                           'errors': 1, 'conversions': 1}
+        assert set(read_json("download_progress.json")['downloaded']) == {'a', 'b'}
+        assert read_json("timezone_conversions.json") == {'conversions': {'b': {}}}
+        assert Path("download_progress.shard-1-of-2.json.merged").exists()
+        assert not Path("download_progress.shard-1-of-2.json").exists()
+
+        # Merging again changes nothing
+        assert merge_shards(2)['downloaded'] == 2
@@ -182,6 +182,28 @@ class TestMemoriesParser:
             assert len(parser.memories) == 1
             assert parser.memories[0]['sid'] == expected_sid
 
+    def test_request_method_flag_kept(self):
+        """Test the downloadMemories GET/POST flag is kept with the memory."""
+        html = """
+        <tr>
+            <td>2023-01-15 14:30:00 UTC</td>
+            <td>Image</td>
+            <td></td>
+            <td><a onclick="downloadMemories('https://example.com/download?sid=get1', this, true)">Download</a></td>
+        </tr>
+        <tr>
+            <td>2023-01-16 14:30:00 UTC</td>
+            <td>Video</td>
+            <td></td>
+            <td><a onclick="downloadMemories('https://example.com/download?sid=post1', this, false)">Download</a></td>
+        </tr>
+        """
+        parser = MemoriesParser()
+        parser.feed(html)
+
+        flags = {memory['sid']: memory['is_get_request'] for memory in parser.memories}
+        assert flags == {'get1': True, 'post1': False}
+
     def test_parse_html_with_extra_content(self):
         """Test parsing HTML with extra content outside table."""
         html = """
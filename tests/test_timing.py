@@ -0,0 +1,183 @@
+"""
+Unit tests for timing module.
+"""
+
+import sys
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+import pytest
+import requests
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from timing import TimedHTTPAdapter, StageTimer, TimingLog, percentile, take_connect_time, STAGES
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'x' * 1024
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    """Serve a small body over HTTP/1.1 keep-alive on localhost."""
+    server = HTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+class TestPercentile:
+    """Test nearest-rank percentiles."""
+
+    def test_empty(self):
+        """Test an empty sample gives 0."""
+        assert percentile([], 50) == 0.0
+
+    def test_nearest_rank(self):
+        """Test percentiles pick existing sample values."""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile([3.0], 99) == 3.0
+
+    def test_unsorted_input(self):
+        """Test the input order does not matter."""
+        assert percentile([5, 1, 4, 2, 3], 50) == 3
+
+
+class TestStageTimer:
+    """Test StageTimer accumulation."""
+
+    def test_starts_at_zero(self):
+        """Test every stage starts at zero."""
+        timer = StageTimer()
+        assert set(timer.stages) == set(STAGES)
+        assert all(seconds == 0.0 for seconds in timer.stages.values())
+
+    def test_concurrent_adds(self):
+        """Test adds from several threads (parallel ZIP members) are summed."""
+        timer = StageTimer()
+
+        def worker():
+            for _ in range(1000):
+                timer.add('zip_extract', 0.001)
+                timer.add_bytes(10)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert timer.stages['zip_extract'] == pytest.approx(4.0)
+        assert timer.num_bytes == 40_000
+
+
+class TestTimingLog:
+    """Test the JSONL timing log."""
+
+    def test_records_appended_as_jsonl(self, tmp_path):
+        """Test each record is one JSON line with every stage."""
+        log = TimingLog(str(tmp_path / "timings.jsonl"))
+        timer = StageTimer()
+        timer.add('ttfb', 0.25)
+        timer.add('transfer', 0.5)
+
+        log.record('sid1', 'Image', timer, True, 2048)
+        log.record('sid2', 'Video', StageTimer(), False, failure_class='throttled')
+
+        lines = (tmp_path / "timings.jsonl").read_text().splitlines()
+        assert len(lines) == 2
+        first, second = (json.loads(line) for line in lines)
+        assert first['sid'] == 'sid1'
+        assert first['bytes'] == 2048
+        assert first['ttfb'] == 0.25
+        assert first['total'] == 0.75
+        assert all(stage in first for stage in STAGES)
+        assert 'failure_class' not in first
+        assert second['success'] is False
+        assert second['failure_class'] == 'throttled'
+
+    def test_reset_keeps_file(self, tmp_path):
+        """Test reset starts a new run summary without truncating the file."""
+        log = TimingLog(str(tmp_path / "timings.jsonl"))
+        log.record('sid1', 'Image', StageTimer(), True)
+        log.reset()
+        log.record('sid2', 'Image', StageTimer(), True)
+
+        assert len(log.records) == 1
+        assert len((tmp_path / "timings.jsonl").read_text().splitlines()) == 2
+
+    def test_memory_only_without_file(self, tmp_path, monkeypatch, capsys):
+        """Test records are kept in memory and no file is written without a log file."""
+        monkeypatch.chdir(tmp_path)
+        log = TimingLog()
+        log.record('sid1', 'Image', StageTimer(), True)
+        log.print_summary()
+
+        assert len(log.records) == 1
+        assert list(tmp_path.iterdir()) == []
+        assert "details in" not in capsys.readouterr().out
+
+    def test_summary_percentiles(self, tmp_path):
+        """Test the summary has p50/p95/p99 per stage."""
+        log = TimingLog(str(tmp_path / "timings.jsonl"))
+        for i in range(1, 101):
+            timer = StageTimer()
+            timer.add('transfer', i / 100)
+            log.record(f"sid{i}", 'Image', timer, True)
+
+        summary = log.summary()
+
+        assert summary['transfer'] == {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+        assert summary['connect']['p99'] == 0.0
+        assert summary['total']['p50'] == 0.5
+
+    def test_print_summary(self, tmp_path, capsys):
+        """Test the summary table is printed in milliseconds."""
+        log = TimingLog(str(tmp_path / "timings.jsonl"))
+        log.print_summary()
+        assert capsys.readouterr().out == ""
+
+        timer = StageTimer()
+        timer.add('ttfb', 0.123)
+        log.record('sid1', 'Image', timer, True)
+        log.print_summary()
+
+        out = capsys.readouterr().out
+        assert "1 attempts" in out
+        assert "ttfb" in out and "123" in out
+
+
+class TestTimedHTTPAdapter:
+    """Test connection setup timing."""
+
+    def test_connect_timed_once_per_connection(self, local_server):
+        """Test a new connection reports setup time and a reused one does not."""
+        session = requests.Session()
+        session.mount('http://', TimedHTTPAdapter())
+        take_connect_time()
+
+        session.get(local_server).content
+        first = take_connect_time()
+        session.get(local_server).content
+        second = take_connect_time()
+
+        assert first > 0
+        assert second == 0
@@ -0,0 +1,190 @@
+"""
+Unit tests for url_resolver module.
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+import pytest
+import requests
+
+# Add scripts directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from url_resolver import (
+    needs_resolution,
+    parse_expiry,
+    resolve_url,
+    URLCache,
+    DEFAULT_URL_TTL,
+    EXPIRY_MARGIN
+)
+from download_errors import RateLimitedError, ErrorPageError
+
+
+class ResolveResponse:
+    """Minimal response for link resolution."""
+
+    def __init__(self, text='', status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error", response=self)
+
+
+class ResolveSession:
+    """Fake session recording POSTs."""
+
+    def __init__(self, response):
+        self.response = response
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append((url, kwargs))
+        return self.response
+
+
+POST_MEMORY = {
+    'sid': 'abc',
+    'download_url': 'https://app.snapchat.com/dmd/memories?uid=u1&sid=abc&mid=m1',
+    'is_get_request': False
+}
+
+
+class TestNeedsResolution:
+    """Test the GET/POST flag check."""
+
+    def test_flags(self):
+        """Test only POST links need resolution; old memories default to GET."""
+        assert needs_resolution(POST_MEMORY)
+        assert not needs_resolution(dict(POST_MEMORY, is_get_request=True))
+        assert not needs_resolution({'sid': 'x', 'download_url': 'https://example.com'})
+
+
+class TestParseExpiry:
+    """Test reading the expiry of signed URLs."""
+
+    def test_expires_epoch(self):
+        """Test CloudFront-style Expires parameter."""
+        assert parse_expiry("https://cdn.example.com/a.jpg?Expires=1700000000&Signature=x") == 1700000000
+
+    def test_amz_date_and_expires(self):
+        """Test S3-style signing date plus lifetime."""
+        url = "https://s3.example.com/a.mp4?X-Amz-Date=20231114T221320Z&X-Amz-Expires=3600&X-Amz-Signature=x"
+        assert parse_expiry(url) == 1700000000 + 3600
+
+    def test_goog_date_and_expires(self):
+        """Test GCS-style signing date plus lifetime."""
+        url = "https://storage.example.com/a.mp4?x-goog-date=20231114T221320Z&x-goog-expires=60"
+        assert parse_expiry(url) == 1700000000 + 60
+
+    def test_no_expiry(self):
+        """Test URLs without expiry information."""
+        assert parse_expiry("https://cdn.example.com/a.jpg") is None
+        assert parse_expiry("https://cdn.example.com/a.jpg?X-Amz-Date=garbage&X-Amz-Expires=10") is None
+
+
+class TestResolveURL:
+    """Test POSTing export links."""
+
+    def test_post_returns_cdn_url(self):
+        """Test the query string is POSTed as form body and the response is the URL."""
+        session = ResolveSession(ResolveResponse("https://cdn.example.com/a.jpg?Expires=1700000000\n"))
+
+        url, expires_at = resolve_url(session, POST_MEMORY)
+
+        assert url == "https://cdn.example.com/a.jpg?Expires=1700000000"
+        assert expires_at == 1700000000
+        posted_url, kwargs = session.posts[0]
+        assert posted_url == "https://app.snapchat.com/dmd/memories"
+        assert kwargs['data'] == "uid=u1&sid=abc&mid=m1"
+        assert kwargs['headers']['Content-Type'] == 'application/x-www-form-urlencoded'
+
+    def test_default_ttl(self):
+        """Test URLs without expiry get the default lifetime."""
+        session = ResolveSession(ResolveResponse("https://cdn.example.com/a.jpg"))
+        before = time.time()
+
+        _, expires_at = resolve_url(session, POST_MEMORY)
+
+        assert before + DEFAULT_URL_TTL <= expires_at <= time.time() + DEFAULT_URL_TTL
+
+    def test_error_page(self):
+        """Test an HTML answer is treated as an error page."""
+        session = ResolveSession(ResolveResponse("<html>Try again later</html>"))
+        with pytest.raises(ErrorPageError):
+            resolve_url(session, POST_MEMORY)
+
+    def test_throttled(self):
+        """Test HTTP 429 raises RateLimitedError with Retry-After."""
+        session = ResolveSession(ResolveResponse(status_code=429, headers={'retry-after': '7'}))
+        with pytest.raises(RateLimitedError) as exc_info:
+            resolve_url(session, POST_MEMORY)
+        assert exc_info.value.retry_after == 7
+
+    def test_http_error(self):
+        """Test other HTTP errors are raised as HTTPError."""
+        session = ResolveSession(ResolveResponse(status_code=404))
+        with pytest.raises(requests.HTTPError):
+            resolve_url(session, POST_MEMORY)
+
+
+class TestURLCache:
+    """Test the resolved URL cache."""
+
+    def test_get_put_invalidate(self, tmp_path):
+        """Test cached URLs are returned until invalidated."""
+        cache = URLCache(str(tmp_path / "urls.json"))
+        cache.put('abc', "https://cdn.example.com/a.jpg", time.time() + 3600)
+
+        assert cache.get('abc') == "https://cdn.example.com/a.jpg"
+        cache.invalidate('abc')
+        assert cache.get('abc') is None
+        cache.invalidate('missing')
+
+    def test_expiring_url_not_used(self, tmp_path):
+        """Test URLs within the expiry margin are treated as missing."""
+        cache = URLCache(str(tmp_path / "urls.json"))
+        cache.put('abc', "https://cdn.example.com/a.jpg", time.time() + EXPIRY_MARGIN / 2)
+
+        assert cache.get('abc') is None
+        assert cache.get('abc', margin=0) == "https://cdn.example.com/a.jpg"
+
+    def test_persisted_without_expired(self, tmp_path):
+        """Test the cache survives a restart and expired URLs are dropped on save."""
+        cache_file = tmp_path / "urls.json"
+        cache = URLCache(str(cache_file))
+        cache.put('valid', "https://cdn.example.com/a.jpg", time.time() + 3600)
+        cache.put('expired', "https://cdn.example.com/b.jpg", time.time() - 1)
+        cache.save()
+
+        assert set(json.loads(cache_file.read_text())) == {'valid'}
+        assert URLCache(str(cache_file)).get('valid') == "https://cdn.example.com/a.jpg"
+
+    def test_concurrent_saves_merged(self, tmp_path):
+        """Test two processes sharing the file keep each other's URLs and removals."""
+        cache_file = tmp_path / "urls.json"
+        seed = URLCache(str(cache_file))
+        seed.put('old', "https://cdn.example.com/old.jpg", time.time() + 3600)
+        seed.save()
+        first, second = URLCache(str(cache_file)), URLCache(str(cache_file))
+
+        first.put('a', "https://cdn.example.com/a.jpg", time.time() + 3600)
+        first.invalidate('old')
+        first.save()
+        second.put('b', "https://cdn.example.com/b.jpg", time.time() + 3600)
+        second.save()
+
+        assert set(json.loads(cache_file.read_text())) == {'a', 'b'}
+
+    def test_broken_cache_file(self, tmp_path, capsys):
+        """Test a corrupt cache file is discarded with a warning."""
+        cache_file = tmp_path / "urls.json"
+        cache_file.write_text("{broken")
+
+        assert URLCache(str(cache_file)).entries == {}
+        assert "Could not load URL cache" in capsys.readouterr().out